@@ -11,6 +11,7 @@ os.environ["DOCKER_CONTAINER"] = "true"
 os.environ["PORT"] = os.getenv("PORT", "8001")
 os.environ["DB_TYPE"] = "sqlite"
 os.environ["SQLITE_DB_NAME"] = "ferreteria.db"
+os.environ.setdefault("SYNC_DAEMON_ENABLED", "true")  # Background push/pull with the cloud
 
 # DEBUG: Confirm env vars are set
 print(f"[DEBUG] DOCKER_CONTAINER={os.getenv('DOCKER_CONTAINER')}")
@@ -0,0 +1,62 @@
+"""add_delta_sync_columns_and_tombstones
+
+Revision ID: a7d3e9c2b4f1
+Revises: 12fea28e253c
+Create Date: 2026-01-06 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9c2b4f1'
+down_revision: Union[str, Sequence[str], None] = '12fea28e253c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tables pulled by offline clients that did not track changes yet
+NEW_UPDATED_AT = ['categories', 'product_units', 'customers', 'users']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in NEW_UPDATED_AT:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(f'ix_{table}_updated_at', ['updated_at'], unique=False)
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_updated_at', ['updated_at'], unique=False)
+
+    # Existing rows get a timestamp so the first delta after a full sync is well defined
+    for table in NEW_UPDATED_AT + ['products', 'exchange_rates']:
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+
+    op.create_table(
+        'sync_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sync_tombstones_id', 'sync_tombstones', ['id'], unique=False)
+    op.create_index('ix_sync_tombstones_deleted_at', 'sync_tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tombstones_deleted_at', table_name='sync_tombstones')
+    op.drop_index('ix_sync_tombstones_id', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_updated_at')
+
+    for table in NEW_UPDATED_AT:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_updated_at')
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,70 @@
+"""add_daily_sales_rollups
+
+Revision ID: b3e8f1a6c2d7
+Revises: a7d3e9c2b4f1
+Create Date: 2026-01-08 09:41:15.274031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f1a6c2d7'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e9c2b4f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sales_rollup_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=14, scale=3), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('cost', sa.Numeric(precision=16, scale=4), nullable=False),
+        sa.Column('lines', sa.Integer(), nullable=False),
+        sa.Column('refund_quantity', sa.Numeric(precision=14, scale=3), nullable=False),
+        sa.Column('refund_revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('refund_cost', sa.Numeric(precision=16, scale=4), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'product_id', 'warehouse_id', 'currency', name='uq_sales_rollup_daily_key')
+    )
+    op.create_index('ix_sales_rollup_daily_id', 'sales_rollup_daily', ['id'], unique=False)
+    op.create_index('ix_sales_rollup_daily_day', 'sales_rollup_daily', ['day'], unique=False)
+
+    op.create_table(
+        'currency_rollup_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('sale_count', sa.Integer(), nullable=False),
+        sa.Column('collected', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('rate_sum', sa.Numeric(precision=18, scale=4), nullable=False),
+        sa.Column('rate_count', sa.Integer(), nullable=False),
+        sa.Column('refunded', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'currency', name='uq_currency_rollup_daily_key')
+    )
+    op.create_index('ix_currency_rollup_daily_id', 'currency_rollup_daily', ['id'], unique=False)
+    op.create_index('ix_currency_rollup_daily_day', 'currency_rollup_daily', ['day'], unique=False)
+    # Rollups start empty: run scripts/rebuild_rollups.py once to backfill history
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_currency_rollup_daily_day', table_name='currency_rollup_daily')
+    op.drop_index('ix_currency_rollup_daily_id', table_name='currency_rollup_daily')
+    op.drop_table('currency_rollup_daily')
+    op.drop_index('ix_sales_rollup_daily_day', table_name='sales_rollup_daily')
+    op.drop_index('ix_sales_rollup_daily_id', table_name='sales_rollup_daily')
+    op.drop_table('sales_rollup_daily')
+    op.execute("DELETE FROM business_config WHERE key = 'sales_rollups_built_at'")
@@ -0,0 +1,52 @@
+"""add_unit_cost_snapshot
+
+Revision ID: c5d2a9e7f3b1
+Revises: b3e8f1a6c2d7
+Create Date: 2026-01-09 16:05:52.481920
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2a9e7f3b1'
+down_revision: Union[str, Sequence[str], None] = 'b3e8f1a6c2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('sale_details', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_cost', sa.Numeric(precision=14, scale=4), nullable=True))
+    with op.batch_alter_table('return_details', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_cost', sa.Numeric(precision=14, scale=4), nullable=True))
+
+    # Existing lines get today's cost (what reports used so far); scripts/backfill_unit_cost.py
+    # can re-estimate them from purchase history afterwards
+    op.execute(
+        "UPDATE sale_details SET unit_cost = COALESCE("
+        "(SELECT cost_price FROM products WHERE products.id = sale_details.product_id), 0)"
+    )
+    op.execute(
+        "UPDATE return_details SET unit_cost = COALESCE("
+        "(SELECT cost_price FROM products WHERE products.id = return_details.product_id), 0)"
+    )
+    business_config = sa.table('business_config', sa.column('key', sa.String), sa.column('value', sa.Text))
+    op.execute(business_config.delete().where(business_config.c.key == 'unit_cost_snapshot_since'))
+    op.bulk_insert(business_config, [
+        {'key': 'unit_cost_snapshot_since', 'value': datetime.now().isoformat(timespec='seconds')}
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM business_config WHERE key = 'unit_cost_snapshot_since'")
+    with op.batch_alter_table('return_details', schema=None) as batch_op:
+        batch_op.drop_column('unit_cost')
+    with op.batch_alter_table('sale_details', schema=None) as batch_op:
+        batch_op.drop_column('unit_cost')
@@ -0,0 +1,45 @@
+"""add_cash_session_balances
+
+Revision ID: d8f4b2c6a9e3
+Revises: c5d2a9e7f3b1
+Create Date: 2026-01-12 10:22:37.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f4b2c6a9e3'
+down_revision: Union[str, Sequence[str], None] = 'c5d2a9e7f3b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'cash_session_balances',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('initial', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('cash_sales', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('deposits', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('expenses', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('refunds', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['session_id'], ['cash_sessions.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id', 'currency', name='uq_cash_session_balance_key')
+    )
+    op.create_index('ix_cash_session_balances_id', 'cash_session_balances', ['id'], unique=False)
+    # Sessions still open are seeded with their derived totals on their next cash write
+    # (readers derive them meanwhile); scripts/reconcile_cash.py --all stores them right away
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cash_session_balances_id', table_name='cash_session_balances')
+    op.drop_table('cash_session_balances')
@@ -0,0 +1,53 @@
+"""add_hot_query_indexes
+
+Revision ID: e2a7c4f9b6d1
+Revises: d8f4b2c6a9e3
+Create Date: 2026-01-19 09:41:12.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c4f9b6d1'
+down_revision: Union[str, Sequence[str], None] = 'd8f4b2c6a9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, columns); covered by tests/test_query_plans.py
+INDEXES = [
+    ('ix_sale_payments_sale_id', 'sale_payments', ['sale_id']),
+    ('ix_sale_details_sale_id', 'sale_details', ['sale_id']),
+    ('ix_sale_details_product_id', 'sale_details', ['product_id']),
+    ('ix_sales_customer_id_is_credit_paid_due_date', 'sales', ['customer_id', 'is_credit', 'paid', 'due_date']),
+    ('ix_sales_is_credit_paid_due_date', 'sales', ['is_credit', 'paid', 'due_date']),
+    ('ix_product_stocks_product_id_warehouse_id', 'product_stocks', ['product_id', 'warehouse_id']),
+    ('ix_cash_movements_session_id_type_currency', 'cash_movements', ['session_id', 'type', 'currency']),
+    ('ix_cash_movements_date', 'cash_movements', ['date']),
+    ('ix_kardex_product_id_date', 'kardex', ['product_id', 'date']),
+    ('ix_returns_sale_id', 'returns', ['sale_id']),
+    ('ix_returns_date', 'returns', ['date']),
+    ('ix_return_details_return_id', 'return_details', ['return_id']),
+    ('ix_audit_logs_table_name_timestamp', 'audit_logs', ['table_name', 'timestamp']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    # Fresh statistics so the planner picks the new indexes right away
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE')
+    else:
+        for table in sorted({table for _, table, _ in INDEXES}):
+            op.execute(f'ANALYZE {table}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,69 @@
+"""add_product_search
+
+On Postgres the typo fallback needs the pg_trgm extension, which only a
+superuser (or, on Postgres 13+, a role with CREATE on the database) can
+install. Without it the migration still succeeds and leaves the trigram
+index out; see services/product_search.py.
+
+Revision ID: f3b9d2a7c5e8
+Revises: e2a7c4f9b6d1
+Create Date: 2026-01-22 10:12:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d2a7c5e8'
+down_revision: Union[str, Sequence[str], None] = 'e2a7c4f9b6d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Filled by services/product_search.py (ensure_index at startup, then incrementally)
+SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "name, codes, category, details, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search_vocab USING fts5vocab(product_search, row)",
+]
+POSTGRES = [
+    "CREATE TABLE IF NOT EXISTS product_search ("
+    "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+    "name TEXT NOT NULL, codes TEXT NOT NULL, category TEXT NOT NULL, details TEXT NOT NULL, "
+    "document TSVECTOR GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', codes), 'B') || "
+    "setweight(to_tsvector('simple', category), 'C') || setweight(to_tsvector('simple', details), 'D')"
+    ") STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_document ON product_search USING gin (document)",
+]
+POSTGRES_TRIGRAM = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_name_trgm ON product_search USING gin (name gin_trgm_ops)",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for statement in SQLITE:
+            op.execute(statement)
+        return
+    for statement in POSTGRES:
+        op.execute(statement)
+    try:
+        with bind.begin_nested():  # A failed CREATE EXTENSION must not abort the migration transaction
+            for statement in POSTGRES_TRIGRAM:
+                op.execute(statement)
+    except sa.exc.DBAPIError as e:
+        print(f"[WARN] pg_trgm not installed ({e.orig}); product search runs without typo tolerance")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS product_search_vocab')
+    op.execute('DROP TABLE IF EXISTS product_search')
@@ -32,4 +32,68 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+    # Connection pools (see database/db.py). OLTP = POS traffic (get_db); reads = reports/exports/search (get_read_db)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_READ_URL: str = os.getenv("DB_READ_URL", "")  # Read replica; empty = primary through its own pool
+    DB_READ_SPLIT: bool = os.getenv("DB_READ_SPLIT", "true").lower() == "true"  # false: reads share the OLTP pool
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", "5"))
+    DB_READ_STATEMENT_TIMEOUT: float = float(os.getenv("DB_READ_STATEMENT_TIMEOUT", "60"))  # seconds, 0 = none
+
+    # SQLite desktop profile (see database/sqlite_profile.py)
+    SQLITE_WAL: bool = os.getenv("SQLITE_WAL", "true").lower() == "true"  # Readers don't block the POS writer
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough under WAL
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Per connection
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    SQLITE_BUSY_TIMEOUT: float = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))  # seconds
+    SQLITE_SERIALIZE_WRITES: bool = os.getenv("SQLITE_SERIALIZE_WRITES", "true").lower() == "true"
+    SQLITE_CHECKPOINT_INTERVAL: float = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "300"))  # seconds
+    SQLITE_OPTIMIZE_INTERVAL: float = float(os.getenv("SQLITE_OPTIMIZE_INTERVAL", "3600"))  # seconds
+
+    # Real-time events across workers/nodes (see websocket/pubsub.py)
+    WS_BACKEND: str = os.getenv("WS_BACKEND", "memory")  # memory | local | postgres
+    WS_BROKER_ADDRESS: str = os.getenv("WS_BROKER_ADDRESS", "127.0.0.1:8765")
+    WS_PG_DSN: str = os.getenv("WS_PG_DSN", "")  # Defaults to DATABASE_URL
+    WS_PG_CHANNEL: str = os.getenv("WS_PG_CHANNEL", "ws_events")
+
+    # Background sync with the cloud (desktop/local backend, see services/sync_daemon.py)
+    # Off by default; the packaged desktop backend turns it on
+    SYNC_DAEMON_ENABLED: bool = os.getenv("SYNC_DAEMON_ENABLED", "false").lower() == "true"
+    SYNC_PUSH_BATCH_SIZE: int = int(os.getenv("SYNC_PUSH_BATCH_SIZE", "200"))
+    SYNC_PUSH_INTERVAL: float = float(os.getenv("SYNC_PUSH_INTERVAL", "15"))  # seconds
+    SYNC_PULL_INTERVAL: float = float(os.getenv("SYNC_PULL_INTERVAL", "300"))  # seconds
+    SYNC_MAX_BACKOFF: float = float(os.getenv("SYNC_MAX_BACKOFF", "300"))  # seconds
+
+    # Background report jobs (see services/report_jobs.py)
+    REPORT_JOBS_DIR: str = os.getenv("REPORT_JOBS_DIR", "./report_jobs")  # Job store + artifacts
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", "1"))  # Reports built at the same time (per API worker)
+    REPORT_WORKER_NICE: int = int(os.getenv("REPORT_WORKER_NICE", "10"))  # Below POS traffic
+    REPORT_JOBS_PROCESSES: bool = os.getenv("REPORT_JOBS_PROCESSES", "true").lower() == "true"  # false: threads
+    REPORT_MAX_ACTIVE_PER_USER: int = int(os.getenv("REPORT_MAX_ACTIVE_PER_USER", "3"))
+    REPORT_CACHE_TTL: float = float(os.getenv("REPORT_CACHE_TTL", "3600"))  # seconds an artifact is reused
+    REPORT_JOB_RETENTION: float = float(os.getenv("REPORT_JOB_RETENTION", "86400"))  # seconds before cleanup
+
+    # In-memory scan index for /products/scan (see services/scan_index.py)
+    SCAN_INDEX_ENABLED: bool = os.getenv("SCAN_INDEX_ENABLED", "true").lower() == "true"
+    SCAN_INDEX_REFRESH_INTERVAL: float = float(os.getenv("SCAN_INDEX_REFRESH_INTERVAL", "0.5"))  # seconds
+    SCAN_INDEX_REBUILD_INTERVAL: float = float(os.getenv("SCAN_INDEX_REBUILD_INTERVAL", "900"))  # Full reload, seconds
+
+    # Full-text product search (see services/product_search.py): build the index at startup when empty
+    PRODUCT_SEARCH_BACKFILL: bool = os.getenv("PRODUCT_SEARCH_BACKFILL", "true").lower() == "true"
+
+    # Verified-token and user caches for get_current_user (see services/auth_cache.py)
+    AUTH_CACHE_ENABLED: bool = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))  # Tokens kept
+    AUTH_USER_CACHE_TTL: float = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))  # seconds; bounds cross-worker staleness
+    PIN_CACHE_TTL: float = float(os.getenv("PIN_CACHE_TTL", "300"))  # seconds a validated PIN skips the database
+
+    # Password hashing (see security.py): bcrypt runs in its own bounded pool, off the event loop
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Hashes of any other cost are upgraded on login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # Concurrent bcrypt calls
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # Beyond this logins get 503
+
+    # Cached BusinessConfig / exchange rates / currencies (see services/config_store.py)
+    CONFIG_CACHE_TTL: float = float(os.getenv("CONFIG_CACHE_TTL", "60"))  # seconds; bounds cross-worker staleness
+
 settings = Settings()
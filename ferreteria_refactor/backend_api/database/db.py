@@ -1,12 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import HTTPConnection
 from ..config import settings
+from . import sqlite_profile
 
 # Hybrid Database Support
 # If DB_TYPE is 'sqlite' or DATABASE_URL contains 'sqlite', we adapt.
 import os
 import sqlite3
+import time
 from decimal import Decimal
 
 # Register adapter for Decimal -> float in SQLite to avoid "Error binding parameter: type 'decimal.Decimal' is not supported"
@@ -50,32 +53,126 @@ if DB_TYPE == "sqlite" or "sqlite" in str(DATABASE_URL):
             DATABASE_URL = f"sqlite:///{db_path}"
             print(f"[DB] Modo Desarrollo. Usando BD absoluta: {db_path}")
         
-    connect_args = {"check_same_thread": False, "timeout": 30}
+    connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT}
     pool_config = {} # SQLite doesn't use the same pool config as Postgres
 else:
     # VPS/Docker Mode (Postgres)
     connect_args = {}
     pool_config = {
-        "pool_size": 20,        # Mantener 20 conexiones listas
-        "max_overflow": 10,     # Permitir 10 extra en picos
+        "pool_size": settings.DB_POOL_SIZE,        # Mantener 20 conexiones listas
+        "max_overflow": settings.DB_MAX_OVERFLOW,  # Permitir 10 extra en picos
         "pool_timeout": 30,     # Esperar 30s antes de dar error
         "pool_recycle": 1800,   # Reciclar conexiones cada 30 min
         "pool_pre_ping": True   # Verificar conexión antes de usarla
     }
 
+IS_SQLITE = str(DATABASE_URL).startswith("sqlite")
+SQLITE_MEMORY = IS_SQLITE and (":memory:" in str(DATABASE_URL) or str(DATABASE_URL) == "sqlite://")
+
 engine = create_engine(
     DATABASE_URL,
     connect_args=connect_args,
     **pool_config
 )
 
+# Desktop SQLite file: WAL + tuned PRAGMAs, and mutation requests serialized (see sqlite_profile.py)
+SQLITE_PROFILE = IS_SQLITE and not SQLITE_MEMORY
+write_lock = None
+sqlite_maintenance = None
+if SQLITE_PROFILE:
+    if settings.SQLITE_SERIALIZE_WRITES:
+        write_lock = sqlite_profile.WriteLock(settings.SQLITE_BUSY_TIMEOUT)
+    sqlite_profile.install(engine, write_lock=write_lock)
+    if settings.SQLITE_WAL:
+        sqlite_maintenance = sqlite_profile.SqliteMaintenance(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessions of mutation requests: BEGIN IMMEDIATE under the write lock (same as SessionLocal elsewhere)
+WriteSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False,
+    bind=engine.execution_options(sqlite_begin="IMMEDIATE") if write_lock else engine
+)
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# --- Read sessions (reports, exports, search) ---
+# A second engine with its own pool so long analytical queries never take
+# connections from create_sale: a replica when DB_READ_URL is set, otherwise
+# the primary through a separate read-only pool. Every statement is bounded
+# by DB_READ_STATEMENT_TIMEOUT. Replicas lag a little: anything that must
+# read its own writes stays on get_db.
+
+def _sqlite_read_only_url(url: str) -> str:
+    """sqlite:///path.db -> read-only URI connection to the same file"""
+    path = str(url)[len("sqlite:///"):].replace("\\", "/")
+    return f"sqlite:///file:{path}?mode=ro&uri=true"
+
+
+def _install_sqlite_timeout(read_engine, timeout: float):
+    """SQLite has no statement_timeout: interrupt a statement from the progress handler once it runs too long"""
+    @event.listens_for(read_engine, "connect")
+    def _progress_deadline(dbapi_connection, connection_record):
+        deadline = connection_record.info.setdefault("statement_deadline", [None])
+        dbapi_connection.set_progress_handler(
+            lambda: 1 if deadline[0] is not None and time.monotonic() > deadline[0] else 0, 10000)
+
+    @event.listens_for(read_engine, "before_cursor_execute")
+    def _start_deadline(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_deadline"][0] = time.monotonic() + timeout
+
+    @event.listens_for(read_engine, "after_cursor_execute")
+    def _clear_deadline(conn, cursor, statement, parameters, context, executemany):
+        # Rows streamed afterwards (yield_per exports) are not cut off
+        conn.info["statement_deadline"][0] = None
+
+
+def _create_read_engine():
+    if not settings.DB_READ_SPLIT or SQLITE_MEMORY:
+        return engine  # Same pool (in-memory SQLite can't be opened twice)
+    timeout = settings.DB_READ_STATEMENT_TIMEOUT
+    read_pool = {"pool_size": settings.DB_READ_POOL_SIZE, "max_overflow": settings.DB_READ_MAX_OVERFLOW}
+    if IS_SQLITE:
+        read_engine = create_engine(_sqlite_read_only_url(DATABASE_URL), connect_args=dict(connect_args), **read_pool)
+        sqlite_profile.install(read_engine, read_only=True)
+        if timeout:
+            _install_sqlite_timeout(read_engine, timeout)
+        return read_engine
+
+    options = "-c default_transaction_read_only=on"
+    if timeout:
+        options += f" -c statement_timeout={int(timeout * 1000)}"
+    return create_engine(
+        settings.DB_READ_URL or DATABASE_URL,
+        connect_args={**connect_args, "options": options},
+        **{**pool_config, **read_pool}
+    )
+
+
+read_engine = _create_read_engine()
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
-def get_db():
+def get_db(connection: HTTPConnection):
+    # POST/PUT/PATCH/DELETE get a write session: on desktop SQLite they queue for the write lock
+    factory = WriteSessionLocal if connection.scope.get("method") in WRITE_METHODS else SessionLocal
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_unserialized_db():
+    """Deferred transactions, no write lock: for mutation requests that wait on the network between commits"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Session for reports, exports and search (see read_engine above); never commit on it"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,196 @@
+"""
+SQLite Desktop Profile
+Connection tuning for the desktop (SQLite file) database.
+
+Every connection gets the profile's PRAGMAs: WAL journal (readers never
+block the writer), synchronous=NORMAL (safe under WAL, no fsync per
+commit), a larger page cache, mmap reads, in-memory temp tables and an
+explicit busy_timeout.
+
+pysqlite's own transaction handling is turned off and BEGIN is emitted
+from SQLAlchemy events instead (the documented workaround), so SAVEPOINTs
+work and a transaction can start as BEGIN IMMEDIATE. Write sessions
+(mutation requests, see db.get_db) start that way and hold a process-wide
+lock for the whole transaction: POS writers queue in order instead of
+polling the busy handler, and a read transaction never has to be
+upgraded (the "database is locked" case). Other sessions keep pysqlite's
+old behaviour: BEGIN right before their first write.
+
+The lock is a blocking threading.Lock, so write sessions belong to plain
+`def` routes (threadpool). Taken from the event loop it never waits: a busy
+lock raises DatabaseBusyError (503) instead of freezing the whole process.
+
+SqliteMaintenance checkpoints the WAL and runs PRAGMA optimize
+periodically from the app loop.
+"""
+import asyncio
+import threading
+import time
+from typing import List, Optional
+from sqlalchemy import event
+from ..config import settings
+
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "SAVEPOINT", "CREATE", "DROP", "ALTER")
+
+
+class DatabaseBusyError(Exception):
+    """The write lock was not free within SQLITE_BUSY_TIMEOUT"""
+
+
+def connection_pragmas(read_only: bool = False) -> List[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # Negative = KiB
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if not read_only:
+        if settings.SQLITE_WAL:
+            pragmas.insert(0, "PRAGMA journal_mode=WAL")  # Persistent in the file
+        pragmas += [
+            f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+            f"PRAGMA journal_size_limit={64 * 1024 * 1024}",  # Truncate the WAL back after checkpoints
+        ]
+    return pragmas
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class WriteLock:
+    """FIFO-ish process lock held from BEGIN IMMEDIATE to COMMIT/ROLLBACK (may be released by another thread)"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def acquire(self):
+        if _on_event_loop():
+            # Waiting here would freeze every request and websocket of the process (and can
+            # deadlock against a holder that awaits): write sessions belong in sync routes
+            if not self._lock.acquire(blocking=False):
+                raise DatabaseBusyError("Database busy: write session opened on the event loop")
+            self.waits += 1
+            return
+        started = time.perf_counter()
+        if not self._lock.acquire(timeout=self.timeout):
+            raise DatabaseBusyError(f"Database busy: no write slot within {self.timeout:.0f}s")
+        waited = (time.perf_counter() - started) * 1000
+        self.waits += 1
+        self.wait_total_ms += waited
+        self.wait_max_ms = max(self.wait_max_ms, waited)
+
+    def release(self):
+        self._lock.release()
+
+
+def install(engine, read_only: bool = False, write_lock: Optional[WriteLock] = None):
+    """Apply the profile to every connection of `engine`"""
+    pragmas = connection_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None  # SQLAlchemy emits BEGIN (see _on_begin)
+        for pragma in pragmas:
+            dbapi_connection.execute(pragma)
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        mode = conn.get_execution_options().get("sqlite_begin")
+        if mode == "IMMEDIATE" and write_lock is not None:
+            write_lock.acquire()
+            conn.info["holds_write_lock"] = True
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            except Exception:
+                _end(conn)
+                raise
+        elif read_only:
+            conn.exec_driver_sql("BEGIN")  # One snapshot for every query of a report
+        else:
+            # Like pysqlite: BEGIN right before the first write. A deferred transaction that has
+            # already read can't wait for the write lock (SQLITE_BUSY_SNAPSHOT under WAL).
+            conn.info["begin_pending"] = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _lazy_begin(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("begin_pending") and statement.lstrip()[:9].upper().startswith(WRITE_STATEMENTS):
+            conn.info.pop("begin_pending")
+            cursor.execute("BEGIN")
+
+    def _end(conn):
+        # Fired before the COMMIT/ROLLBACK itself; a writer let in early waits on busy_timeout for a moment
+        conn.info.pop("begin_pending", None)
+        if conn.info.pop("holds_write_lock", False):
+            write_lock.release()
+
+    @event.listens_for(engine, "commit")
+    def _on_commit(conn):
+        _end(conn)
+
+    @event.listens_for(engine, "rollback")
+    def _on_rollback(conn):
+        _end(conn)
+
+
+class SqliteMaintenance:
+    """Periodic WAL checkpoint and PRAGMA optimize, run in a worker thread"""
+
+    def __init__(self, engine, checkpoint_interval: float = None, optimize_interval: float = None):
+        self.engine = engine
+        self.checkpoint_interval = checkpoint_interval or settings.SQLITE_CHECKPOINT_INTERVAL
+        self.optimize_interval = optimize_interval or settings.SQLITE_OPTIMIZE_INTERVAL
+        self._task = None
+        self._next_optimize = 0.0
+        self.last_checkpoint = None  # (busy, wal frames, frames checkpointed)
+
+    def _pragma(self, statement: str):
+        # Raw connection: autocommit, outside any BEGIN
+        conn = self.engine.raw_connection()
+        try:
+            return conn.execute(statement).fetchone()
+        finally:
+            conn.close()
+
+    def run_once(self, mode: str = "PASSIVE"):
+        self.last_checkpoint = tuple(self._pragma(f"PRAGMA wal_checkpoint({mode})"))
+        if time.monotonic() >= self._next_optimize:
+            self._pragma("PRAGMA optimize")
+            self._next_optimize = time.monotonic() + self.optimize_interval
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        self._next_optimize = time.monotonic() + self.optimize_interval
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=5.0)
+            self._task = None
+            try:
+                # Leave a small WAL and fresh statistics behind
+                self._next_optimize = 0.0
+                await asyncio.to_thread(self.run_once, "TRUNCATE")
+            except Exception as e:
+                print(f"[DB] Final checkpoint skipped: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[DB] WAL checkpoint failed: {type(e).__name__}: {e}")
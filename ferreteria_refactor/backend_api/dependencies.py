@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
@@ -7,37 +7,51 @@ from typing import List, Annotated
 from .database.db import get_db
 from .config import settings
 from .models.models import User, UserRole
+from .services.auth_cache import AuthUser, auth_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
-    print(f"🕵️ SERVER PROBE: Checking Token: {token[:15]}...")
+def _token_subject(token: str):
+    """Username of a valid token (verified once, then served from the cache until exp), or None"""
+    if settings.AUTH_CACHE_ENABLED:
+        username = auth_cache.token_subject(token)
+        if username is not None:
+            return username
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is not None and settings.AUTH_CACHE_ENABLED:
+        auth_cache.remember_token(token, username, payload.get("exp"))
+    return username
+
+def get_current_user(request: Request, token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    # Resolved once per request; nested dependencies and later code read request.state.user
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            print("⛔ Auth Failed: Token payload missing 'sub'")
-            raise credentials_exception
-    except JWTError as e:
-        print(f"⛔ JWT Validation Error: {e}")
-        print(f"   - Expected Key: {settings.SECRET_KEY[:5]}...")
-        print(f"   - Algorithm: {settings.ALGORITHM}")
+    username = _token_subject(token)
+    if username is None:
         raise credentials_exception
-        
-    user = db.query(User).filter(User.username == username).first()
+
+    user = auth_cache.user(username) if settings.AUTH_CACHE_ENABLED else None
     if user is None:
-        print(f"⛔ Auth Failed: User '{username}' not found in DB.")
-        raise credentials_exception
-    
-    print(f"✅ Auth Success: User '{username}' authenticated.")
+        db_user = db.query(User).filter(User.username == username).first()
+        if db_user is None:
+            raise credentials_exception
+        user = AuthUser.from_model(db_user)
+        if settings.AUTH_CACHE_ENABLED:
+            auth_cache.remember_user(user)
+    request.state.user = user
     return user
 
-def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
+def get_current_active_user(current_user: Annotated[AuthUser, Depends(get_current_user)]):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -46,10 +60,8 @@ class RoleChecker:
     def __init__(self, allowed_roles: List[UserRole]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: Annotated[User, Depends(get_current_active_user)]):
-        print(f"🕵️ RoleChecker: User '{user.username}' (Role: {user.role}) vs Allowed: {self.allowed_roles}")
+    def __call__(self, user: Annotated[AuthUser, Depends(get_current_active_user)]):
         if user.role not in self.allowed_roles:
-            print(f"⛔ RoleChecker: Access DENIED. User role {user.role} not in {self.allowed_roles}")
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail="Operation not permitted"
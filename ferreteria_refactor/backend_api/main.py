@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
+import asyncio
 import os
 import sys
 
@@ -20,7 +21,7 @@ from .routers import (
     auth, products, users, reports, customers, suppliers, 
     purchases, cash, config, quotes, warehouses, transfers, 
     inventory, returns, categories, websocket, audit, system, 
-    payment_methods, sync, sync_local, cloud
+    payment_methods, sync, sync_local, cloud, report_jobs
 )
 from .audit_utils import log_action
 from .models.models import UserRole
@@ -34,12 +35,54 @@ app = FastAPI(
 )
 
 from .config import settings
+from .websocket.event_bus import event_bus
+from .services.sync_daemon import sync_daemon
+from .services.report_jobs import report_jobs as report_job_manager
+from .database.db import sqlite_maintenance, WriteSessionLocal
+from .services.scan_index import scan_index
+from .services import product_search
+from .database.sqlite_profile import DatabaseBusyError
 
 @app.on_event("startup")
 async def startup_event_async():
     print("\n" + "="*60)
     print("[INFO] FERRETERIA API INICIADA (Modo Docker SaaS v2)")
     print("="*60 + "\n")
+    # Real-time events are delivered by a single consumer on the app loop
+    await event_bus.start()
+    # Desktop mode: keep the local database in sync with the cloud in the background
+    if settings.SYNC_DAEMON_ENABLED:
+        await sync_daemon.start()
+    # Heavy exports queued through /reports/jobs, built outside the request workers
+    await report_job_manager.start()
+    # Desktop SQLite: periodic WAL checkpoint + PRAGMA optimize
+    if sqlite_maintenance:
+        await sqlite_maintenance.start()
+    # In-memory SKU/barcode index for /products/scan, refreshed from product changes
+    if settings.SCAN_INDEX_ENABLED:
+        await scan_index.start()
+    # Full-text search tables: created with the schema, filled here the first time
+    if settings.PRODUCT_SEARCH_BACKFILL:
+        try:
+            indexed = await asyncio.to_thread(product_search.ensure_index, WriteSessionLocal)
+            if indexed is not None:
+                print(f"[OK] Product search index built ({indexed} products)")
+        except Exception as e:
+            print(f"[WARN] Product search index not built: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event_async():
+    await scan_index.stop()
+    await report_job_manager.stop()
+    await sync_daemon.stop()
+    if sqlite_maintenance:
+        await sqlite_maintenance.stop()
+    await event_bus.stop()
+
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request, exc):
+    # Desktop SQLite: the write lock stayed taken longer than SQLITE_BUSY_TIMEOUT
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 # --- SEGURIDAD HÍBRIDA (License Guard) ---
 # TEMPORARILY DISABLED FOR DEBUGGING
@@ -74,6 +117,7 @@ app.include_router(suppliers, prefix="/api/v1", tags=["Proveedores"])
 app.include_router(inventory, prefix="/api/v1", tags=["Inventario (Operaciones)"])
 app.include_router(returns, prefix="/api/v1", tags=["Devoluciones"])
 app.include_router(reports, prefix="/api/v1", tags=["Reportes"])
+app.include_router(report_jobs.router, prefix="/api/v1", tags=["Reportes"])
 app.include_router(purchases, prefix="/api/v1", tags=["Compras"])
 app.include_router(users, prefix="/api/v1", tags=["Usuarios"])
 app.include_router(config, prefix="/api/v1", tags=["Configuración"])
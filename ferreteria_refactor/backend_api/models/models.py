@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric, Text, DateTime, Date, Enum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from ..database.db import Base
 import datetime
@@ -24,6 +24,7 @@ class Category(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     description = Column(Text, nullable=True)
     parent_id = Column(Integer, ForeignKey('categories.id'), nullable=True)  # For subcategories
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Delta sync
 
     # Relationships
     children = relationship("Category", backref="parent", remote_side=[id])
@@ -113,7 +114,7 @@ class Product(Base):
     
     # Image Support
     image_url = Column(String(255), nullable=True)  # Relative path to product image
-    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)  # Auto-updated timestamp
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Auto-updated timestamp
 
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     supplier_id = Column(Integer, ForeignKey("suppliers.id"), nullable=True)
@@ -165,6 +166,7 @@ class ProductUnit(Base):
     
     is_default = Column(Boolean, default=False)
     exchange_rate_id = Column(Integer, ForeignKey("exchange_rates.id"), nullable=True)  # Unit-specific rate
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Delta sync
 
     product = relationship("Product", back_populates="units")
     exchange_rate = relationship("ExchangeRate", back_populates="product_units")
@@ -214,6 +216,10 @@ class Kardex(Base):
 
     product = relationship("Product")
 
+    __table_args__ = (
+        Index("ix_kardex_product_id_date", "product_id", "date"),  # Product history, newest first
+    )
+
     def __repr__(self):
         return f"<Kardex(product='{self.product_id}', type='{self.movement_type}', qty={self.quantity})>"
 
@@ -253,6 +259,13 @@ class Sale(Base):
     returns = relationship("Return", back_populates="sale")
     warehouse = relationship("Warehouse")
 
+    __table_args__ = (
+        # Customer credit checks (overdue invoices, current debt)
+        Index("ix_sales_customer_id_is_credit_paid_due_date", "customer_id", "is_credit", "paid", "due_date"),
+        # Accounts receivable: every open credit sale by due date
+        Index("ix_sales_is_credit_paid_due_date", "is_credit", "paid", "due_date"),
+    )
+
     @property
     def status(self):
         return "VOIDED" if self.returns else "COMPLETED"
@@ -264,7 +277,7 @@ class SalePayment(Base):
     __tablename__ = "sale_payments"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
     amount = Column(Numeric(12, 2), nullable=False)
     currency = Column(String, default="USD") # USD or Bs
     payment_method = Column(String, default="Efectivo") # Efectivo, Tarjeta, etc.
@@ -276,10 +289,11 @@ class SaleDetail(Base):
     __tablename__ = "sale_details"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Numeric(12, 3), nullable=False) # Units sold
     unit_price = Column(Numeric(12, 2), nullable=False) # Price at moment of sale
+    unit_cost = Column(Numeric(14, 4), nullable=True) # Cost per unit at moment of sale (COGS snapshot)
     
     # Discount Support
     discount = Column(Numeric(12, 2), default=0.00)  # Discount amount or percentage
@@ -348,13 +362,44 @@ class CashMovement(Base):
     currency = Column(String, default="USD") # USD or BS
     exchange_rate = Column(Numeric(14, 4), default=1.0000)
     description = Column(Text, nullable=True)
-    date = Column(DateTime, default=datetime.datetime.now)
+    date = Column(DateTime, default=datetime.datetime.now, index=True)
 
     session = relationship("CashSession", back_populates="movements")
 
+    __table_args__ = (
+        Index("ix_cash_movements_session_id_type_currency", "session_id", "type", "currency"),
+    )
+
     def __repr__(self):
         return f"<CashMovement(type='{self.type}', amount={self.amount})>"
 
+class CashSessionBalance(Base):
+    """
+    Running drawer totals per session x currency (services/cash_ledger.py).
+    Currency is normalised: Bs/VES/VEF are stored as "Bs".
+    """
+    __tablename__ = "cash_session_balances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("cash_sessions.id"), nullable=False)
+    currency = Column(String(10), nullable=False)
+    initial = Column(Numeric(14, 2), nullable=False, default=0)
+    cash_sales = Column(Numeric(14, 2), nullable=False, default=0)  # Cash payments of sales in the session
+    deposits = Column(Numeric(14, 2), nullable=False, default=0)
+    expenses = Column(Numeric(14, 2), nullable=False, default=0)  # EXPENSE, WITHDRAWAL, OUT
+    refunds = Column(Numeric(14, 2), nullable=False, default=0)  # RETURN movements
+
+    __table_args__ = (
+        UniqueConstraint("session_id", "currency", name="uq_cash_session_balance_key"),
+    )
+
+    @property
+    def balance(self):
+        return self.initial + self.cash_sales + self.deposits - self.expenses - self.refunds
+
+    def __repr__(self):
+        return f"<CashSessionBalance(session={self.session_id}, {self.currency})>"
+
 class UserRole(str, enum.Enum):
     ADMIN = "ADMIN"
     CASHIER = "CASHIER"
@@ -371,6 +416,7 @@ class User(Base):
     full_name = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Delta sync
 
     def __repr__(self):
         return f"<User(username='{self.username}', role='{self.role}')>"
@@ -379,8 +425,8 @@ class Return(Base):
     __tablename__ = "returns"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
-    date = Column(DateTime, default=datetime.datetime.now)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
+    date = Column(DateTime, default=datetime.datetime.now, index=True)
     total_refunded = Column(Numeric(12, 2), nullable=False)
     reason = Column(Text, nullable=True)
 
@@ -394,10 +440,11 @@ class ReturnDetail(Base):
     __tablename__ = "return_details"
 
     id = Column(Integer, primary_key=True, index=True)
-    return_id = Column(Integer, ForeignKey("returns.id"), nullable=False)
+    return_id = Column(Integer, ForeignKey("returns.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Numeric(12, 3), nullable=False) # Units returned
     unit_price = Column(Numeric(12, 2), default=0.00)  # Price at time of return
+    unit_cost = Column(Numeric(14, 4), nullable=True)  # Cost snapshot of the original sale line
 
     return_obj = relationship("Return", back_populates="details")
     product = relationship("Product")
@@ -421,6 +468,7 @@ class Customer(Base):
     # Hybrid/Sync Fields
     unique_uuid = Column(String(36), nullable=True, unique=True, index=True)
     sync_status = Column(String(20), default="SYNCED") # SYNCED, PENDING
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)  # Delta sync
 
     sales = relationship("Sale", back_populates="customer")
     payments = relationship("Payment", back_populates="customer")
@@ -605,6 +653,72 @@ class AuditLog(Base):
     ip_address = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.now, index=True)
 
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_audit_logs_table_name_timestamp", "table_name", "timestamp"),
+    )
+
+class SyncTombstone(Base):
+    """Hard deletes of synced rows, so offline clients can drop them on delta pulls"""
+    __tablename__ = "sync_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(30), nullable=False)  # categories, products, customers, exchange_rates, users
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.datetime.now, index=True)
+
+    def __repr__(self):
+        return f"<SyncTombstone(entity='{self.entity}', id={self.entity_id})>"
+
+class SalesRollupDaily(Base):
+    """
+    Sales and returns pre-aggregated per day x product x warehouse x currency
+    (services/sales_rollups.py). warehouse_id 0 = sale without warehouse.
+    """
+    __tablename__ = "sales_rollup_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    product_id = Column(Integer, nullable=False)
+    warehouse_id = Column(Integer, nullable=False, default=0)
+    currency = Column(String(10), nullable=False)
+    quantity = Column(Numeric(14, 3), nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    cost = Column(Numeric(16, 4), nullable=False, default=0)  # Cost at time of sale
+    lines = Column(Integer, nullable=False, default=0)
+    refund_quantity = Column(Numeric(14, 3), nullable=False, default=0)
+    refund_revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    refund_cost = Column(Numeric(16, 4), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "product_id", "warehouse_id", "currency", name="uq_sales_rollup_daily_key"),
+    )
+
+    def __repr__(self):
+        return f"<SalesRollupDaily(day={self.day}, product={self.product_id}, wh={self.warehouse_id}, {self.currency})>"
+
+class CurrencyRollupDaily(Base):
+    """Money in and out per day x currency: sales, payments collected and cash refunds"""
+    __tablename__ = "currency_rollup_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    currency = Column(String(10), nullable=False)
+    sale_count = Column(Integer, nullable=False, default=0)  # Sales whose ticket currency is this one
+    collected = Column(Numeric(14, 2), nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+    rate_sum = Column(Numeric(18, 4), nullable=False, default=0)  # avg rate = rate_sum / rate_count
+    rate_count = Column(Integer, nullable=False, default=0)
+    refunded = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "currency", name="uq_currency_rollup_daily_key"),
+    )
+
+    def __repr__(self):
+        return f"<CurrencyRollupDaily(day={self.day}, {self.currency})>"
+
 class Warehouse(Base):
     __tablename__ = "warehouses"
 
@@ -631,6 +745,10 @@ class ProductStock(Base):
     product = relationship("Product", back_populates="stocks")
     warehouse = relationship("Warehouse", back_populates="stocks")
 
+    __table_args__ = (
+        Index("ix_product_stocks_product_id_warehouse_id", "product_id", "warehouse_id"),
+    )
+
     def __repr__(self):
         return f"<ProductStock(product={self.product_id}, warehouse={self.warehouse_id}, qty={self.quantity})>"
 
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..database.db import get_db
+from ..database.db import get_read_db
 from ..models import models
 from .. import schemas
 import datetime
@@ -19,7 +19,7 @@ def get_audit_logs(
     table_name: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     from sqlalchemy.orm import joinedload
     query = db.query(models.AuditLog).options(joinedload(models.AuditLog.user))
@@ -1,21 +1,27 @@
+import hmac
 from datetime import timedelta
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from ..database.db import get_db
+from ..database.db import get_db, get_unserialized_db
 from ..models import models
-from ..security import verify_password, create_access_token, get_password_hash
+from ..security import (HashPoolBusy, verify_and_update_password, rehash_password,
+                        create_access_token, get_password_hash)
+from ..services.auth_cache import auth_cache
 from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/token")
-async def login_for_access_token(
+def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_unserialized_db)  # No write lock held while bcrypt runs
 ):
+    # Sync on purpose: the query and the ~250 ms bcrypt check run in the
+    # threadpool (bcrypt itself in security.py's bounded hash pool), not on
+    # the event loop that serves websockets and every other request.
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
     if not user:
         # Generic error for security
@@ -26,12 +32,13 @@ async def login_for_access_token(
         )
         
     try:
-        if not verify_password(form_data.password, user.password_hash):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        valid, new_hash = verify_and_update_password(form_data.password, user.password_hash)
+    except HashPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again",
+            headers={"Retry-After": "1"},
+        )
     except Exception:
         # If hash is invalid/unknown (e.g. from old system), treat as auth failure
         raise HTTPException(
@@ -39,13 +46,23 @@ async def login_for_access_token(
             detail="Incorrect username or password (Security Update Required)",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
         
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
+    claims = {"sub": user.username, "role": user.role.value}  # Role in claims
+    if new_hash:
+        rehash_password(db, user, new_hash)
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role.value}, # Role in claims
+        data=claims,
         expires_delta=access_token_expires
     )
     
@@ -55,13 +72,22 @@ async def login_for_access_token(
 def validate_pin(pin_data: dict, db: Session = Depends(get_db)):
     """Validate user PIN for sensitive operations (void sales, discounts, etc.)"""
     user_id = pin_data.get("user_id")
-    pin = pin_data.get("pin", "")
+    pin = str(pin_data.get("pin", ""))
     
     if not user_id:
         raise HTTPException(
             status_code=400,
             detail="user_id is required"
         )
+    try:
+        user_id = int(user_id)  # Cached PINs are keyed (and invalidated) by the integer id
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="user_id must be an integer")
+    
+    # Quick-switch: the same cashier re-entering a PIN that just passed
+    cached = auth_cache.pin_result(user_id, pin)
+    if cached is not None:
+        return cached
     
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -78,14 +104,16 @@ def validate_pin(pin_data: dict, db: Session = Depends(get_db)):
         )
     
     # Validate PIN
-    if user.pin == pin:
-        return {
+    if hmac.compare_digest(user.pin.encode(), pin.encode()):
+        result = {
             "valid": True,
             "user_id": user.id,
             "username": user.username,
             "role": user.role.value if hasattr(user.role, 'value') else user.role,
             "message": "PIN validated successfully"
         }
+        auth_cache.remember_pin(user.id, pin, result)
+        return result
     else:
         return {
             "valid": False,
@@ -5,9 +5,10 @@ from typing import List, Dict, Optional
 from datetime import datetime, date
 from decimal import Decimal
 from ..database.db import get_db
-from ..dependencies import get_current_active_user
+from ..dependencies import get_current_active_user, admin_only
 from ..models import models
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
+from ..services import cash_ledger
 from .. import schemas
 
 router = APIRouter(
@@ -16,7 +17,7 @@ router = APIRouter(
 )
 
 @router.post("/sessions/open", response_model=schemas.CashSessionRead)
-async def open_cash_session(
+def open_cash_session(
     initial_cash: schemas.CashSessionCreate, 
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -48,12 +49,14 @@ async def open_cash_session(
             initial_amount=req_curr.initial_amount
         )
         db.add(db_curr)
+    db.flush()
+    cash_ledger.init_session(db, new_session)
     
     db.commit()
     db.refresh(new_session)
     
     # Broadcast cash session opened event to all connected clients
-    await manager.broadcast("cash_session:opened", {
+    event_bus.publish("cash_session:opened", {
         "session_id": new_session.id,
         "initial_cash": float(new_session.initial_cash),
         "initial_cash_bs": float(new_session.initial_cash_bs),
@@ -109,6 +112,8 @@ def register_movement(
         date=datetime.now()
     )
     db.add(new_movement)
+    db.flush()
+    cash_ledger.record_movement(db, new_movement)
     db.commit()
     db.refresh(new_movement)
     return new_movement
@@ -131,50 +136,8 @@ def get_current_balance(
     return {"available": float(available), "status": "OPEN"}
 
 def get_available_cash(db: Session, session_id: int, currency: str) -> Decimal:
-    """Calculate available physical cash in the drawer for a specific currency"""
-    session = db.query(models.CashSession).filter(models.CashSession.id == session_id).first()
-    if not session:
-        return Decimal("0.00")
-
-    # 1. Initial Cash
-    initial = Decimal("0.00")
-    if currency == "USD":
-        initial = session.initial_cash
-    elif currency in ["Bs", "VES", "VEF"]:
-        initial = session.initial_cash_bs
-    
-    # 2. Cash Sales (Only "Efectivo")
-    # Query optimization: Calculate sum directly in DB would be faster, but staying consistent with existing logic
-    # We filter specifically for CASH payments in the requested currency
-    
-    # Normalize currency for query
-    target_currencies = [currency]
-    if currency in ["Bs", "VES", "VEF"]:
-        target_currencies = ["Bs", "VES", "VEF"]
-    
-    cash_sales = db.query(func.sum(models.SalePayment.amount)).\
-        join(models.Sale).\
-        filter(
-            models.Sale.date >= session.start_time,
-            models.Sale.date <= (session.end_time or datetime.now()),
-            models.SalePayment.payment_method.in_(["Efectivo", "CASH", "Cash", "efectivo"]),
-            models.SalePayment.currency.in_(target_currencies)
-        ).scalar() or Decimal("0.00")
-
-    # 3. Movements (Deposits - Withdrawals/Expenses)
-    movements_in = db.query(func.sum(models.CashMovement.amount)).filter(
-        models.CashMovement.session_id == session.id,
-        models.CashMovement.type == "DEPOSIT",
-        models.CashMovement.currency.in_(target_currencies)
-    ).scalar() or Decimal("0.00")
-    
-    movements_out = db.query(func.sum(models.CashMovement.amount)).filter(
-        models.CashMovement.session_id == session.id,
-        models.CashMovement.type.in_(["EXPENSE", "WITHDRAWAL", "OUT"]),
-        models.CashMovement.currency.in_(target_currencies)
-    ).scalar() or Decimal("0.00")
-    
-    return initial + cash_sales + movements_in - movements_out
+    """Available physical cash in the drawer for a specific currency (running balance, one row)"""
+    return cash_ledger.available(db, session_id, currency)
 
 @router.get("/sessions/history")
 def get_sessions_history(
@@ -256,132 +219,90 @@ def get_session_details(
     if not session:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
 
-    # 1. Calculate Sales Totals
-    sales_query = db.query(models.SalePayment).join(models.Sale).filter(
+    # 1. Sales by payment method and currency (grouped in SQL)
+    sales_query = db.query(
+        models.SalePayment.payment_method,
+        models.SalePayment.currency,
+        func.sum(models.SalePayment.amount)
+    ).join(models.Sale).filter(
         models.Sale.date >= session.start_time,
         models.Sale.date <= (session.end_time or datetime.now()),
-        # Filter by user if we tracked user per sale
-    )
-    
-    # 2. Get Movements
-    movements = db.query(models.CashMovement).filter(models.CashMovement.session_id == session.id).all()
-    
-    # Initialize totals
+    ).group_by(models.SalePayment.payment_method, models.SalePayment.currency)
+
     sales_total_usd = Decimal("0.00")
-    sales_total_bs = Decimal("0.00")
-    
     sales_by_method = {} # e.g. {"CASH": {"USD": 10, "BS": 500}, "CARD": ...}
-    
-    payments = sales_query.all()
-    
-    for p in payments:
-        curr = p.currency 
-        method = p.payment_method
-        amt = p.amount # Already Decimal from DB
-        
-        if method not in sales_by_method:
-            sales_by_method[method] = {}
-        
-        # Initialize currency in method if not exists
-        if curr not in sales_by_method[method]:
-            sales_by_method[method][curr] = Decimal("0.00")
-        
-        # Accumulate by actual currency
-        sales_by_method[method][curr] += amt
-        
+
+    for method, curr, amt in sales_query:
+        amt = amt or Decimal("0.00")
+        sales_by_method.setdefault(method, {})
+        sales_by_method[method][curr] = sales_by_method[method].get(curr, Decimal("0.00")) + amt
+
         # Also track total by currency (for backward compatibility)
-        if curr and curr.upper() in ["BS", "VES", "VEF"]:
-            sales_total_bs += amt
-        else:
+        if not (curr and curr.upper() in ["BS", "VES", "VEF"]):
             sales_total_usd += amt
 
-    # Calculate Movements
-    # Calculate Movements
-    expenses_usd = sum((m.amount for m in movements if m.type in ["EXPENSE", "WITHDRAWAL", "OUT"] and m.currency == "USD"), Decimal("0.00"))
-    expenses_bs = sum((m.amount for m in movements if m.type in ["EXPENSE", "WITHDRAWAL", "OUT"] and (m.currency and m.currency.upper() in ["BS", "VES", "VEF"])), Decimal("0.00"))
-    
-    deposits_usd = sum((m.amount for m in movements if m.type == "DEPOSIT" and m.currency == "USD"), Decimal("0.00"))
-    deposits_bs = sum((m.amount for m in movements if m.type == "DEPOSIT" and (m.currency and m.currency.upper() in ["BS", "VES", "VEF"])), Decimal("0.00"))
-
-    # Calculate Expected Cash (Only Cash payments affect the drawer)
-    # Check for multiple possible cash payment method names
-    cash_methods = ["Efectivo", "CASH", "Cash", "efectivo"]
-    cash_by_currency = {}  # Track cash sales by currency
-    
-    for method_name in cash_methods:
-        if method_name in sales_by_method:
-            for curr, amt in sales_by_method[method_name].items():
-                if curr not in cash_by_currency:
-                    cash_by_currency[curr] = Decimal("0.00")
-                cash_by_currency[curr] += amt
-    
-    # Legacy USD/Bs for backward compatibility
-    cash_sales_usd = cash_by_currency.get("USD", Decimal("0.00"))
-    cash_sales_bs = Decimal("0.00")
-    for curr in ["Bs", "VES", "VEF"]:
-        cash_sales_bs += cash_by_currency.get(curr, Decimal("0.00"))
-
-    expected_usd = session.initial_cash + cash_sales_usd + deposits_usd - expenses_usd
-    expected_bs = session.initial_cash_bs + cash_sales_bs + deposits_bs - expenses_bs
-    
-    final_reported_usd = session.final_cash_reported or Decimal("0.00")
-    final_reported_bs = session.final_cash_reported_bs or Decimal("0.00")
+    # Cash sales by currency as paid (only cash payments affect the drawer)
+    cash_by_currency = {}
+    for method_name in cash_ledger.CASH_METHODS:
+        for curr, amt in sales_by_method.get(method_name, {}).items():
+            cash_by_currency[curr] = cash_by_currency.get(curr, Decimal("0.00")) + amt
 
-    # Build expected_by_currency dict for frontend
-    expected_by_currency = {
-        "USD": float(expected_usd),
-        "Bs": float(expected_bs)
-    }
-    
-    # Build cash_by_currency (only cash payments) - convert to float for JSON
-    cash_by_currency_response = {curr: float(amt) for curr, amt in cash_by_currency.items()}
-    
     # Build transfers_by_currency (non-cash payments)
     transfers_by_currency = {}
     for method, currencies in sales_by_method.items():
-        if method not in cash_methods:  # Exclude cash
+        if method not in cash_ledger.CASH_METHODS:  # Exclude cash
             for curr, amt in currencies.items():
                 if amt > 0:
-                    if curr not in transfers_by_currency:
-                        transfers_by_currency[curr] = {}
-                    transfers_by_currency[curr][method] = float(amt)
-    
-    # Calculate credit sales (only unpaid ones)
-    credit_sales = db.query(models.Sale).filter(
+                    transfers_by_currency.setdefault(curr, {})[method] = float(amt)
+
+    # 2. Drawer totals: running balance of the session
+    balances = cash_ledger.balances(db, session)
+    empty = {name: Decimal("0.00") for name in cash_ledger.MEASURES + ("balance",)}
+    usd = balances.get("USD", empty)
+    bs = balances.get("Bs", empty)
+
+    expected_usd = usd["balance"]
+    expected_bs = bs["balance"]
+
+    final_reported_usd = session.final_cash_reported or Decimal("0.00")
+    final_reported_bs = session.final_cash_reported_bs or Decimal("0.00")
+
+    # 3. Unpaid credit sales of the session
+    credit_pending, credit_count = db.query(
+        func.sum(models.Sale.balance_pending), func.count(models.Sale.id)
+    ).filter(
         models.Sale.date >= session.start_time,
         models.Sale.date <= (session.end_time or datetime.now()),
         models.Sale.is_credit == True,
         models.Sale.balance_pending > 0  # Only unpaid credits
-    ).all()
-    
-    total_credit_pending = sum(float(sale.balance_pending or 0) for sale in credit_sales)
-    credit_count = len(credit_sales)
+    ).one()
 
     return {
         "session": session,
         "details": {
-            "initial_usd": session.initial_cash,
-            "initial_bs": session.initial_cash_bs,
+            "initial_usd": usd["initial"],
+            "initial_bs": bs["initial"],
             "sales_total": sales_total_usd,
             "sales_by_method": {k: {curr: float(amt) for curr, amt in v.items()} for k, v in sales_by_method.items()},
-            "expenses_usd": expenses_usd,
-            "expenses_bs": expenses_bs,
-            "deposits_usd": deposits_usd,
-            "deposits_bs": deposits_bs,
-            "cash_by_currency": cash_by_currency_response,
+            "expenses_usd": usd["expenses"],
+            "expenses_bs": bs["expenses"],
+            "deposits_usd": usd["deposits"],
+            "deposits_bs": bs["deposits"],
+            "cash_by_currency": {curr: float(amt) for curr, amt in cash_by_currency.items()},
             "transfers_by_currency": transfers_by_currency,
-            "credit_pending": total_credit_pending,  # NEW: Total unpaid credits
+            "refunds_by_currency": {curr: float(m["refunds"]) for curr, m in balances.items() if m["refunds"]},
+            "credit_pending": float(credit_pending or 0),  # NEW: Total unpaid credits
             "credit_count": credit_count  # NEW: Number of unpaid credit sales
         },
         "expected_usd": expected_usd,
         "expected_bs": expected_bs,
-        "expected_by_currency": expected_by_currency,
+        "expected_by_currency": {curr: float(m["balance"]) for curr, m in balances.items()},
         "diff_usd": final_reported_usd - expected_usd,
         "diff_bs": final_reported_bs - expected_bs
     }
 
 @router.post("/sessions/{session_id}/close", response_model=schemas.CashSessionRead)
-async def close_cash_session(
+def close_cash_session(
     session_id: int,
     close_data: schemas.CashSessionClose,
     db: Session = Depends(get_db),
@@ -394,51 +315,20 @@ async def close_cash_session(
     if session.status == "CLOSED":
         raise HTTPException(status_code=400, detail="La sesión ya está cerrada")
 
-    # Re-calculate expected totals to save them
-    sales_query = db.query(models.SalePayment).join(models.Sale).filter(
-        models.Sale.date >= session.start_time,
-        # models.Sale.date <= datetime.now() 
-    )
-    payments = sales_query.all()
-    movements = db.query(models.CashMovement).filter(models.CashMovement.session_id == session.id).all()
-    
     # ============================================
-    # CALCULATE EXPECTED BY CURRENCY
+    # EXPECTED BY CURRENCY
     # ============================================
-    
-    cash_methods = ["Efectivo", "CASH", "Cash", "efectivo"]
-    
-    # Track sales and movements by currency
-    cash_sales_by_currency = {}  # {currency_symbol: amount}
-    movements_by_currency = {}   # {currency_symbol: {'deposits': X, 'expenses': Y}}
-    
-    # Process payments
-    for p in payments:
-        if p.payment_method in cash_methods:
-            curr = p.currency or "USD"
-            # Normalize currency symbols
-            if curr.upper() in ["BS", "VES", "VEF"]:
-                curr = "Bs"
-            
-            if curr not in cash_sales_by_currency:
-                cash_sales_by_currency[curr] = Decimal("0.00")
-            cash_sales_by_currency[curr] += p.amount
-    
-    # Process movements
-    for m in movements:
-        curr = m.currency or "USD"
-        # Normalize currency symbols
-        if curr.upper() in ["BS", "VES", "VEF"]:
-            curr = "Bs"
-        
-        if curr not in movements_by_currency:
-            movements_by_currency[curr] = {'deposits': Decimal("0.00"), 'expenses': Decimal("0.00")}
-        
-        if m.type == "DEPOSIT":
-            movements_by_currency[curr]['deposits'] += m.amount
-        elif m.type in ["EXPENSE", "WITHDRAWAL", "OUT"]:
-            movements_by_currency[curr]['expenses'] += m.amount
-    
+
+    # The closing figures are stored for good: re-derive the running balance first
+    drift = cash_ledger.reconcile(db, [session.id])
+    if drift:
+        print(f"[WARN] Cash session {session.id}: running balance drifted, re-derived ({len(drift)} figures)")
+    balances = cash_ledger.balances(db, session)
+
+    def expected_for(symbol):
+        totals = balances.get(cash_ledger.normalize_currency(symbol))
+        return totals["balance"] if totals else Decimal("0.00")
+
     # ============================================
     # UPDATE CURRENCY RECORDS
     # ============================================
@@ -450,14 +340,7 @@ async def close_cash_session(
     
     for curr_record in currency_records:
         symbol = curr_record.currency_symbol
-        
-        # Calculate expected
-        initial = curr_record.initial_amount or Decimal("0.00")
-        sales = cash_sales_by_currency.get(symbol, Decimal("0.00"))
-        deposits = movements_by_currency.get(symbol, {}).get('deposits', Decimal("0.00"))
-        expenses = movements_by_currency.get(symbol, {}).get('expenses', Decimal("0.00"))
-        
-        expected = initial + sales + deposits - expenses
+        expected = expected_for(symbol)
         
         # Get reported from close_data
         # close_data should have currencies array with {currency_symbol, final_reported}
@@ -477,28 +360,18 @@ async def close_cash_session(
     # UPDATE LEGACY FIELDS (for backward compatibility)
     # ============================================
     
-    # Calculate legacy USD and BS totals
-    cash_sales_usd = cash_sales_by_currency.get("USD", Decimal("0.00"))
-    cash_sales_bs = cash_sales_by_currency.get("Bs", Decimal("0.00"))
-    
-    expenses_usd = movements_by_currency.get("USD", {}).get('expenses', Decimal("0.00"))
-    expenses_bs = movements_by_currency.get("Bs", {}).get('expenses', Decimal("0.00"))
-    
-    deposits_usd = movements_by_currency.get("USD", {}).get('deposits', Decimal("0.00"))
-    deposits_bs = movements_by_currency.get("Bs", {}).get('deposits', Decimal("0.00"))
+    expected_usd = expected_for("USD")
+    expected_bs = expected_for("Bs")
     
-    expected_usd = session.initial_cash + cash_sales_usd + deposits_usd - expenses_usd
-    expected_bs = session.initial_cash_bs + cash_sales_bs + deposits_bs - expenses_bs
-    
-    # Calculate unpaid credit sales for reporting
-    credit_sales = db.query(models.Sale).filter(
+    # Unpaid credit sales for reporting
+    total_credit_pending, credit_count = db.query(
+        func.sum(models.Sale.balance_pending), func.count(models.Sale.id)
+    ).filter(
         models.Sale.date >= session.start_time,
         models.Sale.date <= datetime.now(),
         models.Sale.is_credit == True,
         models.Sale.balance_pending > 0  # Only unpaid credits
-    ).all()
-    
-    total_credit_pending = sum(float(sale.balance_pending or 0) for sale in credit_sales)
+    ).one()
 
     # Update Session
     session.end_time = datetime.now()
@@ -514,16 +387,31 @@ async def close_cash_session(
     db.refresh(session)
     
     # Broadcast cash session closed event to all connected clients
-    await manager.broadcast("cash_session:closed", {
+    event_bus.publish("cash_session:closed", {
         "session_id": session.id,
         "end_time": session.end_time.isoformat(),
         "final_cash_reported": float(session.final_cash_reported),
         "final_cash_reported_bs": float(session.final_cash_reported_bs),
         "difference": float(session.difference),
         "difference_bs": float(session.difference_bs),
-        "credit_pending": total_credit_pending,  # NEW: Include unpaid credits
-        "credit_count": len(credit_sales)  # NEW: Count of unpaid sales
+        "credit_pending": float(total_credit_pending or 0),  # NEW: Include unpaid credits
+        "credit_count": credit_count  # NEW: Count of unpaid sales
     })
     
     return session
 
+
+@router.post("/reconcile", dependencies=[Depends(admin_only)])
+def reconcile_cash_balances(
+    session_id: Optional[int] = None,
+    fix: bool = True,
+    db: Session = Depends(get_db)
+):
+    """
+    Re-derive drawer balances from payments and movements and report drift.
+    Defaults to the open session(s); fix=false only reports.
+    """
+    drift = cash_ledger.reconcile(db, [session_id] if session_id is not None else None, fix=fix)
+    if fix:
+        db.commit()
+    return {"drift": drift, "fixed": fix and bool(drift)}
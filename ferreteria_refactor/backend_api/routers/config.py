@@ -8,7 +8,8 @@ from ..database.db import get_db
 from ..models import models
 from .. import schemas
 from ..dependencies import admin_only
-from ..websocket.manager import manager
+from ..services.config_store import config_store
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
 from ..template_presets import get_all_presets, get_preset_by_id
 
@@ -28,18 +29,11 @@ def get_exchange_rates(
     db: Session = Depends(get_db)
 ):
     """Get all exchange rates, optionally filtered by currency or active status"""
-    query = db.query(models.ExchangeRate)
-    
-    if currency_code:
-        query = query.filter(models.ExchangeRate.currency_code == currency_code)
-    if is_active is not None:
-        query = query.filter(models.ExchangeRate.is_active == is_active)
-    
-    return query.order_by(models.ExchangeRate.currency_code, models.ExchangeRate.is_default.desc()).all()
+    return config_store.snapshot(db).rates(currency_code=currency_code or None, is_active=is_active)
 
 
 @router.post("/exchange-rates", response_model=schemas.ExchangeRateRead)
-async def create_exchange_rate(
+def create_exchange_rate(
     rate_data: schemas.ExchangeRateCreate,
     db: Session = Depends(get_db),
     user: Any = Depends(admin_only)  # Protect mutation
@@ -58,7 +52,7 @@ async def create_exchange_rate(
     db.refresh(new_rate)
     
     # Broadcast event
-    await manager.broadcast(WebSocketEvents.EXCHANGE_RATE_CREATED, {
+    event_bus.publish(WebSocketEvents.EXCHANGE_RATE_CREATED, {
         "id": new_rate.id,
         "name": new_rate.name,
         "rate": new_rate.rate,
@@ -73,14 +67,14 @@ async def create_exchange_rate(
 @router.get("/exchange-rates/{id}", response_model=schemas.ExchangeRateRead)
 def get_exchange_rate_by_id(id: int, db: Session = Depends(get_db)):
     """Get a specific exchange rate by ID"""
-    rate = db.query(models.ExchangeRate).get(id)
+    rate = config_store.snapshot(db).rate(id)
     if not rate:
         raise HTTPException(status_code=404, detail="Exchange rate not found")
     return rate
 
 
 @router.put("/exchange-rates/{id}", response_model=schemas.ExchangeRateRead)
-async def update_exchange_rate(
+def update_exchange_rate(
     id: int,
     rate_data: schemas.ExchangeRateUpdate,
     db: Session = Depends(get_db),
@@ -114,7 +108,7 @@ async def update_exchange_rate(
     log_action(db, user_id=1, action="UPDATE", table_name="exchange_rates", record_id=rate.id, changes=json.dumps({"rate": rate.rate, "is_active": rate.is_active}, default=str))
 
     # Broadcast event
-    await manager.broadcast(WebSocketEvents.EXCHANGE_RATE_UPDATED, {
+    event_bus.publish(WebSocketEvents.EXCHANGE_RATE_UPDATED, {
         "id": rate.id,
         "name": rate.name,
         "rate": rate.rate, # Float
@@ -127,7 +121,7 @@ async def update_exchange_rate(
 
 
 @router.delete("/exchange-rates/{id}")
-async def delete_exchange_rate(
+def delete_exchange_rate(
     id: int,
     db: Session = Depends(get_db),
     user: Any = Depends(admin_only)  # Protect mutation
@@ -147,7 +141,7 @@ async def delete_exchange_rate(
     db.commit()
     
     # Broadcast event
-    await manager.broadcast(WebSocketEvents.EXCHANGE_RATE_DELETED, {
+    event_bus.publish(WebSocketEvents.EXCHANGE_RATE_DELETED, {
         "id": rate.id
     })
     
@@ -160,17 +154,15 @@ async def delete_exchange_rate(
 @router.get("/business", response_model=schemas.BusinessInfo)
 def get_business_info(db: Session = Depends(get_db)):
     """Get aggregated business information"""
-    keys = ["business_name", "business_doc", "business_address", "business_phone", "business_email"]
-    configs = db.query(models.BusinessConfig).filter(models.BusinessConfig.key.in_(keys)).all()
-    config_dict = {c.key: c.value for c in configs}
+    config = config_store.snapshot(db)
     
     return schemas.BusinessInfo(
-        name=config_dict.get("business_name", ""),
-        document_id=config_dict.get("business_doc", ""),
-        address=config_dict.get("business_address", ""),
-        phone=config_dict.get("business_phone", ""),
-        email=config_dict.get("business_email", ""),
-        ticket_template=config_dict.get("ticket_template", "")  # NEW
+        name=config.get("business_name", ""),
+        document_id=config.get("business_doc", ""),
+        address=config.get("business_address", ""),
+        phone=config.get("business_phone", ""),
+        email=config.get("business_email", ""),
+        ticket_template=config.get("ticket_template", "")  # NEW
     )
 
 @router.put("/business", response_model=schemas.BusinessInfo)
@@ -208,8 +200,8 @@ def test_print_ticket(db: Session = Depends(get_db)):
     """Send test ticket to hardware bridge"""
     print("DEBUG: /test-print endpoint hit") # Debug log
     # Get template
-    template_config = db.query(models.BusinessConfig).get("ticket_template")
-    if not template_config or not template_config.value:
+    template = config_store.snapshot(db).get("ticket_template")
+    if not template:
         pass # Allow testing even without saved template (use default if needed) or raise
         # For now, let's just proceed to verify endpoint works
         
@@ -264,7 +256,7 @@ def test_print_ticket(db: Session = Depends(get_db)):
     # NO! In SaaS mode, the backend cannot reach the printer.
     # We return the payload so the FRONTEND can send it to the local bridge.
     
-    template_content = template_config.value if (template_config and template_config.value) else "NOTE: No template saved. This is a test."
+    template_content = template or "NOTE: No template saved. This is a test."
     
     return {
         "status": "ready_to_print",
@@ -316,32 +308,25 @@ def apply_template_preset(
 @router.get("", response_model=List[schemas.BusinessConfigRead])
 def get_all_configs(db: Session = Depends(get_db)):
     """Get all configuration entries"""
-    return db.query(models.BusinessConfig).all()
+    return [{"key": key, "value": value} for key, value in config_store.snapshot(db).as_dict().items()]
 
 @router.get("/dict", response_model=Dict[str, Any])
 def get_all_configs_dict(db: Session = Depends(get_db)):
     """Get all configuration as a dictionary"""
-    configs = db.query(models.BusinessConfig).all()
-    return {c.key: c.value for c in configs}
+    return config_store.snapshot(db).as_dict()
 
 # Helper endpoint for Legacy Exchange Rate compatibility
 @router.get("/exchange-rate/current")
 def get_legacy_exchange_rate(db: Session = Depends(get_db)):
     """Get current legacy exchange rate"""
-    config = db.query(models.BusinessConfig).get("exchange_rate")
-    if not config:
-        return {"rate": 1.0}
-    try:
-        return {"rate": float(config.value)}
-    except (ValueError, TypeError):
-        return {"rate": 1.0}
+    return {"rate": config_store.snapshot(db).get_float("exchange_rate", 1.0)}
 
 # Currency Management Endpoints
 
 @router.get("/currencies")
 def get_currencies(db: Session = Depends(get_db)):
     """Get all currencies"""
-    data = db.query(models.Currency).all()
+    data = config_store.snapshot(db).currencies()
     print(f"DEBUG: Returning {len(data)} currencies")
     return data
 
@@ -393,11 +378,11 @@ def delete_currency(currency_id: int, db: Session = Depends(get_db)):
 @router.get("/{key}", response_model=schemas.BusinessConfigRead)
 def get_config(key: str, db: Session = Depends(get_db)):
     """Get specific configuration key"""
-    config = db.query(models.BusinessConfig).get(key)
-    if not config:
+    config = config_store.snapshot(db)
+    if key not in config:
         # Return a dummy config object instead of 404 to suppress errors
         return models.BusinessConfig(key=key, value="")
-    return config
+    return {"key": key, "value": config.get(key)}
 
 @router.put("/{key}", response_model=schemas.BusinessConfigRead)
 def set_config(
@@ -441,13 +426,7 @@ def set_configs_batch(
 @router.get("/tax-rate/default", response_model=Dict[str, Decimal])
 def get_default_tax_rate(db: Session = Depends(get_db)):
     """Get the default tax rate percentage"""
-    config = db.query(models.BusinessConfig).get("default_tax_rate")
-    if not config or not config.value:
-        return {"rate": Decimal("0.00")}
-    try:
-        return {"rate": Decimal(config.value)}
-    except:
-        return {"rate": Decimal("0.00")}
+    return {"rate": config_store.snapshot(db).get_decimal("default_tax_rate", Decimal("0.00"))}
 
 @router.put("/tax-rate/default")
 def set_default_tax_rate(
@@ -4,7 +4,8 @@ from typing import List, Optional
 from ..database.db import get_db
 from ..models import models
 from .. import schemas
-from ..websocket.manager import manager
+from ..services import receivables
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
 
 router = APIRouter(
@@ -31,7 +32,7 @@ def read_customers(
 
 @router.post("/", response_model=schemas.CustomerRead)
 @router.post("", response_model=schemas.CustomerRead, include_in_schema=False)
-async def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
+def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
     # Check duplicate ID
     if customer.id_number:
         exists = db.query(models.Customer).filter(models.Customer.id_number == customer.id_number).first()
@@ -44,7 +45,7 @@ async def create_customer(customer: schemas.CustomerCreate, db: Session = Depend
     db.refresh(db_customer)
     
     # Broadcast customer created
-    await manager.broadcast(WebSocketEvents.CUSTOMER_CREATED, {
+    event_bus.publish(WebSocketEvents.CUSTOMER_CREATED, {
         "id": db_customer.id,
         "name": db_customer.name,
         "id_number": db_customer.id_number,
@@ -54,7 +55,7 @@ async def create_customer(customer: schemas.CustomerCreate, db: Session = Depend
     return db_customer
 
 @router.put("/{customer_id}", response_model=schemas.CustomerRead)
-async def update_customer(customer_id: int, customer_data: schemas.CustomerCreate, db: Session = Depends(get_db)):
+def update_customer(customer_id: int, customer_data: schemas.CustomerCreate, db: Session = Depends(get_db)):
     db_customer = db.query(models.Customer).filter(models.Customer.id == customer_id).first()
     if not db_customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -66,7 +67,7 @@ async def update_customer(customer_id: int, customer_data: schemas.CustomerCreat
     db.refresh(db_customer)
     
     # Broadcast customer updated
-    await manager.broadcast(WebSocketEvents.CUSTOMER_UPDATED, {
+    event_bus.publish(WebSocketEvents.CUSTOMER_UPDATED, {
         "id": db_customer.id,
         "name": db_customer.name,
         "id_number": db_customer.id_number,
@@ -77,37 +78,12 @@ async def update_customer(customer_id: int, customer_data: schemas.CustomerCreat
 
 @router.get("/{customer_id}/debt")
 def get_customer_debt(customer_id: int, db: Session = Depends(get_db)):
-    # Calculate Total Credit Sales
-    # Note: Logic assumes 'is_credit=True' sales contribute to debt.
-    # We might need to handle 'paid' status if we want to ignore fully paid ones,
-    # but for a running balance, usually we sum ALL credit sales and subtract ALL payments.
-    
-    # 1. Sum of all Credit Sales for this customer
-    # We must be careful not to double count if we have a different tracking system.
-    # Assuming: total_amount_bs or total_amount depending on currency?
-    # For now, let's standardise on USD (total_amount).
-    
-    from sqlalchemy import func
-    
-    total_credit_sales = db.query(func.sum(models.Sale.total_amount))\
-        .filter(models.Sale.customer_id == customer_id)\
-        .filter(models.Sale.is_credit == True)\
-        .scalar() or 0.0
-        
-    # 2. Sum of all Payments
-    # 2. Sum of all Payments (Converted to USD)
-    # We must retrieve payments and sum them manually to handle conversion if DB is mixed currency
-    payments = db.query(models.Payment).filter(models.Payment.customer_id == customer_id).all()
-    total_payments_usd = 0.0
-    
-    for p in payments:
-        if p.currency == "Bs" and p.exchange_rate_used > 0:
-            total_payments_usd += (p.amount / p.exchange_rate_used)
-        else:
-            total_payments_usd += p.amount
-            
-    debt = total_credit_sales - total_payments_usd
-    return {"debt": round(debt, 2)} # Round for clean display
+    # Open balance of unpaid credit invoices minus account payments in USD
+    # (Bs/VES payments divided by their rate in SQL; see services/receivables.py)
+    balance = receivables.customer_balance(db, customer_id)
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return {"debt": balance["debt"]} # Rounded for clean display
 
 @router.get("/{customer_id}/financial-status")
 def get_customer_financial_status(customer_id: int, db: Session = Depends(get_db)):
@@ -6,8 +6,9 @@ from ..models import models
 from .. import schemas
 from datetime import datetime
 from ..dependencies import warehouse_or_admin
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
+from ..services import stock_ledger
 
 router = APIRouter(
     prefix="/inventory",
@@ -16,21 +17,21 @@ router = APIRouter(
 )
 
 @router.post("/add", dependencies=[Depends(warehouse_or_admin)])
-async def add_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Depends(get_db)):
+def add_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Depends(get_db)):
     """Add stock (Purchase/Entry)"""
     product = db.query(models.Product).filter(models.Product.id == adjustment.product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     # Update Stock (quantity already in base units from frontend)
-    product.stock += adjustment.quantity
+    level = stock_ledger.increment(db, product.id, adjustment.quantity)
     
     # Create Kardex
     kardex_entry = models.Kardex(
         product_id=product.id,
         movement_type=adjustment.type,
         quantity=adjustment.quantity,
-        balance_after=product.stock,
+        balance_after=level.total_stock,
         description=adjustment.reason,
         date=datetime.now()
     )
@@ -43,7 +44,7 @@ async def add_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Dep
     from ..audit_utils import log_action
     log_action(db, user_id=1, action="UPDATE", table_name="products", record_id=product.id, changes=f"Stock Adjustment (IN): +{adjustment.quantity}. Reason: {adjustment.reason}")
 
-    await manager.broadcast(WebSocketEvents.PRODUCT_UPDATED, {
+    event_bus.publish(WebSocketEvents.PRODUCT_UPDATED, {
         "id": product.id,
         "name": product.name,
         "price": product.price,
@@ -51,7 +52,7 @@ async def add_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Dep
         "exchange_rate_id": product.exchange_rate_id
     })
     
-    await manager.broadcast(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
+    event_bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
         "id": product.id,
         "stock": product.stock
     })
@@ -59,24 +60,23 @@ async def add_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Dep
     return {"status": "success", "new_stock": product.stock, "product_id": product.id}
 
 @router.post("/remove", dependencies=[Depends(warehouse_or_admin)])
-async def remove_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Depends(get_db)):
+def remove_stock(adjustment: schemas.StockAdjustmentCreate, db: Session = Depends(get_db)):
     """Remove stock (Adjustment/Loss)"""
     product = db.query(models.Product).filter(models.Product.id == adjustment.product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    if product.stock < adjustment.quantity:
-        raise HTTPException(status_code=400, detail=f"Insufficient stock. Current: {product.stock}")
-
-    # Update Stock (quantity already in base units)
-    product.stock -= adjustment.quantity
+    # Update Stock (quantity already in base units) - only if enough is available
+    level = stock_ledger.decrement(db, product.id, adjustment.quantity)
+    if level is None:
+        raise HTTPException(status_code=400, detail=f"Insufficient stock. Current: {stock_ledger.available(db, product.id)}")
     
     # Create Kardex
     kardex_entry = models.Kardex(
         product_id=product.id,
         movement_type=adjustment.type,
         quantity=-adjustment.quantity,  # Negative for outgoing
-        balance_after=product.stock,
+        balance_after=level.total_stock,
         description=adjustment.reason,
         date=datetime.now()
     )
@@ -89,7 +89,7 @@ async def remove_stock(adjustment: schemas.StockAdjustmentCreate, db: Session =
     from ..audit_utils import log_action
     log_action(db, user_id=1, action="UPDATE", table_name="products", record_id=product.id, changes=f"Stock Adjustment (OUT): -{adjustment.quantity}. Reason: {adjustment.reason}")
 
-    await manager.broadcast(WebSocketEvents.PRODUCT_UPDATED, {
+    event_bus.publish(WebSocketEvents.PRODUCT_UPDATED, {
         "id": product.id,
         "name": product.name,
         "price": product.price,
@@ -97,7 +97,7 @@ async def remove_stock(adjustment: schemas.StockAdjustmentCreate, db: Session =
         "exchange_rate_id": product.exchange_rate_id
     })
     
-    await manager.broadcast(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
+    event_bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
         "id": product.id,
         "stock": product.stock
     })
@@ -1,37 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional
 import json
-import asyncio
 from datetime import date, datetime
-from ..database.db import get_db
+from ..database.db import get_db, get_read_db
 from ..models import models
 from ..models.models import UserRole
 from .. import schemas
 from ..dependencies import has_role, cashier_or_admin
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
 from ..audit_utils import log_action
 from ..services.product_import_service import ProductImportService
 from ..services.product_export_service import ProductExportService
+from ..services import cash_ledger, product_catalog, product_search, sales_rollups, streaming_export
+from ..services.scan_index import scan_index
+from ..services.config_store import config_store
 
 router = APIRouter(prefix="/products", tags=["products"])
 
-# Helper para ejecutar broadcast asíncrono desde contexto síncrono
-def run_broadcast(event: str, data: dict):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(manager.broadcast(event, data))
-    finally:
-        loop.close()
-
 @router.get("/", response_model=List[schemas.ProductRead])
 @router.get("", response_model=List[schemas.ProductRead], include_in_schema=False)
 def read_products(skip: int = 0, limit: int = 5000, db: Session = Depends(get_db)):
     try:
-        products = db.query(models.Product).options(joinedload(models.Product.units), joinedload(models.Product.stocks)).filter(models.Product.is_active == True).offset(skip).limit(limit).all()
+        products = db.query(models.Product).options(selectinload(models.Product.units), selectinload(models.Product.stocks)).filter(models.Product.is_active == True).order_by(models.Product.id).offset(skip).limit(limit).all()
         print(f"[OK] Loaded {len(products)} products successfully")
         return products
     except Exception as e:
@@ -40,9 +34,73 @@ def read_products(skip: int = 0, limit: int = 5000, db: Session = Depends(get_db
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error loading products: {str(e)}")
 
+@router.get("/catalog")
+def read_catalog(
+    cursor: Optional[str] = None,
+    limit: int = Query(product_catalog.DEFAULT_PAGE_SIZE, ge=1, le=product_catalog.MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated ProductRead fields, e.g. id,name,sku,price,stock"),
+    category_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    in_stock: Optional[bool] = None,
+    active: Optional[bool] = None,
+    updated_since: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Product catalog, one keyset page at a time (see services/product_catalog.py).
+
+    Repeat with next_cursor while has_more is true. `fields` limits each item
+    to those ProductRead fields. `active` defaults to live products only, or
+    to every changed product when `updated_since` is given. Send the page's
+    ETag back in If-None-Match to get a 304 when it has not changed.
+    """
+    body, etag = product_catalog.catalog_page(
+        db, product_catalog.parse_fields(fields), cursor=cursor, limit=limit,
+        category_id=category_id, warehouse_id=warehouse_id, in_stock=in_stock,
+        active=active, updated_since=updated_since
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if product_catalog.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/scan/{code}", response_model=schemas.ScanResult)
+def scan_product(code: str, warehouse_id: Optional[int] = None, limit: int = Query(10, ge=1, le=50)):
+    """
+    Resolve a scanned or typed code from the in-memory scan index (no DB access).
+
+    SKU or unit barcode -> one exact item (unit_id set for a barcode).
+    Otherwise products whose name starts with `code`, accents and case ignored.
+    """
+    if not scan_index.ready:
+        raise HTTPException(status_code=503, detail="Índice de productos cargando, intente de nuevo",
+                            headers={"Retry-After": "2"})
+    item = scan_index.lookup(code, warehouse_id)
+    if item:
+        return {"code": code, "exact": True, "items": [item]}
+    items = scan_index.search_name(code, warehouse_id, limit)
+    if not items:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return {"code": code, "exact": False, "items": items}
+
+@router.get("/search", response_model=schemas.ProductSearchResult)
+def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(product_search.DEFAULT_LIMIT, ge=1, le=product_search.MAX_LIMIT),
+    category_id: Optional[int] = Query(None, description="Rank products of this category higher"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Ranked full-text search over name, SKU/barcodes, category and description
+    (see services/product_search.py). Words match as prefixes, accents and case
+    ignored; fuzzy=true when some word was taken as a typo.
+    """
+    return product_search.search(db, q, limit=limit, category_id=category_id)
+
 @router.post("/", response_model=schemas.ProductRead, dependencies=[Depends(has_role([UserRole.ADMIN, UserRole.WAREHOUSE]))])
 @router.post("", response_model=schemas.ProductRead, dependencies=[Depends(has_role([UserRole.ADMIN, UserRole.WAREHOUSE]))], include_in_schema=False)
-def create_product(product: schemas.ProductCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
     # 1. Operaciones DB (Síncronas en Threadpool)
     product_data = product.dict(exclude={"units", "combo_items", "warehouse_stocks"})
     db_product = models.Product(**product_data)
@@ -142,12 +200,12 @@ def create_product(product: schemas.ProductCreate, background_tasks: BackgroundT
             } for c in db_product.combo_items
         ] if db_product.combo_items else []
     }
-    background_tasks.add_task(run_broadcast, WebSocketEvents.PRODUCT_CREATED, payload)
+    event_bus.publish(WebSocketEvents.PRODUCT_CREATED, payload)
         
     return db_product
 
 @router.put("/{product_id}", response_model=schemas.ProductRead, dependencies=[Depends(has_role([UserRole.ADMIN, UserRole.WAREHOUSE]))])
-def update_product(product_id: int, product_update: schemas.ProductUpdate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def update_product(product_id: int, product_update: schemas.ProductUpdate, db: Session = Depends(get_db)):
     db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -267,7 +325,7 @@ def update_product(product_id: int, product_update: schemas.ProductUpdate, backg
             } for c in db_product.combo_items
         ] if db_product.combo_items else []
     }
-    background_tasks.add_task(run_broadcast, WebSocketEvents.PRODUCT_UPDATED, payload)
+    event_bus.publish(WebSocketEvents.PRODUCT_UPDATED, payload)
     
     return db_product
 
@@ -290,7 +348,7 @@ def download_template():
     )
 
 @router.post("/import", dependencies=[Depends(has_role([UserRole.ADMIN, UserRole.WAREHOUSE]))])
-async def import_products(
+def import_products(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -313,7 +371,7 @@ async def import_products(
     
     # Read file
     try:
-        contents = await file.read()
+        contents = file.file.read()
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -347,29 +405,29 @@ async def import_products(
         )
 
 @router.get("/export/excel")
-def export_excel(db: Session = Depends(get_db)):
+def export_excel(format: str = "xlsx", db: Session = Depends(get_read_db)):
     """
-    Export all active products to Excel
+    Export all active products to Excel (or CSV with format=csv), streamed
     """
-    products = db.query(models.Product).filter(
-        models.Product.is_active == True
-    ).options(
-        joinedload(models.Product.category),
-        joinedload(models.Product.supplier)
-    ).all()
-    
-    buffer = ProductExportService.export_to_excel(products)
-    
+    if format == "csv":
+        return StreamingResponse(
+            ProductExportService.stream_csv(db),
+            media_type=streaming_export.CSV_MEDIA_TYPE,
+            headers=streaming_export.attachment(f"inventario_{date.today().strftime('%Y-%m-%d')}.csv")
+        )
+    if format != "xlsx":
+        raise HTTPException(status_code=400, detail="format must be xlsx or csv")
+
     filename = f"inventario_{date.today().strftime('%Y-%m-%d')}.xlsx"
     
     return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        ProductExportService.stream_excel(db),
+        media_type=streaming_export.XLSX_MEDIA_TYPE,
+        headers=streaming_export.attachment(filename)
     )
 
 @router.get("/export/pdf")
-def export_pdf(db: Session = Depends(get_db)):
+def export_pdf(db: Session = Depends(get_read_db)):
     """
     Export all active products to PDF
     """
@@ -405,7 +463,7 @@ def read_product(product_id: int, db: Session = Depends(get_db)):
     return product
 
 @router.delete("/{product_id}", dependencies=[Depends(has_role([UserRole.ADMIN]))])
-def delete_product(product_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def delete_product(product_id: int, db: Session = Depends(get_db)):
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -419,7 +477,7 @@ def delete_product(product_id: int, background_tasks: BackgroundTasks, db: Sessi
         "id": product.id,
         "name": product.name
     }
-    background_tasks.add_task(run_broadcast, WebSocketEvents.PRODUCT_DELETED, payload)
+    event_bus.publish(WebSocketEvents.PRODUCT_DELETED, payload)
     
     return {"status": "success", "message": "Product deactivated"}
 
@@ -440,7 +498,7 @@ def calculate_price(
     """
     if exchange_rate_id:
         # Use specific rate
-        rate = db.query(models.ExchangeRate).get(exchange_rate_id)
+        rate = config_store.snapshot(db).rate(exchange_rate_id)
         if not rate or not rate.is_active:
             raise HTTPException(status_code=404, detail="Exchange rate not found or inactive")
         
@@ -452,15 +510,12 @@ def calculate_price(
                 "currency_code": rate.currency_code,
                 "rate": rate.rate
             },
-            "converted_price": price_usd * rate.rate,
+            "converted_price": price_usd * float(rate.rate),
             "currency_symbol": rate.currency_symbol
         }
     else:
         # Calculate for all active default rates
-        default_rates = db.query(models.ExchangeRate).filter(
-            models.ExchangeRate.is_default == True,
-            models.ExchangeRate.is_active == True
-        ).all()
+        default_rates = config_store.snapshot(db).default_rates()
         
         results = []
         for rate in default_rates:
@@ -469,7 +524,7 @@ def calculate_price(
                 "currency_symbol": rate.currency_symbol,
                 "rate_name": rate.name,
                 "exchange_rate": rate.rate,
-                "converted_price": price_usd * rate.rate
+                "converted_price": price_usd * float(rate.rate)
             })
         
         return {
@@ -501,12 +556,12 @@ def delete_price_rule(rule_id: int, db: Session = Depends(get_db)):
     return {"status": "success"}
 
 @router.post("/sales/", dependencies=[Depends(cashier_or_admin)])
-def create_sale(sale_data: schemas.SaleCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def create_sale(sale_data: schemas.SaleCreate, db: Session = Depends(get_db)):
     from ..services.sales_service import SalesService
     
     # Delegate to Service (Now Sync)
     # TODO: Get actual user_id from dependency
-    return SalesService.create_sale(db, sale_data, user_id=1, background_tasks=background_tasks)
+    return SalesService.create_sale(db, sale_data, user_id=1)
 
 # NEW: Get sale detail with items (for invoice detail view)
 @router.get("/sales/{sale_id}", response_model=schemas.SaleRead, dependencies=[Depends(cashier_or_admin)])
@@ -538,7 +593,7 @@ def print_sale_endpoint(sale_id: int, db: Session = Depends(get_db)):
 @router.post("/print/remote", dependencies=[Depends(cashier_or_admin)])
 async def print_remote(
     request: schemas.RemotePrintRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)  # Read only: a write session would take the write lock on the loop
 ):
     """
     Send print command to Hardware Bridge via WebSocket
@@ -561,7 +616,7 @@ async def print_remote(
     
     # Get print payload
     try:
-        payload = SalesService.get_sale_print_payload(db, request.sale_id)
+        payload = await run_in_threadpool(SalesService.get_sale_print_payload, db, request.sale_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando ticket: {str(e)}")
     
@@ -606,6 +661,9 @@ def register_sale_payment(
         exchange_rate=payment_data.exchange_rate
     )
     db.add(payment)
+    db.flush()
+    cash_ledger.record_payments(db, [models.SalePayment.id == payment.id])
+    sales_rollups.record_payments(db, [payment.id])
     db.commit()
     
     return {"status": "success", "payment_id": payment.id}
@@ -705,7 +763,7 @@ else:
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 @router.post("/{product_id}/image")
-async def upload_product_image(
+def upload_product_image(
     product_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
@@ -717,17 +775,18 @@ async def upload_product_image(
     - Resizes to max 800x800px
     - Updates product.updated_at automatically
     """
-    # 1. Verify product exists
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    # 2. Validate file size (max 2MB)
-    contents = await file.read()
+    # 1. Validate file size (max 2MB) before touching the database: this is a write session,
+    #    its first query takes the SQLite write lock until the commit
+    contents = file.file.read()
     file_size = len(contents)
     if file_size > 2 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Imagen muy pesada (máximo 2MB)")
     
+    # 2. Verify product exists
+    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
     # 3. Validate file type and process with Pillow
     try:
         img = Image.open(io.BytesIO(contents))
@@ -4,8 +4,9 @@ from typing import List, Optional
 from ..database.db import get_db
 from ..models import models
 from .. import schemas
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
+from ..services import stock_ledger
 
 router = APIRouter(
     prefix="/purchases",
@@ -13,7 +14,7 @@ router = APIRouter(
 )
 
 @router.post("", response_model=schemas.PurchaseOrderResponse)
-async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Session = Depends(get_db)):
+def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Session = Depends(get_db)):
     """
     Create a new purchase order with automatic:
     - Stock updates
@@ -62,9 +63,9 @@ async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Ses
             )
             db.add(purchase_item)
 
-            # Update stock
-            old_stock = product.stock
-            product.stock += item.quantity
+            # Update stock (atomic increment, returns the new total)
+            new_stock = stock_ledger.increment(db, product.id, item.quantity).total_stock
+            old_stock = new_stock - item.quantity
             
             # Update cost price (weighted average)
             if item.update_cost:
@@ -72,7 +73,7 @@ async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Ses
                     product.cost_price = item.unit_cost
                 else:
                     total_value = (product.cost_price * old_stock) + (item.unit_cost * item.quantity)
-                    product.cost_price = total_value / product.stock
+                    product.cost_price = total_value / new_stock
             
             # Update Sale Price (PVP) if requested
             if item.update_price:
@@ -97,7 +98,7 @@ async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Ses
                 product_id=product.id,
                 movement_type=models.MovementType.PURCHASE,
                 quantity=item.quantity,
-                balance_after=product.stock,
+                balance_after=new_stock,
                 description=f"Compra #{purchase.id} - {supplier.name}",
                 date=purchase_date
             )
@@ -109,7 +110,7 @@ async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Ses
                 "name": product.name,
                 "price": float(product.price),
                 "cost_price": float(product.cost_price), # NEW: Send cost
-                "stock": float(product.stock),
+                "stock": float(new_stock),
                 "profit_margin": float(product.profit_margin) if product.profit_margin else 0, # NEW: Send margin
                 "exchange_rate_id": product.exchange_rate_id
             })
@@ -127,8 +128,8 @@ async def create_purchase_order(order_data: schemas.PurchaseOrderCreate, db: Ses
         
         # Emission of events
         for p_info in updated_products_info:
-            await manager.broadcast(WebSocketEvents.PRODUCT_UPDATED, p_info)
-            await manager.broadcast(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
+            event_bus.publish(WebSocketEvents.PRODUCT_UPDATED, p_info)
+            event_bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
                 "id": p_info["id"], 
                 "stock": p_info["stock"]
             })
@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+import os
+from ..database.db import get_read_db
+from ..dependencies import admin_only, get_current_active_user
+from ..models import models
+from ..services import report_jobs
+from .. import schemas
+
+router = APIRouter(
+    prefix="/reports/jobs",
+    tags=["reports"],
+    dependencies=[Depends(admin_only)]  # 🔒 ADMIN ONLY - same as /reports
+)
+
+
+def _read(job: Dict[str, Any], reused: bool = False) -> schemas.ReportJobRead:
+    stamps = {k: datetime.fromtimestamp(job[k]) if job[k] else None
+              for k in ("created_at", "started_at", "finished_at")}
+    fields = {k: v for k, v in job.items() if k in schemas.ReportJobRead.model_fields and k not in stamps}
+    return schemas.ReportJobRead(**fields, **stamps, reused=reused)
+
+
+def _job_or_404(job_id: str) -> Dict[str, Any]:
+    job = report_jobs.report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+
+@router.post("", response_model=schemas.ReportJobRead, status_code=202)
+def submit_report_job(
+    payload: schemas.ReportJobCreate,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Queue a report (management, general, detailed, sales_detailed, inventory).
+    An identical request whose data has not changed returns the existing job
+    (`reused: true`), finished or still running.
+    When it finishes a `report_job:finished` websocket event is sent.
+    """
+    try:
+        job, reused = report_jobs.report_jobs.submit(
+            db, payload.report, payload.format, payload.params, payload.priority, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except report_jobs.JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return _read(job, reused)
+
+
+@router.get("", response_model=List[schemas.ReportJobRead])
+def list_report_jobs(
+    mine: bool = False,
+    limit: int = 50,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Most recent report jobs"""
+    return [_read(job) for job in report_jobs.report_jobs.list(current_user.id if mine else None, limit)]
+
+
+@router.get("/{job_id}", response_model=schemas.ReportJobRead)
+def get_report_job(job_id: str):
+    """Status of a report job"""
+    return _read(_job_or_404(job_id))
+
+
+@router.get("/{job_id}/download")
+def download_report_job(job_id: str):
+    """Artifact of a finished report job"""
+    job = _job_or_404(job_id)
+    if job["status"] != report_jobs.DONE:
+        raise HTTPException(status_code=409, detail=f"Report job is {job['status']}")
+    path, media_type = report_jobs.report_jobs.artifact(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Report file expired, submit the job again")
+    return FileResponse(path, media_type=media_type, filename=job["filename"])
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, cast, String
 from typing import List, Optional
-from ..database.db import get_db
+from ..database.db import get_db, get_read_db
 from ..models import models
 from .. import schemas
+from ..services import cash_ledger, sales_rollups, stock_ledger
 from datetime import datetime, date
 
 router = APIRouter(
@@ -20,7 +21,7 @@ def search_sales(
     status: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     try:
         """Search sales with filters"""
@@ -134,24 +135,23 @@ def process_return(return_data: schemas.ReturnCreate, db: Session = Depends(get_
             return_id=new_return.id,
             product_id=item.product_id,
             quantity=item.quantity,
-            unit_price=detail.unit_price  # Add unit price from original sale
+            unit_price=detail.unit_price,  # Add unit price from original sale
+            # Cost leaves the books at what it cost when sold
+            unit_cost=detail.unit_cost if detail.unit_cost is not None else (detail.product.cost_price or 0)
         )
         db.add(ret_detail)
         
-        # Get product
-        product = db.query(models.Product).get(item.product_id)
-        
         # Handle stock based on condition
         if item.condition == "GOOD":
-            # GOOD condition: Simply restore to stock
-            product.stock += item.quantity
+            # GOOD condition: Simply restore to stock (back into the warehouse it left)
+            level = stock_ledger.increment(db, item.product_id, item.quantity, warehouse_id=sale.warehouse_id)
             
             # Kardex Entry: RETURN (Entrada)
             kardex = models.Kardex(
-                product_id=product.id,
+                product_id=item.product_id,
                 movement_type="RETURN",
                 quantity=item.quantity,
-                balance_after=product.stock,
+                balance_after=level.total_stock,
                 description=f"Devolución Venta #{sale.id} - Buen Estado",
                 date=datetime.now()
             )
@@ -159,27 +159,26 @@ def process_return(return_data: schemas.ReturnCreate, db: Session = Depends(get_
             
         else:  # DAMAGED condition
             # Step 1: Register the return (for audit trail)
-            old_stock = product.stock
-            product.stock += item.quantity
+            level = stock_ledger.increment(db, item.product_id, item.quantity)
             
             kardex_return = models.Kardex(
-                product_id=product.id,
+                product_id=item.product_id,
                 movement_type="RETURN",
                 quantity=item.quantity,
-                balance_after=product.stock,
+                balance_after=level.total_stock,
                 description=f"Devolución Venta #{sale.id} - Producto Dañado (Entrada)",
                 date=datetime.now()
             )
             db.add(kardex_return)
             
-            # Step 2: Immediately adjust out (automatic shrinkage)
-            product.stock -= item.quantity
+            # Step 2: Immediately adjust out (automatic shrinkage, unconditional)
+            level = stock_ledger.increment(db, item.product_id, -item.quantity)
             
             kardex_adjustment = models.Kardex(
-                product_id=product.id,
+                product_id=item.product_id,
                 movement_type="ADJUSTMENT_OUT",
                 quantity=item.quantity,
-                balance_after=product.stock,
+                balance_after=level.total_stock,
                 description=f"Auto-merma por devolución dañada - Venta #{sale.id}",
                 date=datetime.now()
             )
@@ -209,6 +208,7 @@ def process_return(return_data: schemas.ReturnCreate, db: Session = Depends(get_
     
     # Cash Impact (Refund)
     session = db.query(models.CashSession).filter(models.CashSession.status == "OPEN").first()
+    cash_movement = None
     if session:
         amount_to_record = total_refund
         if return_data.refund_currency == "Bs":
@@ -223,6 +223,12 @@ def process_return(return_data: schemas.ReturnCreate, db: Session = Depends(get_
             description=f"Devolución Venta #{sale.id}: {return_data.reason}"
         )
         db.add(cash_movement)
+
+    # Daily report rollups and drawer balance, in the same transaction
+    db.flush()
+    sales_rollups.record_return(db, new_return.id, [cash_movement.id] if cash_movement else [])
+    if cash_movement:
+        cash_ledger.record_movement(db, cash_movement)
     
     db.commit()
     db.refresh(new_return)
@@ -4,7 +4,7 @@ from typing import List, Optional
 from ..database.db import get_db
 from ..models import models
 from .. import schemas
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
 
 router = APIRouter(
@@ -39,7 +39,7 @@ def read_suppliers(
 
 @router.post("/", response_model=schemas.SupplierRead)
 @router.post("", response_model=schemas.SupplierRead, include_in_schema=False)
-async def create_supplier(supplier: schemas.SupplierCreate, db: Session = Depends(get_db)):
+def create_supplier(supplier: schemas.SupplierCreate, db: Session = Depends(get_db)):
     # Check duplicate name
     exists = db.query(models.Supplier).filter(models.Supplier.name.ilike(supplier.name)).first()
     if exists:
@@ -51,7 +51,7 @@ async def create_supplier(supplier: schemas.SupplierCreate, db: Session = Depend
     db.refresh(db_supplier)
     
     # Broadcast supplier created
-    await manager.broadcast(WebSocketEvents.SUPPLIER_CREATED, {
+    event_bus.publish(WebSocketEvents.SUPPLIER_CREATED, {
         "id": db_supplier.id,
         "name": db_supplier.name,
         "credit_limit": float(db_supplier.credit_limit) if db_supplier.credit_limit else 0.0
@@ -67,7 +67,7 @@ def read_supplier(supplier_id: int, db: Session = Depends(get_db)):
     return supplier
 
 @router.put("/{supplier_id}", response_model=schemas.SupplierRead)
-async def update_supplier(supplier_id: int, supplier_update: schemas.SupplierCreate, db: Session = Depends(get_db)):
+def update_supplier(supplier_id: int, supplier_update: schemas.SupplierCreate, db: Session = Depends(get_db)):
     db_supplier = db.query(models.Supplier).filter(models.Supplier.id == supplier_id).first()
     if not db_supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
@@ -79,7 +79,7 @@ async def update_supplier(supplier_id: int, supplier_update: schemas.SupplierCre
     db.refresh(db_supplier)
     
     # Broadcast supplier updated
-    await manager.broadcast(WebSocketEvents.SUPPLIER_UPDATED, {
+    event_bus.publish(WebSocketEvents.SUPPLIER_UPDATED, {
         "id": db_supplier.id,
         "name": db_supplier.name,
         "credit_limit": float(db_supplier.credit_limit) if db_supplier.credit_limit else 0.0
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
-from ..database.db import get_db
+from ..database.db import get_db, get_unserialized_db
 from ..services import sync_client
+from ..services.sync_daemon import sync_daemon
 from ..models import models
 
 router = APIRouter(prefix="/sync-local", tags=["sync-local"])
@@ -9,10 +10,13 @@ router = APIRouter(prefix="/sync-local", tags=["sync-local"])
 @router.post("/trigger")
 async def trigger_manual_sync(
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    full_resync: bool = False,
+    db: Session = Depends(get_unserialized_db)  # Don't hold the POS write lock during HTTP round trips
 ):
     """
     Called by Desktop App Frontend to start a full sync from VPS.
+    full_resync ignores the stored cursor and reloads the whole catalog,
+    with the catalog indexes dropped during the load and rebuilt after it.
     """
     try:
         # Get cloud URL from business configuration (key-value store)
@@ -30,11 +34,13 @@ async def trigger_manual_sync(
         
         print(f"[SYNC] Starting manual sync with cloud: {cloud_url}")
         
-        # 1. Pull catalog from cloud
-        pull_result = await sync_client.pull_catalog_from_cloud(db, vps_url=cloud_url)
+        # 1. Pull catalog from cloud (reuses the background worker's connection pool when it runs)
+        pull_result = await sync_client.pull_catalog_from_cloud(
+            db, vps_url=cloud_url, full_resync=full_resync, drop_indexes=full_resync, client=sync_daemon.client
+        )
         
         # 2. Push Pending Sales
-        push_result = await sync_client.push_sales_to_cloud(db, vps_url=cloud_url)
+        push_result = await sync_client.push_sales_to_cloud(db, vps_url=cloud_url, client=sync_daemon.client)
         
         return {
             "message": "Sincronización completada", 
@@ -51,3 +57,13 @@ async def trigger_manual_sync(
         raise HTTPException(status_code=500, detail=f"Error en sincronización: {str(e)}")
 
 
+
+
+@router.get("/status")
+def sync_status(db: Session = Depends(get_db)):
+    """
+    Background sync worker status: pending sales (queue depth), last success,
+    last error and backoff, and push throughput.
+    """
+    sync_daemon.queue_depth = sync_client.pending_sales_count(db)
+    return sync_daemon.get_status()
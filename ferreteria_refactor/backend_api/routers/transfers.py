@@ -6,6 +6,7 @@ from ..models import models
 from .. import schemas
 from ..models.models import UserRole
 from ..dependencies import has_role
+from ..services import stock_ledger
 
 router = APIRouter(prefix="/transfers", tags=["transfers"])
 
@@ -36,22 +37,7 @@ def create_transfer(transfer_data: schemas.InventoryTransferCreate, db: Session
     if source_wh.id == target_wh.id:
         raise HTTPException(status_code=400, detail="Cannot transfer to the same warehouse")
 
-    # 2. Check Stock Availability
-    for item in transfer_data.items:
-        stock_record = db.query(models.ProductStock).filter(
-            models.ProductStock.warehouse_id == source_wh.id,
-            models.ProductStock.product_id == item.product_id
-        ).first()
-
-        current_qty = stock_record.quantity if stock_record else 0
-        if current_qty < item.quantity:
-            product = db.query(models.Product).get(item.product_id)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient stock for product '{product.name}'. Available: {current_qty}, Requested: {item.quantity}"
-            )
-
-    # 3. Create Transfer Record
+    # 2. Create Transfer Record
     new_transfer = models.InventoryTransfer(
         source_warehouse_id=transfer_data.source_warehouse_id,
         target_warehouse_id=transfer_data.target_warehouse_id,
@@ -62,9 +48,27 @@ def create_transfer(transfer_data: schemas.InventoryTransferCreate, db: Session
     db.add(new_transfer)
     db.flush() # Get ID
 
-    # 4. Execute Movement and Create Details
+    # 3. Move Stock: conditional decrement at source (all-or-nothing), then credit target.
+    # Transfers don't change the legacy Product.stock total.
+    quantities = {}
+    for item in transfer_data.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    try:
+        stock_ledger.reserve(db, quantities, warehouse_id=source_wh.id, update_total=False)
+    except stock_ledger.InsufficientStock as e:
+        db.rollback()
+        product = db.query(models.Product).get(e.product_id)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Insufficient stock for product '{product.name if product else e.product_id}'. Available: {e.available}, Requested: {e.requested}"
+        )
+
+    for product_id in sorted(quantities):
+        stock_ledger.increment(db, product_id, quantities[product_id], warehouse_id=target_wh.id, update_total=False)
+
+    # 4. Create Details
     for item in transfer_data.items:
-        # Create Detail
         detail = models.TransferDetail(
             transfer_id=new_transfer.id,
             product_id=item.product_id,
@@ -72,29 +76,6 @@ def create_transfer(transfer_data: schemas.InventoryTransferCreate, db: Session
         )
         db.add(detail)
 
-        # DECREASE Source
-        source_stock = db.query(models.ProductStock).filter(
-            models.ProductStock.warehouse_id == source_wh.id,
-            models.ProductStock.product_id == item.product_id
-        ).first()
-        source_stock.quantity -= item.quantity
-
-        # INCREASE Target
-        target_stock = db.query(models.ProductStock).filter(
-            models.ProductStock.warehouse_id == target_wh.id,
-            models.ProductStock.product_id == item.product_id
-        ).first()
-
-        if not target_stock:
-            target_stock = models.ProductStock(
-                warehouse_id=target_wh.id,
-                product_id=item.product_id,
-                quantity=0
-            )
-            db.add(target_stock)
-        
-        target_stock.quantity += item.quantity
-
     try:
         db.commit()
         db.refresh(new_transfer)
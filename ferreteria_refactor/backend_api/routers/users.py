@@ -1,12 +1,13 @@
 
+import hmac
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBasic
 from sqlalchemy.orm import Session
 from .. import schemas
-from ..database.db import get_db
+from ..database.db import get_db, get_unserialized_db
 from ..models import models
 from typing import List
-from ..security import verify_password, get_password_hash
+from ..security import HashPoolBusy, verify_and_update_password, rehash_password, get_password_hash
 
 router = APIRouter(
     prefix="/users",
@@ -84,11 +85,19 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     return {"message": "User deactivated successfully"}
 
 @router.post("/login")
-def login(credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+def login(credentials: schemas.UserLogin, db: Session = Depends(get_unserialized_db)):
     """Authenticate user"""
     user = db.query(models.User).filter(models.User.username == credentials.username).first()
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    try:
+        valid, new_hash = verify_and_update_password(credentials.password, user.password_hash) if user else (False, None)
+    except HashPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again",
+            headers={"Retry-After": "1"},
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -99,6 +108,8 @@ def login(credentials: schemas.UserLogin, db: Session = Depends(get_db)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is inactive"
         )
+    if new_hash:
+        rehash_password(db, user, new_hash)
     
     return {
         "id": user.id,
@@ -115,7 +126,7 @@ def verify_pin(user_id: int, pin: str, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if user.pin == pin:
+    if user.pin and hmac.compare_digest(user.pin.encode(), str(pin).encode()):
         return {"verified": True, "role": user.role.value if hasattr(user.role, 'value') else user.role}
     else:
         return {"verified": False}
@@ -2,21 +2,47 @@
 WebSocket Router
 Handles WebSocket connections and keeps them alive
 """
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from ..dependencies import admin_only
 from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 import json
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
 
+def _parse_topics(raw):
+    if not raw:
+        return None
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    return [t.strip() for t in raw if t and t.strip()] or None
+
+
+def _parse_warehouse(raw):
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
 @router.websocket("")
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for real-time updates
     Clients connect to: ws://localhost:8000/api/v1/ws
+
+    Optional subscriptions (query string or a later message):
+        ?topics=sale:completed            -> dashboards: only completed sales
+        ?topics=product:*&warehouse_id=2  -> cashier: product events for warehouse 2
+        {"action": "subscribe", "topics": [...], "warehouse_id": 2}
     """
     try:
-        await manager.connect(websocket)
+        await manager.connect(
+            websocket,
+            topics=_parse_topics(websocket.query_params.get("topics")),
+            warehouse_id=_parse_warehouse(websocket.query_params.get("warehouse_id"))
+        )
     except Exception as e:
         print(f"[WS] Error connecting WebSocket: {e}")
         return
@@ -28,10 +54,24 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # Handle ping/pong for keep-alive
             if data == "ping":
-                await websocket.send_text("pong")
+                manager.send_to(websocket, "pong")
+                continue
+
+            try:
+                request = json.loads(data)
+            except ValueError:
+                request = None
+
+            if isinstance(request, dict) and request.get("action") == "subscribe":
+                manager.subscribe(
+                    websocket,
+                    topics=_parse_topics(request.get("topics")),
+                    warehouse_id=_parse_warehouse(request.get("warehouse_id"))
+                )
+                manager.send_to(websocket, json.dumps({"type": "subscribed", "data": request}))
             else:
                 # Echo back for debugging
-                await websocket.send_text(json.dumps({
+                manager.send_to(websocket, json.dumps({
                     "type": "echo",
                     "data": data,
                     "connections": manager.get_connection_count()
@@ -43,3 +83,9 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
+
+
+@router.get("/metrics", dependencies=[Depends(admin_only)])
+def websocket_metrics():
+    """Event bus health: queue depth, fan-out latency, dropped/coalesced counters"""
+    return event_bus.get_metrics()
@@ -185,6 +185,40 @@ class ProductRead(ProductBase):
     class Config:
         from_attributes = True
 
+class ScanItem(BaseModel):
+    """What the POS needs to put a scanned code in the cart (services/scan_index.py)"""
+    product_id: int
+    unit_id: Optional[int] = None  # Presentation matched by barcode
+    name: str
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
+    unit_name: Optional[str] = None
+    conversion_factor: Decimal = Decimal("1")
+    price: Decimal
+    stock: Decimal  # Base units, all warehouses
+    warehouse_stock: Optional[Decimal] = None  # Base units in the requested warehouse
+    stocks: Dict[int, Decimal] = {}  # warehouse_id -> base units
+
+class ScanResult(BaseModel):
+    code: str
+    exact: bool  # SKU/barcode match; False = name prefix matches
+    items: List[ScanItem]
+
+class ProductSearchHit(BaseModel):
+    id: int
+    name: str
+    sku: Optional[str] = None
+    price: Decimal = Decimal("0")
+    stock: Decimal = Decimal("0")
+    unit_type: Optional[str] = None
+    category_id: Optional[int] = None
+    score: float  # Higher is better; only comparable within one response
+
+class ProductSearchResult(BaseModel):
+    query: str
+    fuzzy: bool  # Some words were matched as likely typos (services/product_search.py)
+    items: List[ProductSearchHit]
+
 class SaleDetailCreate(BaseModel):
     product_id: int
     quantity: Decimal
@@ -423,6 +457,7 @@ class CashCloseDetails(BaseModel):
     # New: per-currency breakdown
     cash_by_currency: Optional[Dict[str, Decimal]] = {}
     transfers_by_currency: Optional[Dict[str, Dict[str, Decimal]]] = {}  # {currency: {method: amount}}
+    refunds_by_currency: Optional[Dict[str, Decimal]] = {}  # Cash handed back on returns
 
 class CashSessionCloseResponse(BaseModel):
     session: CashSessionRead
@@ -821,3 +856,26 @@ class WarehouseInventoryItem(BaseModel):
     
     class Config:
         from_attributes = True
+
+# Report Jobs (services/report_jobs.py)
+class ReportJobCreate(BaseModel):
+    report: str = Field(..., description="management, general, detailed, sales_detailed o inventory", example="general")
+    format: Optional[str] = Field(None, description="xlsx o csv (según el reporte)", example="xlsx")
+    params: Dict[str, Any] = Field(default_factory=dict, example={"start_date": "2024-01-01", "end_date": "2024-01-31"})
+    priority: int = Field(5, ge=0, le=9, description="0 = primero en la cola")
+
+class ReportJobRead(BaseModel):
+    id: str
+    report: str
+    format: str
+    params: Dict[str, Any]
+    status: str  # queued | running | done | failed
+    priority: int
+    user_id: Optional[int] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    reused: bool = False  # Served from an identical earlier request
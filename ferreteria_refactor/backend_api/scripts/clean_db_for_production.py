@@ -44,6 +44,7 @@ def clean_database():
         db.query(models.PurchaseOrder).delete()
         
         # Cash
+        db.query(models.CashSessionBalance).delete()
         db.query(models.CashMovement).delete()
         db.query(models.CashSession).delete()
         
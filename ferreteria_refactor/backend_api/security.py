@@ -1,17 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy.exc import SQLAlchemyError
 from .config import settings
 
-# Hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashing context. min/max pinned to BCRYPT_ROUNDS so hashes of any other cost
+# count as "needs update" and are re-hashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt is CPU-bound (~250 ms at cost 12). It gets its own small pool so a
+# burst of logins can't take every worker thread, and waiting callers are
+# capped: past PASSWORD_HASH_MAX_PENDING the caller gets HashPoolBusy instead
+# of queueing for seconds. Call these from sync code (threadpool routes),
+# never directly from an async def.
+_hash_pool = ThreadPoolExecutor(max_workers=max(1, settings.PASSWORD_HASH_WORKERS),
+                                thread_name_prefix="password-hash")
+_pending = threading.BoundedSemaphore(max(1, settings.PASSWORD_HASH_MAX_PENDING))
+
+
+class HashPoolBusy(Exception):
+    """Too many password checks already waiting for the hash pool"""
+
+
+def _run_hash(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise HashPoolBusy()
+    try:
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _pending.release()
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_hash(pwd_context.verify, plain_password, hashed_password)
+
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash): new_hash is set when the stored hash should be replaced (other bcrypt cost)"""
+    return _run_hash(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def rehash_password(db, user, new_hash: str):
+    """Store the hash verify_and_update_password returned; best effort, the next login retries"""
+    try:
+        user.password_hash = new_hash
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _run_hash(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
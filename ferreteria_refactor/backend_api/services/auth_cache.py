@@ -0,0 +1,164 @@
+"""
+Auth Cache
+Keeps get_current_user (dependencies.py) off the database for repeat requests.
+
+Verified tokens are cached by a hash of the token until their `exp` claim,
+so the signature check and decode run once per token, not once per request.
+Users are cached by username as a small AuthUser snapshot for
+AUTH_USER_CACHE_TTL seconds.
+
+/auth/validate-pin is hit on every cashier quick-switch, so a successful PIN
+check is kept for PIN_CACHE_TTL seconds keyed by user and a hash of the PIN.
+
+Keeping it fresh:
+- A transaction that changes users (role, active flag, password, PIN) drops
+  their user and PIN entries when it commits (see services/change_tracker.py;
+  Core writes such as catalog sync call touch()).
+- The commit also publishes user:updated through the event bus, so other
+  workers drop the same entries; the TTLs bound how long a worker that
+  missed the message keeps serving the old values.
+
+Routes only read id / username / role / is_active from the current user, so
+the snapshot is a frozen dataclass, not an ORM object bound to some session.
+"""
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.models import User, UserRole
+from ..websocket.event_bus import event_bus
+from ..websocket.events import WebSocketEvents
+from . import change_tracker
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    id: int
+    username: str
+    role: UserRole
+    full_name: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, user) -> "AuthUser":
+        return cls(user.id, user.username, user.role, user.full_name, bool(user.is_active))
+
+
+def token_key(token: str) -> bytes:
+    """The cache never holds raw tokens"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class AuthCache:
+    def __init__(self, max_tokens: int = None, user_ttl: float = None):
+        self.max_tokens = max_tokens or settings.AUTH_TOKEN_CACHE_SIZE
+        self.user_ttl = settings.AUTH_USER_CACHE_TTL if user_ttl is None else user_ttl
+        self._lock = threading.Lock()
+        self._tokens: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()  # key -> (subject, exp)
+        self._users: Dict[str, Tuple[AuthUser, float]] = {}  # username -> (user, cached at)
+        self._pins: Dict[int, Tuple[bytes, dict, float]] = {}  # user id -> (pin key, result, expires at)
+        self.hits = self.misses = 0
+
+    # ---------- Tokens ----------
+
+    def token_subject(self, token: str) -> Optional[str]:
+        """Subject of a token verified before and not expired yet"""
+        key = token_key(token)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return entry[0]
+
+    def remember_token(self, token: str, subject: str, expires_at: Optional[float]):
+        if not expires_at:
+            return  # Tokens without exp are verified every time
+        with self._lock:
+            self._tokens[token_key(token)] = (subject, float(expires_at))
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+
+    # ---------- Users ----------
+
+    def user(self, username: str) -> Optional[AuthUser]:
+        entry = self._users.get(username)
+        if entry is not None and time.monotonic() - entry[1] < self.user_ttl:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def remember_user(self, user: AuthUser):
+        if self.user_ttl > 0:
+            self._users[user.username] = (user, time.monotonic())
+
+    # ---------- PINs ----------
+
+    def pin_result(self, user_id: int, pin: str) -> Optional[dict]:
+        """validate-pin response for a PIN that passed recently"""
+        entry = self._pins.get(user_id)
+        if entry is None or entry[2] <= time.monotonic():
+            return None
+        return entry[1] if hmac.compare_digest(entry[0], token_key(f"{user_id}:{pin}")) else None
+
+    def remember_pin(self, user_id: int, pin: str, result: dict):
+        if settings.PIN_CACHE_TTL > 0:
+            self._pins[user_id] = (token_key(f"{user_id}:{pin}"), result, time.monotonic() + settings.PIN_CACHE_TTL)
+
+    def invalidate_user(self, user_id: Optional[int] = None):
+        """Forget one user (every username it was cached under, and its PIN), or all of them"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self._pins.clear()
+                return
+            self._pins.pop(user_id, None)
+            for username, (user, _) in list(self._users.items()):
+                if user.id == user_id:
+                    self._users.pop(username, None)
+
+    def invalidate_users(self, user_ids: Optional[Iterable[int]]):
+        if user_ids is None:
+            self.invalidate_user()
+        for user_id in user_ids or ():
+            self.invalidate_user(user_id)
+
+    def on_event(self, event_type: str, data: Dict[str, Any]):
+        """Event bus listener: another worker committed user changes (ours were dropped at commit)"""
+        if event_type != WebSocketEvents.USER_UPDATED or not isinstance(data, dict) or not change_tracker.is_remote(data):
+            return
+        self.invalidate_users(data.get("user_ids"))
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+            self._pins.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"tokens": len(self._tokens), "users": len(self._users), "pins": len(self._pins),
+                "hits": self.hits, "misses": self.misses}
+
+
+def _publish_changes(session: Session, keys: set):
+    user_ids = None if change_tracker.ALL in keys else sorted(keys)
+    auth_cache.invalidate_users(user_ids)
+    change_tracker.publish(WebSocketEvents.USER_UPDATED, {"user_ids": user_ids})
+
+
+tracker = change_tracker.ChangeTracker(
+    "auth_cache", {User: lambda user: user.id}, _publish_changes, states=("dirty", "deleted"), bulk=True
+)
+touch = tracker.touch  # Core writes to users: auth_cache.touch(db, user_ids), None for any user
+
+auth_cache = AuthCache()
+event_bus.add_listener(auth_cache.on_event)
@@ -0,0 +1,225 @@
+"""
+Bulk Upsert
+Set-based writes for sync ingest.
+
+Rows are written with INSERT ... ON CONFLICT (id) DO UPDATE (SQLite and
+Postgres dialects) in chunked executemany batches on the session's
+connection, so a whole pull stays in the caller's transaction. Other
+dialects fall back to one id preload plus executemany INSERT/UPDATE.
+
+upsert_add() is the counter flavour used by the report rollups: on conflict
+with an existing key the numeric columns are added rather than replaced.
+
+For full resyncs the secondary (non-unique) indexes of the target tables
+can be dropped first and rebuilt once at the end, which is much cheaper
+than maintaining them row by row.
+"""
+import time
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+from sqlalchemy import Table, bindparam, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+CHUNK_SIZE = 1000
+IN_CHUNK = 900  # Stay under SQLite's bound-parameter limit on IN lists
+
+
+def _chunks(rows: Sequence, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class IngestStats:
+    """Row counts and timing of one ingest run, per table"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.tables: Dict[str, Dict[str, int]] = {}
+
+    def add(self, table: str, inserted: int, updated: int):
+        entry = self.tables.setdefault(table, {"inserted": 0, "updated": 0})
+        entry["inserted"] += inserted
+        entry["updated"] += updated
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def rows(self) -> int:
+        return sum(t["inserted"] + t["updated"] for t in self.tables.values())
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "rows": self.rows,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "tables": self.tables,
+        }
+
+    def report(self, label: str = "Ingest"):
+        print(f"[SYNC] {label}: {self.rows} rows in {self.elapsed:.2f}s ({self.rows_per_sec:.0f} rows/s)")
+
+
+def existing_ids(db: Session, table: Table, ids: Iterable, column: str = "id") -> Set:
+    """Values of `column` already present, one query per IN chunk"""
+    ids = list(ids)
+    col = table.c[column]
+    found = set()
+    for chunk in _chunks(ids, IN_CHUNK):
+        found.update(db.execute(select(col).where(col.in_(chunk))).scalars())
+    return found
+
+
+def insert_returning_keys(db: Session, table: Table, rows: List[Dict], key: str) -> Dict:
+    """
+    Insert rows and map each row's `key` (unique, not null) to its new id.
+    RETURNING rows are matched by key rather than position, so dialects
+    without an insert sentinel (SQLite) can still batch the executemany.
+    """
+    if not rows:
+        return {}
+    conn = db.connection()
+    stmt = insert(table).returning(table.c[key], table.c.id)
+    if getattr(conn.dialect, "insert_executemany_returning", False):
+        return {k: new_id for k, new_id in conn.execute(stmt, rows)}
+    return {row[key]: conn.execute(stmt, row).one()[1] for row in rows}
+
+
+def _upsert_statement(db: Session, table: Table, columns: List[str]):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: stmt.excluded[name] for name in columns if name != "id"},
+    )
+
+
+def upsert(db: Session, table: Table, rows: List[Dict], stats: IngestStats = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Insert or update rows by primary key. Every row must have the same keys,
+    including "id". Nothing is committed here.
+    """
+    if not rows:
+        return
+    # Last occurrence wins; Postgres refuses to touch one row twice in a statement
+    rows = list({row["id"]: row for row in rows}.values())
+    columns = list(rows[0].keys())
+    existing = existing_ids(db, table, [row["id"] for row in rows])
+
+    conn = db.connection()
+    stmt = _upsert_statement(db, table, columns)
+    if stmt is not None:
+        for chunk in _chunks(rows, chunk_size):
+            conn.execute(stmt, chunk)
+    else:
+        new_rows = [row for row in rows if row["id"] not in existing]
+        old_rows = [{**row, "_id": row["id"]} for row in rows if row["id"] in existing]
+        update_stmt = update(table).where(table.c.id == bindparam("_id")).values(
+            {name: bindparam(name) for name in columns if name != "id"}
+        )
+        for chunk in _chunks(new_rows, chunk_size):
+            conn.execute(insert(table), chunk)
+        for chunk in _chunks(old_rows, chunk_size):
+            conn.execute(update_stmt, chunk)
+
+    if stats is not None:
+        stats.add(table.name, inserted=len(rows) - len(existing), updated=len(existing))
+
+
+def upsert_add(db: Session, table: Table, rows: List[Dict], keys: Sequence[str], chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Insert rows, or add their non-key columns onto the row with the same
+    `keys` (needs a unique constraint on them). Nothing is committed here.
+    Returns the number of distinct keys written.
+    """
+    if not rows:
+        return 0
+    columns = list(rows[0].keys())
+    measures = [name for name in columns if name not in keys]
+
+    # Merge rows sharing a key first; one statement may not hit the same row twice
+    merged: Dict[Tuple, Dict] = {}
+    for row in rows:
+        key = tuple(row[k] for k in keys)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = dict(row)
+        else:
+            for name in measures:
+                current[name] += row[name]
+    rows = list(merged.values())
+
+    conn = db.connection()
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={name: table.c[name] + stmt.excluded[name] for name in measures},
+        )
+        for chunk in _chunks(rows, chunk_size):
+            conn.execute(stmt, chunk)
+        return len(rows)
+
+    match = [table.c[k] == bindparam(f"_{k}") for k in keys]
+    update_stmt = update(table).where(*match).values(
+        {name: table.c[name] + bindparam(f"_{name}") for name in measures}
+    )
+    for row in rows:
+        params = {f"_{name}": value for name, value in row.items()}
+        if conn.execute(update_stmt, params).rowcount == 0:
+            conn.execute(insert(table), row)
+    return len(rows)
+
+
+def _secondary_indexes(tables: Iterable[Table]):
+    return [index for table in tables for index in table.indexes if not index.unique]
+
+
+def drop_secondary_indexes(db: Session, tables: Iterable[Table]) -> List[str]:
+    """Drop the non-unique indexes of tables inside the current transaction; returns their names"""
+    conn = db.connection()
+    inspector = inspect(conn)
+    dropped = []
+    for index in _secondary_indexes(tables):
+        present = {ix["name"] for ix in inspector.get_indexes(index.table.name)}
+        if index.name in present:
+            index.drop(bind=conn)
+            dropped.append(index.name)
+    return dropped
+
+
+def ensure_secondary_indexes(db: Session, tables: Iterable[Table]) -> List[str]:
+    """
+    Recreate any missing non-unique index. Call it after commit or rollback:
+    SQLite may run a DROP INDEX outside the transaction, so a failed ingest
+    must not leave tables without their indexes.
+    """
+    created = []
+    with db.get_bind().begin() as conn:
+        inspector = inspect(conn)
+        for index in _secondary_indexes(tables):
+            present = {ix["name"] for ix in inspector.get_indexes(index.table.name)}
+            if index.name not in present:
+                index.create(bind=conn)
+                created.append(index.name)
+    return created
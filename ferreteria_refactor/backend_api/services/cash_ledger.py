@@ -0,0 +1,261 @@
+"""
+Cash Ledger
+Running drawer balance per cash session and currency.
+
+cash_session_balances holds, for every session x currency, the opening
+amount plus the cash that came in (cash payments of sales made while the
+session was open, deposits) and went out (expenses/withdrawals, refunds).
+Rows are updated in the same transaction as the payment, movement or
+return that changes them, with additive upserts, so the drawer balance at
+checkout is a single-row read instead of a scan of every payment.
+
+Which payments belong to a session is the rule the cash screens always
+used: cash payments (Efectivo/CASH) of sales whose date falls inside the
+session window. reconcile() re-derives the totals from those raw rows,
+reports any drift and (by default) overwrites the stored figures.
+
+Sessions created before the table existed (still open across the
+upgrade) have no rows: their first write stores the derived totals, the
+write itself included, instead of adding onto nothing. Until then readers
+derive the figures without storing them; read paths never write.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models import models
+from . import bulk_upsert
+
+CASH_METHODS = ("Efectivo", "CASH", "Cash", "efectivo")
+OUT_TYPES = ("EXPENSE", "WITHDRAWAL", "OUT")
+MEASURES = ("initial", "cash_sales", "deposits", "expenses", "refunds")
+KEYS = ("session_id", "currency")
+
+ZERO = Decimal("0.00")
+_balances = models.CashSessionBalance.__table__
+
+
+def normalize_currency(currency: Optional[str]) -> str:
+    """USD when missing; Bs/BS/VES/VEF all count as the same drawer"""
+    if not currency:
+        return "USD"
+    if currency.upper() in ("BS", "VES", "VEF"):
+        return "Bs"
+    return currency
+
+
+def _empty() -> Dict[str, Decimal]:
+    return {name: ZERO for name in MEASURES}
+
+
+def _rows(session_id: int, totals: Dict[str, Dict[str, Decimal]]) -> List[Dict[str, Any]]:
+    return [{"session_id": session_id, "currency": currency, **measures} for currency, measures in totals.items()]
+
+
+def _seed_missing(db: Session, session_ids: Iterable[int]) -> set:
+    """
+    Store the derived totals of the sessions that have no rows yet and return
+    their ids. Call after the write is flushed: derive() already counts it,
+    so the caller must not add it again for those sessions.
+    """
+    session_ids = set(session_ids)
+    if not session_ids:
+        return set()
+    stored = models.CashSessionBalance.session_id
+    missing = session_ids - {sid for (sid,) in db.query(stored).filter(stored.in_(session_ids)).distinct()}
+    if not missing:
+        return set()
+    db.flush()
+    # Row lock so two first writes don't both seed (SQLite already runs one writer at a time)
+    sessions = db.query(models.CashSession).filter(
+        models.CashSession.id.in_(missing)
+    ).order_by(models.CashSession.id).with_for_update().all()
+    missing -= {sid for (sid,) in db.query(stored).filter(stored.in_(missing)).distinct()}
+    for session in sessions:
+        if session.id in missing:
+            bulk_upsert.upsert_add(db, _balances, _rows(session.id, derive(db, session)), KEYS)
+    return missing
+
+
+def _add(db: Session, session_id: int, currency: str, **amounts):
+    if _seed_missing(db, [session_id]):
+        return
+    row = {"session_id": session_id, "currency": normalize_currency(currency), **_empty()}
+    for name, value in amounts.items():
+        row[name] = Decimal(str(value or 0))
+    bulk_upsert.upsert_add(db, _balances, [row], KEYS)
+
+
+def _movement_field(movement_type: str) -> Optional[str]:
+    if movement_type == "DEPOSIT":
+        return "deposits"
+    if movement_type in OUT_TYPES:
+        return "expenses"
+    if movement_type == "RETURN":
+        return "refunds"
+    return None
+
+
+def _initial_amounts(session: models.CashSession) -> Dict[str, Decimal]:
+    """Opening amounts: the per-currency rows, else the legacy USD / Bs fields"""
+    amounts = {}
+    for curr in session.currencies:
+        symbol = normalize_currency(curr.currency_symbol)
+        amounts[symbol] = amounts.get(symbol, ZERO) + (curr.initial_amount or ZERO)
+    amounts.setdefault("USD", session.initial_cash or ZERO)
+    amounts.setdefault("Bs", session.initial_cash_bs or ZERO)
+    return amounts
+
+
+# ---------- Writers (call before the caller commits) ----------
+
+def init_session(db: Session, session: models.CashSession):
+    """Opening rows for a new session"""
+    rows = [
+        {"session_id": session.id, "currency": currency, **_empty(), "initial": amount}
+        for currency, amount in _initial_amounts(session).items()
+    ]
+    bulk_upsert.upsert_add(db, _balances, rows, KEYS)
+
+
+def _session_for(sessions: List[models.CashSession], when: datetime) -> Optional[int]:
+    for session in sessions:
+        if session.start_time <= when and (session.end_time is None or when <= session.end_time):
+            return session.id
+    return None
+
+
+def record_payments(db: Session, criteria: List):
+    """
+    Add the cash payments matching `criteria` (filters on SalePayment, e.g.
+    the ids of the sales just inserted) to the session their sale falls in.
+    """
+    rows = db.query(
+        models.Sale.date, models.SalePayment.currency, func.sum(models.SalePayment.amount)
+    ).join(models.Sale).filter(
+        *criteria, models.SalePayment.payment_method.in_(CASH_METHODS)
+    ).group_by(models.Sale.id, models.Sale.date, models.SalePayment.currency).all()
+    if not rows:
+        return
+
+    first = min(row[0] for row in rows)
+    last = max(row[0] for row in rows)
+    sessions = db.query(models.CashSession).filter(
+        models.CashSession.start_time <= last,
+        (models.CashSession.end_time == None) | (models.CashSession.end_time >= first)
+    ).order_by(models.CashSession.start_time.desc()).all()
+
+    updates = []
+    for sale_date, currency, amount in rows:
+        session_id = _session_for(sessions, sale_date)
+        if session_id is not None:
+            updates.append({"session_id": session_id, "currency": normalize_currency(currency),
+                            **_empty(), "cash_sales": amount or ZERO})
+    seeded = _seed_missing(db, {row["session_id"] for row in updates})
+    bulk_upsert.upsert_add(db, _balances, [row for row in updates if row["session_id"] not in seeded], KEYS)
+
+
+def record_movement(db: Session, movement: models.CashMovement):
+    field = _movement_field(movement.type)
+    if field:
+        _add(db, movement.session_id, movement.currency, **{field: movement.amount})
+
+
+# ---------- Readers ----------
+
+def derive(db: Session, session: models.CashSession) -> Dict[str, Dict[str, Decimal]]:
+    """Totals of one session recomputed from payments and movements: {currency: measures}"""
+    totals = defaultdict(_empty)
+    for currency, amount in _initial_amounts(session).items():
+        totals[currency]["initial"] += amount
+
+    payments = db.query(models.SalePayment.currency, func.sum(models.SalePayment.amount)).join(models.Sale).filter(
+        models.Sale.date >= session.start_time,
+        models.SalePayment.payment_method.in_(CASH_METHODS),
+    )
+    if session.end_time is not None:
+        payments = payments.filter(models.Sale.date <= session.end_time)
+    for currency, amount in payments.group_by(models.SalePayment.currency):
+        totals[normalize_currency(currency)]["cash_sales"] += amount or ZERO
+
+    movements = db.query(
+        models.CashMovement.type, models.CashMovement.currency, func.sum(models.CashMovement.amount)
+    ).filter(models.CashMovement.session_id == session.id).group_by(
+        models.CashMovement.type, models.CashMovement.currency
+    )
+    for movement_type, currency, amount in movements:
+        field = _movement_field(movement_type)
+        if field:
+            totals[normalize_currency(currency)][field] += amount or ZERO
+    return dict(totals)
+
+
+def _write(db: Session, session_id: int, totals: Dict[str, Dict[str, Decimal]]):
+    db.query(models.CashSessionBalance).filter(models.CashSessionBalance.session_id == session_id).delete(
+        synchronize_session=False
+    )
+    bulk_upsert.upsert_add(db, _balances, _rows(session_id, totals), KEYS)
+
+
+def balances(db: Session, session: models.CashSession) -> Dict[str, Dict[str, Decimal]]:
+    """Stored totals of a session, {currency: measures + balance}; derived (not stored) if there are none"""
+    rows = db.query(models.CashSessionBalance).filter(models.CashSessionBalance.session_id == session.id).all()
+    if rows:
+        totals = {row.currency: {name: getattr(row, name) for name in MEASURES} for row in rows}
+    else:
+        totals = derive(db, session)
+    for measures in totals.values():
+        measures["balance"] = (measures["initial"] + measures["cash_sales"] + measures["deposits"]
+                               - measures["expenses"] - measures["refunds"])
+    return totals
+
+
+def available(db: Session, session_id: int, currency: str) -> Decimal:
+    """Physical cash in the drawer for one currency (one indexed row)"""
+    row = db.query(models.CashSessionBalance).filter(
+        models.CashSessionBalance.session_id == session_id,
+        models.CashSessionBalance.currency == normalize_currency(currency),
+    ).first()
+    if row is not None:
+        return row.balance
+    session = db.query(models.CashSession).filter(models.CashSession.id == session_id).first()
+    if not session:
+        return ZERO
+    totals = balances(db, session)
+    return totals.get(normalize_currency(currency), {}).get("balance", ZERO)
+
+
+def reconcile(db: Session, session_ids: Optional[Iterable[int]] = None, fix: bool = True) -> List[Dict[str, Any]]:
+    """
+    Re-derive the balances of some sessions (default: the open ones) and
+    compare them with what is stored. Returns one entry per drifted figure;
+    with fix=True the stored rows are replaced by the derived ones.
+    Nothing is committed here.
+    """
+    query = db.query(models.CashSession)
+    if session_ids is None:
+        query = query.filter(models.CashSession.status == "OPEN")
+    else:
+        query = query.filter(models.CashSession.id.in_(list(session_ids)))
+
+    drift = []
+    for session in query.order_by(models.CashSession.id):
+        stored = {
+            row.currency: {name: getattr(row, name) for name in MEASURES}
+            for row in db.query(models.CashSessionBalance).filter(models.CashSessionBalance.session_id == session.id)
+        }
+        derived = derive(db, session)
+        for currency in sorted(set(stored) | set(derived)):
+            have = stored.get(currency, _empty())
+            want = derived.get(currency, _empty())
+            for name in MEASURES:
+                if Decimal(str(have[name])) != Decimal(str(want[name])):
+                    drift.append({
+                        "session_id": session.id, "currency": currency, "field": name,
+                        "stored": float(have[name]), "derived": float(want[name]),
+                    })
+        if fix and any(d["session_id"] == session.id for d in drift):
+            _write(db, session.id, derived)
+    return drift
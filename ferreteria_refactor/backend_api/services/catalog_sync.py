@@ -0,0 +1,307 @@
+"""
+Catalog Sync (server side)
+Delta pages for /sync/pull/catalog.
+
+A pull pass covers the window (since, until]: `since` comes from the client's
+cursor (None = full sync), `until` is fixed by the server on the first page.
+Entities are paged in FK order by id keyset, then the tombstones of the window.
+The last page returns a cursor starting at `until - CURSOR_OVERLAP`, so rows
+whose transaction committed slightly after their updated_at are sent again
+rather than missed (client upserts are idempotent).
+
+The same pass is also available as a gzip NDJSON stream (iter_catalog_lines /
+gzip_stream) whose memory use is bounded by the yield_per batch size.
+
+Rows that changed but are no longer live (deactivated product/rate/user,
+blocked customer) and hard deletes recorded in sync_tombstones are returned
+as ids under "deleted".
+
+A product is re-sent whole when its row or units changed. Stock rows, price
+rules and combo items have no updated_at of their own: writing one bumps
+Product.updated_at when the transaction commits (see
+services/change_tracker.py; Core writes that leave the product row alone,
+such as stock_ledger transfers, call touch()).
+"""
+import base64
+import binascii
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import and_, event, insert, or_, select, update
+from sqlalchemy.orm import Session, selectinload
+from ..models import models
+from .. import schemas
+from . import change_tracker
+
+CURSOR_OVERLAP = timedelta(seconds=5)
+DEFAULT_PAGE_SIZE = 2000
+
+# FK order: categories and rates must exist before products reference them
+ENTITY_ORDER = ["categories", "exchange_rates", "products", "customers", "users"]
+
+
+def _user_payload(u):
+    return {"id": u.id, "username": u.username, "role": u.role.value, "pin": u.pin}
+
+
+def _product_changed(since: datetime, until: datetime):
+    """Product row changed, or one of its units did (units are re-sent with the product)"""
+    unit_changed = select(models.ProductUnit.product_id).where(
+        models.ProductUnit.updated_at > since, models.ProductUnit.updated_at <= until
+    )
+    return or_(
+        and_(models.Product.updated_at > since, models.Product.updated_at <= until),
+        models.Product.id.in_(unit_changed)
+    )
+
+
+ENTITIES = {
+    "categories": {
+        "model": models.Category,
+        "live": lambda c: True,
+        "live_filter": None,
+        "options": [],
+        "serialize": schemas.CategoryResponse.from_orm,
+    },
+    "exchange_rates": {
+        "model": models.ExchangeRate,
+        "live": lambda r: bool(r.is_active),
+        "live_filter": models.ExchangeRate.is_active == True,
+        "options": [],
+        "serialize": schemas.ExchangeRateSync.from_orm,
+    },
+    "products": {
+        "model": models.Product,
+        "live": lambda p: bool(p.is_active),
+        "live_filter": models.Product.is_active == True,
+        "options": [
+            selectinload(models.Product.units).joinedload(models.ProductUnit.exchange_rate),
+            selectinload(models.Product.price_rules),
+            selectinload(models.Product.combo_items),
+            selectinload(models.Product.stocks),
+        ],
+        "changed": _product_changed,
+        "serialize": schemas.ProductRead.from_orm,
+    },
+    "customers": {
+        "model": models.Customer,
+        "live": lambda c: c.is_blocked == False,
+        "live_filter": models.Customer.is_blocked == False,
+        "options": [],
+        "serialize": schemas.CustomerRead.from_orm,
+    },
+    "users": {
+        "model": models.User,
+        "live": lambda u: bool(u.is_active),
+        "live_filter": models.User.is_active == True,
+        "options": [],
+        "serialize": _user_payload,
+    },
+}
+
+TOMBSTONE_ENTITIES = {spec["model"]: name for name, spec in ENTITIES.items()}
+
+
+@event.listens_for(Session, "after_flush")
+def _record_tombstones(session, flush_context):
+    """Every hard delete of a synced row leaves a tombstone for offline clients"""
+    rows = [
+        {"entity": TOMBSTONE_ENTITIES[type(obj)], "entity_id": obj.id, "deleted_at": datetime.now()}
+        for obj in session.deleted if type(obj) in TOMBSTONE_ENTITIES
+    ]
+    if rows:
+        session.connection().execute(insert(models.SyncTombstone.__table__), rows)
+
+
+def _bump_products(session: Session, ids: set):
+    products = models.Product.__table__
+    session.connection().execute(
+        update(products).where(products.c.id.in_(sorted(ids))).values(updated_at=datetime.now())
+    )
+
+
+tracker = change_tracker.ChangeTracker(
+    "catalog_sync",
+    {
+        models.ProductStock: lambda stock: stock.product_id,
+        models.PriceRule: lambda rule: rule.product_id,
+        models.ComboItem: lambda item: item.parent_product_id,
+    },
+    _bump_products,
+    before_commit=True,
+)
+touch = tracker.touch  # Core writes to stock, price rules or combo items: catalog_sync.touch(db, product_ids)
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        for key in ("since", "until"):
+            if state.get(key):
+                state[key] = datetime.fromisoformat(state[key])
+        return state
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def _entity_query(db: Session, name: str, since: Optional[datetime], until: datetime):
+    spec = ENTITIES[name]
+    model = spec["model"]
+    query = db.query(model).options(*spec["options"])
+
+    if since is None:
+        # Full sync: only what the client should have
+        if spec["live_filter"] is not None:
+            query = query.filter(spec["live_filter"])
+    elif "changed" in spec:
+        query = query.filter(spec["changed"](since, until))
+    else:
+        query = query.filter(model.updated_at > since, model.updated_at <= until)
+    return query
+
+
+def _tombstone_query(db: Session, since: datetime, until: datetime):
+    return db.query(models.SyncTombstone).filter(
+        models.SyncTombstone.deleted_at > since,
+        models.SyncTombstone.deleted_at <= until
+    )
+
+
+def _fetch(db: Session, name: str, since: Optional[datetime], until: datetime, after: int, limit: int):
+    model = ENTITIES[name]["model"]
+    return _entity_query(db, name, since, until).filter(model.id > after).order_by(model.id).limit(limit).all()
+
+
+def _fetch_tombstones(db: Session, since: datetime, until: datetime, after: int, limit: int):
+    return _tombstone_query(db, since, until).filter(
+        models.SyncTombstone.id > after
+    ).order_by(models.SyncTombstone.id).limit(limit).all()
+
+
+def pull_page(db: Session, cursor: Optional[str] = None, last_sync: Optional[datetime] = None,
+              limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    One page of the catalog. Clients repeat with the returned cursor while
+    has_more is true, and keep the final cursor for their next pull.
+    """
+    state = decode_cursor(cursor) if cursor else {}
+    since = state.get("since") or last_sync
+    until = state.get("until") or datetime.now()
+    phase = state.get("phase", 0)
+    after = state.get("after", 0)
+
+    page = {name: [] for name in ENTITY_ORDER}
+    deleted = {name: [] for name in ENTITY_ORDER}
+    budget = limit
+    last_phase = len(ENTITY_ORDER)  # tombstones come after every entity
+
+    while phase <= last_phase and budget > 0:
+        if phase < last_phase:
+            name = ENTITY_ORDER[phase]
+            rows = _fetch(db, name, since, until, after, budget)
+            spec = ENTITIES[name]
+            for row in rows:
+                if spec["live"](row):
+                    page[name].append(spec["serialize"](row))
+                else:
+                    deleted[name].append(row.id)
+        elif since is not None:
+            rows = _fetch_tombstones(db, since, until, after, budget)
+            for tombstone in rows:
+                deleted.setdefault(tombstone.entity, []).append(tombstone.entity_id)
+        else:
+            rows = []
+
+        budget -= len(rows)
+        if budget > 0:
+            # Fewer rows than asked for: this phase is exhausted
+            phase += 1
+            after = 0
+        else:
+            after = rows[-1].id
+
+    has_more = phase <= last_phase
+    if has_more:
+        next_state = {"since": since.isoformat() if since else None, "until": until.isoformat(),
+                      "phase": phase, "after": after}
+    else:
+        next_state = {"since": (until - CURSOR_OVERLAP).isoformat()}
+
+    return {
+        "sync_timestamp": until,
+        "full": since is None,
+        "cursor": encode_cursor(next_state),
+        "has_more": has_more,
+        **page,
+        "deleted": deleted,
+    }
+
+
+# ---------- Streaming format ----------
+#
+# gzip-compressed NDJSON, one record per line, entities in FK order:
+#   {"type": "header", "sync_timestamp": "...", "full": true}
+#   {"entity": "products", "data": {...}}
+#   {"entity": "products", "deleted": 42}
+#   {"type": "end", "cursor": "...", "counts": {...}}
+# A stream without the end record is incomplete and must be discarded.
+
+def cursor_since(cursor: Optional[str], last_sync: Optional[datetime] = None) -> Optional[datetime]:
+    """Start of the window for a new pass (validates the cursor before streaming starts)"""
+    state = decode_cursor(cursor) if cursor else {}
+    return state.get("since") or last_sync
+
+
+def _to_json(payload) -> str:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump_json()
+    return json.dumps(payload, default=str)
+
+
+def iter_catalog_lines(db: Session, since: Optional[datetime], batch_size: int = 500) -> Iterator[str]:
+    """NDJSON lines for a whole pass; rows are read in yield_per batches"""
+    until = datetime.now()
+    counts = {}
+    yield json.dumps({"type": "header", "sync_timestamp": until.isoformat(), "full": since is None}) + "\n"
+
+    for name in ENTITY_ORDER:
+        spec = ENTITIES[name]
+        query = _entity_query(db, name, since, until).order_by(spec["model"].id).yield_per(batch_size)
+        for row in query:
+            if spec["live"](row):
+                yield f'{{"entity":"{name}","data":{_to_json(spec["serialize"](row))}}}\n'
+            else:
+                yield f'{{"entity":"{name}","deleted":{row.id}}}\n'
+            counts[name] = counts.get(name, 0) + 1
+
+    if since is not None:
+        for tombstone in _tombstone_query(db, since, until).order_by(models.SyncTombstone.id).yield_per(batch_size):
+            yield f'{{"entity":"{tombstone.entity}","deleted":{tombstone.entity_id}}}\n'
+
+    next_cursor = encode_cursor({"since": (until - CURSOR_OVERLAP).isoformat()})
+    yield json.dumps({"type": "end", "cursor": next_cursor, "counts": counts}) + "\n"
+
+
+def gzip_stream(lines: Iterable[str], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Compress text lines incrementally, yielding roughly chunk_size compressed bytes at a time"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    pending = []
+    pending_size = 0
+    for line in lines:
+        data = compressor.compress(line.encode())
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= chunk_size:
+                yield b"".join(pending)
+                pending = []
+                pending_size = 0
+    pending.append(compressor.flush())
+    yield b"".join(pending)
@@ -0,0 +1,128 @@
+"""
+Change Tracker
+Commit-time change tracking shared by the in-process caches (config_store,
+auth_cache, scan_index) and catalog sync.
+
+Each tracker watches some models and collects, per session, the keys of
+what a transaction changed:
+- ORM inserts/updates/deletes of the watched models, from after_flush;
+- bulk query().update()/delete() on their tables (optional), from
+  do_orm_execute, as ALL since the rows aren't known;
+- Core statements the ORM doesn't see, through touch().
+
+Nothing is acted upon until the transaction commits: on_commit(session,
+keys) then runs once (before the commit, inside the transaction, for
+trackers that must write; after it otherwise). A rollback discards the keys.
+
+Caches kept by several API workers also tell the others with publish();
+their event bus listeners skip their own messages with is_remote().
+"""
+import uuid
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..websocket.event_bus import event_bus
+
+ALL = "*"  # Key meaning "any row of the watched tables"
+ORIGIN = uuid.uuid4().hex  # Tells this worker's own messages apart from other workers'
+
+_trackers: List["ChangeTracker"] = []
+
+
+class ChangeTracker:
+    def __init__(self, name: str, keys: Dict[type, Callable[[Any], Any]],
+                 on_commit: Callable[[Session, set], None], states: Sequence[str] = ("new", "dirty", "deleted"),
+                 bulk: bool = False, before_commit: bool = False):
+        """
+        keys maps each watched model to the key of a changed object (e.g. its
+        product id); states are the session collections looked at; bulk also
+        catches bulk statements on the models' tables; before_commit runs
+        on_commit inside the transaction instead of after it.
+        """
+        self.info_key = f"{name}_touched"
+        self.keys = keys
+        self.on_commit = on_commit
+        self.states = states
+        self.tables = {model.__table__ for model in keys} if bulk else set()
+        self.before_commit = before_commit
+        _trackers.append(self)
+
+    def touch(self, db: Session, keys: Optional[Iterable] = None):
+        """This transaction changed these keys (None: ALL) with statements the ORM doesn't track"""
+        db.info.setdefault(self.info_key, set()).update([ALL] if keys is None else keys)
+
+    def pending(self, db: Session) -> bool:
+        """The session has uncommitted changes for this tracker"""
+        return bool(db.info.get(self.info_key))
+
+    def _collect(self, session: Session, changed: Dict[str, Any]):
+        keys = set()
+        for obj in chain.from_iterable(changed[state] for state in self.states):
+            key_of = self.keys.get(type(obj))
+            if key_of is not None:
+                keys.add(key_of(obj))
+        keys.discard(None)
+        if keys:
+            self.touch(session, keys)
+
+    def _run(self, session: Session):
+        keys = session.info.pop(self.info_key, None)
+        if keys:
+            self.on_commit(session, keys)
+
+
+def publish(event_type: str, data: Dict[str, Any]):
+    event_bus.publish(event_type, {**data, "origin": ORIGIN})
+
+
+def is_remote(data: Any) -> bool:
+    """An event bus message that wasn't published by this worker"""
+    return not (isinstance(data, dict) and data.get("origin") == ORIGIN)
+
+
+def primary_session() -> Session:
+    """Session for reloading a cache after a commit: on the primary, a read replica could still lag behind it"""
+    from ..database.db import SessionLocal
+    return SessionLocal()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changed = {"new": session.new, "dirty": session.dirty, "deleted": session.deleted}
+    for tracker in _trackers:
+        tracker._collect(session, changed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    for tracker in _trackers:
+        if mapper.local_table in tracker.tables:
+            tracker.touch(orm_execute_state.session)
+
+
+@event.listens_for(Session, "before_commit")
+def _run_before_commit(session):
+    if session.new or session.deleted or session.dirty:
+        session.flush()  # Pending objects report their keys before the trackers run
+    for tracker in _trackers:
+        if tracker.before_commit:
+            tracker._run(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for tracker in _trackers:
+        if not tracker.before_commit:
+            tracker._run(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    for tracker in _trackers:
+        session.info.pop(tracker.info_key, None)
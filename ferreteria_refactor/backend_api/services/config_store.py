@@ -0,0 +1,241 @@
+"""
+Config Store
+Process-wide cache of BusinessConfig, exchange rates and currencies.
+
+Ticket printing, price conversion, report endpoints and the config routes
+read these small tables on every call. The store keeps one immutable
+ConfigSnapshot per worker, loaded (three queries) the first time it is
+needed after a change and shared by every request until the next one, so a
+read on the hot path is a dict or tuple access.
+
+Keeping it fresh:
+- A version counter is bumped whenever a transaction that touched
+  business_config, exchange_rates or business_currencies commits (see
+  services/change_tracker.py; Core writes such as catalog sync upserts call
+  touch()).
+- The commit also publishes config:updated through the event bus, so other
+  workers drop their snapshot too; exchange_rate:* events do the same.
+- CONFIG_CACHE_TTL bounds how long a worker that missed a message keeps
+  serving the old snapshot.
+- A session with uncommitted changes to those tables reads around the cache,
+  so a rolled back value is never cached; a snapshot loaded by a transaction
+  that began before the last change is labelled stale from the start.
+
+Snapshots hold plain frozen dataclasses, not ORM objects, so they can be
+shared across threads and outlive the session that loaded them.
+"""
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import models
+from ..websocket.event_bus import event_bus
+from ..websocket.events import WebSocketEvents
+from . import change_tracker
+
+TRACKED = (models.BusinessConfig, models.ExchangeRate, models.Currency)
+INVALIDATING_EVENTS = {
+    WebSocketEvents.CONFIG_UPDATED, WebSocketEvents.EXCHANGE_RATE_CREATED,
+    WebSocketEvents.EXCHANGE_RATE_UPDATED, WebSocketEvents.EXCHANGE_RATE_DELETED,
+}
+TRUE_VALUES = {"1", "true", "yes", "si", "sí", "on"}
+
+
+@dataclass(frozen=True)
+class CachedRate:
+    id: int
+    name: str
+    currency_code: str
+    currency_symbol: str
+    rate: Decimal
+    is_default: bool
+    is_active: bool
+    created_at: Optional[datetime.datetime]
+    updated_at: Optional[datetime.datetime]
+
+    @classmethod
+    def from_model(cls, rate) -> "CachedRate":
+        return cls(rate.id, rate.name, rate.currency_code, rate.currency_symbol, rate.rate,
+                   bool(rate.is_default), bool(rate.is_active), rate.created_at, rate.updated_at)
+
+
+@dataclass(frozen=True)
+class CachedCurrency:
+    id: int
+    name: str
+    symbol: str
+    rate: Optional[Decimal]
+    is_anchor: bool
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, currency) -> "CachedCurrency":
+        return cls(currency.id, currency.name, currency.symbol, currency.rate,
+                   bool(currency.is_anchor), bool(currency.is_active))
+
+
+class ConfigSnapshot:
+    """One consistent view of the three tables; never mutated after load"""
+
+    def __init__(self, version: int, configs: Dict[str, Optional[str]],
+                 rates: Tuple[CachedRate, ...], currencies: Tuple[CachedCurrency, ...]):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._configs = configs
+        self._rates = rates
+        self._rates_by_id = {rate.id: rate for rate in rates}
+        self._currencies = currencies
+
+    # ---------- BusinessConfig ----------
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._configs
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._configs.get(key)
+        return default if value is None else value
+
+    def get_decimal(self, key: str, default: Decimal = None) -> Optional[Decimal]:
+        value = self._configs.get(key)
+        if value in (None, ""):
+            return default
+        try:
+            return Decimal(value)
+        except (InvalidOperation, ValueError, TypeError):
+            return default
+
+    def get_float(self, key: str, default: float = None) -> Optional[float]:
+        value = self.get_decimal(key)
+        return default if value is None else float(value)
+
+    def get_int(self, key: str, default: int = None) -> Optional[int]:
+        try:
+            return int(self._configs.get(key))
+        except (ValueError, TypeError):
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self._configs.get(key)
+        if value in (None, ""):
+            return default
+        return value.strip().lower() in TRUE_VALUES
+
+    def as_dict(self) -> Dict[str, Optional[str]]:
+        return dict(self._configs)
+
+    # ---------- Exchange rates ----------
+
+    def rate(self, rate_id: int) -> Optional[CachedRate]:
+        return self._rates_by_id.get(rate_id)
+
+    def rates(self, currency_code: str = None, is_active: bool = None) -> List[CachedRate]:
+        """Ordered like GET /config/exchange-rates: by currency, default rate first"""
+        found = [
+            rate for rate in self._rates
+            if (currency_code is None or rate.currency_code == currency_code)
+            and (is_active is None or rate.is_active == is_active)
+        ]
+        return sorted(found, key=lambda rate: (rate.currency_code, not rate.is_default))
+
+    def default_rates(self) -> List[CachedRate]:
+        """Active default rate of each currency"""
+        return [rate for rate in self._rates if rate.is_default and rate.is_active]
+
+    # ---------- Currencies ----------
+
+    def currencies(self, is_active: bool = None) -> List[CachedCurrency]:
+        return [c for c in self._currencies if is_active is None or c.is_active == is_active]
+
+
+def load_snapshot(db: Session, version: int) -> ConfigSnapshot:
+    configs = {row.key: row.value for row in db.query(models.BusinessConfig.key, models.BusinessConfig.value)}
+    rates = tuple(CachedRate.from_model(r) for r in db.query(models.ExchangeRate).order_by(models.ExchangeRate.id))
+    currencies = tuple(CachedCurrency.from_model(c) for c in db.query(models.Currency).order_by(models.Currency.id))
+    return ConfigSnapshot(version, configs, rates, currencies)
+
+
+def _on_replica(db: Session) -> bool:
+    if not settings.DB_READ_URL:
+        return False
+    from ..database.db import read_engine
+    return db.get_bind() is read_engine
+
+
+class ConfigStore:
+    def __init__(self, ttl: float = None):
+        self.ttl = settings.CONFIG_CACHE_TTL if ttl is None else ttl
+        self.version = 0
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self.loads = 0
+
+    def _fresh(self, snapshot: Optional[ConfigSnapshot]) -> bool:
+        return (snapshot is not None and snapshot.version == self.version
+                and time.monotonic() - snapshot.loaded_at < self.ttl)
+
+    def snapshot(self, db: Session) -> ConfigSnapshot:
+        """Current snapshot; reloaded through `db` only when a change was committed since the last load"""
+        if tracker.pending(db):
+            return load_snapshot(db, self.version)  # Uncommitted changes: don't cache them
+
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot
+            if _on_replica(db):
+                with change_tracker.primary_session() as primary:
+                    return self._load(primary)
+            return self._load(db)
+
+    def _load(self, db: Session) -> ConfigSnapshot:
+        version = self.version
+        snapshot = load_snapshot(db, version)
+        # Label it with the version current when the session's transaction began: if
+        # a change committed after that, the data may predate it and is already stale.
+        snapshot.version = min(version, db.info.get("config_store_version", version))
+        self.loads += 1
+        if not tracker.pending(db):  # Autoflush wrote pending changes during the load
+            self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self) -> int:
+        with self._version_lock:  # Not self._lock: commits never wait for a load
+            self.version += 1
+            self._snapshot = None
+            return self.version
+
+    def on_event(self, event_type: str, data: Dict[str, Any]):
+        """Event bus listener: another worker committed a change (ours already bumped the version)"""
+        if event_type in INVALIDATING_EVENTS and change_tracker.is_remote(data):
+            self.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"version": self.version, "loads": self.loads, "cached": self._snapshot is not None}
+
+
+@event.listens_for(Session, "after_begin")
+def _record_version(session, transaction, connection):
+    session.info["config_store_version"] = config_store.version
+
+
+def _publish_changes(session, keys):
+    version = config_store.invalidate()
+    change_tracker.publish(WebSocketEvents.CONFIG_UPDATED, {"version": version})
+
+
+tracker = change_tracker.ChangeTracker(
+    "config_store", {model: lambda obj: True for model in TRACKED}, _publish_changes, bulk=True
+)
+touch = tracker.touch  # Core writes to the tracked tables: config_store.touch(db)
+
+config_store = ConfigStore()
+event_bus.add_listener(config_store.on_event)
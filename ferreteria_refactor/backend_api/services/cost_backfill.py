@@ -0,0 +1,112 @@
+"""
+Cost Backfill
+One-off re-costing of sale and return lines recorded before unit_cost was
+snapshotted at sale time.
+
+The migration that added the column filled old lines with the product's
+cost_price of that day, so reports kept their numbers. This tool replaces
+that guess with a historical estimate for lines sold before the cutoff
+(BusinessConfig "unit_cost_snapshot_since"):
+
+1. The unit cost of the last purchase of the product on or before the
+   sale date, when there is one.
+2. Otherwise the value already stored (current cost at migration time).
+
+Return lines then take the cost of the sale line they came from. Work is
+done with set-based UPDATEs over id ranges, committing per chunk, so a
+history of millions of lines does not hold one giant transaction.
+"""
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from ..models import models
+
+SINCE_KEY = "unit_cost_snapshot_since"
+CHUNK_SIZE = 50000
+
+_details = models.SaleDetail.__table__
+_sales = models.Sale.__table__
+_purchase_items = models.PurchaseItem.__table__
+_purchases = models.PurchaseOrder.__table__
+_return_details = models.ReturnDetail.__table__
+_returns = models.Return.__table__
+
+
+def snapshot_since(db: Session) -> Optional[datetime]:
+    """When sale lines started carrying their own cost (None if never recorded)"""
+    value = db.query(models.BusinessConfig.value).filter(models.BusinessConfig.key == SINCE_KEY).scalar()
+    return datetime.fromisoformat(value) if value else None
+
+
+def _sale_date():
+    return select(_sales.c.date).where(_sales.c.id == _details.c.sale_id).correlate(_details).scalar_subquery()
+
+
+def _last_purchase_cost():
+    return select(_purchase_items.c.unit_cost).select_from(
+        _purchase_items.join(_purchases, _purchases.c.id == _purchase_items.c.purchase_id)
+    ).where(
+        _purchase_items.c.product_id == _details.c.product_id,
+        _purchases.c.purchase_date <= _sale_date(),
+    ).order_by(
+        _purchases.c.purchase_date.desc(), _purchase_items.c.id.desc()
+    ).limit(1).scalar_subquery()
+
+
+def _id_ranges(db: Session, table, chunk_size: int):
+    low, high = db.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield start, start + chunk_size - 1
+
+
+def backfill_sale_costs(db: Session, before: datetime = None, chunk_size: int = CHUNK_SIZE,
+                        progress: Callable[[int, int], None] = None) -> int:
+    """Re-estimate unit_cost of sale lines sold before `before`; returns lines updated"""
+    before = before or snapshot_since(db) or datetime.now()
+    updated = 0
+    for low, high in _id_ranges(db, _details, chunk_size):
+        result = db.execute(
+            update(_details).values(
+                unit_cost=func.coalesce(_last_purchase_cost(), _details.c.unit_cost, 0)
+            ).where(
+                _details.c.id.between(low, high),
+                _sale_date() < before,
+            )
+        )
+        db.commit()
+        updated += result.rowcount or 0
+        if progress:
+            progress(high, updated)
+    return updated
+
+
+def backfill_return_costs(db: Session, before: datetime = None) -> int:
+    """Return lines of those sales take the cost of their original sale line"""
+    before = before or snapshot_since(db) or datetime.now()
+    sale_id = select(_returns.c.sale_id).where(
+        _returns.c.id == _return_details.c.return_id
+    ).correlate(_return_details).scalar_subquery()
+    original_cost = select(_details.c.unit_cost).where(
+        _details.c.sale_id == sale_id,
+        _details.c.product_id == _return_details.c.product_id,
+    ).order_by(_details.c.id).limit(1).scalar_subquery()
+    sold_before = select(_sales.c.date).where(_sales.c.id == sale_id).scalar_subquery()
+
+    result = db.execute(
+        update(_return_details).values(
+            unit_cost=func.coalesce(original_cost, _return_details.c.unit_cost, 0)
+        ).where(sold_before < before)
+    )
+    db.commit()
+    return result.rowcount or 0
+
+
+def backfill(db: Session, before: datetime = None, chunk_size: int = CHUNK_SIZE,
+             progress: Callable[[int, int], None] = None) -> Dict[str, int]:
+    return {
+        "sale_lines": backfill_sale_costs(db, before, chunk_size, progress),
+        "return_lines": backfill_return_costs(db, before),
+    }
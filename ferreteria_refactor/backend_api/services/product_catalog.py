@@ -0,0 +1,150 @@
+"""
+Product Catalog
+Pages for /products/catalog, the listing the POS grids boot from.
+
+Pages are keyset-paginated on products.id (the cursor carries the last id
+sent), so page N costs the same as page 1 and rows inserted meanwhile are
+neither skipped nor repeated. Filters run in SQL: category, warehouse (has
+a stock row there), in_stock (in that warehouse when one is given),
+active and updated_since.
+
+`fields` selects a subset of ProductRead: only those columns are loaded,
+relations are fetched with selectinload (one extra query each, no join
+row explosion) and only when asked for. Serialization goes through a
+pydantic model of the same fields, so values look exactly like ProductRead.
+
+The ETag is a hash of the page body: a client that sends it back in
+If-None-Match gets a 304 when nothing on the page changed.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from pydantic import ConfigDict, create_model
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, load_only, selectinload
+from ..models import models
+from .. import schemas
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# ProductRead relations and how to load them
+RELATIONS = {
+    "units": lambda: selectinload(models.Product.units).joinedload(models.ProductUnit.exchange_rate),
+    "stocks": lambda: selectinload(models.Product.stocks),
+    "price_rules": lambda: selectinload(models.Product.price_rules),
+    "combo_items": lambda: selectinload(models.Product.combo_items),
+}
+ALL_FIELDS = tuple(schemas.ProductRead.model_fields)
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid catalog cursor")
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Requested ProductRead fields, in schema order; id is always included"""
+    if not fields:
+        return ALL_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(ALL_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return tuple(f for f in ALL_FIELDS if f in requested)
+
+
+@lru_cache(maxsize=64)
+def page_model(fields: Tuple[str, ...]):
+    """Pydantic page model holding only `fields` of ProductRead (cached per field set)"""
+    if fields == ALL_FIELDS:
+        item = schemas.ProductRead
+    else:
+        item = create_model(
+            "ProductCatalogItem",
+            __config__=ConfigDict(from_attributes=True),
+            **{name: (schemas.ProductRead.model_fields[name].annotation, None) for name in fields},
+        )
+    return create_model(
+        "ProductCatalogPage",
+        __config__=ConfigDict(from_attributes=True),
+        items=(List[item], ...),
+        next_cursor=(Optional[str], None),
+        has_more=(bool, False),
+    )
+
+
+def catalog_query(db: Session, fields: Iterable[str], category_id: Optional[int] = None,
+                  warehouse_id: Optional[int] = None, in_stock: Optional[bool] = None,
+                  active: Optional[bool] = None, updated_since: Optional[datetime] = None):
+    fields = set(fields)
+    columns = [getattr(models.Product, f) for f in fields if f not in RELATIONS]
+    query = db.query(models.Product).options(
+        load_only(*columns),
+        *(loader() for name, loader in RELATIONS.items() if name in fields)
+    )
+
+    if active is None:
+        # A full listing only shows live products; a delta also returns the deactivated ones
+        active = True if updated_since is None else None
+    if active is not None:
+        query = query.filter(models.Product.is_active == active)
+    if category_id is not None:
+        query = query.filter(models.Product.category_id == category_id)
+    if updated_since is not None:
+        unit_changed = select(models.ProductUnit.product_id).where(models.ProductUnit.updated_at > updated_since)
+        query = query.filter(or_(models.Product.updated_at > updated_since, models.Product.id.in_(unit_changed)))
+
+    if warehouse_id is not None:
+        stock_row = select(models.ProductStock.id).where(
+            models.ProductStock.product_id == models.Product.id,
+            models.ProductStock.warehouse_id == warehouse_id,
+        )
+        with_stock = stock_row.where(models.ProductStock.quantity > 0).exists()
+        if in_stock is None:
+            query = query.filter(stock_row.exists())
+        elif in_stock:
+            query = query.filter(with_stock)
+        else:
+            query = query.filter(stock_row.exists(), ~with_stock)
+    elif in_stock is not None:
+        query = query.filter(models.Product.stock > 0 if in_stock else models.Product.stock <= 0)
+    return query
+
+
+def catalog_page(db: Session, fields: Tuple[str, ...], cursor: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_SIZE, **filters) -> Tuple[bytes, str]:
+    """JSON body of one page and its ETag"""
+    after = decode_cursor(cursor) if cursor else 0
+    rows = catalog_query(db, fields, **filters).filter(
+        models.Product.id > after
+    ).order_by(models.Product.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    page = page_model(fields).model_validate({
+        "items": rows,
+        "next_cursor": encode_cursor(rows[-1].id) if has_more else None,
+        "has_more": has_more,
+    })
+    body = page.model_dump_json().encode()
+    return body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
@@ -5,82 +5,77 @@ Handles bulk product export to Excel and PDF
 import pandas as pd
 from io import BytesIO
 from datetime import date
-from typing import List
+from typing import Iterator, List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from ..models import models
+from .streaming_export import YIELD_PER, Cell, Sheet, stream_csv, stream_xlsx
 
 
 class ProductExportService:
     
+    EXCEL_HEADER = [
+        'ID', 'Nombre', 'SKU', 'Precio USD', 'Costo', 'Margen %', 'IVA %', 'Stock', 'Stock Mínimo',
+        'Categoría', 'Proveedor', 'Tasa de Cambio', 'Ubicación', 'Descuento %', 'Descuento Activo', 'Descripción'
+    ]
+    EXCEL_WIDTHS = [8, 40, 16, 12, 12, 10, 8, 10, 12, 22, 22, 16, 16, 12, 16, 50]
+
+    @staticmethod
+    def excel_rows(db: Session) -> Iterator[list]:
+        """Active products as export rows, read from a server-side cursor"""
+        P = models.Product
+        stmt = select(
+            P.id, P.name, P.sku, P.price, P.cost_price, P.profit_margin, P.tax_rate, P.stock, P.min_stock,
+            P.location, P.discount_percentage, P.is_discount_active, P.description,
+            models.Category.name.label('category_name'),
+            models.Supplier.name.label('supplier_name'),
+            models.ExchangeRate.name.label('exchange_rate_name'),
+        ).outerjoin(models.Category, P.category_id == models.Category.id) \
+         .outerjoin(models.Supplier, P.supplier_id == models.Supplier.id) \
+         .outerjoin(models.ExchangeRate, P.exchange_rate_id == models.ExchangeRate.id) \
+         .where(P.is_active == True).order_by(P.id).execution_options(yield_per=YIELD_PER)
+
+        for p in db.execute(stmt):
+            yield [
+                p.id,
+                p.name,
+                p.sku or '',
+                f"${p.price:.2f}",
+                f"${p.cost_price or 0:.2f}",
+                f"{p.profit_margin:.2f}%" if p.profit_margin else '',
+                f"{p.tax_rate:.2f}%" if p.tax_rate else '0%',
+                f"{p.stock or 0:.2f}",
+                f"{p.min_stock:.2f}" if p.min_stock else '',
+                p.category_name or '',
+                p.supplier_name or '',
+                p.exchange_rate_name or '',
+                p.location or '',
+                f"{p.discount_percentage:.0f}%" if p.discount_percentage else '',
+                'Sí' if p.is_discount_active else 'No',
+                p.description or ''
+            ]
+
     @staticmethod
-    def export_to_excel(products: List[models.Product]) -> BytesIO:
+    def stream_excel(db: Session) -> Iterator[bytes]:
         """
-        Export products to Excel file with formatting
-        
-        Returns:
-            BytesIO buffer with Excel file
+        Export active products to an Excel file, streamed while rows are read
+        (header styled, filters on the table)
         """
-        # Prepare data
-        data = []
-        for p in products:
-            data.append({
-                'ID': p.id,
-                'Nombre': p.name,
-                'SKU': p.sku or '',
-                'Precio USD': f"${p.price:.2f}",
-                'Costo': f"${p.cost_price:.2f}",
-                'Margen %': f"{p.profit_margin:.2f}%" if p.profit_margin else '',
-                'IVA %': f"{p.tax_rate:.2f}%" if p.tax_rate else '0%',
-                'Stock': f"{p.stock:.2f}",
-                'Stock Mínimo': f"{p.min_stock:.2f}" if p.min_stock else '',
-                'Categoría': p.category.name if p.category else '',
-                'Proveedor': p.supplier.name if p.supplier else '',
-                'Tasa de Cambio': p.exchange_rate.name if p.exchange_rate_id and hasattr(p, 'exchange_rate') else '',
-                'Ubicación': p.location or '',
-                'Descuento %': f"{p.discount_percentage:.0f}%" if p.discount_percentage else '',
-                'Descuento Activo': 'Sí' if p.is_discount_active else 'No',
-                'Descripción': p.description or ''
-            })
-        
-        # Create DataFrame
-        df = pd.DataFrame(data)
-        
-        # Create Excel file
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Inventario')
-            
-            # Get workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets['Inventario']
-            
-            # Format header
-            for cell in worksheet[1]:
-                cell.font = cell.font.copy(bold=True, color="000000")
-                cell.fill = cell.fill.copy(fgColor="4472C4")
-            
-            # Auto-adjust column widths
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            # Add filters
-            worksheet.auto_filter.ref = worksheet.dimensions
-        
-        buffer.seek(0)
-        return buffer
+        def rows():
+            yield [Cell(name, 'bold') for name in ProductExportService.EXCEL_HEADER]
+            yield from ProductExportService.excel_rows(db)
+
+        sheet = Sheet('Inventario', rows(), widths=ProductExportService.EXCEL_WIDTHS, auto_filter=True)
+        return stream_xlsx([sheet])
+
+    @staticmethod
+    def stream_csv(db: Session) -> Iterator[bytes]:
+        return stream_csv(ProductExportService.EXCEL_HEADER, ProductExportService.excel_rows(db))
     
     @staticmethod
     def export_to_pdf(products: List[models.Product], business_name: str = "Inventario") -> BytesIO:
@@ -0,0 +1,405 @@
+"""
+Product Search
+Full-text search for /products/search: SQLite FTS5 on desktop, a tsvector
+column (plus a pg_trgm index when available) on Postgres, one API for both.
+
+Text is tokenized here, not by the database, so both engines index the same
+terms: accents and case are folded ("Galvanización" -> "galvanizacion"),
+fractions and decimals stay one term ("1/2" -> "1f2", "2.5" -> "2p5"), a
+code like "TOR-001-GAL" is indexed whole ("tor001gal") and by parts, and
+"10mm" also as "10" and "mm". Every query word is a prefix, all must match:
+"tornillo 1/2 galv" finds "Tornillo Galvanizado 1/2 x 2".
+
+Columns are weighted name > codes (SKU, barcodes) > category > details, an
+exact SKU goes first, products with stock and of the requested category rank
+higher. A word (not a code or size) with no indexed prefix is replaced by the
+closest indexed words within one or two edits (SQLite: fts5vocab, cached per
+process); on Postgres a query with no hits falls back to trigram similarity
+on the name. Both set `fuzzy`.
+
+pg_trgm is optional: installing it needs a superuser, or on Postgres 13+
+CREATE privilege on the database (it is a trusted extension). When the
+role can't, the search table is created without the trigram index, a
+warning is printed and Postgres searches are exact-prefix only until a DBA
+runs CREATE EXTENSION pg_trgm and the app restarts (ensure_index adds the
+index).
+
+Rows live in product_search (rowid / product_id = product id, only active
+products) and are kept current in the same transaction as the change by an
+after_flush hook on Product, ProductUnit and Category; core bulk writes call
+reindex() themselves. Without the table the endpoint falls back to ILIKE.
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from ..models import models
+from .bulk_upsert import IN_CHUNK
+from .scan_index import normalize_name
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_EXPANSIONS = 8  # Indexed terms that may stand in for one misspelled word
+VOCABULARY_TTL = 300.0  # seconds; other processes' new words become typo candidates after this
+
+# bm25 / setweight order: name, codes, category, details
+COLUMNS = ("name", "codes", "category", "details")
+SQLITE_WEIGHTS = (10.0, 6.0, 3.0, 1.0)
+IN_STOCK_BOOST = 1.5
+CATEGORY_BOOST = 2.0
+
+# Attributes that change a product's document; stock and price updates don't reindex
+INDEXED_ATTRS = {
+    models.Product: ("name", "sku", "description", "category_id", "is_active"),
+    models.ProductUnit: ("product_id", "unit_name", "barcode"),
+    models.Category: ("name",),
+}
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "name, codes, category, details, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search_vocab USING fts5vocab(product_search, row)",
+]
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS product_search ("
+    "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+    "name TEXT NOT NULL, codes TEXT NOT NULL, category TEXT NOT NULL, details TEXT NOT NULL, "
+    "document TSVECTOR GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', codes), 'B') || "
+    "setweight(to_tsvector('simple', category), 'C') || setweight(to_tsvector('simple', details), 'D')"
+    ") STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_document ON product_search USING gin (document)",
+]
+# Typo fallback; skipped when the role may not install the extension
+POSTGRES_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_name_trgm ON product_search USING gin (name gin_trgm_ops)",
+]
+
+_NUMBER = re.compile(r"(\d+)\s*([/.,])\s*(\d+)")
+_NUMBER_MARK = {"/": "f", ".": "p", ",": "p"}
+_ENCODED_NUMBER = re.compile(r"\d+[fp]\d+")
+_PARTS = re.compile(r"[^\W_]+")
+_PIECES = re.compile(r"\d+|[^\W\d_]+")
+
+
+# ---------- Tokenization (shared by documents and queries) ----------
+
+def _words(value: Optional[str]) -> List[List[str]]:
+    """Alphanumeric parts of each whitespace-separated word, folded, with fractions/decimals encoded"""
+    folded = _NUMBER.sub(lambda m: f"{m[1]}{_NUMBER_MARK[m[2]]}{m[3]}", normalize_name(value or ""))
+    return [parts for parts in (_PARTS.findall(word) for word in folded.split()) if parts]
+
+
+def index_terms(value: Optional[str]) -> List[str]:
+    """Terms stored for a text: joined code, its parts and their digit/letter pieces"""
+    terms = []
+    for parts in _words(value):
+        if len(parts) > 1:
+            terms.append("".join(parts))
+        for part in parts:
+            terms.append(part)
+            if not _ENCODED_NUMBER.fullmatch(part):
+                pieces = _PIECES.findall(part)
+                if len(pieces) > 1:
+                    terms.extend(pieces)
+    return list(dict.fromkeys(terms))
+
+
+def query_terms(query: str) -> List[str]:
+    """One prefix term per query word ("tor-001" -> "tor001")"""
+    return list(dict.fromkeys("".join(parts) for parts in _words(query)))
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance with adjacent transpositions, giving up past `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def allowed_edits(term: str) -> int:
+    if len(term) < 4 or any(c.isdigit() for c in term):
+        return 0  # Short words, sizes and codes must be typed right
+    return 1 if len(term) < 8 else 2
+
+
+# ---------- Index maintenance ----------
+
+def _dialect(db) -> str:
+    """Dialect name of a Session or a Connection"""
+    return (db.get_bind() if isinstance(db, Session) else db).dialect.name
+
+
+def has_index(db) -> bool:
+    if _dialect(db) == "sqlite":
+        return db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'product_search'")).first() is not None
+    return db.execute(text("SELECT to_regclass('product_search')")).scalar() is not None
+
+
+def has_trigrams(db) -> bool:
+    return db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def create_trigram_index(db) -> bool:
+    """pg_trgm and the name index, in a savepoint so a missing privilege doesn't abort the transaction"""
+    try:
+        with db.begin_nested():
+            for statement in POSTGRES_TRIGRAM_DDL:
+                db.execute(text(statement))
+        return True
+    except DBAPIError as e:
+        print(f"[SEARCH] pg_trgm not available, typo tolerance disabled: {e.orig}")
+        return False
+
+
+def create_index(db):
+    """Create the search tables if missing (alembic does it on upgrade; this covers create_all databases)"""
+    if _dialect(db) == "sqlite":
+        for statement in SQLITE_DDL:
+            db.execute(text(statement))
+        return
+    for statement in POSTGRES_DDL:
+        db.execute(text(statement))
+    create_trigram_index(db)
+
+
+def documents(db, product_ids: List[int]) -> Dict[int, Tuple[str, str, str, str]]:
+    """Column texts (space-separated terms) of the active products among `product_ids`"""
+    Product, Unit, Category = models.Product, models.ProductUnit, models.Category
+    docs = {}
+    for start in range(0, len(product_ids), IN_CHUNK):
+        chunk = product_ids[start:start + IN_CHUNK]
+        units = {}
+        for row in db.execute(
+            select(Unit.product_id, Unit.unit_name, Unit.barcode).where(Unit.product_id.in_(chunk))
+        ):
+            units.setdefault(row.product_id, []).append(row)
+        rows = db.execute(
+            select(Product.id, Product.name, Product.sku, Product.description, Category.name.label("category"))
+            .outerjoin(Category, Category.id == Product.category_id)
+            .where(Product.id.in_(chunk), Product.is_active == True)
+        )
+        for row in rows:
+            own = units.get(row.id, ())
+            codes = [row.sku] + [u.barcode for u in own]
+            details = [row.description] + [u.unit_name for u in own]
+            docs[row.id] = (
+                " ".join(index_terms(row.name)),
+                " ".join(dict.fromkeys(t for code in codes for t in index_terms(code))),
+                " ".join(index_terms(row.category)),
+                " ".join(dict.fromkeys(t for value in details for t in index_terms(value))),
+            )
+    return docs
+
+
+def reindex(db, product_ids: Iterable[int] = (), category_ids: Iterable[int] = ()) -> int:
+    """
+    Rewrite the search rows of these products (and of every product in these
+    categories) inside the current transaction. Returns the products indexed.
+    """
+    ids = set(product_ids)
+    category_ids = list(set(category_ids))
+    for start in range(0, len(category_ids), IN_CHUNK):
+        ids.update(db.execute(
+            select(models.Product.id).where(models.Product.category_id.in_(category_ids[start:start + IN_CHUNK]))
+        ).scalars())
+    ids = sorted(ids)
+    if not ids:
+        return 0
+    key = "rowid" if _dialect(db) == "sqlite" else "product_id"
+    docs = documents(db, ids)
+    delete = text(f"DELETE FROM product_search WHERE {key} IN :ids").bindparams(bindparam("ids", expanding=True))
+    for start in range(0, len(ids), IN_CHUNK):
+        db.execute(delete, {"ids": ids[start:start + IN_CHUNK]})
+    if docs:
+        db.execute(
+            text(f"INSERT INTO product_search ({key}, name, codes, category, details) "
+                 f"VALUES (:id, :name, :codes, :category, :details)"),
+            [dict(zip(("id",) + COLUMNS, (pid,) + doc)) for pid, doc in docs.items()]
+        )
+    _vocabulary.clear()
+    return len(docs)
+
+
+def rebuild(db) -> int:
+    """Index every active product from scratch (no commit)"""
+    db.execute(text("DELETE FROM product_search"))
+    ids = db.execute(select(models.Product.id).where(models.Product.is_active == True)).scalars().all()
+    indexed = 0
+    for start in range(0, len(ids), 5000):
+        indexed += reindex(db, ids[start:start + 5000])
+    if _dialect(db) == "sqlite":
+        db.execute(text("INSERT INTO product_search(product_search) VALUES ('optimize')"))
+    return indexed
+
+
+def ensure_index(session_factory) -> Optional[int]:
+    """Startup: create the tables when missing and fill them when empty. Returns products indexed, if any"""
+    with session_factory() as db:
+        if not has_index(db):
+            create_index(db)
+        elif _dialect(db) != "sqlite" and not has_trigrams(db):
+            create_trigram_index(db)  # pg_trgm may have been installed since
+        if db.execute(text("SELECT 1 FROM product_search LIMIT 1")).first() is not None:
+            db.commit()
+            return None
+        indexed = rebuild(db)
+        db.commit()
+        return indexed
+
+
+@event.listens_for(Session, "after_flush")
+def _reindex_changed(session, flush_context):
+    """Keep product_search in step with ORM writes, in the same transaction"""
+    product_ids, category_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        attrs = INDEXED_ATTRS.get(type(obj))
+        if attrs is None:
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[a].history.has_changes() for a in attrs):
+            continue
+        if isinstance(obj, models.Category):
+            if obj not in session.new:
+                category_ids.add(obj.id)
+        elif isinstance(obj, models.Product):
+            product_ids.add(obj.id)
+        else:
+            product_ids.add(obj.product_id)
+            old = state.attrs.product_id.history.deleted
+            product_ids.update(pid for pid in old or () if pid is not None)
+    product_ids.discard(None)
+    if not (product_ids or category_ids):
+        return
+    connection = session.connection()
+    if has_index(connection):
+        reindex(connection, product_ids, category_ids)
+
+
+# ---------- Queries ----------
+
+_HIT_COLUMNS = ("p.id, p.name, p.sku, p.price, p.stock, p.unit_type, p.category_id")
+_BOOSTS = (f"(CASE WHEN p.stock > 0 THEN {IN_STOCK_BOOST} ELSE 1.0 END)"
+           f" * (CASE WHEN p.category_id = :category_id THEN {CATEGORY_BOOST} ELSE 1.0 END)")
+
+
+# SQLite typo candidates: indexed words without digits (SKUs would swamp them), by first letter,
+# per database. reindex() drops it; writes from other processes show up after VOCABULARY_TTL.
+_vocabulary: Dict[str, Tuple[float, Dict[str, List[Tuple[str, int]]]]] = {}
+_vocabulary_lock = threading.Lock()
+
+
+def _word_vocabulary(db) -> Dict[str, List[Tuple[str, int]]]:
+    key = str(db.get_bind().url)
+    cached = _vocabulary.get(key)
+    if cached and time.monotonic() - cached[0] < VOCABULARY_TTL:
+        return cached[1]
+    with _vocabulary_lock:
+        words = {}
+        for term, docs in db.execute(text("SELECT term, doc FROM product_search_vocab WHERE term NOT GLOB '*[0-9]*'")):
+            words.setdefault(term[0], []).append((term, docs))
+        _vocabulary[key] = (time.monotonic(), words)
+    return words
+
+
+def _sqlite_expand(db, term: str) -> Optional[List[str]]:
+    """
+    [term] when some indexed term starts with it, otherwise the indexed words
+    (whole or as prefix) at the smallest distance within allowed_edits; None if none.
+    """
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    if db.execute(text("SELECT 1 FROM product_search_vocab WHERE term >= :t AND term < :u LIMIT 1"),
+                  {"t": term, "u": upper}).first():
+        return [term]
+    limit = allowed_edits(term)
+    if not limit:
+        return None
+    close = []
+    for candidate, docs in _word_vocabulary(db).get(term[0], ()):
+        if len(candidate) < len(term) - limit:
+            continue
+        distance = min(_edit_distance(term, candidate, limit), _edit_distance(term, candidate[:len(term)], limit))
+        if distance <= limit:
+            close.append((distance, -docs, candidate))
+    if not close:
+        return None
+    best = min(close)[0]
+    return [candidate for distance, _, candidate in sorted(close)[:MAX_EXPANSIONS] if distance == best]
+
+
+def _search_sqlite(db, terms: List[str], raw: str, limit: int, category_id: Optional[int]):
+    fuzzy, groups = False, []
+    for term in terms:
+        expansion = _sqlite_expand(db, term)
+        if expansion is None:
+            return [], False
+        fuzzy = fuzzy or expansion != [term]
+        groups.append(f'"{term}"*' if expansion == [term] else "(" + " OR ".join(f'"{t}"' for t in expansion) + ")")
+    weights = ", ".join(map(str, SQLITE_WEIGHTS))
+    rows = db.execute(text(
+        f"SELECT {_HIT_COLUMNS}, -bm25(product_search, {weights}) * {_BOOSTS} AS score "
+        "FROM product_search JOIN products p ON p.id = product_search.rowid "
+        "WHERE product_search MATCH :match AND p.is_active = 1 "
+        "ORDER BY (p.sku = :raw) DESC, score DESC, p.id LIMIT :limit"
+    ), {"match": " AND ".join(groups), "raw": raw, "limit": limit, "category_id": category_id}).all()
+    return rows, fuzzy
+
+
+def _search_postgres(db, terms: List[str], raw: str, limit: int, category_id: Optional[int]):
+    params = {"raw": raw, "limit": limit, "category_id": category_id}
+    rows = db.execute(text(
+        f"SELECT {_HIT_COLUMNS}, ts_rank(s.document, to_tsquery('simple', :query)) * {_BOOSTS} AS score "
+        "FROM product_search s JOIN products p ON p.id = s.product_id "
+        "WHERE s.document @@ to_tsquery('simple', :query) AND p.is_active "
+        "ORDER BY (p.sku = :raw) DESC, score DESC, p.id LIMIT :limit"
+    ), {**params, "query": " & ".join(f"{t}:*" for t in terms)}).all()
+    if rows or not has_trigrams(db):
+        return rows, False
+    # Typos: words of the query against the words of the name, trigram index
+    rows = db.execute(text(
+        f"SELECT {_HIT_COLUMNS}, word_similarity(:words, s.name) * {_BOOSTS} AS score "
+        "FROM product_search s JOIN products p ON p.id = s.product_id "
+        "WHERE :words <% s.name AND p.is_active "
+        "ORDER BY score DESC, p.id LIMIT :limit"
+    ), {**params, "words": " ".join(terms)}).all()
+    return rows, bool(rows)
+
+
+def _search_like(db, raw: str, limit: int, category_id: Optional[int]):
+    """No search table: the old substring filter, unranked apart from the boosts"""
+    pattern = f"%{raw}%"
+    rows = db.execute(text(
+        f"SELECT {_HIT_COLUMNS}, {_BOOSTS} AS score FROM products p "
+        "WHERE p.is_active = :active AND (lower(p.name) LIKE lower(:pattern) OR lower(p.sku) LIKE lower(:pattern)) "
+        "ORDER BY score DESC, p.name LIMIT :limit"
+    ), {"pattern": pattern, "limit": limit, "category_id": category_id, "active": True}).all()
+    return rows, False
+
+
+def search(db, query: str, limit: int = DEFAULT_LIMIT, category_id: Optional[int] = None) -> Dict:
+    """Ranked hits for `query`: {"query", "fuzzy", "items": [{id, name, sku, price, stock, ..., score}]}"""
+    raw = query.strip()
+    terms = query_terms(raw)
+    if not terms:
+        return {"query": query, "fuzzy": False, "items": []}
+    if not has_index(db):
+        rows, fuzzy = _search_like(db, raw, limit, category_id)
+    elif _dialect(db) == "sqlite":
+        rows, fuzzy = _search_sqlite(db, terms, raw, limit, category_id)
+    else:
+        rows, fuzzy = _search_postgres(db, terms, raw, limit, category_id)
+    return {"query": query, "fuzzy": fuzzy, "items": [dict(row._mapping) for row in rows]}
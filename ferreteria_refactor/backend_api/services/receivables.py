@@ -0,0 +1,146 @@
+"""
+Receivables
+Accounts receivable and aging for every customer in one grouped SQL pass.
+
+What a customer owes is the open balance of their unpaid credit invoices
+(balance_pending, or the invoice total when no abono was registered yet)
+minus account payments (/customers/{id}/payments) that are not tied to an
+invoice, normalised to USD with the rate they were made at.
+
+Invoices are aged by days past due (sale date when there is no due date)
+into 0-30 / 31-60 / 61-90 / 90+ buckets. Bucket cut-offs are computed
+here, so the SQL is plain CASE/SUM and runs the same on SQLite and Postgres.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, case, func, literal_column, select
+from sqlalchemy.orm import Session
+from ..models import models
+
+LOCAL_CURRENCIES = ("Bs", "BS", "VES")  # Payments in these are divided by their rate
+BUCKETS = (("0_30", 0, 30), ("31_60", 31, 60), ("61_90", 61, 90), ("90_plus", 91, None))
+SORT_FIELDS = ("debt", "overdue", "name", "oldest_due", "open_invoices")
+
+
+def payment_usd():
+    """Account payment amount in USD (1.0 keeps SQLite from integer-dividing)"""
+    P = models.Payment
+    return case(
+        (and_(P.currency.in_(LOCAL_CURRENCIES), P.exchange_rate_used > 0),
+         P.amount * literal_column("1.0") / P.exchange_rate_used),
+        else_=P.amount,
+    )
+
+
+def _invoices(now: datetime):
+    S = models.Sale
+    open_amount = func.coalesce(S.balance_pending, S.total_amount)
+    due = func.coalesce(S.due_date, S.date)
+
+    columns = [
+        S.customer_id.label("customer_id"),
+        func.sum(open_amount).label("invoiced"),
+        func.sum(case((due < now, open_amount), else_=0)).label("overdue"),
+        func.count(S.id).label("open_invoices"),
+        func.min(due).label("oldest_due"),
+    ]
+    for name, low, high in BUCKETS:
+        # Days past due within [low, high]; invoices not due yet count as 0 days
+        conditions = []
+        if low > 0:
+            conditions.append(due < now - timedelta(days=low - 1))
+        if high is not None:
+            conditions.append(due >= now - timedelta(days=high))
+        columns.append(func.sum(case((and_(*conditions), open_amount), else_=0)).label(f"bucket_{name}"))
+
+    return select(*columns).where(
+        S.is_credit == True,
+        S.paid == False,
+        S.customer_id.isnot(None),
+        open_amount > 0,
+    ).group_by(S.customer_id).subquery("open_invoices")
+
+
+def _payments():
+    return select(
+        models.Payment.customer_id.label("customer_id"),
+        func.sum(payment_usd()).label("paid"),
+    ).group_by(models.Payment.customer_id).subquery("account_payments")
+
+
+def _statement(now: datetime):
+    C = models.Customer
+    invoices = _invoices(now)
+    payments = _payments()
+    invoiced = func.coalesce(invoices.c.invoiced, 0)
+    paid = func.coalesce(payments.c.paid, 0)
+    debt = invoiced - paid
+
+    stmt = select(
+        C.id, C.name, C.phone,
+        invoiced.label("invoiced"),
+        paid.label("paid"),
+        debt.label("debt"),
+        func.coalesce(invoices.c.overdue, 0).label("overdue"),
+        func.coalesce(invoices.c.open_invoices, 0).label("open_invoices"),
+        invoices.c.oldest_due,
+        *(func.coalesce(invoices.c[f"bucket_{name}"], 0).label(f"bucket_{name}") for name, _, _ in BUCKETS),
+    ).select_from(C).outerjoin(
+        invoices, invoices.c.customer_id == C.id
+    ).outerjoin(
+        payments, payments.c.customer_id == C.id
+    )
+    return stmt, debt
+
+
+def _money(value) -> float:
+    return float(round(value or 0, 2))
+
+
+def _row(row, now: datetime) -> Dict[str, Any]:
+    oldest_due = row.oldest_due
+    if isinstance(oldest_due, str):  # SQLite hands MIN() over a COALESCE back as text
+        oldest_due = datetime.fromisoformat(oldest_due)
+    return {
+        "customer_id": row.id,
+        "customer_name": row.name,
+        "phone": row.phone,
+        "debt": _money(row.debt),
+        "invoiced": _money(row.invoiced),
+        "unapplied_payments": _money(row.paid),
+        "overdue": _money(row.overdue),
+        "open_invoices": row.open_invoices,
+        "oldest_due": oldest_due,
+        "days_overdue": max(0, (now - oldest_due).days) if oldest_due else 0,
+        "buckets": {name: _money(row._mapping[f"bucket_{name}"]) for name, _, _ in BUCKETS},
+    }
+
+
+def aging_report(db: Session, skip: int = 0, limit: int = 100, sort_by: str = "debt",
+                 descending: bool = True, now: datetime = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Customers that owe money, sorted and paginated in SQL; returns (page, total customers)"""
+    if sort_by not in SORT_FIELDS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORT_FIELDS)}")
+    now = now or datetime.now()
+    stmt, debt = _statement(now)
+    owing = stmt.where(debt > 0)
+    key = owing.selected_columns[sort_by]
+    order = key.desc() if descending else key.asc()
+
+    page = owing.add_columns(func.count().over().label("total_count")).order_by(
+        order, models.Customer.id
+    ).offset(skip).limit(limit)
+    rows = db.execute(page).all()
+    total = rows[0].total_count if rows else 0
+    if not rows and skip:
+        # Past the last page: still report how many there are
+        total = db.execute(select(func.count()).select_from(owing.subquery())).scalar()
+    return [_row(row, now) for row in rows], total
+
+
+def customer_balance(db: Session, customer_id: int, now: datetime = None) -> Optional[Dict[str, Any]]:
+    """Same figures for one customer (debt may be negative when they paid ahead); None if unknown"""
+    now = now or datetime.now()
+    stmt, _ = _statement(now)
+    row = db.execute(stmt.where(models.Customer.id == customer_id)).first()
+    return _row(row, now) if row else None
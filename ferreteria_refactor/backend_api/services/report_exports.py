@@ -0,0 +1,437 @@
+"""
+Report Exports
+Sheets of the downloadable reports (/reports/export/*), for
+streaming_export.
+
+Summary sheets (dashboard KPIs, top products, cash audit) come from SQL
+aggregates and small queries, so they are complete before the first byte
+is written. Row-level sheets (sales, inventory) are generators over
+yield_per cursors and are only read while the file is being sent.
+"""
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session, joinedload
+from ..models import models
+from .streaming_export import YIELD_PER, Cell, Sheet, fit_widths
+
+SALES_HEADER = ["ID Venta", "Fecha", "Cliente", "Total", "Método Pago", "Pagado"]
+INVENTORY_HEADER = ["SKU", "Producto", "Categoría", "Stock", "Costo", "Precio", "Valor Inventario"]
+DETAILED_SALES_HEADER = ["ID Venta", "Fecha", "Cliente", "Total", "Moneda", "Total Bs", "Método Pago", "Crédito",
+                         "Pagado"]
+SALES_WIDTHS = [10, 18, 30, 12, 18, 8]
+INVENTORY_WIDTHS = [16, 40, 22, 10, 10, 10, 16]
+
+
+def _money(value) -> str:
+    return f"${value or 0:,.2f}"
+
+
+def _header(names: Sequence[str], style: str = "header_small") -> List[Cell]:
+    return [Cell(name, style) for name in names]
+
+
+def _message_sheet(title: str, message: str) -> Sheet:
+    return Sheet(title, [["Mensaje"], [message]], widths=[len(message) + 2])
+
+
+# ---------- Row-level sheets ----------
+
+def default_period(start_date: Optional[date], end_date: Optional[date]) -> Tuple[date, date]:
+    """Current month when dates are not provided"""
+    if not end_date:
+        end_date = date.today()
+    if not start_date:
+        start_date = date(end_date.year, end_date.month, 1)
+    return start_date, end_date
+
+
+def _sales_statement(start_dt: datetime, end_dt: datetime):
+    return select(
+        models.Sale.id,
+        models.Sale.date,
+        models.Customer.name.label("customer_name"),
+        models.Sale.total_amount,
+        models.Sale.payment_method,
+        models.Sale.paid,
+    ).outerjoin(
+        models.Customer, models.Sale.customer_id == models.Customer.id
+    ).where(
+        models.Sale.date >= start_dt,
+        models.Sale.date <= end_dt
+    ).order_by(models.Sale.id).execution_options(yield_per=YIELD_PER)
+
+
+def sales_rows(db: Session, start_dt: datetime, end_dt: datetime, with_paid: bool = True) -> Iterator[List[Any]]:
+    """One row per sale in the period, read from a server-side cursor"""
+    for s in db.execute(_sales_statement(start_dt, end_dt)):
+        row = [
+            s.id,
+            s.date.strftime('%Y-%m-%d %H:%M') if s.date else '',
+            s.customer_name or 'Público General',
+            float(s.total_amount or 0),
+            s.payment_method or 'N/A',
+        ]
+        if with_paid:
+            row.append('Sí' if s.paid else 'No')
+        yield row
+
+
+def detailed_sales_rows(db: Session, start_dt: datetime, end_dt: datetime, customer_id: Optional[int] = None,
+                        product_id: Optional[int] = None, payment_method: Optional[str] = None
+                        ) -> Iterator[List[Any]]:
+    """Rows of /reports/sales/detailed (same filters), newest first"""
+    stmt = select(
+        models.Sale.id,
+        models.Sale.date,
+        models.Customer.name.label("customer_name"),
+        models.Sale.total_amount,
+        models.Sale.currency,
+        models.Sale.total_amount_bs,
+        models.Sale.payment_method,
+        models.Sale.is_credit,
+        models.Sale.paid,
+    ).outerjoin(
+        models.Customer, models.Sale.customer_id == models.Customer.id
+    ).where(
+        models.Sale.date >= start_dt,
+        models.Sale.date <= end_dt
+    )
+    if customer_id:
+        stmt = stmt.where(models.Sale.customer_id == customer_id)
+    if payment_method:
+        stmt = stmt.where(models.Sale.payment_method == payment_method)
+    if product_id:
+        stmt = stmt.where(select(models.SaleDetail.id).where(
+            models.SaleDetail.sale_id == models.Sale.id,
+            models.SaleDetail.product_id == product_id
+        ).exists())
+    stmt = stmt.order_by(models.Sale.date.desc()).execution_options(yield_per=YIELD_PER)
+
+    for s in db.execute(stmt):
+        yield [
+            s.id,
+            s.date.strftime('%Y-%m-%d %H:%M') if s.date else '',
+            s.customer_name or 'Público General',
+            float(s.total_amount or 0),
+            s.currency or 'USD',
+            float(s.total_amount_bs) if s.total_amount_bs is not None else '',
+            s.payment_method or 'N/A',
+            'Sí' if s.is_credit else 'No',
+            'Sí' if s.paid else 'No',
+        ]
+
+
+def inventory_rows(db: Session) -> Iterator[List[Any]]:
+    stmt = select(
+        models.Product.name,
+        models.Product.sku,
+        models.Product.stock,
+        models.Product.cost_price,
+        models.Product.price,
+        models.Category.name.label("category_name")
+    ).outerjoin(
+        models.Category, models.Product.category_id == models.Category.id
+    ).where(
+        models.Product.is_active == True
+    ).order_by(models.Product.id).execution_options(yield_per=YIELD_PER)
+    for i in db.execute(stmt):
+        yield [
+            i.sku or '',
+            i.name,
+            i.category_name or 'Sin categoría',
+            float(i.stock or 0),
+            float(i.cost_price or 0),
+            float(i.price or 0),
+            float(i.stock or 0) * float(i.cost_price or 0),
+        ]
+
+
+def _with_header(header: Sequence[str], rows: Iterator[List[Any]], style: str = "bold") -> Iterator[List[Any]]:
+    yield _header(header, style)
+    yield from rows
+
+
+# ---------- Aggregates ----------
+
+def _sales_totals(db: Session, start_dt: datetime, end_dt: datetime):
+    return db.query(
+        func.coalesce(func.sum(models.Sale.total_amount), 0),
+        func.count(models.Sale.id),
+    ).filter(models.Sale.date >= start_dt, models.Sale.date <= end_dt).one()
+
+
+def _product_sales(db: Session, start_dt: datetime, end_dt: datetime):
+    return db.query(
+        models.Product.name.label('product_name'),
+        func.sum(models.SaleDetail.quantity).label('total_quantity'),
+        func.sum(models.SaleDetail.subtotal).label('total_revenue'),
+        func.sum(models.SaleDetail.quantity * models.SaleDetail.unit_cost).label('total_cost')
+    ).join(
+        models.Product, models.SaleDetail.product_id == models.Product.id
+    ).join(
+        models.Sale, models.SaleDetail.sale_id == models.Sale.id
+    ).filter(
+        models.Sale.date >= start_dt,
+        models.Sale.date <= end_dt
+    ).group_by(
+        models.SaleDetail.product_id,
+        models.Product.name
+    ).all()
+
+
+def payment_method_totals(db: Session, start_dt: datetime, end_dt: datetime) -> List[Dict[str, Any]]:
+    """Sales grouped by Sale.payment_method"""
+    results = db.query(
+        models.Sale.payment_method,
+        func.sum(models.Sale.total_amount).label('total_amount'),
+        func.count(models.Sale.id).label('count')
+    ).filter(
+        models.Sale.date >= start_dt,
+        models.Sale.date <= end_dt
+    ).group_by(models.Sale.payment_method).all()
+    return [
+        {
+            "method": r.payment_method or "Desconocido",
+            "total_amount": float(r.total_amount or 0),
+            "count": r.count
+        }
+        for r in results
+    ]
+
+
+def customer_totals(db: Session, start_dt: datetime, end_dt: datetime, limit: int = 20) -> List[Dict[str, Any]]:
+    """Top customers by sales volume"""
+    results = db.query(
+        models.Customer.name,
+        func.sum(models.Sale.total_amount).label('total_purchased'),
+        func.count(models.Sale.id).label('transaction_count')
+    ).join(models.Sale).filter(
+        models.Sale.date >= start_dt,
+        models.Sale.date <= end_dt
+    ).group_by(models.Customer.id, models.Customer.name)\
+    .order_by(desc('total_purchased'))\
+    .limit(limit).all()
+    return [
+        {
+            "customer_name": r.name,
+            "total_purchased": float(r.total_purchased or 0),
+            "transaction_count": r.transaction_count
+        }
+        for r in results
+    ]
+
+
+def _inventory_value(db: Session) -> float:
+    value = db.query(func.sum(models.Product.stock * models.Product.cost_price)).filter(
+        models.Product.is_active == True
+    ).scalar()
+    return float(value or 0)
+
+
+def _has_products(db: Session) -> bool:
+    return db.query(models.Product.id).filter(models.Product.is_active == True).first() is not None
+
+
+def _cash_audit_rows(db: Session, start_dt: datetime, end_dt: datetime) -> List[Dict[str, Any]]:
+    sessions = db.query(
+        models.CashSession.id,
+        models.CashSession.start_time,
+        models.CashSession.end_time,
+        models.CashSession.initial_cash,
+        models.CashSession.final_cash_expected,
+        models.CashSession.final_cash_reported,
+        models.CashSession.status,
+        models.User.full_name.label('cashier_name')
+    ).outerjoin(
+        models.User, models.CashSession.user_id == models.User.id
+    ).filter(
+        models.CashSession.start_time >= start_dt,
+        models.CashSession.start_time <= end_dt
+    ).all()
+    return [{
+        'ID Sesión': c.id,
+        'Cajero': c.cashier_name or f'Usuario #{c.id}',
+        'Apertura': c.start_time.strftime('%Y-%m-%d %H:%M') if c.start_time else '',
+        'Cierre': c.end_time.strftime('%Y-%m-%d %H:%M') if c.end_time else 'Abierta',
+        'Inicial': float(c.initial_cash or 0),
+        'Esperado': float(c.final_cash_expected or 0),
+        'Reportado': float(c.final_cash_reported or 0),
+        'Diferencia': float(c.final_cash_reported or 0) - float(c.final_cash_expected or 0),
+        'Estado': c.status
+    } for c in sessions]
+
+
+def _dashboard_sheet(metrics: List[List[Any]], extra: List[List[Any]] = ()) -> Sheet:
+    rows = [_header(["Métrica", "Valor"], "header")] + metrics + list(extra)
+    return Sheet("Dashboard", rows, widths=fit_widths(rows))
+
+
+# ---------- Reports ----------
+
+def management_report(db: Session, start_dt: datetime, end_dt: datetime) -> List[Sheet]:
+    """Reporte Gerencial: Dashboard, Ventas Detalle, Auditoría Cajas, Inventario"""
+    total_sales, num_sales = _sales_totals(db, start_dt, end_dt)
+    products = [{
+        'Producto': p.product_name,
+        'Cantidad Vendida': float(p.total_quantity or 0),
+        'Ingresos Totales': float(p.total_revenue or 0),
+        'Ganancia Estimada': float(p.total_revenue or 0) - float(p.total_cost or 0)
+    } for p in _product_sales(db, start_dt, end_dt)]
+    cash = _cash_audit_rows(db, start_dt, end_dt)
+
+    metrics = [
+        ['Total Ventas', _money(total_sales) if num_sales else '$0.00'],
+        ['Ganancia Estimada', _money(sum(p['Ganancia Estimada'] for p in products))],
+        ['Número de Ventas', num_sales],
+        ['Ticket Promedio', _money(float(total_sales) / num_sales) if num_sales else '$0.00'],
+        ['Total Faltantes Caja', _money(sum(c['Diferencia'] for c in cash if c['Diferencia'] < 0))],
+        ['Total Sobrantes Caja', _money(sum(c['Diferencia'] for c in cash if c['Diferencia'] > 0))],
+        ['Valor Total Inventario', _money(_inventory_value(db))],
+    ]
+    top = []
+    if products:
+        top_columns = ['Producto', 'Cantidad Vendida', 'Ingresos Totales', 'Ganancia Estimada']
+        top = [[], [Cell('TOP 5 PRODUCTOS MÁS VENDIDOS', 'subtitle')], [Cell(c, 'bold') for c in top_columns]]
+        for p in sorted(products, key=lambda p: p['Ingresos Totales'], reverse=True)[:5]:
+            top.append([p[c] for c in top_columns])
+
+    sheets = [_dashboard_sheet(metrics, top)]
+
+    if num_sales:
+        sheets.append(Sheet('Ventas Detalle', _with_header(SALES_HEADER, sales_rows(db, start_dt, end_dt)),
+                            widths=SALES_WIDTHS))
+    else:
+        sheets.append(_message_sheet('Ventas Detalle', 'No hay ventas en este período'))
+
+    if cash:
+        columns = list(cash[0].keys())
+        rows = [_header(columns)]
+        for c in cash:
+            mark = 'shortage' if c['Diferencia'] < -0.01 else 'overage' if c['Diferencia'] > 0.01 else None
+            rows.append([Cell(c[k], mark) if mark else c[k] for k in columns])
+        sheets.append(Sheet('Auditoría Cajas', rows, widths=fit_widths(rows)))
+    else:
+        sheets.append(_message_sheet('Auditoría Cajas', 'No hay sesiones de caja en este período'))
+
+    if _has_products(db):
+        sheets.append(Sheet('Inventario', _with_header(INVENTORY_HEADER, inventory_rows(db)), widths=INVENTORY_WIDTHS))
+    else:
+        sheets.append(_message_sheet('Inventario', 'No hay productos en inventario'))
+    return sheets
+
+
+def _flattened_audit(db: Session, start_dt: datetime, end_dt: datetime) -> List[Dict[str, Any]]:
+    """One row per session with USD/Bs/... columns side by side"""
+    cash_sessions = db.query(models.CashSession).options(
+        joinedload(models.CashSession.currencies),
+        joinedload(models.CashSession.user)
+    ).filter(
+        models.CashSession.start_time >= start_dt,
+        models.CashSession.start_time <= end_dt
+    ).all()
+
+    audit = []
+    for session in cash_sessions:
+        row = {
+            'Fecha Apertura': session.start_time.strftime('%Y-%m-%d %H:%M') if session.start_time else '',
+            'Fecha Cierre': session.end_time.strftime('%Y-%m-%d %H:%M') if session.end_time else 'Abierta',
+            'Cajero': session.user.full_name if session.user and session.user.full_name else (session.user.username if session.user else f'Usuario #{session.user_id}'),
+            'Estado': session.status,
+        }
+        if session.currencies:
+            for curr in session.currencies:
+                symbol = curr.currency_symbol
+                row[f'{symbol} Inicial'] = float(curr.initial_amount or 0)
+                row[f'{symbol} Esperado'] = float(curr.final_expected or 0)
+                row[f'{symbol} Reportado'] = float(curr.final_reported or 0)
+                row[f'Dif {symbol}'] = float(curr.difference or 0)
+        else:
+            # Legacy session - only USD
+            row['USD Inicial'] = float(session.initial_cash or 0)
+            row['USD Esperado'] = float(session.final_cash_expected or 0)
+            row['USD Reportado'] = float(session.final_cash_reported or 0)
+            row['Dif USD'] = float(session.final_cash_reported or 0) - float(session.final_cash_expected or 0)
+        audit.append(row)
+    return audit
+
+
+def general_report(db: Session, start_dt: datetime, end_dt: datetime) -> List[Sheet]:
+    """Auditoría 360: Dashboard, Auditoría de Cajas (multi-moneda), Ventas Detalladas"""
+    total_sales, num_sales = _sales_totals(db, start_dt, end_dt)
+    audit = _flattened_audit(db, start_dt, end_dt)
+
+    # Columns in order of first appearance (sessions may have different currencies)
+    columns: List[str] = []
+    for row in audit:
+        columns.extend(k for k in row if k not in columns)
+
+    shortages = overages = 0.0
+    for row in audit:
+        for key, value in row.items():
+            if key.startswith('Dif '):
+                if value < -0.01:
+                    shortages += abs(value)
+                elif value > 0.01:
+                    overages += value
+
+    metrics = [
+        ['Total Ventas USD', _money(total_sales)],
+        ['Número de Ventas', num_sales],
+        ['Ticket Promedio', _money(float(total_sales) / num_sales if num_sales else 0)],
+        ['Total Faltantes', _money(shortages)],
+        ['Total Sobrantes', _money(overages)],
+        ['Sesiones Auditadas', len(audit)],
+    ]
+    sheets = [_dashboard_sheet(metrics)]
+
+    if audit:
+        rows = [_header(columns)]
+        for row in audit:
+            cells = []
+            for key in columns:
+                value = row.get(key)
+                if key.startswith('Dif ') and isinstance(value, float) and abs(value) > 0.01:
+                    value = Cell(value, 'shortage_mark' if value < 0 else 'overage_mark')
+                cells.append(value)
+            rows.append(cells)
+        sheets.append(Sheet('Auditoría de Cajas', rows, widths=fit_widths(rows)))
+    else:
+        sheets.append(_message_sheet('Auditoría de Cajas', 'No hay sesiones de caja en este período'))
+
+    if num_sales:
+        sheets.append(Sheet('Ventas Detalladas',
+                            _with_header(SALES_HEADER[:-1], sales_rows(db, start_dt, end_dt, with_paid=False)),
+                            widths=SALES_WIDTHS[:-1]))
+    else:
+        sheets.append(_message_sheet('Ventas Detalladas', 'No hay ventas en este período'))
+    return sheets
+
+
+def boxed_sheet(sheet_title: str, report_title: str, headers: List[str], data: List[List[Any]]) -> Sheet:
+    """Title row, boxed table and a bold total of the third column (small tables)"""
+    rows: List[List[Any]] = [[Cell(report_title, 'title')], [], [Cell(h, 'header_box') for h in headers]]
+    for row in data:
+        rows.append([Cell(value, 'box_money' if index == 2 else 'box') for index, value in enumerate(row)])
+    if data:
+        rows.append([Cell("TOTAL GENERADO", 'bold'), None, Cell(sum(row[2] for row in data), 'bold_money')])
+    widths = fit_widths(rows[2:], limit=1000)
+    return Sheet(sheet_title, rows, widths=widths, merges=[f"A1:{chr(64 + len(headers))}1"])
+
+
+def detailed_report(db: Session, start_date: date, end_date: date) -> List[Sheet]:
+    """Reporte Completo: payment methods and top customers"""
+    start_dt = datetime.combine(start_date, datetime.min.time())
+    end_dt = datetime.combine(end_date, datetime.max.time())
+    period = f"({start_date} - {end_date})"
+
+    data_payments = [[r['method'], r['count'], r['total_amount']]
+                     for r in payment_method_totals(db, start_dt, end_dt)]
+    data_customers = [[r['customer_name'], r['transaction_count'], r['total_purchased']]
+                      for r in customer_totals(db, start_dt, end_dt, limit=100)]
+    return [
+        boxed_sheet("Métodos de Pago", f"Ventas por Método de Pago {period}",
+                    ["Método", "Transacciones", "Total (USD)"], data_payments),
+        boxed_sheet("Clientes Top", f"Ventas por Cliente {period}",
+                    ["Cliente", "Compras", "Total (USD)"], data_customers),
+    ]
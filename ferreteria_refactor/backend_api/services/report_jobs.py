@@ -0,0 +1,528 @@
+"""
+Report Jobs
+Heavy exports built in the background instead of inside request workers.
+
+A client submits a report spec (POST /reports/jobs), gets a job id back,
+then polls GET /reports/jobs/{id} or waits for the `report_job:finished`
+websocket event, and downloads the artifact. Meanwhile:
+
+- jobs live in a small SQLite file next to their artifacts
+  (REPORT_JOBS_DIR), independent of the main database, so every API
+  worker sees the same queue and a restart does not lose it;
+- a dispatcher on the app loop claims queued jobs by priority and builds
+  at most REPORT_WORKERS at a time in a process pool whose workers are
+  reniced (REPORT_WORKER_NICE), so POS requests keep the threadpool and
+  the CPU;
+- artifacts are cached by (report, format, params, data version): an
+  identical request while the data has not changed reuses the file, or
+  joins the job already in flight.
+
+The data version is a fingerprint of counts, max ids and updated_at of
+the tables the reports read. Edits it cannot see (a sale edited in place)
+are picked up once the cached artifact expires (REPORT_CACHE_TTL).
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import partial
+from itertools import chain
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database.db import ReadSessionLocal
+from ..models import models
+from ..websocket.event_bus import event_bus
+from ..websocket.events import WebSocketEvents
+from . import report_exports
+from .product_export_service import ProductExportService
+from .streaming_export import CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE, Cell, Sheet, stream_csv, stream_xlsx
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+MEDIA_TYPES = {"xlsx": XLSX_MEDIA_TYPE, "csv": CSV_MEDIA_TYPE}
+POLL_INTERVAL = 5.0  # seconds; picks up jobs submitted through other API workers
+PURGE_INTERVAL = 600.0  # seconds
+
+
+class JobLimitError(Exception):
+    """The user already has REPORT_MAX_ACTIVE_PER_USER jobs queued or running"""
+
+
+# ---------- Reports ----------
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+PARAM_TYPES = {
+    "start_date": _as_date,
+    "end_date": _as_date,
+    "customer_id": int,
+    "product_id": int,
+    "payment_method": str,
+}
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    formats: Tuple[str, ...]
+    params: Tuple[str, ...]
+    build: Callable[[Session, Dict[str, Any], str], Iterator[bytes]]
+    filename: str  # Formatted with the params and format
+
+
+def _bounds(params: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    return (datetime.combine(date.fromisoformat(params["start_date"]), datetime.min.time()),
+            datetime.combine(date.fromisoformat(params["end_date"]), datetime.max.time()))
+
+
+def _management(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    start_dt, end_dt = _bounds(params)
+    if fmt == "csv":
+        return stream_csv(report_exports.SALES_HEADER, report_exports.sales_rows(db, start_dt, end_dt))
+    return stream_xlsx(report_exports.management_report(db, start_dt, end_dt))
+
+
+def _general(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    return stream_xlsx(report_exports.general_report(db, *_bounds(params)))
+
+
+def _detailed(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    return stream_xlsx(report_exports.detailed_report(
+        db, date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])))
+
+
+def _sales_detailed(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    rows = report_exports.detailed_sales_rows(
+        db, *_bounds(params), customer_id=params.get("customer_id"), product_id=params.get("product_id"),
+        payment_method=params.get("payment_method"))
+    if fmt == "csv":
+        return stream_csv(report_exports.DETAILED_SALES_HEADER, rows)
+    header = [[Cell(name, "bold") for name in report_exports.DETAILED_SALES_HEADER]]
+    return stream_xlsx([Sheet("Ventas", chain(header, rows), auto_filter=True)])
+
+
+def _inventory(db: Session, params: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    return ProductExportService.stream_csv(db) if fmt == "csv" else ProductExportService.stream_excel(db)
+
+
+PERIOD = ("start_date", "end_date")
+REPORTS: Dict[str, ReportSpec] = {
+    "management": ReportSpec(("xlsx", "csv"), PERIOD, _management, "Reporte_Gerencial_{start_date}_{end_date}"),
+    "general": ReportSpec(("xlsx",), PERIOD, _general, "Auditoria_360_General_{start_date}_{end_date}"),
+    "detailed": ReportSpec(("xlsx",), PERIOD, _detailed, "Reporte_Completo_{start_date}_{end_date}"),
+    "sales_detailed": ReportSpec(("csv", "xlsx"), PERIOD + ("customer_id", "product_id", "payment_method"),
+                                 _sales_detailed, "Ventas_Detalle_{start_date}_{end_date}"),
+    "inventory": ReportSpec(("xlsx", "csv"), (), _inventory, "inventario_{today}"),
+}
+
+
+def normalize(report: str, fmt: Optional[str], params: Dict[str, Any]) -> Tuple[ReportSpec, str, Dict[str, Any]]:
+    """Validate a report spec and put its params in canonical form (ValueError if invalid)"""
+    spec = REPORTS.get(report)
+    if spec is None:
+        raise ValueError(f"Unknown report '{report}'. Available: {', '.join(REPORTS)}")
+    fmt = fmt or spec.formats[0]
+    if fmt not in spec.formats:
+        raise ValueError(f"format must be {' or '.join(spec.formats)}")
+    unknown = set(params) - set(spec.params)
+    if unknown:
+        raise ValueError(f"Unknown params for {report}: {', '.join(sorted(unknown))}")
+
+    clean: Dict[str, Any] = {}
+    for key in spec.params:
+        value = params.get(key)
+        if value in (None, ""):
+            continue
+        try:
+            clean[key] = PARAM_TYPES[key](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {key}: {value!r}")
+    if "start_date" in spec.params:
+        start_date, end_date = report_exports.default_period(clean.get("start_date"), clean.get("end_date"))
+        if start_date > end_date:
+            raise ValueError("start_date must not be after end_date")
+        clean["start_date"], clean["end_date"] = start_date.isoformat(), end_date.isoformat()
+    return spec, fmt, clean
+
+
+def data_version(db: Session) -> str:
+    """Fingerprint of the data behind the reports, one query"""
+    columns = []
+    for model in (models.Sale, models.SalePayment, models.SaleDetail, models.Return, models.Payment,
+                  models.CashMovement, models.Kardex):
+        columns.append(select(func.count()).select_from(model).scalar_subquery())
+        columns.append(select(func.max(model.id)).scalar_subquery())
+    columns.append(select(func.max(models.CashSession.id)).scalar_subquery())
+    columns.append(select(func.count()).where(models.CashSession.status == "CLOSED").scalar_subquery())
+    for model in (models.Product, models.Category, models.Customer):
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+    row = db.execute(select(*columns)).one()
+    return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:16]
+
+
+def cache_key(report: str, fmt: str, params: Dict[str, Any], version: str) -> str:
+    raw = json.dumps([report, fmt, params, version], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def build_artifact(report: str, fmt: str, params: Dict[str, Any], path: str,
+                   session_factory: Optional[Callable] = None) -> int:
+    """Write one report to `path` (atomically). Runs in the worker process; returns the size in bytes."""
+    db = (session_factory or ReadSessionLocal)()
+    tmp = f"{path}.part"
+    try:
+        size = 0
+        with open(tmp, "wb") as f:
+            for chunk in REPORTS[report].build(db, params, fmt):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp, path)
+        return size
+    finally:
+        db.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _init_worker(nice: int):
+    """Process pool initializer: run below the API process"""
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+# ---------- Job store ----------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    format TEXT NOT NULL,
+    params TEXT NOT NULL,
+    cache_key TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 5,
+    status TEXT NOT NULL,
+    user_id INTEGER,
+    owner_pid INTEGER,
+    filename TEXT,
+    size INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_report_jobs_queue ON report_jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS ix_report_jobs_cache ON report_jobs (cache_key, status);
+"""
+
+
+class JobStore:
+    """Jobs in a SQLite file (WAL) shared by every API worker on the machine"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.artifacts_dir = os.path.join(directory, "artifacts")
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        self.path = os.path.join(directory, "jobs.db")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def artifact_path(self, job: Dict[str, Any]) -> str:
+        return os.path.join(self.artifacts_dir, f"{job['id']}.{job['format']}")
+
+    def create(self, report: str, fmt: str, params: Dict[str, Any], key: str, priority: int,
+               user_id: Optional[int], filename: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO report_jobs (id, report, format, params, cache_key, priority, status, user_id, "
+                "filename, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, report, fmt, json.dumps(params, sort_keys=True), key, priority, QUEUED, user_id,
+                 filename, time.time()))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            return self._row(conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, user_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query, args = "SELECT * FROM report_jobs", []
+        if user_id is not None:
+            query, args = query + " WHERE user_id = ?", [user_id]
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created_at DESC LIMIT ?", args + [limit]).fetchall()
+        return [self._row(r) for r in rows]
+
+    def find_reusable(self, key: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """Newest job with this key that is in flight, or done within the TTL with its file still there"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM report_jobs WHERE cache_key = ? AND (status IN (?, ?) OR "
+                "(status = ? AND finished_at >= ?)) ORDER BY created_at DESC",
+                (key, QUEUED, RUNNING, DONE, time.time() - ttl)).fetchall()
+        for row in rows:
+            job = self._row(row)
+            if job["status"] != DONE or os.path.exists(self.artifact_path(job)):
+                return job
+        return None
+
+    def active_count(self, user_id: int) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM report_jobs WHERE user_id = ? AND status IN (?, ?)",
+                                (user_id, QUEUED, RUNNING)).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the highest-priority queued job to running (safe across processes)"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM report_jobs WHERE status = ? ORDER BY priority, created_at LIMIT 1",
+                               (QUEUED,)).fetchone()
+            if row:
+                conn.execute("UPDATE report_jobs SET status = ?, started_at = ?, owner_pid = ? WHERE id = ?",
+                             (RUNNING, time.time(), os.getpid(), row["id"]))
+            conn.execute("COMMIT")
+        return self.get(row["id"]) if row else None
+
+    def finish(self, job_id: str, size: int):
+        with self._connect() as conn:
+            conn.execute("UPDATE report_jobs SET status = ?, size = ?, finished_at = ? WHERE id = ?",
+                         (DONE, size, time.time(), job_id))
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE report_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                         (FAILED, error[:1000], time.time(), job_id))
+
+    def requeue_orphans(self) -> int:
+        """Jobs left running by an API process that is gone (crash, kill) go back to the queue"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, owner_pid FROM report_jobs WHERE status = ?", (RUNNING,)).fetchall()
+            orphans = [r["id"] for r in rows if not r["owner_pid"] or not _pid_alive(r["owner_pid"])]
+            for job_id in orphans:
+                conn.execute("UPDATE report_jobs SET status = ?, started_at = NULL, owner_pid = NULL "
+                             "WHERE id = ? AND status = ?", (QUEUED, job_id, RUNNING))
+        return len(orphans)
+
+    def purge(self, retention: float) -> int:
+        """Delete finished jobs (and their files) older than `retention` seconds"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM report_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                                (DONE, FAILED, time.time() - retention)).fetchall()
+            for row in rows:
+                path = self.artifact_path(dict(row))
+                if os.path.exists(path):
+                    os.remove(path)
+                conn.execute("DELETE FROM report_jobs WHERE id = ?", (row["id"],))
+        return len(rows)
+
+
+# ---------- Manager ----------
+
+class ReportJobManager:
+    def __init__(self, directory: str = None, workers: int = None, use_processes: bool = None,
+                 session_factory: Optional[Callable] = None, cache_ttl: float = None, retention: float = None,
+                 max_active_per_user: int = None):
+        self.directory = directory or settings.REPORT_JOBS_DIR
+        self.workers = max(1, workers or settings.REPORT_WORKERS)
+        if use_processes is None:
+            # A frozen desktop build has no freeze_support() hook for spawned children: use threads there
+            use_processes = settings.REPORT_JOBS_PROCESSES and not getattr(sys, 'frozen', False)
+        self.use_processes = use_processes
+        self.session_factory = session_factory  # Threads only; worker processes open their own ReadSessionLocal
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.REPORT_CACHE_TTL
+        self.retention = retention if retention is not None else settings.REPORT_JOB_RETENTION
+        self.max_active_per_user = max_active_per_user or settings.REPORT_MAX_ACTIVE_PER_USER
+
+        self._store: Optional[JobStore] = None
+        self._executor = None
+        self._task = None
+        self._loop = None
+        self._wake = None
+        self._running: set = set()
+        self._next_purge = 0.0
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.directory)
+        return self._store
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _has_store(self) -> bool:
+        """The store file is only created by the first submit"""
+        return self._store is not None or os.path.exists(os.path.join(self.directory, "jobs.db"))
+
+    # ---------- Request side (threadpool) ----------
+
+    def submit(self, db: Session, report: str, fmt: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+               priority: int = 5, user_id: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a report, or return the cached/in-flight job for the same spec. Returns (job, reused)."""
+        spec, fmt, params = normalize(report, fmt, params or {})
+        key = cache_key(report, fmt, params, data_version(db))
+        existing = self.store.find_reusable(key, self.cache_ttl)
+        if existing:
+            return existing, True
+        if user_id is not None and self.store.active_count(user_id) >= self.max_active_per_user:
+            raise JobLimitError(f"Too many report jobs in progress (max {self.max_active_per_user})")
+
+        filename = spec.filename.format(today=date.today().isoformat(), **params) + f".{fmt}"
+        job = self.store.create(report, fmt, params, key, priority, user_id, filename)
+        self.notify()
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def list(self, user_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.store.list(user_id, limit)
+
+    def artifact(self, job: Dict[str, Any]) -> Tuple[str, str]:
+        """(path, media type) of a finished job"""
+        return self.store.artifact_path(job), MEDIA_TYPES[job["format"]]
+
+    def notify(self):
+        """A job was queued: dispatch now instead of at the next poll. Thread-safe."""
+        if self._loop is None or self._wake is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    # ---------- Dispatcher (app loop) ----------
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        requeued = 0
+        if self._has_store():
+            requeued = await asyncio.to_thread(self.store.requeue_orphans)
+        if requeued:
+            print(f"[REPORTS] {requeued} interrupted report job(s) queued again")
+        self._task = self._loop.create_task(self._run())
+        print(f"[REPORTS] Report jobs started (workers={self.workers}, "
+              f"{'processes' if self.use_processes else 'threads'}, dir={self.directory})")
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task:
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=timeout)
+            self._task = None
+        if self._executor:
+            # Jobs cut short stay 'running' with this pid and are queued again on the next start
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._running.clear()
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(settings.REPORT_WORKER_NICE,))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        return self._executor
+
+    async def _run(self):
+        while True:
+            try:
+                while len(self._running) < self.workers and self._has_store():
+                    job = await asyncio.to_thread(self.store.claim_next)
+                    if job is None:
+                        break
+                    task = self._loop.create_task(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+                if time.monotonic() >= self._next_purge and self._has_store():
+                    await asyncio.to_thread(self.store.purge, self.retention)
+                    self._next_purge = time.monotonic() + PURGE_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[REPORTS] Dispatcher error: {type(e).__name__}: {e}")
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: Dict[str, Any]):
+        path = self.store.artifact_path(job)
+        if self.use_processes:
+            work = partial(build_artifact, job["report"], job["format"], job["params"], path)
+        else:
+            work = partial(build_artifact, job["report"], job["format"], job["params"], path, self.session_factory)
+        try:
+            size = await self._loop.run_in_executor(self._get_executor(), work)
+            await asyncio.to_thread(self.store.finish, job["id"], size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None  # A worker died (OOM?): start a fresh pool for the next job
+            print(f"[REPORTS] Job {job['id']} ({job['report']}) failed: {type(e).__name__}: {e}")
+            await asyncio.to_thread(self.store.fail, job["id"], f"{type(e).__name__}: {e}")
+        finally:
+            self._wake.set()
+
+        finished = await asyncio.to_thread(self.store.get, job["id"])
+        event_bus.publish(WebSocketEvents.REPORT_JOB_FINISHED, {
+            "id": finished["id"],
+            "report": finished["report"],
+            "status": finished["status"],
+            "user_id": finished["user_id"],
+            "filename": finished["filename"],
+            "error": finished["error"],
+        })
+
+
+report_jobs = ReportJobManager()
@@ -0,0 +1,332 @@
+"""
+Sales Rollups
+Daily pre-aggregates behind the dashboard and profit reports.
+
+Two tables are kept up to date as sales and returns commit, in the same
+transaction as the rows they summarise:
+
+- sales_rollup_daily: day x product x warehouse x currency with quantity,
+  revenue, cost (SUM of the unit_cost snapshot on each line) and the
+  matching refund columns;
+- currency_rollup_daily: day x currency with sales, payments collected
+  (and their exchange rates) and cash refunds.
+
+Reports read closed days from the rollups and compute today live from the
+base tables, so a month of history costs the same as one day. Until the
+rollups have been built once (scripts/rebuild_rollups.py, or
+POST /reports/rollups/rebuild) everything is computed live.
+
+Writers that bypass the ORM (bulk inserts) are why maintenance is explicit:
+call record_sales / record_return / record_payments right before committing.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import Date, cast, func
+from sqlalchemy.orm import Session
+from ..models import models
+from . import bulk_upsert
+from .config_store import config_store
+
+READY_KEY = "sales_rollups_built_at"  # BusinessConfig row written by a full rebuild
+
+_sales_rollup = models.SalesRollupDaily.__table__
+_currency_rollup = models.CurrencyRollupDaily.__table__
+SALES_KEYS = ("day", "product_id", "warehouse_id", "currency")
+CURRENCY_KEYS = ("day", "currency")
+SALES_MEASURES = ("quantity", "revenue", "cost", "lines", "refund_quantity", "refund_revenue", "refund_cost")
+CURRENCY_MEASURES = ("sale_count", "collected", "payment_count", "rate_sum", "rate_count", "refunded")
+
+ZERO = Decimal("0")
+
+
+def _day(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _num(value) -> Decimal:
+    return Decimal(str(value)) if value is not None else ZERO
+
+
+def _in_range(column, start: Optional[date], end: Optional[date]) -> List:
+    criteria = []
+    if start:
+        criteria.append(column >= datetime.combine(start, time.min))
+    if end:
+        criteria.append(column <= datetime.combine(end, time.max))
+    return criteria
+
+
+def _accumulator(measures):
+    return defaultdict(lambda: {name: (0 if name.endswith(("count", "lines")) else ZERO) for name in measures})
+
+
+# ---------- Aggregation over the base tables ----------
+# Grouped by the raw columns; NULL currency / warehouse are folded in Python so
+# the GROUP BY stays free of bound parameters (Postgres rejects those).
+
+def product_totals(db: Session, sale_criteria: Optional[List] = None,
+                   return_criteria: Optional[List] = None) -> Dict[tuple, Dict[str, Any]]:
+    """(day, product, warehouse, currency) -> measures, for the sales and returns matching the criteria"""
+    acc = _accumulator(SALES_MEASURES)
+
+    if sale_criteria is not None:
+        day = _day(db, models.Sale.date)
+        rows = db.query(
+            day, models.SaleDetail.product_id, models.Sale.warehouse_id, models.Sale.currency,
+            func.sum(models.SaleDetail.quantity),
+            func.sum(models.SaleDetail.subtotal),
+            func.sum(models.SaleDetail.quantity * models.SaleDetail.unit_cost),
+            func.count(models.SaleDetail.id),
+        ).join(
+            models.Sale, models.Sale.id == models.SaleDetail.sale_id
+        ).filter(*sale_criteria).group_by(
+            day, models.SaleDetail.product_id, models.Sale.warehouse_id, models.Sale.currency
+        )
+        for d, product_id, warehouse_id, currency, qty, revenue, cost, lines in rows:
+            entry = acc[(_as_date(d), product_id, warehouse_id or 0, currency or "USD")]
+            entry["quantity"] += _num(qty)
+            entry["revenue"] += _num(revenue)
+            entry["cost"] += _num(cost)
+            entry["lines"] += lines
+
+    if return_criteria is not None:
+        day = _day(db, models.Return.date)
+        rows = db.query(
+            day, models.ReturnDetail.product_id, models.Sale.warehouse_id, models.Sale.currency,
+            func.sum(models.ReturnDetail.quantity),
+            func.sum(models.ReturnDetail.quantity * models.ReturnDetail.unit_price),
+            func.sum(models.ReturnDetail.quantity * models.ReturnDetail.unit_cost),
+        ).join(
+            models.Return, models.Return.id == models.ReturnDetail.return_id
+        ).join(
+            models.Sale, models.Sale.id == models.Return.sale_id
+        ).filter(*return_criteria).group_by(
+            day, models.ReturnDetail.product_id, models.Sale.warehouse_id, models.Sale.currency
+        )
+        for d, product_id, warehouse_id, currency, qty, revenue, cost in rows:
+            entry = acc[(_as_date(d), product_id, warehouse_id or 0, currency or "USD")]
+            entry["refund_quantity"] += _num(qty)
+            entry["refund_revenue"] += _num(revenue)
+            entry["refund_cost"] += _num(cost)
+
+    return acc
+
+
+def currency_totals(db: Session, sale_criteria: Optional[List] = None,
+                    movement_criteria: Optional[List] = None,
+                    payment_criteria: Optional[List] = None) -> Dict[tuple, Dict[str, Any]]:
+    """(day, currency) -> measures. Payments count on the day of their sale, like the dashboard always did.
+
+    payment_criteria selects payments on their own (an abono on an older sale)
+    without counting the sale again.
+    """
+    acc = _accumulator(CURRENCY_MEASURES)
+
+    if sale_criteria is not None:
+        day = _day(db, models.Sale.date)
+        for d, currency, count in db.query(
+            day, models.Sale.currency, func.count(models.Sale.id)
+        ).filter(*sale_criteria).group_by(day, models.Sale.currency):
+            acc[(_as_date(d), currency or "USD")]["sale_count"] += count
+
+    if sale_criteria is not None or payment_criteria is not None:
+        day = _day(db, models.Sale.date)
+        for d, currency, collected, payments, rate_sum, rates in db.query(
+            day, models.SalePayment.currency,
+            func.sum(models.SalePayment.amount),
+            func.count(models.SalePayment.id),
+            func.sum(models.SalePayment.exchange_rate),
+            func.count(models.SalePayment.exchange_rate),
+        ).join(
+            models.Sale, models.Sale.id == models.SalePayment.sale_id
+        ).filter(*(payment_criteria if sale_criteria is None else sale_criteria)).group_by(
+            day, models.SalePayment.currency
+        ):
+            entry = acc[(_as_date(d), currency or "USD")]
+            entry["collected"] += _num(collected)
+            entry["payment_count"] += payments
+            entry["rate_sum"] += _num(rate_sum)
+            entry["rate_count"] += rates
+
+    if movement_criteria is not None:
+        day = _day(db, models.CashMovement.date)
+        for d, currency, refunded in db.query(
+            day, models.CashMovement.currency, func.sum(models.CashMovement.amount)
+        ).filter(
+            models.CashMovement.type == "RETURN", *movement_criteria
+        ).group_by(day, models.CashMovement.currency):
+            acc[(_as_date(d), currency or "USD")]["refunded"] += _num(refunded)
+
+    return acc
+
+
+def _write(db: Session, products: Dict[tuple, Dict], currencies: Dict[tuple, Dict]) -> Dict[str, int]:
+    product_rows = [dict(zip(SALES_KEYS, key), **values) for key, values in products.items()]
+    currency_rows = [dict(zip(CURRENCY_KEYS, key), **values) for key, values in currencies.items()]
+    return {
+        "product_rows": bulk_upsert.upsert_add(db, _sales_rollup, product_rows, SALES_KEYS),
+        "currency_rows": bulk_upsert.upsert_add(db, _currency_rollup, currency_rows, CURRENCY_KEYS),
+    }
+
+
+# ---------- Maintenance ----------
+
+def record_sales(db: Session, sale_ids: Iterable[int]):
+    """Add freshly inserted sales (details and payments already written) to the rollups. Caller commits."""
+    sale_ids = list(sale_ids)
+    if not sale_ids:
+        return
+    db.flush()
+    criteria = [models.Sale.id.in_(sale_ids)]
+    _write(db, product_totals(db, sale_criteria=criteria), currency_totals(db, sale_criteria=criteria))
+
+
+def record_payments(db: Session, payment_ids: Iterable[int]):
+    """Add payments registered after their sale (abonos) to the rollup of the sale's day. Caller commits."""
+    payment_ids = list(payment_ids)
+    if not payment_ids:
+        return
+    db.flush()
+    _write(db, {}, currency_totals(db, payment_criteria=[models.SalePayment.id.in_(payment_ids)]))
+
+
+def record_return(db: Session, return_id: int, movement_ids: Iterable[int] = ()):
+    """Add a return (and the cash refund movements it created) to the rollups. Caller commits."""
+    db.flush()
+    movement_ids = [m for m in movement_ids if m is not None]
+    _write(
+        db,
+        product_totals(db, return_criteria=[models.Return.id == return_id]),
+        currency_totals(db, movement_criteria=[models.CashMovement.id.in_(movement_ids)]) if movement_ids else {},
+    )
+
+
+def is_ready(db: Session) -> bool:
+    return READY_KEY in config_store.snapshot(db)
+
+
+def rebuild(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Recompute the rollups for [start, end] (everything by default) from the
+    base tables and commit. A full rebuild also marks the rollups as ready.
+    """
+    for table in (_sales_rollup, _currency_rollup):
+        stmt = table.delete()
+        if start:
+            stmt = stmt.where(table.c.day >= start)
+        if end:
+            stmt = stmt.where(table.c.day <= end)
+        db.execute(stmt)
+
+    sale_criteria = _in_range(models.Sale.date, start, end)
+    written = _write(
+        db,
+        product_totals(db, sale_criteria, _in_range(models.Return.date, start, end)),
+        currency_totals(db, sale_criteria, _in_range(models.CashMovement.date, start, end)),
+    )
+
+    if start is None and end is None:
+        marker = db.query(models.BusinessConfig).filter(models.BusinessConfig.key == READY_KEY).first()
+        if not marker:
+            marker = models.BusinessConfig(key=READY_KEY)
+            db.add(marker)
+        marker.value = datetime.now().isoformat(timespec="seconds")
+    db.commit()
+    return {"start": start, "end": end, **written}
+
+
+# ---------- Reading ----------
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "quantity": ZERO, "revenue": ZERO, "cost": ZERO,
+        "refund_revenue": ZERO, "refund_cost": ZERO,
+        "sale_count": 0,
+        "currencies": _accumulator(CURRENCY_MEASURES),
+    }
+
+
+def _add_rollups(db: Session, totals: Dict[str, Any], start: Optional[date], end: date):
+    R = models.SalesRollupDaily
+    criteria = [R.day <= end] + ([R.day >= start] if start else [])
+    qty, revenue, cost, refund_revenue, refund_cost = db.query(
+        func.sum(R.quantity), func.sum(R.revenue), func.sum(R.cost),
+        func.sum(R.refund_revenue), func.sum(R.refund_cost),
+    ).filter(*criteria).one()
+    totals["quantity"] += _num(qty)
+    totals["revenue"] += _num(revenue)
+    totals["cost"] += _num(cost)
+    totals["refund_revenue"] += _num(refund_revenue)
+    totals["refund_cost"] += _num(refund_cost)
+
+    C = models.CurrencyRollupDaily
+    criteria = [C.day <= end] + ([C.day >= start] if start else [])
+    for row in db.query(
+        C.currency, *(func.sum(getattr(C, name)) for name in CURRENCY_MEASURES)
+    ).filter(*criteria).group_by(C.currency):
+        entry = totals["currencies"][row[0]]
+        for name, value in zip(CURRENCY_MEASURES, row[1:]):
+            entry[name] += (value or 0) if isinstance(entry[name], int) else _num(value)
+
+
+def _add_live(db: Session, totals: Dict[str, Any], start: Optional[date], end: Optional[date]):
+    """Same measures straight from the base tables: flat SUMs, no per-product grouping"""
+    sale_criteria = _in_range(models.Sale.date, start, end)
+    qty, revenue, cost = db.query(
+        func.sum(models.SaleDetail.quantity),
+        func.sum(models.SaleDetail.subtotal),
+        func.sum(models.SaleDetail.quantity * models.SaleDetail.unit_cost),
+    ).join(models.Sale, models.Sale.id == models.SaleDetail.sale_id).filter(*sale_criteria).one()
+    refund_revenue, refund_cost = db.query(
+        func.sum(models.ReturnDetail.quantity * models.ReturnDetail.unit_price),
+        func.sum(models.ReturnDetail.quantity * models.ReturnDetail.unit_cost),
+    ).join(models.Return, models.Return.id == models.ReturnDetail.return_id).filter(
+        *_in_range(models.Return.date, start, end)
+    ).one()
+    totals["quantity"] += _num(qty)
+    totals["revenue"] += _num(revenue)
+    totals["cost"] += _num(cost)
+    totals["refund_revenue"] += _num(refund_revenue)
+    totals["refund_cost"] += _num(refund_cost)
+
+    for (_, currency), values in currency_totals(
+        db, sale_criteria, _in_range(models.CashMovement.date, start, end)
+    ).items():
+        entry = totals["currencies"][currency]
+        for name in CURRENCY_MEASURES:
+            entry[name] += values[name]
+
+
+def period_totals(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Sales, cost, refunds and money per currency for [start, end] (open ends allowed).
+    Days before today come from the rollups once they are built; today and later are live.
+    """
+    totals = _empty_totals()
+    today = date.today()
+    if is_ready(db):
+        closed_end = today - timedelta(days=1)
+        if end is not None and end < closed_end:
+            closed_end = end
+        if start is None or start <= closed_end:
+            _add_rollups(db, totals, start, closed_end)
+        if end is None or end >= today:
+            _add_live(db, totals, max(start, today) if start else today, end)
+    else:
+        _add_live(db, totals, start, end)
+
+    totals["sale_count"] = sum(c["sale_count"] for c in totals["currencies"].values())
+    totals["currencies"] = dict(totals["currencies"])
+    return totals
@@ -1,28 +1,21 @@
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from fastapi import HTTPException, BackgroundTasks
+from fastapi import HTTPException
 from decimal import Decimal
 import requests
 from ..models import models
 from .. import schemas
-from ..websocket.manager import manager
+from ..websocket.event_bus import event_bus
 from ..websocket.events import WebSocketEvents
-import asyncio
+from . import cash_ledger, sales_rollups, stock_ledger
+from .config_store import config_store
+from .sync_daemon import sync_daemon
 import uuid
 
-# DUPLICATED HELPER due to circular import risks if we try to import from routers
-def run_broadcast(event: str, data: dict):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(manager.broadcast(event, data))
-    finally:
-        loop.close()
-
 class SalesService:
     @staticmethod
-    def create_sale(db: Session, sale_data: schemas.SaleCreate, user_id: int, background_tasks: BackgroundTasks = None):
+    def create_sale(db: Session, sale_data: schemas.SaleCreate, user_id: int):
         try:
             updated_products_info = []
             
@@ -122,205 +115,212 @@ class SalesService:
                 if quote:
                     quote.status = "CONVERTED" # Mark as Sold/Converted
                     db.add(quote) # Ensure update is tracked       
-            # 2. Process Items
+            # 2. Prefetch everything the ticket touches in a handful of IN (...) queries
+            item_product_ids = {item.product_id for item in sale_data.items}
+
+            # Components of the combos on this ticket (with their unit presentation)
+            combo_items_by_parent = {}
+            combo_rows = db.query(models.ComboItem).options(
+                joinedload(models.ComboItem.unit)
+            ).join(
+                models.Product, models.Product.id == models.ComboItem.parent_product_id
+            ).filter(
+                models.ComboItem.parent_product_id.in_(item_product_ids),
+                models.Product.is_combo == True
+            ).order_by(models.ComboItem.id).all()
+            for combo_item in combo_rows:
+                combo_items_by_parent.setdefault(combo_item.parent_product_id, []).append(combo_item)
+
+            child_product_ids = {c.child_product_id for c in combo_rows}
+            ticket_product_ids = sorted(item_product_ids | child_product_ids)
+
+            products = {
+                p.id: p for p in db.query(models.Product).filter(
+                    models.Product.id.in_(ticket_product_ids)
+                ).all()
+            }
+
+            # 3. Resolve lines into stock deductions (nothing written yet)
+            # Each deduction: (product, qty, kardex description, combo parent or None)
+            deductions = []
+            detail_rows = []
             for item in sale_data.items:
-                # Fetch Product with Pessimistic Lock
-                product = db.query(models.Product).filter(models.Product.id == item.product_id).with_for_update().first()
+                product = products.get(item.product_id)
                 if not product:
                     raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-                
+
                 # Calculate base units to deduct using conversion_factor
                 units_to_deduct = item.quantity * item.conversion_factor
-                
-                # NEW: COMBO LOGIC - Check if product is a combo
+                line_cost = (product.cost_price or 0) * units_to_deduct
+
                 if product.is_combo:
-                     # COMBO: Deduct stock from child components in specific warehouse
-                    if not product.combo_items:
+                    # COMBO: Deduct stock from child components in specific warehouse
+                    components = combo_items_by_parent.get(product.id)
+                    if not components:
                         raise HTTPException(
-                            status_code=400, 
+                            status_code=400,
                             detail=f"Combo product '{product.name}' has no components defined"
                         )
-                    
-                    # Check stock for ALL child products first (fail fast)
-                    for combo_item in product.combo_items:
-                        child_product = combo_item.child_product
-                        
-                        if combo_item.unit_id and combo_item.unit:
-                            conversion_factor = combo_item.unit.conversion_factor
-                            qty_needed = item.quantity * combo_item.quantity * conversion_factor
-                        else:
-                            qty_needed = item.quantity * combo_item.quantity
-                        
-                        # CHECK WAREHOUSE STOCK
-                        child_stock = db.query(models.ProductStock).filter(
-                            models.ProductStock.product_id == child_product.id,
-                            models.ProductStock.warehouse_id == warehouse_id
-                        ).first()
-                        
-                        available_qty = child_stock.quantity if child_stock else 0
-                        
-                        if available_qty < qty_needed:
-                             wh_name = db.query(models.Warehouse.name).filter(models.Warehouse.id == warehouse_id).scalar()
-                             raise HTTPException(
-                                status_code=400,
-                                detail=f"Insufficient stock for combo component '{child_product.name}' in '{wh_name}'. Needed: {qty_needed}, Available: {available_qty}"
-                            )
-                    
-                    # All checks passed, now deduct stock from buffer/children
-                    for combo_item in product.combo_items:
-                        child_product = combo_item.child_product
-                        
+
+                    # A combo costs what its components cost
+                    line_cost = 0
+                    for combo_item in components:
                         if combo_item.unit_id and combo_item.unit:
-                            conversion_factor = combo_item.unit.conversion_factor
-                            qty_to_deduct = item.quantity * combo_item.quantity * conversion_factor
+                            qty_to_deduct = item.quantity * combo_item.quantity * combo_item.unit.conversion_factor
                             unit_description = f" ({combo_item.quantity}x {combo_item.unit.unit_name})"
                         else:
                             qty_to_deduct = item.quantity * combo_item.quantity
                             unit_description = ""
-                        
-                        # Deduct stock from WAREHOUSE STOCK
-                        child_stock = db.query(models.ProductStock).filter(
-                            models.ProductStock.product_id == child_product.id,
-                            models.ProductStock.warehouse_id == warehouse_id
-                        ).first()
+                        line_cost += (products[combo_item.child_product_id].cost_price or 0) * qty_to_deduct
 
-                        if not child_stock:
-                             # Should have been caught by check, but just in case
-                             child_stock = models.ProductStock(product_id=child_product.id, warehouse_id=warehouse_id, quantity=0)
-                             db.add(child_stock)
-
-                        child_stock.quantity -= qty_to_deduct
-                        
-                        # ALSO UPDATE TOTAL PRODUCT STOCK (Legacy Support)
-                        child_product.stock -= qty_to_deduct
-                        
-                        # Create Kardex entry
-                        kardex_entry = models.Kardex(
-                            product_id=child_product.id,
-                            movement_type="SALE",
-                            quantity=-qty_to_deduct,
-                            balance_after=child_product.stock, # Legacy balance
-                            description=f"Sale via combo: {product.name}{unit_description} (Sale #{new_sale.id})",
-                            # warehouse_id=warehouse_id # TODO: Add warehouse_id to Kardex
-                        )
-                        db.add(kardex_entry)
-                        
-                        # Collect info
-                        updated_products_info.append({
-                            "id": child_product.id,
-                            "name": child_product.name,
-                            "price": float(child_product.price),
-                            "stock": float(child_product.stock),
-                            "exchange_rate_id": child_product.exchange_rate_id
-                        })
+                        deductions.append((
+                            products[combo_item.child_product_id],
+                            qty_to_deduct,
+                            f"Sale via combo: {product.name}{unit_description} (Sale #{new_sale.id})",
+                            product
+                        ))
                 else:
-                    # NORMAL PRODUCT: Check and deduct stock from WAREHOUSE
-                    product_stock = db.query(models.ProductStock).filter(
-                        models.ProductStock.product_id == product.id,
-                        models.ProductStock.warehouse_id == warehouse_id
-                    ).first()
-                    
-                    available_qty = product_stock.quantity if product_stock else 0
+                    deductions.append((
+                        product,
+                        units_to_deduct,
+                        f"Sale #{new_sale.id} from Warehouse #{warehouse_id}",
+                        None
+                    ))
 
-                    if available_qty < units_to_deduct:
-                        wh_name = db.query(models.Warehouse.name).filter(models.Warehouse.id == warehouse_id).scalar()
-                        raise HTTPException(status_code=400, detail=f"Insufficient stock for product '{product.name}' in warehouse '{wh_name or 'Unknown'}'. Available: {available_qty}")
-                    
-                    # Update Stock
-                    product_stock.quantity -= units_to_deduct
-                    
-                    # Update Total Legacy Stock
-                    product.stock -= units_to_deduct
-                    
-                    # Collect info for broadcast
-                    updated_products_info.append({
-                        "id": product.id,
-                        "name": product.name,
-                        "price": float(product.price),
-                        "stock": float(product.stock),
-                        "exchange_rate_id": product.exchange_rate_id
-                    })
-                    
-                    # Register Kardex Movement
-                    kardex_entry = models.Kardex(
-                        product_id=product.id,
-                        movement_type="SALE",
-                        quantity=-units_to_deduct,
-                        balance_after=product.stock,
-                        description=f"Sale #{new_sale.id} from Warehouse #{warehouse_id}"
-                    )
-                    db.add(kardex_entry)
-                
                 # Calculate subtotal (before discount) - SAME FOR BOTH
                 subtotal = item.unit_price * item.quantity
-                
+
                 # Apply discount if any
                 if item.discount > 0:
                     if item.discount_type == "PERCENT":
                         subtotal = subtotal * (1 - item.discount / 100)
                     elif item.discount_type == "FIXED":
                         subtotal = subtotal - item.discount
-                
-                # Create Sale Detail - SAME FOR BOTH
-                detail = models.SaleDetail(
-                    sale_id=new_sale.id,
-                    product_id=product.id,
-                    quantity=units_to_deduct,
-                    unit_price=item.unit_price,
-                    subtotal=subtotal,
-                    is_box_sale=False,
-                    discount=item.discount,
-                    discount_type=item.discount_type
+
+                detail_rows.append({
+                    "sale_id": new_sale.id,
+                    "product_id": product.id,
+                    "quantity": units_to_deduct,
+                    "unit_price": item.unit_price,
+                    "unit_cost": line_cost / units_to_deduct if units_to_deduct else 0,  # COGS snapshot
+                    "subtotal": subtotal,
+                    "is_box_sale": False,
+                    "discount": item.discount,
+                    "discount_type": item.discount_type
+                })
+
+            # Repeated lines / shared combo components are checked against their combined need
+            needed_by_product = {}
+            for product, qty, _, _ in deductions:
+                needed_by_product[product.id] = needed_by_product.get(product.id, 0) + qty
+
+            # 4. Atomic conditional decrement per distinct product, in ascending id order
+            # (UPDATE ... WHERE quantity >= n). The rows stay locked until the commit below
+            try:
+                levels = stock_ledger.reserve(
+                    db,
+                    {pid: qty for pid, qty in needed_by_product.items() if qty > 0},
+                    warehouse_id=warehouse_id
                 )
-                db.add(detail)
-        
-            # 3. Process Payments (New Multi-Payment Logic)
-            if sale_data.payments:
-                for p in sale_data.payments:
-                    new_payment = models.SalePayment(
-                        sale_id=new_sale.id,
-                        amount=p.amount,
-                        currency=p.currency,
-                        payment_method=p.payment_method,
-                        exchange_rate=p.exchange_rate
+            except stock_ledger.InsufficientStock as e:
+                product = products[e.product_id]
+                is_component = any(d[0].id == e.product_id and d[3] is not None for d in deductions)
+                wh_name = db.query(models.Warehouse.name).filter(models.Warehouse.id == warehouse_id).scalar()
+                if is_component:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Insufficient stock for combo component '{product.name}' in '{wh_name}'. Needed: {e.requested}, Available: {e.available}"
                     )
-                    db.add(new_payment)
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for product '{product.name}' in warehouse '{wh_name or 'Unknown'}'. Available: {e.available}")
+
+            # Legacy running balance per product, replayed line by line for the Kardex
+            final_totals = {
+                pid: levels[pid].total_stock if pid in levels else (products[pid].stock or 0)
+                for pid in needed_by_product
+            }
+            running_totals = {pid: final_totals[pid] + needed_by_product[pid] for pid in needed_by_product}
+
+            kardex_rows = []
+            for product, qty, description, _ in deductions:
+                running_totals[product.id] -= qty
+                kardex_rows.append({
+                    "product_id": product.id,
+                    "movement_type": models.MovementType.SALE,
+                    "quantity": -qty,
+                    "balance_after": running_totals[product.id], # Legacy balance
+                    "description": description,
+                    "date": datetime.now()
+                    # warehouse_id=warehouse_id # TODO: Add warehouse_id to Kardex
+                })
+
+            # Collect info for broadcast (one entry per touched product, final stock)
+            for pid in needed_by_product:
+                product = products[pid]
+                updated_products_info.append({
+                    "id": product.id,
+                    "name": product.name,
+                    "price": float(product.price),
+                    "stock": float(final_totals[pid]),
+                    "exchange_rate_id": product.exchange_rate_id
+                })
+
+            # 5. Process Payments (New Multi-Payment Logic)
+            if sale_data.payments:
+                payment_rows = [
+                    {
+                        "sale_id": new_sale.id,
+                        "amount": p.amount,
+                        "currency": p.currency,
+                        "payment_method": p.payment_method,
+                        "exchange_rate": p.exchange_rate
+                    }
+                    for p in sale_data.payments
+                ]
             else:
                 # Fallback for legacy calls or single payment
-                fallback_payment = models.SalePayment(
-                    sale_id=new_sale.id,
-                    amount=sale_data.total_amount,
-                    currency=sale_data.currency,
-                    payment_method=sale_data.payment_method,
-                    exchange_rate=sale_data.exchange_rate
-                )
-                db.add(fallback_payment)
+                payment_rows = [{
+                    "sale_id": new_sale.id,
+                    "amount": sale_data.total_amount,
+                    "currency": sale_data.currency,
+                    "payment_method": sale_data.payment_method,
+                    "exchange_rate": sale_data.exchange_rate
+                }]
+
+            # 6. Bulk insert child rows (one executemany per table)
+            db.flush()
+            db.bulk_insert_mappings(models.SaleDetail, detail_rows)
+            db.bulk_insert_mappings(models.Kardex, kardex_rows)
+            db.bulk_insert_mappings(models.SalePayment, payment_rows)
+            sales_rollups.record_sales(db, [new_sale.id])
+            cash_ledger.record_payments(db, [models.SalePayment.sale_id == new_sale.id])
             
             db.commit()
             
-            # Emit Stock Update Events using BackgroundTasks
-            if background_tasks:
-                for p_info in updated_products_info:
-                    background_tasks.add_task(run_broadcast, WebSocketEvents.PRODUCT_UPDATED, p_info)
-                    background_tasks.add_task(run_broadcast, WebSocketEvents.PRODUCT_STOCK_UPDATED, {
-                        "id": p_info["id"], 
-                        "stock": p_info["stock"]
-                    })
-                
-                # Emit Sale Event
-                background_tasks.add_task(run_broadcast, WebSocketEvents.SALE_COMPLETED, {
-                    "id": new_sale.id,
-                    "total_amount": float(new_sale.total_amount),
-                    "currency": new_sale.currency,
-                    "payment_method": new_sale.payment_method,
-                    "customer_id": new_sale.customer_id,
-                    "date": new_sale.date.isoformat() if new_sale.date else None
+            # Emit Stock Update Events (event bus coalesces them into one batch message)
+            for p_info in updated_products_info:
+                event_bus.publish(WebSocketEvents.PRODUCT_UPDATED, p_info)
+                event_bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
+                    "id": p_info["id"], 
+                    "stock": p_info["stock"],
+                    "warehouse_id": warehouse_id  # Lets cashiers subscribe to their own warehouse
                 })
-                
-                # AUTO-PRINT TICKET
-                # REMOVED: Server-side printing is incompatible with SaaS architecture.
-                # Client (Frontend) is now responsible for initiating print via local bridge.
-                # background_tasks.add_task(print_sale_ticket, new_sale.id)
+            
+            # Emit Sale Event
+            event_bus.publish(WebSocketEvents.SALE_COMPLETED, {
+                "id": new_sale.id,
+                "total_amount": float(new_sale.total_amount),
+                "currency": new_sale.currency,
+                "payment_method": new_sale.payment_method,
+                "customer_id": new_sale.customer_id,
+                "date": new_sale.date.isoformat() if new_sale.date else None
+            })
+            
+            # Desktop mode: let the background sync push the new sale right away
+            sync_daemon.notify_pending()
+
+            # AUTO-PRINT TICKET
+            # REMOVED: Server-side printing is incompatible with SaaS architecture.
+            # Client (Frontend) is now responsible for initiating print via local bridge.
                 
             return {"status": "success", "sale_id": new_sale.id}
         
@@ -350,10 +350,7 @@ class SalesService:
             raise HTTPException(status_code=404, detail="Sale not found")
         
         # Get business info
-        business_config = {}
-        configs = db.query(models.BusinessConfig).all()
-        for config in configs:
-            business_config[config.key] = config.value
+        business_config = config_store.snapshot(db)
             
         # Get ticket template
         template = business_config.get('ticket_template')
@@ -0,0 +1,171 @@
+"""
+Sales Sync (server side)
+Set-based ingestion of offline sales for /sync/push/sales.
+
+A branch that was offline for a day pushes thousands of sales at once, so
+the batch is handled with a constant number of statements instead of a few
+per sale:
+
+1. One IN query for uuids already stored (idempotency) and one for the
+   referenced products (which also gives the cost snapshot of each line).
+2. The whole batch inserted inside one savepoint: sales with
+   INSERT ... RETURNING, details and payments as executemany.
+3. If that fails, each sale is retried in its own savepoint so a bad sale
+   is reported without discarding the rest of the batch.
+4. Stock deltas aggregated per product and applied with one UPDATE per
+   distinct product, in the same savepoint as the rows they belong to,
+   together with the daily report rollups (sales_rollups).
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+from ..models import models
+from .. import schemas
+from . import bulk_upsert, cash_ledger, sales_rollups, stock_ledger
+
+_sales = models.Sale.__table__
+_details = models.SaleDetail.__table__
+_payments = models.SalePayment.__table__
+
+
+def _sale_row(sale_data: schemas.SaleCreate, now: datetime) -> Dict[str, Any]:
+    return {
+        "date": now,  # Server time; the offline timestamp is not sent yet
+        "total_amount": sale_data.total_amount,
+        "payment_method": sale_data.payment_method,
+        "currency": sale_data.currency,
+        "exchange_rate_used": sale_data.exchange_rate,
+        "customer_id": sale_data.customer_id,
+        "is_credit": sale_data.is_credit,
+        "notes": sale_data.notes,
+        # HYBRID FIELDS
+        "unique_uuid": sale_data.unique_uuid,
+        "sync_status": "SYNCED",  # It's now safe in the cloud
+        "is_offline_sale": True,
+    }
+
+
+def _product_costs(db: Session, product_ids) -> Dict[int, Decimal]:
+    """Current cost_price of the referenced products (missing ids are unknown products)"""
+    product_ids = list(product_ids)
+    costs = {}
+    for start in range(0, len(product_ids), bulk_upsert.IN_CHUNK):
+        chunk = product_ids[start:start + bulk_upsert.IN_CHUNK]
+        costs.update(db.query(models.Product.id, models.Product.cost_price).filter(models.Product.id.in_(chunk)))
+    return costs
+
+
+def _insert_sales(db: Session, sales: List[schemas.SaleCreate], costs: Dict[int, Decimal]):
+    """Sales, details and payments for a list of sales, as bulk statements; returns the new sale ids"""
+    if not sales:
+        return []
+    now = datetime.now()
+    ids_by_uuid = bulk_upsert.insert_returning_keys(db, _sales, [_sale_row(s, now) for s in sales], "unique_uuid")
+    sale_ids = [ids_by_uuid[s.unique_uuid] for s in sales]
+
+    details = [
+        {
+            "sale_id": sale_id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "unit_price": item.unit_price,
+            # COGS snapshot: detail quantity is in sold units, cost_price is per base unit
+            "unit_cost": (costs.get(item.product_id) or 0) * item.conversion_factor,
+            "subtotal": item.subtotal,
+            "discount": item.discount,
+            "discount_type": item.discount_type,
+            "tax_rate": item.tax_rate,
+        }
+        for sale_id, sale_data in zip(sale_ids, sales) for item in sale_data.items
+    ]
+    payments = [
+        {
+            "sale_id": sale_id,
+            "amount": payment.amount,
+            "currency": payment.currency,
+            "payment_method": payment.payment_method,
+            "exchange_rate": payment.exchange_rate,
+        }
+        for sale_id, sale_data in zip(sale_ids, sales) for payment in sale_data.payments
+    ]
+    conn = db.connection()
+    if details:
+        conn.execute(_details.insert(), details)
+    if payments:
+        conn.execute(_payments.insert(), payments)
+    return sale_ids
+
+
+def _stock_deltas(sales: List[schemas.SaleCreate]) -> Dict[int, Decimal]:
+    deltas = defaultdict(Decimal)
+    for sale_data in sales:
+        for item in sale_data.items:
+            # We trust the cloud stock is the master, but we apply the subtraction (base units)
+            deltas[item.product_id] -= item.quantity * item.conversion_factor
+    return deltas
+
+
+def _store(db: Session, sales: List[schemas.SaleCreate], costs: Dict[int, Decimal]):
+    """Rows and stock for some sales, inside one savepoint"""
+    with db.begin_nested():
+        sale_ids = _insert_sales(db, sales, costs)
+        # Stock Deduction (CRITICAL): one UPDATE per distinct product
+        stock_ledger.apply_deltas(db, _stock_deltas(sales))
+        sales_rollups.record_sales(db, sale_ids)
+        for start in range(0, len(sale_ids), bulk_upsert.IN_CHUNK):
+            chunk = sale_ids[start:start + bulk_upsert.IN_CHUNK]
+            cash_ledger.record_payments(db, [models.SalePayment.sale_id.in_(chunk)])
+
+
+def push_sales(db: Session, sales_batch: List[schemas.SaleCreate]) -> Dict[str, Any]:
+    """Store a batch of offline sales and commit; returns processed/skipped/errors"""
+    results = {"processed": 0, "skipped": 0, "errors": []}
+
+    # 1. IDEMPOTENCY (The Golden Rule): one query for the whole batch
+    seen = bulk_upsert.existing_ids(
+        db, _sales, {s.unique_uuid for s in sales_batch if s.unique_uuid}, column="unique_uuid"
+    )
+    pending = []
+    for sale_data in sales_batch:
+        if sale_data.unique_uuid:
+            if sale_data.unique_uuid in seen:
+                results["skipped"] += 1
+                continue
+            seen.add(sale_data.unique_uuid)  # Same uuid twice in one batch
+        else:
+            # Older clients: give the sale an identity so inserted rows can be matched back
+            sale_data.unique_uuid = str(uuid.uuid4())
+        pending.append(sale_data)
+
+    # Unknown products would only fail at commit (or never, on SQLite): reject those sales up front
+    costs = _product_costs(db, {item.product_id for s in pending for item in s.items})
+    known_products = set(costs)
+    valid = []
+    for sale_data in pending:
+        missing = sorted({item.product_id for item in sale_data.items} - known_products)
+        if missing:
+            results["errors"].append({"uuid": sale_data.unique_uuid, "error": f"Unknown products: {missing}"})
+        else:
+            valid.append(sale_data)
+
+    # 2. Whole batch at once; 3. one savepoint per sale if anything in it fails
+    stored = []
+    try:
+        _store(db, valid, costs)
+        stored = valid
+    except Exception as e:
+        print(f"[SYNC] Batch insert failed ({e}), retrying sale by sale")
+        for sale_data in valid:
+            try:
+                _store(db, [sale_data], costs)
+                stored.append(sale_data)
+            except Exception as sale_error:
+                print(f"[ERROR] ERROR PROCESSING SALE {sale_data.unique_uuid}: {sale_error}")
+                results["errors"].append({"uuid": sale_data.unique_uuid, "error": str(sale_error)})
+
+    db.commit()
+    results["processed"] = len(stored)
+    return results
@@ -0,0 +1,334 @@
+"""
+Scan Index
+In-process lookup table behind /products/scan/{code}.
+
+A scan resolves a code to a product (SKU) or to one of its presentations
+(ProductUnit.barcode); typing resolves a name prefix (accents and case
+folded). Each worker keeps what the POS needs to put the item in the cart:
+product and unit ids, conversion factor, price and stock per warehouse.
+A lookup is a couple of dict accesses and never touches the database.
+
+Keeping it fresh:
+- rebuild() loads the whole active catalog at startup, and again every
+  SCAN_INDEX_REBUILD_INTERVAL as a safety net.
+- Each session collects the ids of products whose row, units or stock it
+  changed; they are marked dirty when the transaction commits (see
+  services/change_tracker.py; Core updates such as stock_ledger call touch()).
+- Product events delivered by the event bus, other workers' included, also
+  mark their ids dirty.
+- The background loop reloads dirty products every SCAN_INDEX_REFRESH_INTERVAL.
+"""
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import models
+from ..websocket.event_bus import event_bus
+from ..websocket.events import WebSocketEvents
+from . import change_tracker
+from .bulk_upsert import IN_CHUNK
+
+# stocks: (warehouse_id, quantity, warehouse_id, quantity, ...); unit_ids: units of the product in the index
+ProductEntry = namedtuple("ProductEntry", ["id", "name", "sku", "unit_type", "price", "stock", "stocks", "unit_ids"])
+# price: the unit's own USD price, None when it follows the product price times the factor
+UnitEntry = namedtuple("UnitEntry", ["id", "product_id", "unit_name", "conversion_factor", "price", "barcode"])
+
+PRODUCT_EVENTS = {
+    WebSocketEvents.PRODUCT_CREATED, WebSocketEvents.PRODUCT_UPDATED, WebSocketEvents.PRODUCT_DELETED,
+    WebSocketEvents.PRODUCT_STOCK_UPDATED, WebSocketEvents.PRODUCT_LOW_STOCK, WebSocketEvents.PRODUCT_OUT_OF_STOCK,
+}
+ONE = Decimal("1")
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper()
+
+
+def _code_key(code: str) -> str:
+    """normalize_code, reusing the string itself when it is already normalized (one copy in memory)"""
+    key = normalize_code(code)
+    return code if key == code else key
+
+
+def normalize_name(name: str) -> str:
+    """Lower case, no accents, single spaces: "Martillo  de UÑA" -> "martillo de una" """
+    folded = unicodedata.normalize("NFKD", name)
+    return " ".join("".join(c for c in folded if not unicodedata.combining(c)).casefold().split())
+
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), IN_CHUNK):
+        yield ids[start:start + IN_CHUNK]
+
+
+class _Interner:
+    """Shares equal Decimals (of the same scale) between entries: prices and stock levels repeat a lot"""
+
+    def __init__(self):
+        self._values = {}
+
+    def __call__(self, value: Optional[Decimal]) -> Decimal:
+        value = Decimal("0") if value is None else value
+        return self._values.setdefault((value, value.as_tuple().exponent), value)
+
+
+def load_entries(db: Session, product_ids: Optional[Iterable[int]] = None):
+    """Active products (all, or those of `product_ids`) as ({id: ProductEntry}, {id: UnitEntry})"""
+    Product, Unit, Stock = models.Product, models.ProductUnit, models.ProductStock
+    shared = _Interner()
+    if product_ids is None:
+        filters = [[]]
+    else:
+        filters = [[Product.id.in_(chunk)] for chunk in _chunks(sorted(product_ids))]
+
+    products, units, stocks, unit_ids = {}, {}, {}, {}
+    for where in filters:
+        active = [Product.is_active == True, *where]
+        for row in db.query(Stock.product_id, Stock.warehouse_id, Stock.quantity).join(Product).filter(*active):
+            stocks.setdefault(row.product_id, []).extend((row.warehouse_id, shared(row.quantity)))
+        for row in db.query(Product.id, Product.name, Product.sku, Product.unit_type, Product.price,
+                            Product.stock).filter(*active):
+            products[row.id] = row
+        for row in db.query(Unit.id, Unit.product_id, Unit.unit_name, Unit.conversion_factor, Unit.price_usd,
+                            Unit.barcode).join(Product).filter(*active):
+            factor = shared(row.conversion_factor or ONE)
+            price = shared(row.price_usd) if row.price_usd is not None else None
+            units[row.id] = UnitEntry(row.id, row.product_id, sys.intern(row.unit_name or ""), factor, price,
+                                      row.barcode)
+            unit_ids.setdefault(row.product_id, []).append(row.id)
+
+    entries = {
+        pid: ProductEntry(pid, row.name or "", row.sku, sys.intern(row.unit_type or ""),
+                          shared(row.price), shared(row.stock), tuple(stocks.get(pid, ())),
+                          tuple(unit_ids.get(pid, ())))
+        for pid, row in products.items()
+    }
+    return entries, units
+
+
+class ScanIndex:
+    """
+    codes: normalized SKU -> product id, normalized unit barcode -> -unit id
+    (one int per code; a SKU wins over an equal barcode). names: sorted
+    (normalized name, product id) pairs for prefix search.
+    """
+
+    def __init__(self, session_factory=None, refresh_interval: float = None, rebuild_interval: float = None):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval or settings.SCAN_INDEX_REFRESH_INTERVAL
+        self.rebuild_interval = rebuild_interval or settings.SCAN_INDEX_REBUILD_INTERVAL
+        self._lock = threading.Lock()
+        self._codes: Dict[str, int] = {}
+        self._products: Dict[int, ProductEntry] = {}
+        self._units: Dict[int, UnitEntry] = {}
+        self._names: List[tuple] = []
+        self._dirty: Set[int] = set()
+        self._task = None
+        self._listening = False
+        self._next_rebuild = 0.0
+        self.ready = False
+        self.built_at = None
+        self.refreshes = 0
+
+    # ---------- Loading ----------
+
+    def _session(self):
+        if self.session_factory is None:
+            return change_tracker.primary_session()
+        return self.session_factory()
+
+    def rebuild(self, db: Session = None) -> int:
+        """Reload the whole catalog and swap it in; returns the number of products"""
+        own = db is None
+        db = self._session() if own else db
+        try:
+            products, units = load_entries(db)
+        finally:
+            if own:
+                db.close()
+
+        codes = {}
+        for unit in units.values():
+            if unit.barcode:
+                codes[_code_key(unit.barcode)] = -unit.id
+        for product in products.values():
+            if product.sku:
+                codes[_code_key(product.sku)] = product.id
+        names = sorted((normalize_name(p.name), p.id) for p in products.values())
+
+        with self._lock:
+            self._codes, self._products, self._units, self._names = codes, products, units, names
+            self.ready = True
+        self.built_at = time.time()
+        self._next_rebuild = time.monotonic() + self.rebuild_interval
+        return len(products)
+
+    def mark_dirty(self, product_ids: Iterable[int]):
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def refresh(self, db: Session = None) -> int:
+        """Reload the products marked dirty; returns how many were reloaded"""
+        with self._lock:
+            ids, self._dirty = self._dirty, set()
+        if not ids:
+            return 0
+        own = db is None
+        try:
+            db = self._session() if own else db
+            try:
+                products, units = load_entries(db, ids)
+            finally:
+                if own:
+                    db.close()
+        except Exception:
+            self.mark_dirty(ids)  # Try again next round
+            raise
+
+        with self._lock:
+            for pid in ids:
+                self._remove(pid)
+                if pid in products:
+                    self._add(products[pid], [units[uid] for uid in products[pid].unit_ids])
+        self.refreshes += 1
+        return len(ids)
+
+    def _remove(self, product_id: int):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        if product.sku and self._codes.get(normalize_code(product.sku)) == product_id:
+            del self._codes[normalize_code(product.sku)]
+        for unit_id in product.unit_ids:
+            unit = self._units.pop(unit_id)
+            if unit.barcode and self._codes.get(normalize_code(unit.barcode)) == -unit_id:
+                del self._codes[normalize_code(unit.barcode)]
+        name = (normalize_name(product.name), product_id)
+        i = bisect.bisect_left(self._names, name)
+        if i < len(self._names) and self._names[i] == name:
+            del self._names[i]
+
+    def _add(self, product: ProductEntry, units: List[UnitEntry]):
+        self._products[product.id] = product
+        for unit in units:
+            self._units[unit.id] = unit
+            if unit.barcode:
+                code = _code_key(unit.barcode)
+                if self._codes.get(code, -1) < 0:
+                    self._codes[code] = -unit.id
+        if product.sku:
+            self._codes[_code_key(product.sku)] = product.id
+        bisect.insort(self._names, (normalize_name(product.name), product.id))
+
+    # ---------- Lookups (no database) ----------
+
+    @staticmethod
+    def _item(product: ProductEntry, unit: Optional[UnitEntry], warehouse_id: Optional[int]) -> Dict[str, Any]:
+        stocks = dict(zip(product.stocks[::2], product.stocks[1::2]))
+        return {
+            "product_id": product.id,
+            "unit_id": unit.id if unit else None,
+            "name": product.name,
+            "sku": product.sku,
+            "barcode": unit.barcode if unit else None,
+            "unit_name": unit.unit_name if unit else product.unit_type,
+            "conversion_factor": unit.conversion_factor if unit else ONE,
+            "price": product.price if unit is None else (
+                unit.price if unit.price is not None else product.price * unit.conversion_factor),
+            "stock": product.stock,
+            "warehouse_stock": stocks.get(warehouse_id, Decimal("0")) if warehouse_id is not None else None,
+            "stocks": stocks,
+        }
+
+    def lookup(self, code: str, warehouse_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Exact SKU or unit barcode"""
+        with self._lock:
+            key = self._codes.get(normalize_code(code))
+            if key is None:
+                return None
+            if key > 0:
+                return self._item(self._products[key], None, warehouse_id)
+            unit = self._units[-key]
+            return self._item(self._products[unit.product_id], unit, warehouse_id)
+
+    def search_name(self, prefix: str, warehouse_id: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Products whose normalized name starts with `prefix`, alphabetically"""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        items = []
+        with self._lock:
+            i = bisect.bisect_left(self._names, (key,))
+            while i < len(self._names) and len(items) < limit and self._names[i][0].startswith(key):
+                items.append(self._item(self._products[self._names[i][1]], None, warehouse_id))
+                i += 1
+        return items
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "products": len(self._products), "units": len(self._units),
+                "codes": len(self._codes), "pending": len(self._dirty), "refreshes": self.refreshes,
+                "built_at": self.built_at}
+
+    # ---------- Change feed ----------
+
+    def on_event(self, event_type: str, data: Dict[str, Any]):
+        """Event bus listener: product events mark their product dirty"""
+        if event_type == WebSocketEvents.PRODUCT_BATCH_UPDATED:
+            for item in data.get("events", []):
+                self.on_event(item["type"], item["data"])
+        elif event_type in PRODUCT_EVENTS and isinstance(data, dict) and data.get("id") is not None:
+            self.mark_dirty([data["id"]])
+
+    # ---------- Background loop (app loop) ----------
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        if not self._listening:
+            event_bus.add_listener(self.on_event)
+            self._listening = True
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=5.0)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if time.monotonic() >= self._next_rebuild:
+                    started = time.perf_counter()
+                    count = await asyncio.to_thread(self.rebuild)
+                    print(f"[SCAN] Index built: {count} products in {time.perf_counter() - started:.2f}s")
+                elif self._dirty:
+                    await asyncio.to_thread(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[SCAN] Index refresh failed: {type(e).__name__}: {e}")
+                if not self.ready:
+                    self._next_rebuild = time.monotonic() + 10  # Tables may still be migrating
+            await asyncio.sleep(self.refresh_interval)
+
+
+tracker = change_tracker.ChangeTracker(
+    "scan_index",
+    {
+        models.Product: lambda product: product.id,
+        models.ProductUnit: lambda unit: unit.product_id,
+        models.ProductStock: lambda stock: stock.product_id,
+    },
+    lambda session, ids: scan_index.mark_dirty(ids),
+)
+touch = tracker.touch  # Core writes to products, units or stock: scan_index.touch(db, product_ids)
+
+scan_index = ScanIndex()
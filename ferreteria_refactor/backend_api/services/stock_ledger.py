@@ -0,0 +1,193 @@
+"""
+Stock Ledger
+Atomic stock mutations expressed as single conditional UPDATE statements.
+
+Instead of loading an ORM object and doing ``stock.quantity -= x`` in Python
+(read-modify-write: a stale read unless the row is locked with SELECT ... FOR
+UPDATE first), every change is pushed to the database as:
+
+    UPDATE product_stocks SET quantity = quantity - :n
+    WHERE product_id = :p AND warehouse_id = :w AND quantity >= :n
+    RETURNING quantity
+
+so the check and the decrement are one atomic step and no update is lost.
+Dialects without UPDATE ... RETURNING (SQLite < 3.35) fall back to UPDATE +
+rowcount + SELECT inside the same transaction.
+
+The UPDATE still locks what it writes until the transaction ends: the row on
+Postgres, the whole database on SQLite. All functions run inside the
+caller's transaction and the caller commits, so keep the work between the
+first stock change and the commit short; reserve() takes rows in ascending
+product id order so concurrent sales queue instead of deadlocking.
+Touched products are reported to the scan index (services/scan_index.py).
+"""
+from collections import namedtuple
+from decimal import Decimal
+from typing import Dict, Optional
+from sqlalchemy import bindparam, select, update, insert, func
+from sqlalchemy.orm import Session
+from ..models import models
+from . import catalog_sync, scan_index
+
+# warehouse_quantity is None when the change only touched the legacy product total
+StockLevel = namedtuple("StockLevel", ["warehouse_quantity", "total_stock"])
+
+_stocks = models.ProductStock.__table__
+_products = models.Product.__table__
+
+
+class InsufficientStock(Exception):
+    """Raised by reserve() when a product cannot cover the requested quantity."""
+
+    def __init__(self, product_id: int, requested: Decimal, available: Decimal):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Insufficient stock for product {product_id}: requested {requested}, available {available}")
+
+
+def _as_decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _supports_returning(db: Session) -> bool:
+    return bool(getattr(db.get_bind().dialect, "update_returning", False))
+
+
+def _execute_returning(db: Session, stmt, column, select_stmt):
+    """Run an UPDATE and return the new value of `column` (None if no row matched)."""
+    if _supports_returning(db):
+        return db.execute(stmt.returning(column)).scalar()
+
+    # SQLite fallback: rowcount tells us if the condition matched, then read back
+    result = db.execute(stmt)
+    if result.rowcount == 0:
+        return None
+    return db.execute(select_stmt).scalar()
+
+
+def _change_warehouse(db: Session, product_id: int, warehouse_id: int, delta: Decimal, conditional: bool):
+    scan_index.touch(db, [product_id])
+    where = [_stocks.c.product_id == product_id, _stocks.c.warehouse_id == warehouse_id]
+    if conditional:
+        where.append(_stocks.c.quantity >= -delta)
+
+    stmt = update(_stocks).where(*where).values(quantity=func.coalesce(_stocks.c.quantity, 0) + delta)
+    select_stmt = select(_stocks.c.quantity).where(*where[:2]).order_by(_stocks.c.id).limit(1)
+    return _execute_returning(db, stmt, _stocks.c.quantity, select_stmt)
+
+
+def _change_total(db: Session, product_id: int, delta: Decimal, conditional: bool):
+    scan_index.touch(db, [product_id])
+    where = [_products.c.id == product_id]
+    if conditional:
+        where.append(_products.c.stock >= -delta)
+
+    stmt = update(_products).where(*where).values(stock=func.coalesce(_products.c.stock, 0) + delta)
+    select_stmt = select(_products.c.stock).where(_products.c.id == product_id)
+    return _execute_returning(db, stmt, _products.c.stock, select_stmt)
+
+
+def available(db: Session, product_id: int, warehouse_id: Optional[int] = None) -> Decimal:
+    """Current quantity (warehouse row if warehouse_id is given, else legacy total)."""
+    if warehouse_id is not None:
+        qty = db.execute(
+            select(_stocks.c.quantity).where(
+                _stocks.c.product_id == product_id, _stocks.c.warehouse_id == warehouse_id
+            ).order_by(_stocks.c.id).limit(1)
+        ).scalar()
+    else:
+        qty = db.execute(select(_products.c.stock).where(_products.c.id == product_id)).scalar()
+    return qty if qty is not None else Decimal("0")
+
+
+def decrement(db: Session, product_id: int, quantity: Decimal, warehouse_id: Optional[int] = None,
+              update_total: bool = True) -> Optional[StockLevel]:
+    """
+    Take `quantity` base units out of stock if (and only if) it is available.
+
+    With warehouse_id the condition applies to the warehouse row and the legacy
+    Product.stock total follows unconditionally; without it the condition applies
+    to Product.stock. Returns the new levels, or None when stock is insufficient
+    (nothing is changed in that case).
+    """
+    delta = -_as_decimal(quantity)
+
+    if warehouse_id is None:
+        total = _change_total(db, product_id, delta, conditional=True)
+        return StockLevel(None, total) if total is not None else None
+
+    warehouse_qty = _change_warehouse(db, product_id, warehouse_id, delta, conditional=True)
+    if warehouse_qty is None:
+        return None
+
+    total = None
+    if update_total:
+        total = _change_total(db, product_id, delta, conditional=False)
+    else:
+        catalog_sync.touch(db, [product_id])  # The product row (and its updated_at) is left alone
+    return StockLevel(warehouse_qty, total)
+
+
+def increment(db: Session, product_id: int, quantity: Decimal, warehouse_id: Optional[int] = None,
+              update_total: bool = True) -> StockLevel:
+    """Put `quantity` base units into stock, creating the warehouse row if missing."""
+    delta = _as_decimal(quantity)
+    warehouse_qty = None
+
+    if warehouse_id is not None:
+        warehouse_qty = _change_warehouse(db, product_id, warehouse_id, delta, conditional=False)
+        if warehouse_qty is None:
+            db.execute(insert(_stocks).values(product_id=product_id, warehouse_id=warehouse_id, quantity=delta))
+            warehouse_qty = delta
+
+    total = None
+    if warehouse_id is None or update_total:
+        total = _change_total(db, product_id, delta, conditional=False)
+    else:
+        catalog_sync.touch(db, [product_id])
+    return StockLevel(warehouse_qty, total)
+
+
+def apply_deltas(db: Session, deltas: Dict[int, Decimal]) -> int:
+    """
+    Unconditionally add signed deltas to Product.stock, one UPDATE per product
+    sent as a single executemany (ascending product id, same lock order as
+    reserve()). For movements that already happened elsewhere, e.g. offline
+    sales, where the stock may legitimately go negative. Returns rows touched.
+    """
+    rows = [
+        {"_product_id": product_id, "_delta": _as_decimal(delta)}
+        for product_id, delta in sorted(deltas.items()) if delta
+    ]
+    if not rows:
+        return 0
+    scan_index.touch(db, [row["_product_id"] for row in rows])
+    stmt = update(_products).where(_products.c.id == bindparam("_product_id")).values(
+        stock=func.coalesce(_products.c.stock, 0) + bindparam("_delta", type_=_products.c.stock.type)
+    )
+    db.connection().execute(stmt, rows)
+    return len(rows)
+
+
+def reserve(db: Session, quantities: Dict[int, Decimal], warehouse_id: Optional[int] = None,
+            update_total: bool = True) -> Dict[int, StockLevel]:
+    """
+    All-or-nothing decrement of several products.
+
+    Rows are updated in ascending product id order so concurrent reservations
+    always lock in the same sequence. If any product is short, the decrements
+    already applied are reverted and InsufficientStock is raised.
+    """
+    applied = {}
+    levels = {}
+    for product_id in sorted(quantities):
+        qty = quantities[product_id]
+        level = decrement(db, product_id, qty, warehouse_id=warehouse_id, update_total=update_total)
+        if level is None:
+            for done_id, done_qty in applied.items():
+                increment(db, done_id, done_qty, warehouse_id=warehouse_id, update_total=update_total)
+            raise InsufficientStock(product_id, qty, available(db, product_id, warehouse_id))
+        applied[product_id] = qty
+        levels[product_id] = level
+    return levels
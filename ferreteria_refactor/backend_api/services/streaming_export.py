@@ -0,0 +1,339 @@
+"""
+Streaming Export
+XLSX and CSV downloads that are written while the rows are read.
+
+openpyxl (even in write_only mode) and pandas keep the workbook until
+save(), so a year of sales used to sit in memory twice before the first
+byte left the server. Here each sheet is serialised as SpreadsheetML
+straight into a zip stream: rows come from a server-side cursor
+(yield_per), go through a deflate stream and are handed to
+StreamingResponse in ~64 KB chunks. Memory stays flat whatever the row
+count, and the download starts as soon as the first sheet has rows.
+
+Sheets are written one after the other, so summary sheets must be
+computed first (they are small: SQL aggregates). A small fixed set of
+named styles covers the report look: blue headers, bold totals, money
+format, and the red/green shortage/overage marks of the cash audit.
+"""
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+CHUNK_BYTES = 64 * 1024
+YIELD_PER = 2000  # Rows fetched per round trip from the server-side cursor
+
+_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# ---------- Styles ----------
+# Index in each list = id referenced by the cell formats below
+
+_FONTS = [
+    '<font><sz val="11"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="12"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="14"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="11"/><color rgb="FFCC0000"/><name val="Calibri"/></font>',
+    '<font><b/><sz val="11"/><color rgb="FF00CC00"/><name val="Calibri"/></font>',
+]
+
+
+def _solid(rgb: str) -> str:
+    return f'<fill><patternFill patternType="solid"><fgColor rgb="FF{rgb}"/><bgColor rgb="FF{rgb}"/></patternFill></fill>'
+
+
+_FILLS = [
+    '<fill><patternFill patternType="none"/></fill>',
+    '<fill><patternFill patternType="gray125"/></fill>',
+    _solid("4472C4"),
+    _solid("3366FF"),
+    _solid("FFE6E6"),
+    _solid("E6FFE6"),
+]
+_BORDERS = [
+    '<border><left/><right/><top/><bottom/><diagonal/></border>',
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>',
+]
+_MONEY_FORMAT = 164
+
+# name: (font, fill, border, number format, centred)
+STYLES = {
+    "default": (0, 0, 0, 0, False),
+    "header": (2, 2, 0, 0, True),  # Dashboard headers
+    "header_small": (3, 2, 0, 0, True),  # Detail sheet headers
+    "header_box": (3, 3, 1, 0, True),  # Boxed table headers
+    "title": (5, 0, 0, 0, True),
+    "subtitle": (4, 0, 0, 0, False),
+    "bold": (1, 0, 0, 0, False),
+    "bold_money": (1, 0, 0, _MONEY_FORMAT, False),
+    "money": (0, 0, 0, _MONEY_FORMAT, False),
+    "box": (0, 0, 1, 0, False),
+    "box_money": (0, 0, 1, _MONEY_FORMAT, False),
+    "shortage": (0, 4, 0, 0, False),
+    "overage": (0, 5, 0, 0, False),
+    "shortage_mark": (6, 4, 0, 0, False),
+    "overage_mark": (7, 5, 0, 0, False),
+}
+_STYLE_IDS = {name: index for index, name in enumerate(STYLES)}
+
+
+def _stylesheet() -> str:
+    xfs = []
+    for font, fill, border, num_fmt, centred in STYLES.values():
+        attrs = f'numFmtId="{num_fmt}" fontId="{font}" fillId="{fill}" borderId="{border}" xfId="0"'
+        for flag, used in (("applyFont", font), ("applyFill", fill), ("applyBorder", border), ("applyNumberFormat", num_fmt)):
+            if used:
+                attrs += f' {flag}="1"'
+        if centred:
+            xfs.append(f'<xf {attrs} applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>')
+        else:
+            xfs.append(f"<xf {attrs}/>")
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<numFmts count="1"><numFmt numFmtId="{_MONEY_FORMAT}" formatCode="&quot;$&quot;#,##0.00"/></numFmts>'
+        f'<fonts count="{len(_FONTS)}">{"".join(_FONTS)}</fonts>'
+        f'<fills count="{len(_FILLS)}">{"".join(_FILLS)}</fills>'
+        f'<borders count="{len(_BORDERS)}">{"".join(_BORDERS)}</borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="{len(xfs)}">{"".join(xfs)}</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+
+
+# ---------- Sheets ----------
+
+@dataclass
+class Cell:
+    """A value with a named style (see STYLES)"""
+    value: Any
+    style: str = "default"
+
+
+@dataclass
+class Sheet:
+    """
+    One worksheet. `rows` may be any iterable (a generator over a cursor is
+    consumed lazily); items are plain values or Cell. widths are column
+    widths in characters; merges are ranges like "A1:C1"; auto_filter puts
+    a filter on the whole table (first row = header).
+    """
+    title: str
+    rows: Iterable[Sequence[Any]]
+    widths: Optional[List[float]] = None
+    merges: List[str] = field(default_factory=list)
+    auto_filter: bool = False
+
+
+def column_letter(index: int) -> str:
+    """1 -> A, 27 -> AA"""
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+_LETTERS = [column_letter(i) for i in range(1, 257)]
+
+
+def fit_widths(rows: List[Sequence[Any]], limit: int = 50) -> List[float]:
+    """Column widths from the longest value (for small, fully known sheets)"""
+    widths: List[float] = []
+    for row in rows:
+        for index, value in enumerate(row):
+            if isinstance(value, Cell):
+                value = value.value
+            length = len(str(value)) if value is not None else 0
+            if index >= len(widths):
+                widths.append(0)
+            widths[index] = max(widths[index], length)
+    return [min(width + 2, limit) for width in widths]
+
+
+def _cell_xml(ref: str, value: Any, style: int) -> str:
+    s = f' s="{style}"' if style else ""
+    if value is None:
+        return f'<c r="{ref}"{s}/>' if style else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"{s}><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%d %H:%M")
+    elif isinstance(value, date):
+        value = value.isoformat()
+    text = escape(_ILLEGAL.sub("", str(value)))
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row_xml(number: int, values: Sequence[Any]) -> str:
+    cells = []
+    for index, value in enumerate(values):
+        style = 0
+        if isinstance(value, Cell):
+            style = _STYLE_IDS[value.style]
+            value = value.value
+        letter = _LETTERS[index] if index < len(_LETTERS) else column_letter(index + 1)
+        cells.append(_cell_xml(f"{letter}{number}", value, style))
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+class _Sink:
+    """Write-only file object for ZipFile; bytes are collected until drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _workbook_parts(titles: List[str]) -> Dict[str, str]:
+    sheets = "".join(
+        f'<sheet name="{escape(title)}" sheetId="{i}" r:id="rId{i}"/>' for i, title in enumerate(titles, 1)
+    )
+    rels = "".join(
+        f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(titles) + 1)
+    )
+    n = len(titles) + 1
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(titles) + 1)
+    )
+    return {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{overrides}</Types>'
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{rels}<Relationship Id="rId{n}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ),
+        "xl/styles.xml": _stylesheet(),
+    }
+
+
+def _sheet_head(sheet: Sheet) -> str:
+    head = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">')
+    if sheet.widths:
+        cols = "".join(
+            f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>' for i, width in enumerate(sheet.widths, 1)
+        )
+        head += f"<cols>{cols}</cols>"
+    return head + "<sheetData>"
+
+
+def _sheet_tail(sheet: Sheet, last_row: int, last_column: int) -> str:
+    tail = "</sheetData>"
+    if sheet.auto_filter and last_row and last_column:
+        tail += f'<autoFilter ref="A1:{column_letter(last_column)}{last_row}"/>'
+    if sheet.merges:
+        tail += f'<mergeCells count="{len(sheet.merges)}">'
+        tail += "".join(f'<mergeCell ref="{ref}"/>' for ref in sheet.merges)
+        tail += "</mergeCells>"
+    return tail + "</worksheet>"
+
+
+def stream_xlsx(sheets: List[Sheet], chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield the bytes of an .xlsx file as its sheets' rows are consumed"""
+    sink = _Sink()
+    titles = [sheet.title[:31] for sheet in sheets]  # Excel's sheet name limit
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as book:
+        for name, xml in _workbook_parts(titles).items():
+            book.writestr(name, xml)
+        for number, sheet in enumerate(sheets, 1):
+            with book.open(f"xl/worksheets/sheet{number}.xml", "w") as part:
+                part.write(_sheet_head(sheet).encode("utf-8"))
+                buffer = []
+                pending = 0
+                row_number = last_column = 0
+                for row_number, values in enumerate(sheet.rows, 1):
+                    last_column = max(last_column, len(values))
+                    xml = _row_xml(row_number, values)
+                    buffer.append(xml)
+                    pending += len(xml)
+                    if pending >= chunk_bytes:
+                        part.write("".join(buffer).encode("utf-8"))
+                        buffer.clear()
+                        pending = 0
+                        if sink.size >= chunk_bytes:
+                            yield sink.drain()
+                part.write(("".join(buffer) + _sheet_tail(sheet, row_number, last_column)).encode("utf-8"))
+            if sink.size >= chunk_bytes:
+                yield sink.drain()
+    yield sink.drain()
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, Cell):
+        value = value.value
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    return value
+
+
+def stream_csv(header: Sequence[str], rows: Iterable[Sequence[Any]], chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield a UTF-8 CSV (with BOM, so Excel detects the encoding) in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for values in rows:
+        writer.writerow([_csv_value(value) for value in values])
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def attachment(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f"attachment; filename={filename}"}
@@ -1,11 +1,16 @@
+import asyncio
 import httpx
+import json
 import os
+from contextlib import asynccontextmanager
 from decimal import Decimal
+from sqlalchemy import bindparam, update
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
 from ..models import models
 from .. import schemas
 from ..database.db import SessionLocal
+from . import auth_cache, bulk_upsert, config_store, product_search
 import datetime
 
 # ... (rest of imports/code unchanged until push_sales_to_cloud payload construction) ...
@@ -15,12 +20,196 @@ import datetime
 VPS_BASE_URL = os.getenv("VPS_URL", "https://ferreteria-vps.gamijoam.com/api/v1") # Placeholder
 # AUTH_TOKEN = ... # We might need a machine token
 
-async def pull_catalog_from_cloud(db: Session, vps_url: str = None):
-    """
-    Connects to the VPS and downloads the catalog (Products, Customers, etc.)
-    """
+# BusinessConfig key holding the cursor returned by the last complete catalog pull
+SYNC_CURSOR_KEY = "sync_catalog_cursor"
+
+
+def _get_sync_cursor(db: Session):
+    row = db.query(models.BusinessConfig).filter(models.BusinessConfig.key == SYNC_CURSOR_KEY).first()
+    return row.value if row and row.value else None
+
+
+def _store_sync_cursor(db: Session, cursor: str):
+    row = db.query(models.BusinessConfig).filter(models.BusinessConfig.key == SYNC_CURSOR_KEY).first()
+    if not row:
+        row = models.BusinessConfig(key=SYNC_CURSOR_KEY)
+        db.add(row)
+    row.value = cursor
+
+
+def _apply_deletions(db: Session, deleted: dict):
+    """Tombstones from the server: deactivate what local history may reference, drop the rest"""
+    if deleted.get("products"):
+        db.query(models.Product).filter(models.Product.id.in_(deleted["products"])).update(
+            {models.Product.is_active: False}, synchronize_session=False)
+    if deleted.get("exchange_rates"):
+        db.query(models.ExchangeRate).filter(models.ExchangeRate.id.in_(deleted["exchange_rates"])).update(
+            {models.ExchangeRate.is_active: False}, synchronize_session=False)
+    if deleted.get("users"):
+        db.query(models.User).filter(models.User.id.in_(deleted["users"])).update(
+            {models.User.is_active: False}, synchronize_session=False)
+    if deleted.get("customers"):
+        db.query(models.Customer).filter(models.Customer.id.in_(deleted["customers"])).update(
+            {models.Customer.is_blocked: True}, synchronize_session=False)
+    if deleted.get("categories"):
+        db.query(models.Category).filter(models.Category.id.in_(deleted["categories"])).delete(
+            synchronize_session=False)
+    return sum(len(ids) for ids in deleted.values())
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value) if value else datetime.datetime.now()
+
+
+def _category_row(c_data: dict, now):
+    return {"id": c_data['id'], "name": c_data['name'], "updated_at": now}
+
+
+def _rate_row(r_data: dict, now):
+    return {
+        "id": r_data['id'],
+        "name": r_data['name'],
+        "currency_code": r_data['currency_code'],
+        "currency_symbol": r_data['currency_symbol'],
+        "rate": r_data['rate'],
+        "is_default": r_data['is_default'],
+        "is_active": r_data['is_active'],
+        "updated_at": _parse_datetime(r_data.get('updated_at')),
+    }
+
+
+def _product_row(p_data: dict, now):
+    return {
+        "id": p_data['id'],  # Preserve ID
+        "name": p_data.get('name', 'Unknown'),
+        "description": p_data.get('description'),
+        "price": p_data.get('price', 0),
+        "stock": p_data.get('stock', 0),
+        "category_id": p_data.get('category_id'),
+        "exchange_rate_id": p_data.get('exchange_rate_id'),  # Crucial FK
+        "sku": p_data.get('sku'),
+        "is_active": p_data.get('is_active', True),
+        "image_url": p_data.get('image_url'),
+        "updated_at": now,
+    }
+
+
+def _unit_row(u_data: dict, product_id: int, now):
+    return {
+        "id": u_data['id'],
+        "product_id": product_id,
+        "unit_name": u_data.get('unit_name', 'Unit'),
+        "conversion_factor": u_data.get('conversion_factor', 1),
+        "price_usd": u_data.get('price_usd', u_data.get('price')),
+        "barcode": u_data.get('barcode'),
+        "is_default": u_data.get('is_default', False),
+        "updated_at": now,
+    }
+
+
+def _customer_row(c_data: dict, now):
+    return {
+        "id": c_data['id'],
+        "name": c_data.get('name', 'Unknown'),
+        "email": c_data.get('email'),
+        "phone": c_data.get('phone'),
+        "id_number": c_data.get('id_number', c_data.get('nit')),
+        "address": c_data.get('address'),
+        "unique_uuid": c_data.get('unique_uuid'),
+        "is_blocked": c_data.get('is_blocked', False),  # Unblocked on the server: sent again as live
+        "updated_at": now,
+    }
+
+
+def _user_row(u_data: dict, now):
+    return {
+        "id": u_data['id'],
+        "username": u_data['username'],
+        "role": u_data['role'],
+        "pin": u_data.get('pin'),
+        "is_active": True,  # Only live users are sent; deactivated ones come as tombstones
+        "updated_at": now,
+    }
+
+
+def _apply_users(db: Session, users_data: list, now, stats: bulk_upsert.IngestStats = None):
+    """Reactivations, role and PIN changes of users this terminal already has.
+    The payload carries no password hash, so unknown users are left to provisioning."""
+    if not users_data:
+        return
+    users = models.User.__table__
+    known = bulk_upsert.existing_ids(db, users, [u['id'] for u in users_data])
+    rows = [{**_user_row(u, now), "_id": u['id']} for u in users_data if u['id'] in known]
+    if rows:
+        db.connection().execute(
+            update(users).where(users.c.id == bindparam("_id")).values(
+                {name: bindparam(name) for name in rows[0] if name not in ("id", "_id")}),
+            rows
+        )
+        auth_cache.touch(db, [row["_id"] for row in rows])  # Core update: the session hooks don't see it
+    if stats is not None:
+        stats.add(users.name, inserted=0, updated=len(rows))
+
+
+# Tables written by catalog ingest, in FK order
+CATALOG_TABLES = [
+    models.Category.__table__,
+    models.ExchangeRate.__table__,
+    models.Product.__table__,
+    models.ProductUnit.__table__,
+    models.Customer.__table__,
+]
+
+
+def _apply_catalog_page(db: Session, data: dict, stats: bulk_upsert.IngestStats = None):
+    """Upsert one page of /sync/pull/catalog into the local database (no commit)"""
+    now = datetime.datetime.now()
+    products_data = data.get("products", [])
+    customers_data = data.get("customers", [])
+
+    # Categories and rates first (FK constraint), then products and their units
+    bulk_upsert.upsert(db, models.Category.__table__,
+                       [_category_row(c, now) for c in data.get("categories", [])], stats)
+    rates = [_rate_row(r, now) for r in data.get("exchange_rates", [])]
+    bulk_upsert.upsert(db, models.ExchangeRate.__table__, rates, stats)
+    if rates:
+        config_store.touch(db)  # Core upsert: the session hooks don't see it
+    bulk_upsert.upsert(db, models.Product.__table__,
+                       [_product_row(p, now) for p in products_data], stats)
+    bulk_upsert.upsert(db, models.ProductUnit.__table__,
+                       [_unit_row(u, p['id'], now) for p in products_data for u in (p.get('units') or [])], stats)
+    bulk_upsert.upsert(db, models.Customer.__table__,
+                       [_customer_row(c, now) for c in customers_data], stats)
+    _apply_users(db, data.get("users", []), now, stats)
+
+    # Units are sent as the full set of each product: drop local units the server no longer has
+    if products_data:
+        incoming_unit_ids = [u['id'] for p_data in products_data for u in (p_data.get('units') or [])]
+        stale_units = db.query(models.ProductUnit).filter(
+            models.ProductUnit.product_id.in_([p_data['id'] for p_data in products_data])
+        )
+        if incoming_unit_ids:
+            stale_units = stale_units.filter(~models.ProductUnit.id.in_(incoming_unit_ids))
+        stale_units.delete(synchronize_session=False)
+
+    deleted = data.get("deleted") or {}
+    deleted_count = _apply_deletions(db, deleted)
+
+    # Core writes skip the ORM hooks: refresh the search rows of what this page touched
+    if product_search.has_index(db):
+        product_search.reindex(
+            db, [p['id'] for p in products_data] + list(deleted.get("products") or ()),
+            [c['id'] for c in data.get("categories", [])] + list(deleted.get("categories") or ())
+        )
+    return len(products_data), len(customers_data), deleted_count
+
+
+def resolve_api_url(vps_url: str = None) -> str:
+    """Base URL of the cloud API (.../api/v1) from a configured site URL"""
     target_url = vps_url or VPS_BASE_URL  # Use environment variable
-    
+
     # Remove frontend hash if present (e.g., https://site.com/#/dashboard -> https://site.com)
     if "/#" in target_url:
         target_url = target_url.split("/#")[0]
@@ -28,214 +217,343 @@ async def pull_catalog_from_cloud(db: Session, vps_url: str = None):
     # Ensure /api/v1 is present
     # Remove trailing slash first to avoid double slash
     target_url = target_url.rstrip('/')
-    
+
     if not target_url.endswith("/api/v1"):
-         target_url = f"{target_url}/api/v1"
+        target_url = f"{target_url}/api/v1"
+    return target_url
+
 
+def _auth_headers():
     # Use a hardcoded token or a specific 'sync' user token for now
     # In production, we'd do a proper handshake
-    headers = {
-        "Authorization": f"Bearer {os.getenv('SYNC_API_KEY', 'dev-sync-key')}" 
+    return {
+        "Authorization": f"Bearer {os.getenv('SYNC_API_KEY', 'dev-sync-key')}"
     }
 
+
+@asynccontextmanager
+async def _client_or(client: httpx.AsyncClient = None, timeout: float = 30.0):
+    """The caller's (pooled) client, or a throwaway one"""
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient(timeout=timeout) as own_client:
+        yield own_client
+
+
+async def pull_catalog_from_cloud(db: Session, vps_url: str = None, full_resync: bool = False,
+                                  drop_indexes: bool = False, client: httpx.AsyncClient = None):
+    """
+    Connects to the VPS and downloads the catalog (Products, Customers, etc.)
+    Sends the cursor stored from the previous pull so only changes come back;
+    full_resync ignores it and downloads everything.
+
+    drop_indexes drops the secondary indexes of the catalog tables during
+    ingest and rebuilds them once at the end. Only for a full_resync an
+    operator asked for: until the rebuild, every lookup on those tables is a
+    full scan, so a first run or a reset cursor never does it on its own.
+    Database writes run in a worker thread so the event loop keeps serving
+    requests while a large pull is applied, and each page / stream batch is
+    committed on its own: no transaction (or SQLite write lock) stays open
+    while waiting on the network. Upserts are idempotent, so a pass that
+    fails halfway is simply repeated from the last stored cursor.
+    """
+    target_url = resolve_api_url(vps_url)
+    headers = _auth_headers()
+
+    cursor = None if full_resync else _get_sync_cursor(db)
+    db.commit()  # End the read transaction before waiting on the network
+    if drop_indexes and not full_resync:
+        raise ValueError("drop_indexes is only allowed on a full resync")
+    stats = bulk_upsert.IngestStats()
+
     try:
-        print(f"[SYNC] Downloading catalog from {target_url}/sync/pull/catalog...")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(f"{target_url}/sync/pull/catalog", headers=headers)
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Sync failed with status: {response.status_code}")
-                # Try to print body to see what happened (HTML error page?)
-                print(f"[ERROR] Body: {response.text[:200]}...") 
-                return {"success": False, "error": f"Status {response.status_code}"}
-            
-            data = response.json()
-
-            # --- PROCESS CATEGORIES FIRST (FK Constraint) ---
-            categories_data = data.get("categories", [])
-            print(f"[SYNC] Processing {len(categories_data)} categories...")
-            for cat_data in categories_data:
-                category = db.query(models.Category).filter(models.Category.id == cat_data['id']).first()
-                if not category:
-                    category = models.Category(id=cat_data['id'])
-                    db.add(category)
-                category.name = cat_data['name']
-                # category.description = cat_data.get('description') 
-
-            # --- PROCESS EXCHANGE RATES FIRST (FK Constraint) ---
-            rates_data = data.get("exchange_rates", [])
-            print(f"[SYNC] Processing {len(rates_data)} exchange rates...")
-            for r_data in rates_data:
-                rate = db.query(models.ExchangeRate).filter(models.ExchangeRate.id == r_data['id']).first()
-                if not rate:
-                    rate = models.ExchangeRate(id=r_data['id'])
-                    db.add(rate)
-                rate.name = r_data['name']
-                rate.currency_code = r_data['currency_code']
-                rate.currency_symbol = r_data['currency_symbol']
-                rate.rate = r_data['rate']
-                rate.is_default = r_data['is_default']
-                rate.is_active = r_data['is_active']
-                rate.updated_at = datetime.datetime.fromisoformat(r_data['updated_at']) if r_data.get('updated_at') else datetime.datetime.now()
-
-            # --- PROCESS PRODUCTS ---
-            products_data = data.get("products", [])
-            print(f"[SYNC] Processing {len(products_data)} products...")
-            
-            for p_data in products_data:
-                # Upsert Product
-                product = db.query(models.Product).filter(models.Product.id == p_data['id']).first()
-                if not product:
-                    product = models.Product(id=p_data['id']) # Preserve ID
-                    db.add(product)
-                
-                
-                # Update fields (use .get() for optional fields)
-                product.name = p_data.get('name', 'Unknown')
-                product.description = p_data.get('description')
-                product.price = p_data.get('price', 0)
-                product.stock = p_data.get('stock', 0)
-                product.category_id = p_data.get('category_id')
-                product.exchange_rate_id = p_data.get('exchange_rate_id') # Crucial FK
-                product.sku = p_data.get('sku')
-                product.is_active = p_data.get('is_active', True)
-                product.image_url = p_data.get('image_url')
-                
-                # --- PROCESS UNITS (Nested) ---
-                # We delete existing units and re-add to sync state purely
-                # Or we can upsert. For simplicity, we skip delete for now and just upsert based on unit_id
-                if 'units' in p_data and p_data['units']:
-                    for u_data in p_data['units']:
-                        unit = db.query(models.ProductUnit).filter(models.ProductUnit.id == u_data['id']).first()
-                        if not unit:
-                            unit = models.ProductUnit(id=u_data['id'])
-                            db.add(unit)
-                        
-                        unit.product_id = p_data['id']
-                        unit.unit_name = u_data.get('unit_name', 'Unit')
-                        unit.conversion_factor = u_data.get('conversion_factor', 1)
-                        unit.price = u_data.get('price', 0)
-                        unit.barcode = u_data.get('barcode')
-                        unit.is_default = u_data.get('is_default', False)
-                        
-            # --- PROCESS CUSTOMERS ---
-            customers_data = data.get("customers", [])
-            print(f"busts Processing {len(customers_data)} customers...")
-            for c_data in customers_data:
-                customer = db.query(models.Customer).filter(models.Customer.id == c_data['id']).first()
-                if not customer:
-                    customer = models.Customer(id=c_data['id'])
-                    db.add(customer)
-                
-                
-                customer.name = c_data.get('name', 'Unknown')
-                customer.email = c_data.get('email')
-                customer.phone = c_data.get('phone')
-                customer.nit = c_data.get('nit')
-                customer.address = c_data.get('address')
-                customer.unique_uuid = c_data.get('unique_uuid')
-
-            db.commit()
-            return {"status": "success", "products": len(products_data), "customers": len(customers_data)}
+        print(f"[SYNC] Downloading catalog from {target_url}/sync/pull/catalog ({'delta' if cursor else 'full'})...")
+        if drop_indexes:
+            dropped = await asyncio.to_thread(bulk_upsert.drop_secondary_indexes, db, CATALOG_TABLES)
+            print(f"[SYNC] Dropped {len(dropped)} secondary indexes for bulk ingest")
+        async with _client_or(client) as http:
+            result = await _pull_streamed(http, db, target_url, headers, cursor, stats)
+            if result is None:
+                # Older server without the streaming endpoint
+                result = await _pull_paged(http, db, target_url, headers, cursor, stats)
 
     except Exception as e:
         db.rollback()
         print(f"[ERROR] Sync Error: {e}")
         raise e
+    finally:
+        if drop_indexes:
+            rebuilt = await asyncio.to_thread(bulk_upsert.ensure_secondary_indexes, db, CATALOG_TABLES)
+            print(f"[SYNC] Rebuilt {len(rebuilt)} secondary indexes")
+
+    stats.stop()
+    stats.report("Catalog ingest")
+    result["ingest"] = stats.as_dict()
+    return result
 
-async def push_sales_to_cloud(db: Session, vps_url: str = None):
+
+class CatalogStreamIngest:
     """
-    Uploads pending sales to the VPS.
+    Applies catalog NDJSON records (see services/catalog_sync.py) as they
+    arrive, batch_size records at a time, so memory stays bounded by the
+    batch instead of the catalog. Nothing is committed here.
+
+    With auto_flush=False, feed() only buffers and returns True when a batch
+    is ready; the caller runs flush() (e.g. in a worker thread).
     """
-    target_url = vps_url or VPS_BASE_URL
-    
-    # Ensure /api/v1 is present
-    if not target_url.endswith("/api/v1"):
-         target_url = f"{target_url.rstrip('/')}/api/v1"
-    
-    headers = {
-        "Authorization": f"Bearer {os.getenv('SYNC_API_KEY', 'dev-sync-key')}"
-    }
 
-    try:
-        # 1. Get offline sales that haven't been synced
-        pending_sales = db.query(models.Sale).filter(
-            models.Sale.sync_status == 'PENDING',
-            models.Sale.is_offline_sale == True  # Only push sales created offline
-        ).all()
+    def __init__(self, db: Session, batch_size: int = 500, stats: bulk_upsert.IngestStats = None,
+                 auto_flush: bool = True):
+        self.db = db
+        self.batch_size = batch_size
+        self.stats = stats
+        self.auto_flush = auto_flush
+        self.cursor = None
+        self.complete = False
+        self.totals = {"products": 0, "customers": 0, "deleted": 0, "batches": 0}
+        self._reset()
+
+    def _reset(self):
+        self.page = {}
+        self.deleted = {}
+        self.pending = 0
+
+    def feed(self, record: dict) -> bool:
+        kind = record.get("type")
+        if kind == "header":
+            return False
+        if kind == "end":
+            self.cursor = record.get("cursor")
+            self.complete = True
+            if self.auto_flush:
+                self.flush()
+            return self.pending > 0
+
+        if "deleted" in record:
+            self.deleted.setdefault(record["entity"], []).append(record["deleted"])
+        else:
+            self.page.setdefault(record["entity"], []).append(record["data"])
+        self.pending += 1
+        if self.pending < self.batch_size:
+            return False
+        if self.auto_flush:
+            self.flush()
+            return False
+        return True
+
+    def flush(self):
+        if not self.pending:
+            return
+        products, customers, deleted = _apply_catalog_page(self.db, {**self.page, "deleted": self.deleted}, self.stats)
+        self.totals["products"] += products
+        self.totals["customers"] += customers
+        self.totals["deleted"] += deleted
+        self.totals["batches"] += 1
+        # Rows went out as Core statements: nothing piles up in the identity map
+        self._reset()
+
+
+def _commit_pull(db: Session, cursor: str = None):
+    """Commit what was applied so far; cursor is stored when it resumes exactly after it"""
+    if cursor:
+        _store_sync_cursor(db, cursor)
+    db.commit()
+
+
+def _flush_and_commit(ingest: "CatalogStreamIngest"):
+    ingest.flush()
+    ingest.db.commit()  # The stream has no intermediate cursors: a retry re-reads the pass
+
+
+async def _pull_streamed(client: httpx.AsyncClient, db: Session, target_url: str, headers: dict, cursor: str = None,
+                         stats: bulk_upsert.IngestStats = None):
+    """gzip NDJSON stream, applied incrementally. Returns None if the server has no stream endpoint."""
+    params = {"cursor": cursor} if cursor else {}
+    async with client.stream("GET", f"{target_url}/sync/pull/catalog/stream", headers=headers, params=params) as response:
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            body = await response.aread()
+            print(f"[ERROR] Sync failed with status: {response.status_code}")
+            print(f"[ERROR] Body: {body[:200]}...")
+            db.rollback()
+            return {"success": False, "error": f"Status {response.status_code}"}
+
+        ingest = CatalogStreamIngest(db, stats=stats, auto_flush=False)
+        async for line in response.aiter_lines():  # httpx undoes the gzip Content-Encoding
+            if line and ingest.feed(json.loads(line)):
+                await asyncio.to_thread(_flush_and_commit, ingest)
+
+    if not ingest.complete:
+        raise Exception("Catalog stream ended before the end record; the sync cursor was not advanced")
+
+    await asyncio.to_thread(_commit_pull, db, ingest.cursor)
+    return {"status": "success", "streamed": True, **ingest.totals}
+
+
+async def _pull_paged(client: httpx.AsyncClient, db: Session, target_url: str, headers: dict, cursor: str = None,
+                      stats: bulk_upsert.IngestStats = None):
+    """Paged JSON pulls, one local transaction per page. Each page's cursor resumes the pass after it."""
+    totals = {"products": 0, "customers": 0, "deleted": 0, "pages": 0}
+    while True:
+        params = {"cursor": cursor} if cursor else {}
+        response = await client.get(f"{target_url}/sync/pull/catalog", headers=headers, params=params)
+        
+        if response.status_code != 200:
+            print(f"[ERROR] Sync failed with status: {response.status_code}")
+            # Try to print body to see what happened (HTML error page?)
+            print(f"[ERROR] Body: {response.text[:200]}...") 
+            db.rollback()
+            return {"success": False, "error": f"Status {response.status_code}"}
         
-        if not pending_sales:
+        data = response.json()
+        products, customers, deleted = await asyncio.to_thread(_apply_catalog_page, db, data, stats)
+        totals["products"] += products
+        totals["customers"] += customers
+        totals["deleted"] += deleted
+        totals["pages"] += 1
+
+        cursor = data.get("cursor")
+        await asyncio.to_thread(_commit_pull, db, cursor)
+        if not data.get("has_more"):
+            break
+
+    return {"status": "success", **totals}
+
+
+# ---------- Push ----------
+
+PUSH_BATCH_SIZE = 200
+
+
+def pending_sales_count(db: Session) -> int:
+    return db.query(models.Sale).filter(
+        models.Sale.sync_status == 'PENDING',
+        models.Sale.is_offline_sale == True
+    ).count()
+
+
+def _pending_sales_payload(db: Session, limit: int):
+    """Oldest pending offline sales (at most limit) and their push payload"""
+    pending_sales = db.query(models.Sale).filter(
+        models.Sale.sync_status == 'PENDING',
+        models.Sale.is_offline_sale == True  # Only push sales created offline
+    ).order_by(models.Sale.id).limit(limit).all()
+
+    sales_payload = []
+    for sale in pending_sales:
+        # Manual Construction to avoid 'items' vs 'details' alias issues and ensure safety
+        sale_items = []
+        for detail in sale.details:
+            sale_items.append(schemas.SaleDetailCreate(
+                product_id=detail.product_id,
+                quantity=detail.quantity,
+                unit_price=detail.unit_price,
+                subtotal=detail.subtotal,
+                conversion_factor=Decimal("1.0"), # Default as it might not be stored
+                discount=detail.discount,
+                discount_type=detail.discount_type,
+                tax_rate=detail.tax_rate
+            ))
+
+        sale_payments = []
+        for payment in sale.payments:
+            sale_payments.append(schemas.SalePaymentCreate(
+                sale_id=sale.id,
+                amount=payment.amount,
+                currency=payment.currency,
+                payment_method=payment.payment_method,
+                exchange_rate=payment.exchange_rate
+            ))
+
+        sale_schema = schemas.SaleCreate(
+            customer_id=sale.customer_id,
+            payment_method=sale.payment_method,
+            payments=sale_payments,
+            items=sale_items, # Mapped from details
+            total_amount=sale.total_amount,
+            currency=sale.currency,
+            exchange_rate=sale.exchange_rate_used,
+            notes=sale.notes,
+            is_credit=sale.is_credit,
+            unique_uuid=sale.unique_uuid,
+            is_offline_sale=sale.is_offline_sale
+        )
+
+        # Use jsonable_encoder to handle Decimal -> str/float conversion automatically and safely
+        sales_payload.append(jsonable_encoder(sale_schema, exclude_none=True))
+
+    return [(sale.id, sale.unique_uuid) for sale in pending_sales], sales_payload
+
+
+def _mark_pushed(db: Session, sales, errors):
+    """SYNCED for accepted sales; ERROR for the ones the cloud rejected, so they don't block the queue"""
+    failed = {e.get("uuid") for e in errors}
+    synced_ids = [sale_id for sale_id, uuid in sales if uuid not in failed]
+    failed_ids = [sale_id for sale_id, uuid in sales if uuid in failed]
+    if synced_ids:
+        db.query(models.Sale).filter(models.Sale.id.in_(synced_ids)).update(
+            {models.Sale.sync_status: "SYNCED"}, synchronize_session=False)
+    if failed_ids:
+        db.query(models.Sale).filter(models.Sale.id.in_(failed_ids)).update(
+            {models.Sale.sync_status: "ERROR"}, synchronize_session=False)
+    db.commit()
+    return len(synced_ids), len(failed_ids)
+
+
+async def push_sales_batch(db: Session, client: httpx.AsyncClient, target_url: str,
+                           batch_size: int = PUSH_BATCH_SIZE):
+    """
+    Push one bounded batch of pending sales. Returns (pushed, rejected, sent);
+    transport and HTTP errors propagate so the caller can back off.
+    """
+    sales, sales_payload = await asyncio.to_thread(_pending_sales_payload, db, batch_size)
+    if not sales:
+        return 0, 0, 0
+
+    print(f"[SYNC] Push: sending {len(sales)} pending sales to {target_url}...")
+    response = await client.post(
+        f"{target_url}/sync/push/sales",
+        json=sales_payload, # httpx handles JSON serialization
+        headers=_auth_headers(),
+        timeout=60.0
+    )
+    response.raise_for_status()
+
+    # Application-level errors: the cloud stores the rest of the batch and lists rejected sales
+    result_data = response.json()
+    if result_data.get("errors"):
+        print(f"[ERROR] Cloud Sync Returned Errors: {result_data['errors']}")
+    pushed, rejected = await asyncio.to_thread(_mark_pushed, db, sales, result_data.get("errors") or [])
+    print(f"[OK] Pushed {pushed} sales. (Processed: {result_data.get('processed')}, Rejected: {rejected})")
+    return pushed, rejected, len(sales)
+
+
+async def push_sales_to_cloud(db: Session, vps_url: str = None, client: httpx.AsyncClient = None,
+                              batch_size: int = PUSH_BATCH_SIZE):
+    """
+    Uploads pending sales to the VPS, batch_size sales per request.
+    """
+    target_url = resolve_api_url(vps_url)
+    totals = {"pushed": 0, "rejected": 0, "batches": 0}
+
+    try:
+        async with _client_or(client, timeout=60.0) as http:
+            while True:
+                pushed, rejected, sent = await push_sales_batch(db, http, target_url, batch_size)
+                if not sent:
+                    break
+                totals["pushed"] += pushed
+                totals["rejected"] += rejected
+                totals["batches"] += 1
+                if sent < batch_size:
+                    break
+
+        if not totals["batches"]:
             print("[SYNC] No pending sales to push.")
             return {"synced_count": 0}
-
-        print(f"[SYNC] Push: Found {len(pending_sales)} pending sales to push to {target_url}...")
-        
-        sales_payload = []
-        for sale in pending_sales:
-            # Manual Construction to avoid 'items' vs 'details' alias issues and ensure safety
-            sale_items = []
-            for detail in sale.details:
-                sale_items.append(schemas.SaleDetailCreate(
-                    product_id=detail.product_id,
-                    quantity=detail.quantity,
-                    unit_price=detail.unit_price,
-                    subtotal=detail.subtotal,
-                    conversion_factor=Decimal("1.0"), # Default as it might not be stored
-                    discount=detail.discount,
-                    discount_type=detail.discount_type,
-                    tax_rate=detail.tax_rate
-                ))
-
-            sale_payments = []
-            for payment in sale.payments:
-                sale_payments.append(schemas.SalePaymentCreate(
-                    sale_id=sale.id,
-                    amount=payment.amount,
-                    currency=payment.currency,
-                    payment_method=payment.payment_method,
-                    exchange_rate=payment.exchange_rate
-                ))
-
-            sale_schema = schemas.SaleCreate(
-                customer_id=sale.customer_id,
-                payment_method=sale.payment_method,
-                payments=sale_payments,
-                items=sale_items, # Mapped from details
-                total_amount=sale.total_amount,
-                currency=sale.currency,
-                exchange_rate=sale.exchange_rate_used,
-                notes=sale.notes,
-                is_credit=sale.is_credit,
-                unique_uuid=sale.unique_uuid,
-                is_offline_sale=sale.is_offline_sale
-            )
-            
-            # Use jsonable_encoder to handle Decimal -> str/float conversion automatically and safely
-            sales_payload.append(jsonable_encoder(sale_schema, exclude_none=True))
-
-        # 3. Send to Cloud
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{target_url}/sync/push/sales", 
-                json=sales_payload, # httpx handles JSON serialization
-                headers=headers, 
-                timeout=60.0
-            )
-            response.raise_for_status()
-            
-            # 4. Check for Application-Level Errors (Cloud API catches exceptions and returns them in 'errors' list)
-            result_data = response.json()
-            if result_data.get("errors"):
-                print(f"[ERROR] Cloud Sync Returned Errors: {result_data['errors']}")
-                raise Exception(f"Cloud reported errors: {result_data['errors']}")
-            
-            # 5. If success, mark as SYNCHED
-            for sale in pending_sales:
-                sale.sync_status = "SYNCED"
-            
-            db.commit()
-            print(f"[OK] Successfully pushed {len(pending_sales)} sales. (Processed: {result_data.get('processed')})")
-            return {"status": "success", "pushed": len(pending_sales)}
+        return {"status": "success", **totals}
 
     except Exception as e:
         print(f"[ERROR] Push Error: {e}")
@@ -0,0 +1,213 @@
+"""
+Sync Daemon (local backend)
+Keeps the desktop database in sync with the cloud without anyone pressing
+"sync":
+
+- pushes PENDING offline sales in batches of SYNC_PUSH_BATCH_SIZE, draining
+  the queue batch after batch while the link is up;
+- pulls catalog deltas every SYNC_PULL_INTERVAL seconds;
+- reuses one pooled httpx.AsyncClient (keep-alive) for every request;
+- when the VPS is unreachable, waits with exponential backoff plus jitter
+  (capped at SYNC_MAX_BACKOFF) instead of hammering it.
+
+Database work runs in worker threads (see sync_client), so POS requests on
+the event loop are not held up by a sync in progress. Nothing happens until
+cloud_url is configured in BusinessConfig.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+import httpx
+from ..config import settings
+from ..database.db import SessionLocal
+from ..models import models
+from . import sync_client
+
+
+def backoff_delay(failures: int, base: float = 2.0, cap: float = 300.0) -> float:
+    """Exponential backoff with equal jitter: half fixed, half random (never 0, spreads out clients)"""
+    ceiling = min(cap, base * (2 ** max(failures - 1, 0)))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class SyncDaemon:
+    def __init__(self, session_factory: Callable = SessionLocal, batch_size: int = None,
+                 push_interval: float = None, pull_interval: float = None, max_backoff: float = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.SYNC_PUSH_BATCH_SIZE
+        self.push_interval = push_interval if push_interval is not None else settings.SYNC_PUSH_INTERVAL
+        self.pull_interval = pull_interval if pull_interval is not None else settings.SYNC_PULL_INTERVAL
+        self.max_backoff = max_backoff if max_backoff is not None else settings.SYNC_MAX_BACKOFF
+
+        self.client: Optional[httpx.AsyncClient] = None
+        self._task = None
+        self._loop = None
+        self._wake = None
+
+        # Status
+        self.state = "stopped"
+        self.queue_depth = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_error_at = None
+        self.last_success_at = None
+        self.last_push_at = None
+        self.last_pull_at = None
+        self.last_pull = None
+        self.next_attempt_at = None
+        self.pushed_total = 0
+        self.rejected_total = 0
+        self._next_pull = 0.0
+        self._pushes = deque()  # (monotonic time, sales pushed) for the throughput window
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=120.0),
+        )
+        self._next_pull = 0.0  # First pull right away
+        self._task = self._loop.create_task(self._run())
+        print(f"[SYNC] Background sync started (batch={self.batch_size}, push every {self.push_interval}s, "
+              f"pull every {self.pull_interval}s)")
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task:
+            self._task.cancel()
+            # A database step already running in a worker thread can't be interrupted; don't hang shutdown on it
+            await asyncio.wait({self._task}, timeout=timeout)
+            self._task = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+        self.state = "stopped"
+
+    def notify_pending(self):
+        """A new sale is waiting: push it soon. Thread-safe; ignored while backing off."""
+        if self._loop is None or self._wake is None or self.consecutive_failures:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    # ---------- Loop ----------
+
+    def _cloud_url(self) -> Optional[str]:
+        db = self.session_factory()
+        try:
+            row = db.query(models.BusinessConfig).filter(models.BusinessConfig.key == "cloud_url").first()
+            return row.value.rstrip('/') if row and row.value else None
+        finally:
+            db.close()
+
+    async def run_once(self) -> Dict[str, Any]:
+        """One cycle: scheduled pull, then push batches until the queue is empty. Raises on failure."""
+        cloud_url = await asyncio.to_thread(self._cloud_url)
+        if not cloud_url:
+            self.state = "not_configured"
+            return {"configured": False}
+
+        db = self.session_factory()
+        try:
+            result = {"configured": True, "pull": None, "pushed": 0}
+            if time.monotonic() >= self._next_pull:
+                self.state = "pulling"
+                result["pull"] = await sync_client.pull_catalog_from_cloud(db, vps_url=cloud_url, client=self.client)
+                if result["pull"].get("success") is False:
+                    raise RuntimeError(f"Catalog pull failed: {result['pull'].get('error')}")
+                self.last_pull = result["pull"]
+                self.last_pull_at = datetime.now()
+                self._next_pull = time.monotonic() + self.pull_interval
+
+            self.state = "pushing"
+            target_url = sync_client.resolve_api_url(cloud_url)
+            while True:
+                pushed, rejected, sent = await sync_client.push_sales_batch(db, self.client, target_url, self.batch_size)
+                if sent:
+                    self._record_push(pushed, rejected)
+                    result["pushed"] += pushed
+                if sent < self.batch_size:
+                    break
+            self.queue_depth = await asyncio.to_thread(sync_client.pending_sales_count, db)
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            try:
+                result = await self.run_once()
+                if result["configured"]:
+                    self.consecutive_failures = 0
+                    self.last_success_at = datetime.now()
+                    self.last_error = None
+                self.state = "idle" if result["configured"] else "not_configured"
+                delay = self.push_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.consecutive_failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.last_error_at = datetime.now()
+                self.state = "backoff"
+                delay = backoff_delay(self.consecutive_failures, cap=self.max_backoff)
+                print(f"[SYNC] Sync failed ({self.last_error}); retry #{self.consecutive_failures} in {delay:.1f}s")
+
+            self.next_attempt_at = datetime.fromtimestamp(time.time() + delay)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- Status ----------
+
+    def _record_push(self, pushed: int, rejected: int):
+        now = time.monotonic()
+        self.pushed_total += pushed
+        self.rejected_total += rejected
+        self.last_push_at = datetime.now()
+        self._pushes.append((now, pushed))
+
+    def _throughput(self, window: float = 300.0) -> float:
+        """Sales pushed per minute over the last `window` seconds"""
+        cutoff = time.monotonic() - window
+        while self._pushes and self._pushes[0][0] < cutoff:
+            self._pushes.popleft()
+        return round(sum(n for _, n in self._pushes) * 60.0 / window, 2)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "state": self.state,
+            "queue_depth": self.queue_depth,
+            "last_success_at": self.last_success_at,
+            "last_push_at": self.last_push_at,
+            "last_pull_at": self.last_pull_at,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "consecutive_failures": self.consecutive_failures,
+            "next_attempt_at": self.next_attempt_at,
+            "pushed_total": self.pushed_total,
+            "rejected_total": self.rejected_total,
+            "throughput_per_min": self._throughput(),
+            "batch_size": self.batch_size,
+            "last_pull_ingest": (self.last_pull or {}).get("ingest"),
+        }
+
+
+sync_daemon = SyncDaemon()
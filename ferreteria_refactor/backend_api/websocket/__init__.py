@@ -2,5 +2,6 @@
 WebSocket package initialization
 """
 from .manager import manager
+from .event_bus import event_bus
 
-__all__ = ['manager']
+__all__ = ['manager', 'event_bus']
@@ -0,0 +1,230 @@
+"""
+WebSocket Event Bus
+Process-wide queue between the code that produces events and the clients.
+
+Sync handlers (threadpool) and async handlers both call `event_bus.publish()`;
+the bus hands the event to the application loop with `call_soon_threadsafe`,
+so no handler ever spins up its own event loop. A single consumer task owned
+by the app loop drains a bounded queue and fans each message out through the
+ConnectionManager.
+
+Product events (`product:updated`, `product:stock_updated`) are coalesced per
+product id within a short window; when several products change together they
+are delivered as one `product:batch_updated` message.
+
+The consumer publishes through a pub/sub backend (see pubsub.py) so events
+reach clients connected to other workers/nodes; whatever the backend delivers
+passes through a DeliveryFilter (dedup + per-entity ordering) before fan-out.
+In-process caches (e.g. services/scan_index.py) can register a listener to
+see the same delivered events.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+from .events import WebSocketEvents
+from .manager import manager as default_manager
+from .pubsub import BroadcastBackend, DeliveryFilter, Envelope, InProcessBackend, create_backend
+
+
+class EventBus:
+    COALESCED_EVENTS = {WebSocketEvents.PRODUCT_UPDATED, WebSocketEvents.PRODUCT_STOCK_UPDATED}
+
+    def __init__(self, connection_manager, backend: Optional[BroadcastBackend] = None,
+                 max_queue: int = 1000, coalesce_window: float = 0.05):
+        self.connection_manager = connection_manager
+        self.backend = backend or InProcessBackend()
+        self.envelope = Envelope()
+        self.delivery_filter = DeliveryFilter()
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._inbound: Optional[asyncio.Queue] = None
+        self._deliverer: Optional[asyncio.Task] = None
+        self._pending: Dict[tuple, Dict[str, Any]] = {}  # (event_type, product_id, warehouse_id) -> merged data
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+        self._published = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._batches = 0
+        self._fanout_total_ms = 0.0
+        self._fanout_max_ms = 0.0
+        self._fanout_last_ms = 0.0
+
+    # ---------- Lifecycle (app loop) ----------
+
+    async def start(self):
+        """Bind the bus to the running (application) loop and start the consumer."""
+        if self._consumer and not self._consumer.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._inbound = asyncio.Queue()
+        await self.backend.start(self._on_backend_message)
+        self._consumer = self._loop.create_task(self._run())
+        self._deliverer = self._loop.create_task(self._deliver())
+        print(f"[WS] Event bus started (backend={self.backend.name}, queue={self.max_queue}, "
+              f"coalesce={self.coalesce_window * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Deliver whatever is pending, then stop the consumer."""
+        if not self._consumer:
+            return
+        self._flush_pending()
+        await self._queue.join()
+        await self._inbound.join()
+        for task in (self._consumer, self._deliverer):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.backend.stop()
+        self._consumer = None
+        self._deliverer = None
+        self._loop = None
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """Call `callback(event_type, data)` on the app loop for every delivered event (keep it quick)"""
+        self._listeners.append(callback)
+
+    # ---------- Producer side (any thread) ----------
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> bool:
+        """
+        Queue an event for broadcast. Safe to call from sync handlers running
+        in the threadpool as well as from coroutines on the app loop.
+        Returns False if the event was dropped (bus not running).
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._dropped += 1
+            return False
+
+        self._published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._enqueue(event_type, data)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, event_type, data)
+        return True
+
+    # ---------- Loop side ----------
+
+    def _enqueue(self, event_type: str, data: Dict[str, Any]):
+        product_id = data.get("id") if isinstance(data, dict) else None
+
+        if event_type in self.COALESCED_EVENTS and product_id is not None:
+            key = (event_type, product_id, data.get("warehouse_id"))
+            if key in self._pending:
+                self._pending[key].update(data)
+                self._coalesced += 1
+            else:
+                self._pending[key] = dict(data)
+            if self._flush_handle is None:
+                self._flush_handle = self._loop.call_later(self.coalesce_window, self._flush_pending)
+            return
+
+        # Keep ordering: product changes published before this event go out first
+        self._flush_pending()
+        self._put(event_type, data)
+
+    def _flush_pending(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        if len(pending) == 1:
+            (event_type, _, _), data = next(iter(pending.items()))
+            self._put(event_type, data)
+        else:
+            self._batches += 1
+            self._put(WebSocketEvents.PRODUCT_BATCH_UPDATED, {
+                "events": [{"type": event_type, "data": data} for (event_type, _, _), data in pending.items()]
+            })
+
+    def _put(self, event_type: str, data: Dict[str, Any]):
+        try:
+            self._queue.put_nowait((event_type, data))
+        except asyncio.QueueFull:
+            self._dropped += 1
+            print(f"[WS] Event bus full, dropping event: {event_type}")
+
+    async def _run(self):
+        """Outbound: hand queued events to the backend"""
+        while True:
+            event_type, data = await self._queue.get()
+            try:
+                await self.backend.publish(self.envelope.wrap(event_type, data))
+            except Exception as e:
+                print(f"[WS] Error publishing {event_type}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _on_backend_message(self, envelope: Dict[str, Any]):
+        """Called on the app loop for every envelope the backend delivers (ours included)"""
+        self._inbound.put_nowait(envelope)
+
+    async def _deliver(self):
+        """Inbound: dedup/order, then fan out to this process' clients"""
+        while True:
+            envelope = await self._inbound.get()
+            start = time.perf_counter()
+            try:
+                accepted = self.delivery_filter.accept(envelope)
+                if accepted:
+                    for listener in self._listeners:
+                        try:
+                            listener(*accepted)
+                        except Exception as e:
+                            print(f"[WS] Event listener failed on {accepted[0]}: {e}")
+                    await self.connection_manager.broadcast(*accepted)
+                    self._delivered += 1
+            except Exception as e:
+                print(f"[WS] Error broadcasting {envelope.get('type')}: {e}")
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self._fanout_last_ms = elapsed_ms
+                self._fanout_total_ms += elapsed_ms
+                self._fanout_max_ms = max(self._fanout_max_ms, elapsed_ms)
+                self._inbound.task_done()
+
+    # ---------- Metrics ----------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "running": self._consumer is not None and not self._consumer.done(),
+            "backend": self.backend.name,
+            "node": self.envelope.origin,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue,
+            "pending_coalesced": len(self._pending),
+            "published": self._published,
+            "delivered": self._delivered,
+            "dropped": self._dropped,
+            "coalesced": self._coalesced,
+            "batches": self._batches,
+            "duplicates": self.delivery_filter.duplicates,
+            "stale": self.delivery_filter.stale,
+            "fanout_last_ms": round(self._fanout_last_ms, 2),
+            "fanout_avg_ms": round(self._fanout_total_ms / self._delivered, 2) if self._delivered else 0.0,
+            "fanout_max_ms": round(self._fanout_max_ms, 2),
+            **self.connection_manager.get_stats(),
+        }
+
+
+# Global instance
+event_bus = EventBus(default_manager, backend=create_backend())
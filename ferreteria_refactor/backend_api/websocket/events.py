@@ -11,6 +11,9 @@ class WebSocketEvents:
     EXCHANGE_RATE_CREATED = "exchange_rate:created"
     EXCHANGE_RATE_DELETED = "exchange_rate:deleted"
     
+    # Business config (BusinessConfig / rates / currencies committed; see services/config_store.py)
+    CONFIG_UPDATED = "config:updated"
+    
     # Products
     PRODUCT_UPDATED = "product:updated"
     PRODUCT_CREATED = "product:created"
@@ -18,6 +21,7 @@ class WebSocketEvents:
     PRODUCT_STOCK_UPDATED = "product:stock_updated"
     PRODUCT_LOW_STOCK = "product:low_stock"
     PRODUCT_OUT_OF_STOCK = "product:out_of_stock"
+    PRODUCT_BATCH_UPDATED = "product:batch_updated"  # Coalesced product:updated / product:stock_updated
     
     # Cash Sessions
     CASH_SESSION_OPENED = "cash_session:opened"
@@ -48,6 +52,9 @@ class WebSocketEvents:
     USER_UPDATED = "user:updated"
     USER_ROLE_CHANGED = "user:role_changed"
     
+    # Report jobs
+    REPORT_JOB_FINISHED = "report_job:finished"  # done or failed, see services/report_jobs.py
+
     # System
     SYSTEM_NOTIFICATION = "system:notification"
     SYSTEM_ERROR = "system:error"
@@ -1,38 +1,146 @@
 """
 WebSocket Connection Manager
 Manages all active WebSocket connections and broadcasts events to clients
+
+Each connection gets its own bounded outbound queue drained by a dedicated
+writer task, so a stalled client (POS on bad Wi-Fi) only delays itself.
+broadcast() serializes the event once, shares the message across clients and
+returns as soon as it has been queued. Everything sent to a socket (pong and
+subscribe acks included) goes through that queue: only the writer writes.
+
+A client that can't keep up (queue overflow, or one send over send_timeout)
+has missed events for good, so its socket is closed with 1013 (try again
+later): the frontend reconnects and reloads its state instead of silently
+running on stale data.
 """
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional
 from fastapi import WebSocket
+import asyncio
 import json
 from datetime import datetime
 from decimal import Decimal
+from .events import WebSocketEvents
+
+# Events where only the latest state per entity matters: a newer message
+# replaces the one still waiting in a client's queue instead of piling up.
+COLLAPSIBLE_EVENTS = {
+    WebSocketEvents.PRODUCT_UPDATED,
+    WebSocketEvents.PRODUCT_STOCK_UPDATED,
+    WebSocketEvents.EXCHANGE_RATE_UPDATED,
+    WebSocketEvents.CUSTOMER_UPDATED,
+    WebSocketEvents.SUPPLIER_UPDATED,
+}
+
+
+class ClientConnection:
+    """A connected client: its subscriptions and its pending outbound messages"""
+
+    def __init__(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None,
+                 warehouse_id: Optional[int] = None, max_queue: int = 256):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: "OrderedDict[Any, str]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.overflowed = False
+        self.dropped = 0
+        self.collapsed = 0
+        self._seq = 0
+        self.subscribe(topics, warehouse_id)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None, warehouse_id: Optional[int] = None):
+        """
+        topics: event types to receive ("sale:completed") or prefixes ("product:*").
+                None means everything.
+        warehouse_id: only receive warehouse-scoped events for this warehouse.
+        """
+        self.topics = set(topics) if topics else None
+        self.topics_key = frozenset(self.topics) if self.topics else None
+        self.warehouse_id = warehouse_id
+
+    def wants(self, event_type: str) -> bool:
+        if self.topics is None or event_type in self.topics:
+            return True
+        return any(t.endswith("*") and event_type.startswith(t[:-1]) for t in self.topics)
+
+    def enqueue(self, message: str, collapse_key=None):
+        """Queue a message; collapse by key. When full the client is marked overflowed (see _writer)"""
+        if self.overflowed:
+            return
+        if collapse_key is not None and collapse_key in self.queue:
+            self.queue[collapse_key] = message  # Keeps its place in line, newest payload
+            self.collapsed += 1
+            return
+
+        if collapse_key is None:
+            self._seq += 1
+            collapse_key = ("seq", self._seq)
+
+        if len(self.queue) >= self.max_queue:
+            self.overflowed = True
+            self.dropped += len(self.queue) + 1
+            self.queue.clear()
+            self.ready.set()
+            return
+
+        self.queue[collapse_key] = message
+        self.ready.set()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    CLOSE_TRY_AGAIN_LATER = 1013
+
+    def __init__(self, send_timeout: float = 2.0, max_queue: int = 256):
+        self.clients: Dict[WebSocket, ClientConnection] = {}
         self.connection_count = 0
+        self.send_timeout = send_timeout  # Seconds a single client may take to accept a message
+        self.max_queue = max_queue  # Pending messages per client before it is disconnected
+        self.timed_out_count = 0
+        self.overflow_count = 0
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None,
+                      warehouse_id: Optional[int] = None) -> ClientConnection:
         """Accept and register a new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, topics, warehouse_id, max_queue=self.max_queue)
+        client.writer = asyncio.get_running_loop().create_task(self._writer(client))
+        self.clients[websocket] = client
         self.connection_count += 1
-        print(f"[WS] Client connected. Total active: {len(self.active_connections)}")
+        print(f"[WS] Client connected. Total active: {len(self.clients)}")
+        return client
 
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            print(f"[WS] Client disconnected. Total active: {len(self.active_connections)}")
+        client = self.clients.pop(websocket, None)
+        if client:
+            if client.writer and client.writer is not asyncio.current_task():
+                client.writer.cancel()
+            print(f"[WS] Client disconnected. Total active: {len(self.clients)}")
+
+    def subscribe(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None,
+                  warehouse_id: Optional[int] = None):
+        """Change what an already connected client receives"""
+        client = self.clients.get(websocket)
+        if client:
+            client.subscribe(topics, warehouse_id)
+
+    def send_to(self, websocket: WebSocket, message: str) -> bool:
+        """Queue a message for one connected client (behind what it already has pending)"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        client.enqueue(message)
+        return True
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send a message to a specific client"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            print(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+        if not self.send_to(websocket, message):
+            print("Error sending personal message: client not connected")
 
     def _json_serializer(self, obj):
         """Custom JSON serializer for special types"""
@@ -42,37 +150,114 @@ class ConnectionManager:
             return str(obj) # Send as string to preserve precision
         raise TypeError(f"Type {type(obj)} not serializable")
 
+    def _serialize(self, event_type: str, data: Dict[str, Any], timestamp: str) -> str:
+        return json.dumps({
+            "type": event_type,
+            "data": data,
+            "timestamp": timestamp
+        }, default=self._json_serializer)
+
+    @staticmethod
+    def _in_scope(data: Dict[str, Any], warehouse_id: Optional[int]) -> bool:
+        """Warehouse-scoped events only go to clients of that warehouse (or unscoped clients)"""
+        event_wh = data.get("warehouse_id") if isinstance(data, dict) else None
+        return warehouse_id is None or event_wh is None or event_wh == warehouse_id
+
     async def broadcast(self, event_type: str, data: Dict[str, Any]):
         """
         Broadcast an event to all connected clients
-        
+
         Args:
             event_type: Type of event (e.g., 'exchange_rate:updated')
             data: Event payload
         """
-        message = json.dumps({
-            "type": event_type,
-            "data": data,
-            "timestamp": datetime.now().isoformat()
-        }, default=self._json_serializer)
-        
-        print(f"[WS] Broadcasting event: {event_type} to {len(self.active_connections)} clients")
-        
-        disconnected = []
-        for connection in self.active_connections:
+        timestamp = datetime.now().isoformat()
+        collapse_key = None
+        if event_type in COLLAPSIBLE_EVENTS and isinstance(data, dict) and data.get("id") is not None:
+            collapse_key = (event_type, data["id"], data.get("warehouse_id"))
+
+        # One serialized message per distinct view, shared by all clients with that view. Batches
+        # carry several event types, so their view includes the topics (see _render)
+        batch = event_type == WebSocketEvents.PRODUCT_BATCH_UPDATED
+        rendered: Dict[Any, Optional[str]] = {}
+        queued = 0
+
+        for client in list(self.clients.values()):
+            if not batch and not client.wants(event_type):
+                continue
+
+            view = (client.warehouse_id, client.topics_key) if batch else client.warehouse_id
+            if view not in rendered:
+                rendered[view] = self._render(event_type, data, client, timestamp)
+            message = rendered[view]
+            if message is None:
+                continue
+
+            client.enqueue(message, collapse_key)
+            queued += 1
+
+        print(f"[WS] Broadcasting event: {event_type} to {queued} clients")
+
+    def _render(self, event_type: str, data: Dict[str, Any], client: ClientConnection,
+                timestamp: str) -> Optional[str]:
+        warehouse_id = client.warehouse_id
+        if event_type == WebSocketEvents.PRODUCT_BATCH_UPDATED:
+            wants_batch = client.wants(event_type)
+            events = [
+                e for e in data.get("events", [])
+                if (wants_batch or client.wants(e.get("type", ""))) and self._in_scope(e.get("data"), warehouse_id)
+            ]
+            if not events:
+                return None
+            return self._serialize(event_type, {"events": events}, timestamp)
+
+        if not self._in_scope(data, warehouse_id):
+            return None
+        return self._serialize(event_type, data, timestamp)
+
+    async def _writer(self, client: ClientConnection):
+        """Drain one client's queue; a client that stops reading is closed (1013) so it reconnects"""
+        close = True
+        try:
+            while not client.overflowed:
+                await client.ready.wait()
+                while client.queue and not client.overflowed:
+                    _, message = client.queue.popitem(last=False)
+                    await asyncio.wait_for(client.websocket.send_text(message), timeout=self.send_timeout)
+                client.ready.clear()
+            print(f"[WS] Client queue overflow (>{client.max_queue} pending), closing connection")
+            self.overflow_count += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            print(f"[WS] Client too slow (>{self.send_timeout}s), closing connection")
+            self.timed_out_count += 1
+        except Exception as e:
+            print(f"[WS] Error sending to client: {e}")
+            close = False  # The socket is already gone
+        self.disconnect(client.websocket)
+        if close:
             try:
-                await connection.send_text(message)
-            except Exception as e:
-                print(f"[WS] Error sending to client: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
+                await asyncio.wait_for(client.websocket.close(code=self.CLOSE_TRY_AGAIN_LATER),
+                                       timeout=self.send_timeout)
+            except Exception:
+                pass
 
     def get_connection_count(self) -> int:
         """Get number of active connections"""
-        return len(self.active_connections)
+        return len(self.clients)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backpressure counters across connected clients"""
+        clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "max_client_queue": max((len(c.queue) for c in clients), default=0),
+            "client_dropped": sum(c.dropped for c in clients),
+            "client_collapsed": sum(c.collapsed for c in clients),
+            "send_timeouts": self.timed_out_count,
+            "overflow_closes": self.overflow_count,
+        }
 
 
 # Global instance
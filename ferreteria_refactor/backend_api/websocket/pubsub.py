@@ -0,0 +1,355 @@
+"""
+WebSocket Pub/Sub Backends
+Carry events between API processes so every connected client sees them,
+whichever worker handled the request.
+
+    WS_BACKEND=memory    (default) single process, current behavior
+    WS_BACKEND=local     several workers on one host (uvicorn --workers N).
+                         The first worker to bind WS_BROKER_ADDRESS becomes the
+                         broker and relays to the others; if it dies another
+                         worker takes over. No external service needed.
+    WS_BACKEND=postgres  several nodes sharing the database: LISTEN/NOTIFY on
+                         WS_PG_CHANNEL.
+
+Every event travels as an envelope with a unique id and a version
+(time_ns, origin, seq). DeliveryFilter drops duplicates and, per entity,
+any update older than one already delivered.
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+from .events import WebSocketEvents
+
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def json_default(obj):
+    """Same wire format the ConnectionManager sends to clients"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+class Envelope:
+    """Builds envelopes for this process with a monotonically increasing version"""
+
+    def __init__(self, origin: str = NODE_ID):
+        self.origin = origin
+        self._seq = 0
+        self._last_ns = 0
+
+    def wrap(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        self._seq += 1
+        now = max(time.time_ns(), self._last_ns + 1)  # Never goes backwards within a process
+        self._last_ns = now
+        return {
+            "id": uuid.uuid4().hex,
+            "origin": self.origin,
+            "version": [now, self.origin, self._seq],
+            "type": event_type,
+            "data": data,
+        }
+
+
+class DeliveryFilter:
+    """De-duplication by envelope id and last-writer-wins ordering per entity"""
+
+    def __init__(self, max_ids: int = 10000, max_entities: int = 50000):
+        self.max_ids = max_ids
+        self.max_entities = max_entities
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._versions: "OrderedDict[tuple, list]" = OrderedDict()
+        self.duplicates = 0
+        self.stale = 0
+
+    @staticmethod
+    def _entity_key(event_type: str, data):
+        if isinstance(data, dict) and data.get("id") is not None:
+            return (event_type, data["id"], data.get("warehouse_id"))
+        return None
+
+    def _is_current(self, event_type: str, data, version: list) -> bool:
+        key = self._entity_key(event_type, data)
+        if key is None:
+            return True
+        last = self._versions.get(key)
+        if last is not None and version <= last:
+            self.stale += 1
+            return False
+        self._versions[key] = version
+        self._versions.move_to_end(key)
+        if len(self._versions) > self.max_entities:
+            self._versions.popitem(last=False)
+        return True
+
+    def accept(self, envelope: Dict[str, Any]):
+        """Return (event_type, data) to deliver, or None if it must be skipped"""
+        if envelope["id"] in self._seen:
+            self.duplicates += 1
+            return None
+        self._seen[envelope["id"]] = None
+        if len(self._seen) > self.max_ids:
+            self._seen.popitem(last=False)
+
+        event_type, data, version = envelope["type"], envelope["data"], envelope["version"]
+        if event_type == WebSocketEvents.PRODUCT_BATCH_UPDATED:
+            events = [e for e in data.get("events", []) if self._is_current(e["type"], e["data"], version)]
+            return (event_type, {"events": events}) if events else None
+
+        if not self._is_current(event_type, data, version):
+            return None
+        return event_type, data
+
+
+class BroadcastBackend:
+    """Interface: publish envelopes, hand every received envelope to on_message (on the app loop)"""
+    name = "base"
+
+    async def start(self, on_message: Callable[[Dict[str, Any]], None]):
+        raise NotImplementedError
+
+    async def publish(self, envelope: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InProcessBackend(BroadcastBackend):
+    """Single process: delivery is a direct call"""
+    name = "memory"
+
+    async def start(self, on_message):
+        self._on_message = on_message
+
+    async def publish(self, envelope):
+        self._on_message(envelope)
+
+
+class LocalSocketBackend(BroadcastBackend):
+    """
+    Loopback broker for several workers on the same host.
+
+    Every worker is a client of the broker; whoever manages to bind the
+    address first also runs the broker, which relays each line to all clients
+    (the sender included, so every process sees one ordered stream).
+    """
+    name = "local"
+
+    def __init__(self, address: str = "127.0.0.1:8765", reconnect_delay: float = 0.2):
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.reconnect_delay = reconnect_delay
+        self.connected = asyncio.Event()
+        self.is_broker = False
+        self._server = None
+        self._peers = set()
+        self._writer = None
+        self._pending = deque(maxlen=1000)  # Published while (re)connecting
+        self._task = None
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        self._task = asyncio.get_running_loop().create_task(self._maintain())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            await self._server.wait_closed()
+
+    async def publish(self, envelope):
+        line = json.dumps(envelope, default=json_default).encode() + b"\n"
+        if self._writer is None:
+            self._pending.append(line)
+            return
+        self._writer.write(line)
+        await self._writer.drain()
+
+    async def _maintain(self):
+        """Keep a link to the broker, becoming the broker when nobody holds the address"""
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                await self._become_broker()
+                continue
+
+            self._writer = writer
+            while self._pending:
+                writer.write(self._pending.popleft())
+            self.connected.set()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._on_message(json.loads(line))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.connected.clear()
+                self._writer = None
+                writer.close()
+            print("[WS] Lost connection to local broker, reconnecting")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _become_broker(self):
+        try:
+            self._server = await asyncio.start_server(self._serve_peer, self.host, self.port)
+            self.is_broker = True
+            print(f"[WS] Local broker listening on {self.host}:{self.port}")
+        except OSError:
+            # Another worker won the race; retry connecting to it
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _serve_peer(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    try:
+                        peer.write(line)
+                    except Exception:
+                        self._peers.discard(peer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+
+class PostgresNotifyBackend(BroadcastBackend):
+    """
+    Multi-node fan-out through Postgres LISTEN/NOTIFY.
+
+    A daemon thread holds the LISTEN connection (works with any event loop
+    policy, including Windows proactor) and hands notifications to the app
+    loop; NOTIFY runs in the default executor.
+    """
+    name = "postgres"
+    MAX_PAYLOAD = 7900  # NOTIFY payloads must stay under 8000 bytes
+
+    def __init__(self, dsn: str, channel: str = "ws_events"):
+        self.dsn = dsn
+        self.channel = channel
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._notify_conn = None
+        self._thread = None
+        self._loop = None
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="ws-pg-listen", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._thread:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join, 3)
+        with self._lock:
+            if self._notify_conn is not None:
+                self._notify_conn.close()
+                self._notify_conn = None
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _listen(self):
+        import select
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.cursor().execute(f'LISTEN "{self.channel}"')
+                print(f"[WS] Listening on Postgres channel {self.channel}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._loop.call_soon_threadsafe(self._on_message, json.loads(notify.payload))
+            except Exception as e:
+                print(f"[WS] Postgres listener error: {e}")
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _notify(self, payload: str):
+        with self._lock:
+            if self._notify_conn is None or self._notify_conn.closed:
+                self._notify_conn = self._connect()
+            self._notify_conn.cursor().execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+    def _split(self, envelope):
+        """Split oversized batch envelopes so each NOTIFY fits the payload limit"""
+        payload = json.dumps(envelope, default=json_default)
+        if len(payload.encode()) <= self.MAX_PAYLOAD:
+            return [payload]
+        events = envelope["data"].get("events") if envelope["type"] == WebSocketEvents.PRODUCT_BATCH_UPDATED else None
+        if not events or len(events) < 2:
+            return []
+        half = len(events) // 2
+        parts = []
+        for chunk in (events[:half], events[half:]):
+            parts.extend(self._split(dict(envelope, id=uuid.uuid4().hex, data={"events": chunk})))
+        return parts
+
+    async def publish(self, envelope):
+        payloads = self._split(envelope)
+        if not payloads:
+            print(f"[WS] Event {envelope['type']} too large for NOTIFY, delivering locally only")
+            self._on_message(envelope)
+            return
+        loop = asyncio.get_running_loop()
+        for payload in payloads:
+            await loop.run_in_executor(None, self._notify, payload)
+
+
+def create_backend(kind: Optional[str] = None) -> BroadcastBackend:
+    """Backend selected by WS_BACKEND (memory | local | postgres)"""
+    from ..config import settings
+
+    kind = (kind or settings.WS_BACKEND).lower()
+    if kind == "local":
+        return LocalSocketBackend(settings.WS_BROKER_ADDRESS)
+    if kind == "postgres":
+        dsn = settings.WS_PG_DSN
+        if not dsn:
+            from sqlalchemy.engine import make_url
+            from ..database.db import DATABASE_URL
+            dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresNotifyBackend(dsn, settings.WS_PG_CHANNEL)
+    return InProcessBackend()
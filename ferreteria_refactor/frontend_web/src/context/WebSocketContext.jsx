@@ -75,9 +75,13 @@ export const WebSocketProvider = ({ children }) => {
                     const message = JSON.parse(event.data);
                     const { type, data } = message;
 
-                    if (listeners.current[type]) {
-                        listeners.current[type].forEach(cb => cb(data));
-                    }
+                    // Coalesced product changes arrive as one batch; unpack them
+                    const events = type === 'product:batch_updated' ? data.events : [{ type, data }];
+                    events.forEach(evt => {
+                        if (listeners.current[evt.type]) {
+                            listeners.current[evt.type].forEach(cb => cb(evt.data));
+                        }
+                    });
                 } catch (err) {
                     console.warn('WS: Non-JSON message', event.data);
                 }
@@ -0,0 +1,59 @@
+"""
+Recalcula el costo unitario (unit_cost) de las líneas de venta y devolución
+registradas antes de que el costo se guardara al momento de vender.
+
+Por cada línea vendida antes del corte usa el costo de la última compra del
+producto en o antes de la fecha de la venta; si no hay compras deja el costo
+que puso la migración. Las devoluciones toman el costo de su línea de venta.
+Al terminar reconstruye los acumulados diarios (sales_rollups) si ya existían.
+
+Uso:
+    python scripts/backfill_unit_cost.py
+    python scripts/backfill_unit_cost.py --before 2026-01-01 --chunk 20000
+"""
+import sys
+import os
+import argparse
+import time
+from datetime import datetime
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend_api.database.db import SessionLocal
+from backend_api.services import cost_backfill, sales_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill unit_cost on historical sale lines")
+    parser.add_argument("--before", type=datetime.fromisoformat, default=None,
+                        help="Corte (YYYY-MM-DD); por defecto, cuando se empezó a guardar el costo")
+    parser.add_argument("--chunk", type=int, default=cost_backfill.CHUNK_SIZE, help="Líneas por transacción")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        before = args.before or cost_backfill.snapshot_since(db) or datetime.now()
+        print(f"📦 Recalculando costos de líneas vendidas antes de {before:%Y-%m-%d %H:%M}...")
+        started = time.perf_counter()
+        result = cost_backfill.backfill(
+            db, before, args.chunk,
+            progress=lambda last_id, n: print(f"   ... hasta id {last_id}: {n} líneas")
+        )
+        print(f"✅ {result['sale_lines']} líneas de venta y {result['return_lines']} de devolución "
+              f"en {time.perf_counter() - started:.1f}s")
+
+        if sales_rollups.is_ready(db):
+            print("🔄 Reconstruyendo acumulados diarios...")
+            sales_rollups.rebuild(db)
+            print("✅ Acumulados al día")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
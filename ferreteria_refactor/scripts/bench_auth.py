@@ -0,0 +1,97 @@
+"""
+Benchmark: autenticación por petición (dependencies.get_current_user).
+
+Monta una ruta mínima protegida con cashier_or_admin sobre una BD SQLite
+temporal y mide peticiones autenticadas/s y consultas SQL por petición,
+con la caché de tokens/usuarios (services/auth_cache.py) apagada y encendida.
+
+Uso:
+    python scripts/bench_auth.py
+    python scripts/bench_auth.py --requests 20000 --tokens 50
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_TYPE", "sqlite")  # The benchmark only builds SQLite files
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.config import settings
+from backend_api.database.db import Base, get_db
+from backend_api.dependencies import cashier_or_admin
+from backend_api.models import models
+from backend_api.security import create_access_token
+from backend_api.services.auth_cache import auth_cache
+
+
+def build_app(Session):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping(user=Depends(cashier_or_admin)):
+        return {"user": user.id}
+
+    def session():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = session
+    return app
+
+
+def run(client, headers, n_requests, queries):
+    for h in headers:  # Warm up: every token verified once
+        client.get("/ping", headers=h)
+    queries.clear()
+    started = time.perf_counter()
+    for i in range(n_requests):
+        response = client.get("/ping", headers=headers[i % len(headers)])
+        assert response.status_code == 200, response.text
+    elapsed = time.perf_counter() - started
+    return n_requests / elapsed, len(queries) / n_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Authenticated request throughput")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=20, help="Distinct users/terminals")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([models.User(username=f"caja{i}", password_hash="x", role=models.UserRole.CASHIER, is_active=True)
+                    for i in range(args.tokens)])
+        db.commit()
+    headers = [{"Authorization": f"Bearer {create_access_token(data={'sub': f'caja{i}'})}"}
+               for i in range(args.tokens)]
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.append(a[2]))
+    with TestClient(build_app(Session)) as client:
+        results = {}
+        for label, enabled in (("sin caché", False), ("con caché", True)):
+            settings.AUTH_CACHE_ENABLED = enabled
+            auth_cache.clear()
+            results[label] = run(client, headers, args.requests, queries)
+            rate, per_request = results[label]
+            print(f"🔐 {label:10s} {rate:10,.0f} peticiones/s   {per_request:.2f} consultas SQL/petición")
+    speedup = results["con caché"][0] / results["sin caché"][0]
+    print(f"⚡ {speedup:.2f}x  ({auth_cache.stats()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: ingesta del catálogo en la BD local (sync_client).
+
+Aplica un catálogo sintético con _apply_catalog_page sobre una BD SQLite
+temporal, en páginas como las del pull, y reporta filas/s y tiempo total
+(las mismas cifras que imprime pull_catalog_from_cloud en cada sync).
+
+Escenarios:
+  full         carga inicial sobre BD vacía
+  full+drop    carga inicial con índices secundarios eliminados y reconstruidos
+  resync       mismo catálogo otra vez (todo son UPDATE)
+
+Uso:
+    python scripts/bench_catalog_ingest.py
+    python scripts/bench_catalog_ingest.py --products 50000 --page 2000
+"""
+import sys
+import os
+import argparse
+import tempfile
+import shutil
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.services import bulk_upsert, sync_client
+
+
+def synthetic_pages(n_products, page_size, n_customers=2000):
+    products = [
+        {"id": i, "name": f"Producto {i}", "sku": f"SKU-{i:06d}", "price": "4.50", "stock": "25.000",
+         "category_id": 1 + i % 25, "exchange_rate_id": 1, "is_active": True,
+         "units": [{"id": i, "unit_name": "Caja", "conversion_factor": "12", "price_usd": "50.00", "barcode": f"77{i:010d}"}]}
+        for i in range(1, n_products + 1)
+    ]
+    first = {
+        "categories": [{"id": c, "name": f"Categoria {c}"} for c in range(1, 26)],
+        "exchange_rates": [{"id": 1, "name": "BCV", "currency_code": "VES", "currency_symbol": "Bs", "rate": "40",
+                            "is_default": True, "is_active": True, "updated_at": None}],
+        "customers": [{"id": c, "name": f"Cliente {c}", "id_number": f"V-{c}"} for c in range(1, n_customers + 1)],
+    }
+    pages = [dict(products=products[i:i + page_size]) for i in range(0, len(products), page_size)]
+    pages[0].update(first)
+    return pages
+
+
+def run(db_path, pages, drop_indexes):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    stats = bulk_upsert.IngestStats()
+    if drop_indexes:
+        bulk_upsert.drop_secondary_indexes(db, sync_client.CATALOG_TABLES)
+    for page in pages:
+        sync_client._apply_catalog_page(db, page, stats)
+    db.commit()
+    if drop_indexes:
+        bulk_upsert.ensure_secondary_indexes(db, sync_client.CATALOG_TABLES)
+    stats.stop()
+    db.close()
+    engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog ingest throughput (bulk upsert)")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=2000, help="Rows per pull page")
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.products, args.page)
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        print(f"🚀 Ingesta de {args.products} productos en páginas de {args.page}")
+        print(f"{'escenario':>10} | {'filas':>8} | {'segundos':>8} | {'filas/s':>9}")
+        print("-" * 45)
+        scenarios = [
+            ("full", os.path.join(workdir, "a.db"), False),
+            ("full+drop", os.path.join(workdir, "b.db"), True),
+            ("resync", os.path.join(workdir, "a.db"), False),
+        ]
+        for name, db_path, drop in scenarios:
+            stats = run(db_path, pages, drop)
+            print(f"{name:>10} | {stats.rows:>8} | {stats.elapsed:>8.2f} | {stats.rows_per_sec:>9.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Benchmark: catálogo JSON completo vs. stream NDJSON+gzip.
+
+Genera un catálogo sintético (por defecto 50.000 productos) en una BD SQLite
+temporal "servidor" y compara las dos formas de entregarlo a un cliente
+offline:
+
+  json    -> pull_page() con todo el catálogo en un único documento (formato
+             anterior: dict en memoria + response.json() en el cliente)
+  stream  -> iter_catalog_lines() + gzip_stream() servido por lotes yield_per,
+             ingerido con CatalogStreamIngest a medida que llega
+
+Cada fase corre en su propio proceso para medir el pico de RSS por separado.
+Reporta bytes en el cable, RSS pico del servidor y del cliente, tiempo hasta
+el primer upsert y tiempo total de ingesta.
+
+Uso:
+    python scripts/bench_catalog_stream.py
+    python scripts/bench_catalog_stream.py --products 10000
+"""
+import sys
+import os
+import argparse
+import gzip
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+import zlib
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KB
+
+
+def session_for(path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend_api.database.db import Base
+    from backend_api.models import models  # noqa: F401 (register tables)
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def seed(path, n_products, n_customers=2000, n_categories=25):
+    from backend_api.models import models
+
+    db = session_for(path)
+    db.bulk_insert_mappings(models.Category, [{"id": i + 1, "name": f"Categoria {i}"} for i in range(n_categories)])
+    db.bulk_insert_mappings(models.ExchangeRate, [
+        {"id": 1, "name": "BCV", "currency_code": "VES", "currency_symbol": "Bs", "rate": 40, "is_default": True, "is_active": True},
+    ])
+    db.bulk_insert_mappings(models.Product, [
+        {"id": i + 1, "name": f"Producto sintetico {i}", "sku": f"SKU-{i:06d}", "price": 1 + i % 97,
+         "stock": 100, "is_active": True, "category_id": 1 + i % n_categories, "exchange_rate_id": 1}
+        for i in range(n_products)
+    ])
+    db.bulk_insert_mappings(models.ProductUnit, [
+        {"id": i + 1, "product_id": i + 1, "unit_name": "Caja", "conversion_factor": 12, "price_usd": 10}
+        for i in range(n_products)
+    ])
+    db.bulk_insert_mappings(models.Customer, [
+        {"id": i + 1, "name": f"Cliente {i}", "id_number": f"V-{i}", "is_blocked": False} for i in range(n_customers)
+    ])
+    db.commit()
+    db.close()
+
+
+# ---------- Phases (each runs in a child process) ----------
+
+def server_json(db_path, out_path, result):
+    from fastapi.encoders import jsonable_encoder
+    from backend_api.services import catalog_sync
+
+    db = session_for(db_path)
+    start = time.perf_counter()
+    page = catalog_sync.pull_page(db, limit=10 ** 9)
+    body = json.dumps(jsonable_encoder(page)).encode()
+    with open(out_path, "wb") as f:
+        f.write(body)
+    result.update(seconds=time.perf_counter() - start, wire=len(body),
+                  wire_gzip=len(gzip.compress(body, 6)), rss=peak_rss_mb())
+
+
+def server_stream(db_path, out_path, result):
+    from backend_api.services import catalog_sync
+
+    db = session_for(db_path)
+    start = time.perf_counter()
+    wire = 0
+    with open(out_path, "wb") as f:
+        for chunk in catalog_sync.gzip_stream(catalog_sync.iter_catalog_lines(db, None)):
+            f.write(chunk)
+            wire += len(chunk)
+    result.update(seconds=time.perf_counter() - start, wire=wire, wire_gzip=wire, rss=peak_rss_mb())
+
+
+def client_json(db_path, in_path, result):
+    from backend_api.services import sync_client
+
+    db = session_for(db_path)
+    start = time.perf_counter()
+    with open(in_path, "rb") as f:
+        data = json.loads(f.read())
+    parsed = time.perf_counter()
+    sync_client._apply_catalog_page(db, data)
+    db.commit()
+    result.update(first_upsert=parsed - start, seconds=time.perf_counter() - start, rss=peak_rss_mb())
+
+
+def client_stream(db_path, in_path, result):
+    from backend_api.services import sync_client
+
+    db = session_for(db_path)
+    ingest = sync_client.CatalogStreamIngest(db)
+    first = {}
+    original_flush = ingest.flush
+
+    def timed_flush():
+        first.setdefault("t", time.perf_counter())
+        original_flush()
+
+    ingest.flush = timed_flush
+
+    start = time.perf_counter()
+    decompressor = zlib.decompressobj(31)
+    tail = b""
+    with open(in_path, "rb") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            lines = (tail + decompressor.decompress(chunk)).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                if line:
+                    ingest.feed(json.loads(line))
+    assert ingest.complete, "stream without end record"
+    db.commit()
+    result.update(first_upsert=first.get("t", start) - start, seconds=time.perf_counter() - start, rss=peak_rss_mb())
+
+
+def run_in_child(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        result = manager.dict()
+        p = ctx.Process(target=target, args=(*args, result))
+        p.start()
+        p.join()
+        if p.exitcode != 0:
+            raise RuntimeError(f"{target.__name__} failed")
+        return dict(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full JSON catalog vs. streaming NDJSON+gzip")
+    parser.add_argument("--products", type=int, default=50000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_catalog_")
+    try:
+        server_db = os.path.join(workdir, "server.db")
+        print(f"🚀 Generando catálogo sintético: {args.products} productos...")
+        seed(server_db, args.products)
+
+        print(f"{'formato':>8} | {'cable MB':>8} | {'(gzip) MB':>9} | {'srv s':>6} | {'srv RSS MB':>10} | "
+              f"{'1er upsert s':>12} | {'ingesta s':>9} | {'cli RSS MB':>10}")
+        print("-" * 96)
+        for name, server, client in (("json", server_json, client_json), ("stream", server_stream, client_stream)):
+            payload = os.path.join(workdir, f"{name}.payload")
+            srv = run_in_child(server, server_db, payload)
+            cli = run_in_child(client, os.path.join(workdir, f"client_{name}.db"), payload)
+            print(f"{name:>8} | {srv['wire'] / 1e6:>8.2f} | {srv['wire_gzip'] / 1e6:>9.2f} | {srv['seconds']:>6.2f} | "
+                  f"{srv['rss']:>10.1f} | {cli['first_upsert']:>12.2f} | {cli['seconds']:>9.2f} | {cli['rss']:>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
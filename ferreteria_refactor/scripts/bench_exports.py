@@ -0,0 +1,140 @@
+"""
+Benchmark: exportación del Reporte Gerencial con muchas ventas.
+
+Genera N ventas (por defecto 500k) en una BD SQLite temporal y mide, cada
+modo en un proceso nuevo para que el pico de memoria sea comparable:
+
+  legacy      la ruta anterior: .all() + DataFrame + ExcelWriter + reabrir
+              el libro para darle estilo, todo en un BytesIO
+  xlsx        report_exports + streaming_export (yield_per + zip en flujo)
+  csv         solo el detalle de ventas en CSV
+
+Reporta tiempo hasta el primer byte (TTFB), tiempo total, tamaño y el
+pico de RSS del proceso (junto al que tenía antes de exportar).
+
+Uso:
+    python scripts/bench_exports.py
+    python scripts/bench_exports.py --sales 100000 --skip-legacy
+"""
+import sys
+import os
+import argparse
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.models import models
+from backend_api.services import report_exports, streaming_export
+
+
+def seed(db, n_sales, days=365):
+    conn = db.connection()
+    conn.execute(models.Customer.__table__.insert(), [{"id": i, "name": f"Cliente {i}"} for i in range(1, 501)])
+    conn.execute(models.Product.__table__.insert(), [
+        {"id": i, "name": f"Producto {i}", "sku": f"SKU-{i}", "price": 10, "cost_price": 6, "stock": 100,
+         "is_active": True}
+        for i in range(1, 2001)
+    ])
+    start = datetime.now() - timedelta(days=days)
+    batch = 50000
+    for first in range(1, n_sales + 1, batch):
+        conn.execute(models.Sale.__table__.insert(), [
+            {"id": sid, "date": start + timedelta(seconds=sid * days * 86400 // n_sales),
+             "total_amount": 10 + sid % 90, "payment_method": "Efectivo", "currency": "USD",
+             "customer_id": sid % 500 + 1 if sid % 3 else None, "paid": True}
+            for sid in range(first, min(first + batch, n_sales + 1))
+        ])
+    db.commit()
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_export(db, start_dt, end_dt):
+    """The previous /export/excel sales path (summary sheets left out: they are small)"""
+    import pandas as pd
+    from io import BytesIO
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill
+
+    sales = list(report_exports.sales_rows(db, start_dt, end_dt))  # .all() in the old code
+    df = pd.DataFrame(sales, columns=report_exports.SALES_HEADER)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Ventas Detalle', index=False)
+    output.seek(0)
+    workbook = openpyxl.load_workbook(output)
+    for cell in workbook['Ventas Detalle'][1]:
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    final_output = BytesIO()
+    workbook.save(final_output)
+    yield final_output.getvalue()
+
+
+def run_mode(db_path, mode):
+    engine = create_engine(f"sqlite:///{db_path}")
+    db = sessionmaker(bind=engine)()
+    start_dt = datetime.combine(date.today() - timedelta(days=400), datetime.min.time())
+    end_dt = datetime.combine(date.today(), datetime.max.time())
+    baseline = max_rss_mb()
+
+    started = time.perf_counter()
+    if mode == "legacy":
+        chunks = legacy_export(db, start_dt, end_dt)
+    elif mode == "xlsx":
+        chunks = streaming_export.stream_xlsx(report_exports.management_report(db, start_dt, end_dt))
+    else:
+        chunks = streaming_export.stream_csv(report_exports.SALES_HEADER,
+                                             report_exports.sales_rows(db, start_dt, end_dt))
+    first_byte = None
+    size = 0
+    for chunk in chunks:
+        if first_byte is None and chunk:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    print(f"⏱️  {mode:<7} TTFB {first_byte * 1000:9.1f} ms | total {total:6.2f} s | "
+          f"{size / 1e6:6.1f} MB | pico RSS {max_rss_mb():7.1f} MB (antes de exportar {baseline:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming export benchmark")
+    parser.add_argument("--sales", type=int, default=500_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="Omitir la ruta pandas/openpyxl")
+    parser.add_argument("--run", nargs=2, metavar=("DB", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(*args.run)
+        return
+
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    print(f"📦 Generando {args.sales} ventas...")
+    started = time.perf_counter()
+    seed(db, args.sales)
+    db.close()
+    print(f"✅ Histórico listo en {time.perf_counter() - started:.1f}s\n")
+
+    modes = ["csv", "xlsx"] if args.skip_legacy else ["legacy", "xlsx", "csv"]
+    for mode in modes:
+        subprocess.run([sys.executable, __file__, "--run", db_path, mode], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark: logins bajo carga con tráfico websocket en paralelo.
+
+Levanta uvicorn en un hilo con el router real de /auth sobre una BD SQLite
+temporal, más un websocket que emite un tick cada --tick-ms. Mientras un
+cliente websocket recibe ticks, lanza ráfagas de logins concurrentes y mide:
+  - latencia de login p50/p99
+  - retraso de los ticks websocket (p99 y máximo) y del event loop
+
+Compara el login anterior (async def con bcrypt en el event loop) con el
+actual (def en el threadpool + pool acotado de security.py).
+
+Uso:
+    python scripts/bench_login_ws.py
+    python scripts/bench_login_ws.py --logins 200 --concurrency 20
+    BCRYPT_ROUNDS=10 python scripts/bench_login_ws.py
+"""
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_TYPE", "sqlite")  # The benchmark only builds SQLite files
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI, Form, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from websockets.sync.client import connect
+
+from backend_api.database.db import Base, get_db, get_unserialized_db
+from backend_api.models import models
+from backend_api.routers.auth import router as auth_router
+from backend_api.security import create_access_token, get_password_hash, pwd_context
+
+
+def build_app(Session, tick_ms, lag):
+    app = FastAPI()
+    app.include_router(auth_router)
+
+    def session():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_unserialized_db] = session
+
+    @app.post("/legacy/token")
+    async def legacy_login(username: str = Form(...), password: str = Form(...), db=Depends(session)):
+        # The previous /auth/token: async def, bcrypt straight on the event loop
+        user = db.query(models.User).filter(models.User.username == username).first()
+        if not user or not pwd_context.verify(password, user.password_hash):
+            raise HTTPException(status_code=401)
+        return {"access_token": create_access_token(data={"sub": user.username}), "token_type": "bearer"}
+
+    @app.websocket("/ws")
+    async def ticks(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                await websocket.send_text(str(time.perf_counter()))
+                await asyncio.sleep(tick_ms / 1000)
+        except WebSocketDisconnect:
+            pass
+
+    @app.on_event("startup")
+    async def watch_loop():
+        async def monitor():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag.append(time.perf_counter() - started - 0.01)
+        asyncio.get_running_loop().create_task(monitor())
+
+    return app
+
+
+def pick(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+
+
+def listen(url, gaps, stop):
+    with connect(url) as ws:
+        last = None
+        while not stop.is_set():
+            ws.recv()
+            now = time.perf_counter()
+            if last is not None:
+                gaps.append(now - last)
+            last = now
+
+
+def run(base_url, path, n_logins, concurrency, users, tick_ms, lag):
+    gaps, stop = [], threading.Event()
+    listener = threading.Thread(target=listen, args=(base_url.replace("http", "ws") + "/ws", gaps, stop))
+    listener.start()
+    time.sleep(0.5)  # Baseline ticks before the burst
+    lag.clear()
+    gaps.clear()
+
+    def one(i):
+        started = time.perf_counter()
+        response = client.post(path, data={"username": users[i % len(users)], "password": "clave123"})
+        assert response.status_code == 200, response.text
+        return time.perf_counter() - started
+
+    with httpx.Client(base_url=base_url, timeout=120) as client, ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(one, range(n_logins)))
+        elapsed = time.perf_counter() - started
+    stop.set()
+    listener.join()
+
+    delays = [max(0.0, gap - tick_ms / 1000) for gap in gaps]
+    print(f"   login   p50 {pick(latencies, 0.5):8.1f} ms   p99 {pick(latencies, 0.99):8.1f} ms   "
+          f"{n_logins / elapsed:6.1f} logins/s")
+    print(f"   ws tick retraso p99 {pick(delays, 0.99):8.1f} ms   máx {pick(delays, 1.0):8.1f} ms   "
+          f"event loop máx {pick(lag, 1.0):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login latency with websocket traffic")
+    parser.add_argument("--logins", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--tick-ms", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    password_hash = get_password_hash("clave123")
+    users = [f"caja{i}" for i in range(args.users)]
+    with Session() as db:
+        db.add_all([models.User(username=name, password_hash=password_hash, role=models.UserRole.CASHIER,
+                                is_active=True) for name in users])
+        db.commit()
+
+    lag = []
+    server = uvicorn.Server(uvicorn.Config(build_app(Session, args.tick_ms, lag), port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"🔑 {args.logins} logins, {args.concurrency} concurrentes, bcrypt cost {password_hash.split('$')[2]}, "
+          f"{os.cpu_count()} CPU")
+    for label, path in (("antes: async + bcrypt en el event loop", "/legacy/token"),
+                        ("ahora: threadpool + pool de hash acotado", "/auth/token")):
+        print(f"\n⏱️  {label}")
+        run(base_url, path, args.logins, args.concurrency, users, args.tick_ms, lag)
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark: latencia de cobro (POST /products/sales/) mientras se exporta un reporte.
+
+Crea una BD SQLite temporal con N ventas históricas, levanta la API con
+uvicorn y mide el p50/p95/p99 de las ventas que registran varios cajeros
+simultáneos, primero en reposo y luego con un gerente descargando el
+Reporte Gerencial (/reports/export/excel) una y otra vez. Compara:
+
+  shared   configuración original: reportes en el mismo pool que el POS,
+           journal clásico (el lector bloquea al escritor)
+  split    get_read_db: pool propio de solo lectura, WAL, timeout por sentencia
+  desktop  split + perfil SQLite de escritorio (synchronous=NORMAL, caché,
+           mmap, BEGIN IMMEDIATE con escrituras serializadas)
+
+Uso:
+    python scripts/bench_mixed_workload.py
+    python scripts/bench_mixed_workload.py --sales 100000 --cashiers 8 --seconds 20
+    python scripts/bench_mixed_workload.py --modes split desktop
+"""
+import sys
+import os
+import argparse
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to path so we can import backend_api modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+os.environ.setdefault("DB_TYPE", "sqlite")  # The benchmark only builds SQLite files
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.models import models
+from backend_api.security import create_access_token, get_password_hash
+
+MODES = {
+    "shared": {"DB_READ_SPLIT": "false", "SQLITE_WAL": "false", "SQLITE_SYNCHRONOUS": "FULL",
+               "SQLITE_SERIALIZE_WRITES": "false"},
+    "split": {"DB_READ_SPLIT": "true", "SQLITE_WAL": "true", "SQLITE_SYNCHRONOUS": "FULL",
+              "SQLITE_SERIALIZE_WRITES": "false"},
+    "desktop": {},  # Defaults
+}
+
+
+def seed(db_path, n_sales, days=365):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    conn = db.connection()
+    conn.execute(models.User.__table__.insert(), [{"id": 1, "username": "admin", "full_name": "Admin",
+                                                   "password_hash": get_password_hash("admin123"),
+                                                   "role": models.UserRole.ADMIN, "is_active": True}])
+    conn.execute(models.ExchangeRate.__table__.insert(), [
+        {"name": "BCV", "currency_code": "USD", "currency_symbol": "$", "rate": 1, "is_default": True},
+        {"name": "BCV", "currency_code": "VES", "currency_symbol": "Bs", "rate": 40, "is_default": True},
+    ])
+    conn.execute(models.Warehouse.__table__.insert(), [{"id": 1, "name": "Principal", "is_main": True,
+                                                        "is_active": True}])
+    conn.execute(models.Customer.__table__.insert(), [{"id": i, "name": f"Cliente {i}"} for i in range(1, 501)])
+    conn.execute(models.Product.__table__.insert(), [
+        {"id": i, "name": f"Producto {i}", "sku": f"SKU-{i}", "price": 10, "cost_price": 6, "stock": 10 ** 6,
+         "is_active": True}
+        for i in range(1, 2001)
+    ])
+    conn.execute(models.ProductStock.__table__.insert(), [
+        {"product_id": i, "warehouse_id": 1, "quantity": 10 ** 6} for i in range(1, 2001)
+    ])
+    start = datetime.now() - timedelta(days=days)
+    batch = 50000
+    for first in range(1, n_sales + 1, batch):
+        conn.execute(models.Sale.__table__.insert(), [
+            {"id": sid, "date": start + timedelta(seconds=sid * days * 86400 // n_sales),
+             "total_amount": 10 + sid % 90, "payment_method": "Efectivo", "currency": "USD",
+             "customer_id": sid % 500 + 1 if sid % 3 else None, "paid": True}
+            for sid in range(first, min(first + batch, n_sales + 1))
+        ])
+    db.commit()
+    db.close()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def checkout_load(base_url, headers, cashiers, seconds):
+    """Sales from `cashiers` threads for `seconds`; returns latencies (ms) and errors"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def cashier(n):
+        with httpx.Client(base_url=base_url, headers=headers, timeout=60) as client:
+            i = 0
+            while time.monotonic() < stop_at:
+                product_id = (n * 997 + i) % 2000 + 1
+                payload = {
+                    "items": [{"product_id": product_id, "quantity": 1, "unit_price": 10.0, "subtotal": 10.0,
+                               "conversion_factor": 1}],
+                    "total_amount": 10.0,
+                    "payments": [{"amount": 10.0, "currency": "USD", "payment_method": "Efectivo",
+                                  "exchange_rate": 1.0}],
+                }
+                started = time.perf_counter()
+                response = client.post("/api/v1/products/sales/", json=payload)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    (latencies if response.status_code == 200 else errors).append(elapsed)
+                i += 1
+
+    threads = [threading.Thread(target=cashier, args=(n,)) for n in range(cashiers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def export_loop(base_url, headers, stop, done):
+    with httpx.Client(base_url=base_url, headers=headers, timeout=600) as client:
+        start_date = (datetime.now() - timedelta(days=400)).date()
+        while not stop.is_set():
+            started = time.perf_counter()
+            with client.stream("GET", "/api/v1/reports/export/excel",
+                               params={"start_date": str(start_date)}) as response:
+                for _ in response.iter_bytes():
+                    if stop.is_set():
+                        break
+            done.append(time.perf_counter() - started)
+
+
+def run_mode(mode, db_path, port, args):
+    env = dict(os.environ, DB_TYPE="sqlite", SQLITE_DB_NAME=db_path, **MODES[mode])
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend_api.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'admin'})}"}
+    try:
+        for _ in range(600):
+            try:
+                if httpx.get(f"{base_url}/api/v1/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        httpx.post(f"{base_url}/api/v1/cash/sessions/open", json={"initial_cash": 100}, headers=headers)
+
+        for phase in ("reposo", "con export"):
+            stop, exports = threading.Event(), []
+            exporter = None
+            if phase == "con export":
+                exporter = threading.Thread(target=export_loop, args=(base_url, headers, stop, exports))
+                exporter.start()
+                time.sleep(1.0)  # Let the export get going
+            latencies, errors = checkout_load(base_url, headers, args.cashiers, args.seconds)
+            stop.set()
+            if exporter:
+                exporter.join()
+            print(f"⏱️  {mode:<7} {phase:<10} ventas {len(latencies):5d} | p50 {percentile(latencies, 50):8.1f} ms | "
+                  f"p95 {percentile(latencies, 95):8.1f} ms | p99 {percentile(latencies, 99):8.1f} ms | "
+                  f"errores {len(errors)}" + (f" | exports {len(exports)}" if exporter else ""))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed POS + report workload benchmark")
+    parser.add_argument("--sales", type=int, default=200_000)
+    parser.add_argument("--cashiers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    print(f"📦 Generando {args.sales} ventas...")
+    for n, mode in enumerate(args.modes):
+        # Same starting data for every mode
+        db_path = os.path.join(tmp, f"bench_{mode}.db")
+        seed(db_path, args.sales)
+        run_mode(mode, db_path, args.port + n, args)
+
+
+if __name__ == "__main__":
+    main()
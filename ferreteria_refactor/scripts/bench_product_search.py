@@ -0,0 +1,117 @@
+"""
+Benchmark: búsqueda de productos (services/product_search.py).
+
+Para cada tamaño de catálogo (por defecto 10k, 100k y 1M productos) genera
+nombres de ferretería variados en una BD SQLite temporal, construye el índice
+FTS5 y mide la latencia (p50/p95/p99) de consultas típicas del mostrador,
+frente al filtro ILIKE '%q%' de antes.
+
+Uso:
+    python scripts/bench_product_search.py
+    python scripts/bench_product_search.py --sizes 10000,100000 --queries 300
+"""
+import sys
+import os
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_TYPE", "sqlite")  # The benchmark only builds SQLite files
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.models import models
+from backend_api.services import product_search
+
+KINDS = ["Tornillo", "Tuerca", "Arandela", "Clavo", "Tubo", "Codo", "Llave", "Cable", "Brocha", "Pintura",
+         "Martillo", "Alicate", "Destornillador", "Cemento", "Manguera", "Bombillo", "Candado", "Bisagra"]
+FINISHES = ["Galvanizado", "Negro", "Inoxidable", "Cromado", "PVC", "Cobre", "Bronce", "Aluminio", "Acero"]
+SIZES = ["1/4", "3/8", "1/2", "3/4", "1", "1-1/2", "2", "2.5mm", "4mm", "10mm", "16oz", "20m"]
+BRANDS = ["Truper", "Stanley", "Pretul", "Bosch", "Makita", "Vinotinto", "Ferrum", "Gerardo"]
+CATEGORIES = ["Tornillería", "Plomería", "Electricidad", "Pinturas", "Herramientas", "Construcción"]
+QUERIES = ["tornillo 1/2 galv", "tuerca 3/8", "cable 2.5", "llave stanley", "tubo pvc 3/4", "martillo",
+           "brocha", "pintura negro", "codo cobre 1/2", "TOR-00013", "destornillador cromado", "manguera 20m",
+           "tornilo galvanisado", "candado bronse", "bisagra acero 2"]
+
+
+def seed(db, n_products):
+    conn = db.connection()
+    conn.execute(models.Category.__table__.insert(),
+                 [{"id": i + 1, "name": name} for i, name in enumerate(CATEGORIES)])
+    rng = random.Random(7)
+    batch = 50000
+    for first in range(1, n_products + 1, batch):
+        ids = range(first, min(first + batch, n_products + 1))
+        conn.execute(models.Product.__table__.insert(), [
+            {"id": i, "name": f"{rng.choice(KINDS)} {rng.choice(FINISHES)} {rng.choice(SIZES)} {rng.choice(BRANDS)}",
+             "sku": f"TOR-{i:05d}" if i % 2 else f"SKU-{i:07d}", "price": 1 + i % 300,
+             "stock": rng.choice([0, 0, 5, 20, 100]), "category_id": 1 + i % len(CATEGORIES), "is_active": True}
+            for i in ids
+        ])
+    db.commit()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def measure(fn, queries):
+    samples, by_query = [], {}
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - started)
+        by_query.setdefault(query, []).append(samples[-1])
+    slowest = sorted(by_query, key=lambda q: statistics.median(by_query[q]), reverse=True)[:3]
+    return percentiles(samples) + ([(q, statistics.median(by_query[q]) * 1000) for q in slowest],)
+
+
+def run(n_products, n_queries, like_queries):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    print(f"\n📦 {n_products:,} productos")
+    with Session() as db:
+        seed(db, n_products)
+
+    with Session() as db:
+        product_search.create_index(db)
+        started = time.perf_counter()
+        product_search.rebuild(db)
+        db.commit()
+        print(f"⏱️  Índice: {time.perf_counter() - started:.1f} s, "
+              f"BD {os.path.getsize(db_path) / 1e6:.0f} MB")
+
+    queries = [QUERIES[i % len(QUERIES)] for i in range(n_queries)]
+    with Session() as db:
+        product_search.search(db, "calentar")  # Warm the page cache
+        fts = measure(lambda q: product_search.search(db, q), queries)
+        print(f"🔎 FTS5:  p50 {fts[0]:7.2f} ms   p95 {fts[1]:7.2f} ms   p99 {fts[2]:7.2f} ms")
+        print("   más lentas: " + ", ".join(f"'{q}' {ms:.1f} ms" for q, ms in fts[3]))
+
+        like = lambda q: product_search._search_like(db, q, product_search.DEFAULT_LIMIT, None)
+        ilike = measure(like, queries[:like_queries])
+        print(f"🐢 ILIKE: p50 {ilike[0]:7.2f} ms   p95 {ilike[1]:7.2f} ms   p99 {ilike[2]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product search benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--like-queries", type=int, default=45, help="The ILIKE baseline is slow on big catalogs")
+    args = parser.parse_args()
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size, args.queries, args.like_queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: reportes de ganancia sobre un histórico sintético grande.
+
+Genera un histórico de ventas (por defecto 1M de líneas repartidas en 120
+días) en una BD SQLite temporal y compara, para /profit/sales sobre todo
+el período:
+
+  legacy      la ruta anterior: cargar cada SaleDetail por ORM y multiplicar
+              por product.cost_price en Python
+  sum         SUM(quantity * unit_cost) en SQL (costo guardado en la venta)
+  live        sales_rollups.period_totals sin acumulados (agregación en vivo)
+  rollups     period_totals con los acumulados diarios ya construidos
+
+Uso:
+    python scripts/bench_profit_reports.py
+    python scripts/bench_profit_reports.py --lines 200000 --skip-legacy
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.models import models
+from backend_api.services import sales_rollups
+
+
+def seed(db, lines, days, products=2000, lines_per_sale=4):
+    random.seed(7)
+    conn = db.connection()
+    conn.execute(models.Product.__table__.insert(), [
+        {"id": i, "name": f"Producto {i}", "price": 10, "cost_price": Decimal(random.randint(200, 900)) / 100,
+         "stock": 1000, "is_active": True}
+        for i in range(1, products + 1)
+    ])
+    start = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    n_sales = lines // lines_per_sale
+    batch = 20000
+    for first in range(1, n_sales + 1, batch):
+        ids = range(first, min(first + batch, n_sales + 1))
+        conn.execute(models.Sale.__table__.insert(), [
+            {"id": sid, "date": start + timedelta(seconds=sid * days * 86400 // n_sales),
+             "total_amount": 40, "currency": "USD", "warehouse_id": 1}
+            for sid in ids
+        ])
+        details = []
+        for sid in ids:
+            for _ in range(lines_per_sale):
+                pid = random.randint(1, products)
+                qty = random.randint(1, 5)
+                details.append({"sale_id": sid, "product_id": pid, "quantity": qty, "unit_price": 10,
+                                "subtotal": 10 * qty, "unit_cost": Decimal(random.randint(200, 900)) / 100})
+        conn.execute(models.SaleDetail.__table__.insert(), details)
+        conn.execute(models.SalePayment.__table__.insert(), [
+            {"sale_id": sid, "amount": 40, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1}
+            for sid in ids
+        ])
+        print(f"   ... {min(first + batch - 1, n_sales) * lines_per_sale} líneas")
+    db.commit()
+
+
+def legacy_profit(db):
+    """The previous /profit/sales body: every line through the ORM"""
+    details = db.query(models.SaleDetail).join(models.Sale).all()
+    total_revenue = 0
+    total_cost = 0
+    for detail in details:
+        total_revenue += detail.subtotal
+        total_cost += detail.product.cost_price * detail.quantity
+    return total_revenue - total_cost
+
+
+def sum_profit(db):
+    revenue, cost = db.query(
+        func.sum(models.SaleDetail.subtotal),
+        func.sum(models.SaleDetail.quantity * models.SaleDetail.unit_cost)
+    ).one()
+    return revenue - cost
+
+
+def timed(label, fn, repeat=1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"⏱️  {label:<10} {best * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profit report benchmark")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--skip-legacy", action="store_true", help="Omitir la ruta ORM (lenta con 1M líneas)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+
+    print(f"📦 Generando {args.lines} líneas en {args.days} días...")
+    started = time.perf_counter()
+    seed(db, args.lines, args.days)
+    print(f"✅ Histórico listo en {time.perf_counter() - started:.1f}s\n")
+
+    first_day = date.today() - timedelta(days=args.days)
+    if not args.skip_legacy:
+        timed("legacy", lambda: legacy_profit(db))
+        db.expunge_all()
+    timed("sum", lambda: sum_profit(db), repeat=3)
+    timed("live", lambda: sales_rollups.period_totals(db, first_day, date.today()), repeat=3)
+
+    started = time.perf_counter()
+    result = sales_rollups.rebuild(db)
+    print(f"🔄 Rebuild de acumulados: {time.perf_counter() - started:.1f}s ({result['product_rows']} filas)")
+    timed("rollups", lambda: sales_rollups.period_totals(db, first_day, date.today()), repeat=3)
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: índice de escaneo en memoria (services/scan_index.py).
+
+Genera N productos (por defecto 100k) con una presentación con código de
+barras cada uno y stock en dos almacenes (precios y existencias variados),
+en una BD SQLite temporal, y mide:
+
+  - tiempo de construcción del índice y memoria retenida (tracemalloc)
+  - búsquedas/s en memoria: SKU, código de barras y prefijo de nombre
+  - búsquedas/s contra la BD (SKU y luego código de barras, como antes)
+
+Uso:
+    python scripts/bench_scan_index.py
+    python scripts/bench_scan_index.py --products 200000 --lookups 500000
+"""
+import sys
+import os
+import argparse
+import gc
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_TYPE", "sqlite")  # The benchmark only builds SQLite files
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base
+from backend_api.models import models
+from backend_api.services.scan_index import ScanIndex
+
+WORDS = ["Martillo", "Tornillo", "Tubo", "Cemento", "Cable", "Llave", "Pintura", "Brocha", "Clavo", "Codo"]
+
+
+def seed(db, n_products):
+    conn = db.connection()
+    conn.execute(models.Warehouse.__table__.insert(), [{"id": 1, "name": "Principal", "is_main": True},
+                                                       {"id": 2, "name": "Sucursal", "is_main": False}])
+    batch = 50000
+    for first in range(1, n_products + 1, batch):
+        ids = range(first, min(first + batch, n_products + 1))
+        conn.execute(models.Product.__table__.insert(), [
+            {"id": i, "name": f"{WORDS[i % 10]} {i % 997} mm Ref {i}", "sku": f"SKU-{i:07d}",
+             "price": 1 + (i * 7919 % 100000) / 100, "stock": i % 500, "is_active": True}
+            for i in ids
+        ])
+        conn.execute(models.ProductUnit.__table__.insert(), [
+            {"product_id": i, "unit_name": "Caja", "conversion_factor": 12, "barcode": f"759{i:010d}"}
+            for i in ids
+        ])
+        conn.execute(models.ProductStock.__table__.insert(), [
+            {"product_id": i, "warehouse_id": w, "quantity": (i * w) % 300} for i in ids for w in (1, 2)
+        ])
+    db.commit()
+
+
+def rate(fn, keys):
+    started = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return len(keys) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory scan index benchmark")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--db-lookups", type=int, default=5_000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    print(f"📦 Generando {args.products} productos...")
+    with Session() as db:
+        seed(db, args.products)
+
+    index = ScanIndex(session_factory=Session)
+    started = time.perf_counter()
+    index.rebuild()
+    print(f"⏱️  Construcción: {time.perf_counter() - started:.2f} s")
+
+    # Memory kept by a fresh index, measured on a second build
+    index = ScanIndex(session_factory=Session)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    index.rebuild()
+    gc.collect()
+    retained = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    per_100k = retained / args.products * 100_000 / 1e6
+    print(f"🧠 Memoria retenida: {retained / 1e6:.1f} MB ({per_100k:.1f} MB por 100k SKUs)")
+
+    ids = [random.randint(1, args.products) for _ in range(args.lookups)]
+    skus = [f"SKU-{i:07d}" for i in ids]
+    barcodes = [f"759{i:010d}" for i in ids]
+    prefixes = [f"{WORDS[i % 10]} {i % 997}"[:random.randint(3, 12)] for i in ids[:args.lookups // 10]]
+    print(f"🔎 SKU:      {rate(index.lookup, skus):12,.0f} búsquedas/s")
+    print(f"🔎 Barras:   {rate(index.lookup, barcodes):12,.0f} búsquedas/s")
+    print(f"🔎 Prefijo:  {rate(lambda p: index.search_name(p, limit=10), prefixes):12,.0f} búsquedas/s")
+
+    with Session() as db:
+        def db_lookup(code):
+            product = db.query(models.Product).filter(models.Product.sku == code).first()
+            if product is None:
+                unit = db.query(models.ProductUnit).filter(models.ProductUnit.barcode == code).first()
+                product = unit.product if unit else None
+            db.expunge_all()
+            return product
+        print(f"🐢 BD (SKU o barras, sesión ORM): "
+              f"{rate(db_lookup, barcodes[:args.db_lookups]):8,.0f} búsquedas/s")
+
+
+if __name__ == "__main__":
+    main()
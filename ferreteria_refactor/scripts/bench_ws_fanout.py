@@ -0,0 +1,106 @@
+"""
+Benchmark: latencia de entrega WebSocket con un cliente lento.
+
+Conecta N clientes simulados (por defecto 200) al ConnectionManager, uno de
+ellos con un lector deliberadamente lento, emite eventos a ritmo constante y
+mide la latencia broadcast -> recepción en los clientes normales (p50/p99).
+Se compara contra el broadcast secuencial anterior (un send_text tras otro),
+reproducido abajo como referencia.
+
+Uso:
+    python scripts/bench_ws_fanout.py
+    python scripts/bench_ws_fanout.py --clients 500 --events 300 --slow-delay 0.5
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend_api.websocket.manager import ConnectionManager
+from backend_api.websocket.events import WebSocketEvents
+
+
+class SimulatedClient:
+    """Minimal WebSocket stand-in: records when each message arrives"""
+
+    def __init__(self, read_delay: float = 0.0):
+        self.read_delay = read_delay
+        self.latencies = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.read_delay:
+            await asyncio.sleep(self.read_delay)
+        else:
+            await asyncio.sleep(0)  # Yield like a real socket write would
+        sent_at = json.loads(message)["data"]["sent_at"]
+        self.latencies.append((time.perf_counter() - sent_at) * 1000)
+
+
+class SequentialManager(ConnectionManager):
+    """Previous behavior: serialize per call and await every client in turn"""
+
+    async def connect(self, websocket, topics=None, warehouse_id=None):
+        await websocket.accept()
+        self.clients[websocket] = None
+
+    async def broadcast(self, event_type, data):
+        message = self._serialize(event_type, data, "")
+        for connection in list(self.clients):
+            await connection.send_text(message)
+
+
+async def run(manager_cls, n_clients, n_events, interval, slow_delay):
+    manager = manager_cls(send_timeout=max(5.0, slow_delay * 10))
+    fast = [SimulatedClient() for _ in range(n_clients - 1)]
+    slow = SimulatedClient(read_delay=slow_delay)
+    await manager.connect(slow)
+    for client in fast:
+        await manager.connect(client)
+
+    start = time.perf_counter()
+    for i in range(n_events):
+        await manager.broadcast(WebSocketEvents.PRODUCT_STOCK_UPDATED, {
+            "id": i % 50, "stock": i, "sent_at": time.perf_counter()
+        })
+        await asyncio.sleep(interval)
+
+    # Wait until every fast client received every event
+    expected = n_events
+    while any(len(c.latencies) < expected for c in fast):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for c in fast for l in c.latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return statistics.median(latencies), p99, elapsed, len(slow.latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket fan-out latency with one slow client")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between events")
+    parser.add_argument("--slow-delay", type=float, default=0.25, help="Seconds the slow client takes per message")
+    args = parser.parse_args()
+
+    print(f"🚀 Fan-out: {args.clients} clientes (1 lento, {args.slow_delay * 1000:.0f} ms/msg), {args.events} eventos")
+    print(f"{'impl':>12} | {'p50 ms':>9} | {'p99 ms':>9} | {'total s':>8} | {'lento recibió':>13}")
+    print("-" * 64)
+    for name, cls in (("sequential", SequentialManager), ("queued", ConnectionManager)):
+        p50, p99, elapsed, slow_got = asyncio.run(
+            run(cls, args.clients, args.events, args.interval, args.slow_delay)
+        )
+        print(f"{name:>12} | {p50:>9.2f} | {p99:>9.2f} | {elapsed:>8.2f} | {slow_got:>13}")
+
+
+if __name__ == "__main__":
+    main()
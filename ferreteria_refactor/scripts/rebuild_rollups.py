@@ -0,0 +1,49 @@
+"""
+Reconstruye los acumulados diarios de ventas (sales_rollup_daily y
+currency_rollup_daily) a partir de ventas, devoluciones y movimientos de caja.
+
+Ejecutarlo una vez después de la migración para cargar el histórico; a
+partir de ahí las ventas y devoluciones los mantienen al confirmar. Sirve
+también para corregir un rango tras editar datos a mano.
+
+Uso:
+    python scripts/rebuild_rollups.py
+    python scripts/rebuild_rollups.py --start 2026-01-01 --end 2026-01-31
+"""
+import sys
+import os
+import argparse
+import time
+from datetime import date
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend_api.database.db import SessionLocal
+from backend_api.services import sales_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily sales rollups")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="Primer día (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Último día (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        result = sales_rollups.rebuild(db, args.start, args.end)
+        elapsed = time.perf_counter() - started
+        scope = f"{args.start or 'inicio'} → {args.end or 'hoy'}"
+        print(f"✅ Acumulados reconstruidos ({scope}) en {elapsed:.2f}s: "
+              f"{result['product_rows']} filas producto, {result['currency_rows']} filas moneda")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error reconstruyendo acumulados: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Concilia los saldos corridos de caja (cash_session_balances) con los pagos
+y movimientos reales, y reporta las diferencias encontradas.
+
+Por defecto revisa la caja abierta y corrige lo que no cuadre. Con --all
+recorre todas las sesiones (útil tras la migración, para dejar cargado el
+histórico); con --dry-run solo informa.
+
+Uso:
+    python scripts/reconcile_cash.py
+    python scripts/reconcile_cash.py --all
+    python scripts/reconcile_cash.py --session 42 --dry-run
+"""
+import sys
+import os
+import argparse
+
+# Add parent directory to path so we can import backend_api modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend_api.database.db import SessionLocal
+from backend_api.models import models
+from backend_api.services import cash_ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile cash session running balances")
+    parser.add_argument("--session", type=int, action="append", help="Id de sesión (se puede repetir)")
+    parser.add_argument("--all", action="store_true", help="Todas las sesiones, abiertas y cerradas")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reportar, no corregir")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        session_ids = args.session
+        if args.all:
+            session_ids = [sid for (sid,) in db.query(models.CashSession.id)]
+        drift = cash_ledger.reconcile(db, session_ids, fix=not args.dry_run)
+        for d in drift:
+            print(f"⚠️  Sesión {d['session_id']} {d['currency']} {d['field']}: "
+                  f"guardado {d['stored']:.2f} / real {d['derived']:.2f}")
+        if args.dry_run:
+            db.rollback()
+        else:
+            db.commit()
+        if drift:
+            action = "reportadas" if args.dry_run else "corregidas"
+            print(f"🔄 {len(drift)} diferencias {action}")
+        else:
+            print("✅ Saldos de caja al día")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error conciliando caja: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 import pytest
 import os
+import re
 import sys
+from contextlib import contextmanager
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, event, StaticPool
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
 from backend_api.main import app
-from backend_api.database.db import Base, get_db
+from backend_api.database.db import Base, get_db, get_read_db, get_unserialized_db
 from backend_api.models import models
 from backend_api.security import create_access_token, get_password_hash
+from backend_api.services.auth_cache import auth_cache
+from backend_api.services.config_store import config_store
 
 # In-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -27,6 +31,8 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 def db_session():
     """Create a fresh database for each test."""
     Base.metadata.create_all(bind=engine)
+    auth_cache.clear()  # Users are recreated with the same names and ids in every test
+    config_store.invalidate()  # So are rates and config rows
     session = TestingSessionLocal()
     
     # Seed required data (Exchange Rates, etc)
@@ -75,6 +81,8 @@ def client(db_session):
             pass
             
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_unserialized_db] = override_get_db
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -84,3 +92,32 @@ def auth_headers():
     """Return headers with valid Admin token."""
     access_token = create_access_token(data={"sub": "admin"})
     return {"Authorization": f"Bearer {access_token}"}
+
+@contextmanager
+def capture_sql(engine, pattern=None, with_parameters=False):
+    """
+    Collect the statements run on `engine` inside the block, only those
+    matching the regex `pattern` (case-insensitive, `.` spans lines) if given.
+    with_parameters collects (statement, parameters) and skips executemany.
+    """
+    matches = re.compile(pattern, re.IGNORECASE | re.DOTALL).search if pattern else None
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if matches is not None and not matches(statement):
+            return
+        if not with_parameters:
+            statements.append(statement)
+        elif not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def captured_sql():
+    """`with captured_sql(engine, pattern) as statements:` (see capture_sql)"""
+    return capture_sql
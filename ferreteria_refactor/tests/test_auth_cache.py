@@ -0,0 +1,89 @@
+import time
+from backend_api.models import models
+from backend_api.security import create_access_token
+from backend_api.services import change_tracker
+from backend_api.services.auth_cache import AuthCache, AuthUser, auth_cache
+from backend_api.websocket.events import WebSocketEvents
+
+CASHIER_ONLY = "/api/v1/products/sales/999999"  # 404 once the role check passes
+
+
+USER_QUERIES = r"^\s*SELECT\b.*\bFROM users\b"
+
+
+def test_repeat_requests_skip_the_user_query(client, db_session, auth_headers, captured_sql):
+    with captured_sql(db_session.get_bind(), USER_QUERIES) as statements:
+        assert client.get(CASHIER_ONLY, headers=auth_headers).status_code == 404
+        assert len(statements) == 1
+        for _ in range(5):
+            assert client.get(CASHIER_ONLY, headers=auth_headers).status_code == 404
+        assert len(statements) == 1
+
+    assert client.get(CASHIER_ONLY, headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert client.get(CASHIER_ONLY).status_code == 401
+
+
+def test_user_changes_invalidate_the_cache(client, db_session, auth_headers):
+    cashier = models.User(username="caja1", password_hash="x", role=models.UserRole.CASHIER, is_active=True)
+    db_session.add(cashier)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'caja1'})}"}
+
+    assert client.get(CASHIER_ONLY, headers=headers).status_code == 404
+    assert client.put(f"/api/v1/users/{cashier.id}", json={"role": "WAREHOUSE"},
+                      headers=auth_headers).status_code == 200
+    assert client.get(CASHIER_ONLY, headers=headers).status_code == 403
+
+    assert client.put(f"/api/v1/users/{cashier.id}", json={"role": "CASHIER"},
+                      headers=auth_headers).status_code == 200
+    assert client.get(CASHIER_ONLY, headers=headers).status_code == 404
+    assert client.delete(f"/api/v1/users/{cashier.id}", headers=auth_headers).status_code == 200
+    assert client.get(CASHIER_ONLY, headers=headers).status_code == 400  # Inactive user
+
+
+def test_any_committed_change_drops_the_pin_here_and_on_other_workers(client, db_session, monkeypatch):
+    published = []
+    monkeypatch.setattr(change_tracker.event_bus, "publish", lambda *args: published.append(args))
+    cashier = models.User(username="caja1", password_hash="x", pin="1234", role=models.UserRole.CASHIER,
+                          is_active=True)
+    db_session.add(cashier)
+    db_session.commit()
+
+    def validate():
+        return client.post("/api/v1/auth/validate-pin", json={"user_id": cashier.id, "pin": "1234"})
+
+    assert validate().json()["role"] == "CASHIER"
+    cashier.role = models.UserRole.ADMIN  # Not through routers/users.py
+    db_session.commit()
+    assert published[-1] == (WebSocketEvents.USER_UPDATED, {"user_ids": [cashier.id], "origin": change_tracker.ORIGIN})
+    assert validate().json()["role"] == "ADMIN"
+
+    db_session.query(models.User).filter(models.User.id == cashier.id).update({"is_active": False})
+    db_session.commit()
+    assert published[-1][1]["user_ids"] is None  # Bulk update: every user
+    assert validate().status_code == 403
+
+    # Another worker's commit arrives through the event bus; our own is ignored
+    auth_cache.remember_pin(cashier.id, "1234", {"valid": True})
+    auth_cache.on_event(WebSocketEvents.USER_UPDATED, {"user_ids": [cashier.id], "origin": change_tracker.ORIGIN})
+    assert auth_cache.pin_result(cashier.id, "1234") is not None
+    auth_cache.on_event(WebSocketEvents.USER_UPDATED, {"user_ids": [cashier.id], "origin": "another-worker"})
+    assert auth_cache.pin_result(cashier.id, "1234") is None
+
+
+def test_cache_expiry():
+    cache = AuthCache(max_tokens=2, user_ttl=0.05)
+    cache.remember_token("a", "admin", time.time() + 60)
+    cache.remember_token("b", "caja", time.time() - 1)
+    cache.remember_token("c", "caja", None)  # No exp: never cached
+    assert cache.token_subject("a") == "admin"
+    assert cache.token_subject("b") is None and cache.token_subject("c") is None
+
+    cache.remember_token("d", "x", time.time() + 60)
+    cache.remember_token("e", "y", time.time() + 60)  # Over max_tokens: least recently used goes
+    assert cache.token_subject("a") is None and cache.token_subject("e") == "y"
+
+    cache.remember_user(AuthUser(1, "admin", models.UserRole.ADMIN, None, True))
+    assert cache.user("admin").id == 1
+    time.sleep(0.06)
+    assert cache.user("admin") is None
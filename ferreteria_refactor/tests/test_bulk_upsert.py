@@ -0,0 +1,61 @@
+from sqlalchemy import inspect
+from backend_api.models import models
+from backend_api.services import bulk_upsert, sync_client
+
+
+def catalog_page(n_products, name="Tornillo"):
+    return {
+        "categories": [{"id": 1, "name": "Ferreteria"}],
+        "products": [
+            {"id": i, "name": f"{name} {i}", "price": 1.5, "stock": 10, "category_id": 1,
+             "units": [{"id": 1000 + i, "unit_name": "Caja", "conversion_factor": 12, "price_usd": 15}]}
+            for i in range(1, n_products + 1)
+        ],
+        "customers": [{"id": 1, "name": "Cliente", "id_number": "V-123"}],
+    }
+
+
+def test_page_ingest_is_set_based(db_session, captured_sql):
+    stats = bulk_upsert.IngestStats()
+    with captured_sql(db_session.get_bind()) as statements:
+        sync_client._apply_catalog_page(db_session, catalog_page(300), stats)
+    db_session.commit()
+
+    # One id preload + one executemany per table, not one SELECT per row
+    assert len(statements) < 20
+    assert stats.tables["products"] == {"inserted": 300, "updated": 0}
+    unit = db_session.query(models.ProductUnit).get(1001)
+    assert float(unit.price_usd) == 15
+    assert db_session.query(models.Customer).get(1).id_number == "V-123"
+
+
+def test_second_ingest_updates_in_place(db_session):
+    sync_client._apply_catalog_page(db_session, catalog_page(5))
+    db_session.commit()
+
+    stats = bulk_upsert.IngestStats()
+    sync_client._apply_catalog_page(db_session, catalog_page(6, name="Clavo"), stats)
+    db_session.commit()
+    db_session.expire_all()
+
+    assert stats.tables["products"] == {"inserted": 1, "updated": 5}
+    assert db_session.query(models.Product).count() == 6
+    assert db_session.query(models.Product).get(3).name == "Clavo 3"
+    assert stats.rows_per_sec > 0
+
+
+def test_secondary_indexes_are_dropped_and_rebuilt(db_session):
+    table = models.Product.__table__
+
+    def index_names():
+        return {ix["name"] for ix in inspect(db_session.get_bind()).get_indexes("products")}
+
+    before = index_names()
+    dropped = bulk_upsert.drop_secondary_indexes(db_session, [table])
+    assert dropped and not set(dropped) & index_names()
+    # Unique indexes stay: they are constraints, not just access paths
+    assert "ix_products_sku" in index_names()
+
+    db_session.rollback()
+    bulk_upsert.ensure_secondary_indexes(db_session, [table])
+    assert index_names() == before
@@ -0,0 +1,131 @@
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import cash_ledger
+
+
+def setup_drawer(client, db, auth_headers):
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db.add(warehouse)
+    db.flush()
+    cement = models.Product(name="Cemento", price=10.0, cost_price=6.0, stock=50, is_active=True)
+    db.add(cement)
+    db.flush()
+    db.add(models.ProductStock(product_id=cement.id, warehouse_id=warehouse.id, quantity=50))
+    db.commit()
+
+    response = client.post("/api/v1/cash/sessions/open", json={"initial_cash": 100, "initial_cash_bs": 1000},
+                           headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return cement, response.json()["id"]
+
+
+def sell(client, auth_headers, product, quantity, payments):
+    payload = {
+        "items": [{"product_id": product.id, "quantity": quantity, "unit_price": 10.0,
+                   "subtotal": 10.0 * quantity, "conversion_factor": 1}],
+        "total_amount": 10.0 * quantity,
+        "payments": payments,
+    }
+    response = client.post("/api/v1/products/sales/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()["sale_id"]
+
+
+def balance(client, auth_headers, currency):
+    return client.get("/api/v1/cash/balance", params={"currency": currency}, headers=auth_headers).json()["available"]
+
+
+def test_running_balance_follows_payments_movements_and_refunds(client, db_session, auth_headers, captured_sql):
+    cement, session_id = setup_drawer(client, db_session, auth_headers)
+    sale_id = sell(client, auth_headers, cement, 3, [
+        {"amount": 20.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0},
+        {"amount": 400.0, "currency": "VES", "payment_method": "Efectivo", "exchange_rate": 40.0},
+    ])
+    sell(client, auth_headers, cement, 1, [
+        {"amount": 10.0, "currency": "USD", "payment_method": "Zelle", "exchange_rate": 1.0},  # Not in the drawer
+    ])
+    client.post("/api/v1/cash/movements", json={"type": "EXPENSE", "amount": 5, "currency": "USD",
+                                                "description": "Café"}, headers=auth_headers)
+    client.post("/api/v1/returns", json={"sale_id": sale_id, "items": [{"product_id": cement.id, "quantity": 1}],
+                                         "reason": "Roto"}, headers=auth_headers)
+
+    with captured_sql(db_session.get_bind()) as statements:
+        usd = balance(client, auth_headers, "USD")
+
+    assert usd == 105.0  # 100 + 20 cash - 5 expense - 10 refund
+    assert not any("sale_payments" in s for s in statements)
+    assert balance(client, auth_headers, "Bs") == 1400.0
+
+    # Over-withdrawing is still refused, from the running balance
+    response = client.post("/api/v1/cash/movements", json={"type": "WITHDRAWAL", "amount": 200, "currency": "USD",
+                                                                "description": "Retiro"},
+                           headers=auth_headers)
+    assert response.status_code == 400
+
+    details = client.get(f"/api/v1/cash/sessions/{session_id}/details", headers=auth_headers).json()
+    assert Decimal(str(details["expected_usd"])) == Decimal("105")
+    assert float(details["details"]["transfers_by_currency"]["USD"]["Zelle"]) == 10.0
+    assert {c: float(v) for c, v in details["details"]["refunds_by_currency"].items()} == {"USD": 10.0}
+
+    cashflow = client.get("/api/v1/reports/dashboard/cashflow", headers=auth_headers).json()
+    usd_flow = next(b for b in cashflow["balances"] if b["currency"] == "USD")
+    assert usd_flow == {"currency": "USD", "initial": 100.0, "sales": 20.0, "expenses": -15.0, "net_balance": 105.0}
+
+
+def test_reconcile_reports_and_fixes_drift(client, db_session, auth_headers):
+    cement, session_id = setup_drawer(client, db_session, auth_headers)
+    sell(client, auth_headers, cement, 2, [
+        {"amount": 20.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0},
+    ])
+    db_session.expire_all()
+    session = db_session.get(models.CashSession, session_id)
+    assert cash_ledger.reconcile(db_session, fix=False) == []
+
+    # A payment written behind the ledger's back
+    db_session.add(models.SalePayment(sale_id=1, amount=7, currency="USD", payment_method="Efectivo"))
+    db_session.commit()
+
+    response = client.post("/api/v1/cash/reconcile", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["drift"] == [
+        {"session_id": session_id, "currency": "USD", "field": "cash_sales", "stored": 20.0, "derived": 27.0}
+    ]
+    assert cash_ledger.balances(db_session, session)["USD"]["balance"] == Decimal("127")
+
+    closed = client.post(f"/api/v1/cash/sessions/{session_id}/close",
+                         json={"final_cash_reported": 127, "final_cash_reported_bs": 1000},
+                         headers=auth_headers).json()
+    assert Decimal(str(closed["final_cash_expected"])) == Decimal("127")
+    db_session.expire_all()
+    assert db_session.get(models.CashSession, session_id).final_cash_expected_bs == Decimal("1000")
+
+
+def test_session_opened_before_the_ledger_is_seeded_on_its_first_write(client, db_session, auth_headers):
+    cement, session_id = setup_drawer(client, db_session, auth_headers)
+    cash = [{"amount": 50.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0}]
+    sell(client, auth_headers, cement, 5, cash)
+
+    def stored():
+        db_session.expire_all()
+        return db_session.query(models.CashSessionBalance).filter_by(session_id=session_id).count()
+
+    def forget():  # As if the session was opened before cash_session_balances existed
+        db_session.query(models.CashSessionBalance).delete()
+        db_session.commit()
+
+    forget()
+    assert balance(client, auth_headers, "USD") == 150.0
+    client.get(f"/api/v1/cash/sessions/{session_id}/details", headers=auth_headers)
+    client.get("/api/v1/reports/dashboard/cashflow", headers=auth_headers)
+    assert stored() == 0  # Reads derive without writing
+
+    sell(client, auth_headers, cement, 1, [{**cash[0], "amount": 10.0}])
+    assert stored() == 2  # USD and Bs, derived in full
+    assert cash_ledger.available(db_session, session_id, "USD") == Decimal("160")
+    assert cash_ledger.available(db_session, session_id, "Bs") == Decimal("1000")
+
+    forget()
+    client.post("/api/v1/cash/movements", json={"type": "EXPENSE", "amount": 5, "currency": "USD",
+                                                "description": "Café"}, headers=auth_headers)
+    assert cash_ledger.available(db_session, session_id, "USD") == Decimal("155")
+    assert cash_ledger.reconcile(db_session, fix=False) == []
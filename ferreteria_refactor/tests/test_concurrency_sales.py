@@ -86,3 +86,87 @@ def test_race_condition_live_server():
     assert final_stock >= 0, f"CRITICAL: Stock became negative! ({final_stock})"
     assert success_count == 1, f"Expected exactly 1 success, but got {success_count}. Race condition detected!"
     assert fail_count == 4, f"Expected 4 failures, got {fail_count}"
+
+# ============================================
+# LOAD TEST: 20 concurrent cashiers on hot SKUs
+# ============================================
+CASHIERS = 20
+SALES_PER_CASHIER = 25
+HOT_SKUS = 3
+HOT_STOCK = 100  # Per SKU; HOT_SKUS * HOT_STOCK < CASHIERS * SALES_PER_CASHIER, so some sales must be rejected
+
+def server_available():
+    try:
+        return requests.get(f"{BASE_URL}/health", timeout=2).status_code == 200
+    except requests.RequestException:
+        return False
+
+def setup_hot_skus(headers):
+    """Create (or restock) HOT_SKUS products with HOT_STOCK units in the main warehouse."""
+    warehouses = requests.get(f"{BASE_URL}/warehouses", headers=headers).json()
+    main_wh = next((w for w in warehouses if w.get("is_main")), warehouses[0])
+
+    products = requests.get(f"{BASE_URL}/products/", headers=headers).json()
+    product_ids = []
+    for i in range(HOT_SKUS):
+        name = f"Load Test Hot SKU {i}"
+        stocks = [{"warehouse_id": main_wh["id"], "quantity": HOT_STOCK}]
+        existing = next((p for p in products if p["name"] == name), None)
+        if existing:
+            requests.put(f"{BASE_URL}/products/{existing['id']}", json={"warehouse_stocks": stocks, "is_active": True}, headers=headers)
+            product_ids.append(existing["id"])
+        else:
+            resp = requests.post(f"{BASE_URL}/products/", json={
+                "name": name, "price": 1.0, "stock": HOT_STOCK, "is_active": True,
+                "unit_type": "Unidad", "warehouse_stocks": stocks
+            }, headers=headers)
+            assert resp.status_code == 200, resp.text
+            product_ids.append(resp.json()["id"])
+    return main_wh["id"], product_ids
+
+def test_hot_sku_throughput_live_server():
+    """
+    20 cashiers sell the same hot SKUs as fast as they can.
+    Reports sales/sec and verifies no unit is sold twice or goes negative.
+    """
+    if not server_available():
+        pytest.skip(f"Live server not reachable at {BASE_URL}")
+
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    warehouse_id, product_ids = setup_hot_skus(headers)
+
+    def sale_payload(product_id):
+        return {
+            "items": [{"product_id": product_id, "quantity": 1, "unit_price": 1.0, "subtotal": 1.0, "conversion_factor": 1}],
+            "total_amount": 1.0,
+            "warehouse_id": warehouse_id,
+            "payments": [{"amount": 1.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0}]
+        }
+
+    def cashier(n):
+        session = requests.Session()
+        results = []
+        for i in range(SALES_PER_CASHIER):
+            product_id = product_ids[(n + i) % len(product_ids)]
+            resp = session.post(f"{BASE_URL}/products/sales/", json=sale_payload(product_id), headers=headers)
+            results.append((product_id, resp.status_code))
+        return results
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=CASHIERS) as executor:
+        outcomes = [r for batch in executor.map(cashier, range(CASHIERS)) for r in batch]
+    elapsed = time.perf_counter() - start
+
+    successes = [pid for pid, code in outcomes if code == 200]
+    unexpected = [code for _, code in outcomes if code not in (200, 400)]
+    print(f"\n[LOAD] {len(outcomes)} requests in {elapsed:.2f}s -> {len(outcomes) / elapsed:.1f} req/s, "
+          f"{len(successes) / elapsed:.1f} sales/s ({len(successes)} accepted)")
+
+    assert not unexpected, f"Unexpected status codes: {set(unexpected)}"
+    for product_id in product_ids:
+        sold = successes.count(product_id)
+        product = requests.get(f"{BASE_URL}/products/{product_id}", headers=headers).json()
+        remaining = next(float(s["quantity"]) for s in product["stocks"] if s["warehouse_id"] == warehouse_id)
+        assert remaining >= 0, f"Stock went negative for product {product_id}: {remaining}"
+        assert remaining == HOT_STOCK - sold, f"Product {product_id}: sold {sold} but {remaining} left of {HOT_STOCK}"
@@ -0,0 +1,72 @@
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import change_tracker
+from backend_api.services.config_store import config_store
+from backend_api.websocket.events import WebSocketEvents
+
+CONFIG_QUERIES = r"^\s*SELECT\b.*\bFROM (business_config|exchange_rates|business_currencies)\b"
+
+
+def test_hot_reads_skip_the_database(client, db_session, auth_headers, captured_sql):
+    assert client.put("/api/v1/config/exchange_rate", json={"key": "exchange_rate", "value": "36.5"},
+                      headers=auth_headers).status_code == 200
+    client.get("/api/v1/config/dict")  # Load once
+
+    with captured_sql(db_session.get_bind(), CONFIG_QUERIES) as statements:
+        for _ in range(3):
+            assert client.get("/api/v1/config/exchange-rate/current").json() == {"rate": 36.5}
+            assert client.get("/api/v1/config/dict").json()["exchange_rate"] == "36.5"
+            rates = client.get("/api/v1/config/exchange-rates", params={"currency_code": "VES"}).json()
+            assert [r["rate"] for r in rates] == ["40.0000"]
+            assert client.get("/api/v1/config/tax-rate/default").json() == {"rate": "0.00"}
+            assert client.get("/api/v1/config/missing").json() == {"key": "missing", "value": ""}
+            body = client.post("/api/v1/products/calculate-price", params={"price_usd": 2}).json()
+            assert {c["currency_code"]: c["converted_price"] for c in body["conversions"]} == {"USD": 2.0, "VES": 80.0}
+        assert statements == []
+
+
+def test_writes_bump_the_version(client, db_session, auth_headers):
+    version = config_store.version
+    assert client.post("/api/v1/config/batch", json={"business_name": "Ferretería Uno", "default_tax_rate": "16"},
+                       headers=auth_headers).status_code == 200
+    assert config_store.version > version
+    assert client.get("/api/v1/config/business").json()["name"] == "Ferretería Uno"
+    assert client.get("/api/v1/config/tax-rate/default").json() == {"rate": "16"}
+
+    created = client.post("/api/v1/config/exchange-rates", headers=auth_headers, json={
+        "name": "Paralelo", "currency_code": "VES", "currency_symbol": "Bs", "rate": 45, "is_default": True}).json()
+    ves = client.get("/api/v1/config/exchange-rates", params={"currency_code": "VES"}).json()
+    assert [(r["name"], r["is_default"]) for r in ves] == [("Paralelo", True), ("BCV", False)]  # Bulk update seen
+
+    assert client.put(f"/api/v1/config/exchange-rates/{created['id']}", json={"rate": 47},
+                      headers=auth_headers).status_code == 200
+    assert client.get(f"/api/v1/config/exchange-rates/{created['id']}").json()["rate"] == "47.0000"
+
+    bcv = ves[1]["id"]
+    assert client.delete(f"/api/v1/config/exchange-rates/{bcv}", headers=auth_headers).status_code == 200
+    assert client.get("/api/v1/config/exchange-rates", params={"is_active": False}).json()[0]["id"] == bcv
+
+
+def test_uncommitted_changes_are_not_cached(db_session):
+    db_session.add(models.BusinessConfig(key="business_name", value="Borrador"))
+    db_session.flush()
+    assert config_store.snapshot(db_session).get("business_name") == "Borrador"
+    db_session.rollback()
+    assert config_store.snapshot(db_session).get("business_name") is None
+
+
+def test_typed_accessors_and_other_workers(db_session):
+    db_session.add_all([models.BusinessConfig(key=key, value=value) for key, value in
+                        {"tax": "16.5", "copies": "2", "bad": "x", "print_logo": "Sí"}.items()])
+    db_session.commit()
+    config = config_store.snapshot(db_session)
+    assert config.get_decimal("tax") == Decimal("16.5") and config.get_float("tax") == 16.5
+    assert config.get_int("copies") == 2 and config.get_int("bad", 1) == 1
+    assert config.get_decimal("bad", Decimal("0")) == Decimal("0")
+    assert config.get_bool("print_logo") is True and config.get_bool("missing", True) is True
+    assert config_store.snapshot(db_session) is config
+
+    config_store.on_event(WebSocketEvents.CONFIG_UPDATED, {"version": 1, "origin": change_tracker.ORIGIN})
+    assert config_store.snapshot(db_session) is config  # Our own commit, already applied
+    config_store.on_event(WebSocketEvents.CONFIG_UPDATED, {"version": 1, "origin": "another-worker"})
+    assert config_store.snapshot(db_session) is not config
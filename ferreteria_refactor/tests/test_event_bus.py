@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from backend_api.websocket.event_bus import EventBus
+from backend_api.websocket.events import WebSocketEvents
+
+
+class RecordingManager:
+    """Stands in for ConnectionManager; records what would be sent to clients."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def broadcast(self, event_type, data):
+        self.sent.append((event_type, data))
+
+    def get_stats(self):
+        return {"clients": 0}
+
+
+def test_product_events_are_coalesced_into_one_batch():
+    async def scenario():
+        recorder = RecordingManager()
+        bus = EventBus(recorder, coalesce_window=0.01)
+        await bus.start()
+
+        bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 1, "stock": 9})
+        bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 1, "stock": 8})
+        bus.publish(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 2, "stock": 4})
+        await asyncio.sleep(0.05)
+        await bus.stop()
+        return recorder.sent, bus.get_metrics()
+
+    sent, metrics = asyncio.run(scenario())
+
+    assert len(sent) == 1
+    event_type, data = sent[0]
+    assert event_type == WebSocketEvents.PRODUCT_BATCH_UPDATED
+    assert data["events"] == [
+        {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 1, "stock": 8}},
+        {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 2, "stock": 4}},
+    ]
+    assert metrics["coalesced"] == 1
+    assert metrics["batches"] == 1
+
+
+def test_other_events_flush_pending_product_changes_first():
+    async def scenario():
+        recorder = RecordingManager()
+        bus = EventBus(recorder, coalesce_window=10)
+        await bus.start()
+
+        bus.publish(WebSocketEvents.PRODUCT_UPDATED, {"id": 5, "stock": 1})
+        bus.publish(WebSocketEvents.SALE_COMPLETED, {"id": 77})
+        await bus.stop()
+        return recorder.sent
+
+    sent = asyncio.run(scenario())
+    assert [event_type for event_type, _ in sent] == [
+        WebSocketEvents.PRODUCT_UPDATED,
+        WebSocketEvents.SALE_COMPLETED,
+    ]
+
+
+def test_publish_from_worker_threads():
+    async def scenario():
+        recorder = RecordingManager()
+        bus = EventBus(recorder)
+        await bus.start()
+
+        def worker(n):
+            bus.publish(WebSocketEvents.CUSTOMER_UPDATED, {"id": n})
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        await asyncio.sleep(0.05)
+        await bus.stop()
+        return recorder.sent
+
+    sent = asyncio.run(scenario())
+    assert sorted(data["id"] for _, data in sent) == list(range(20))
+
+
+def test_publish_without_running_bus_is_dropped():
+    bus = EventBus(RecordingManager())
+    assert bus.publish(WebSocketEvents.SALE_COMPLETED, {"id": 1}) is False
+    assert bus.get_metrics()["dropped"] == 1
+
+
+def test_metrics_endpoint_is_admin_only(client, auth_headers):
+    assert client.get("/api/v1/ws/metrics").status_code == 401
+    response = client.get("/api/v1/ws/metrics", headers=auth_headers)
+    assert response.status_code == 200
+    assert "dropped" in response.json()
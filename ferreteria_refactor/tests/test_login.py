@@ -0,0 +1,61 @@
+import threading
+from passlib.context import CryptContext
+from backend_api import security
+from backend_api.models import models
+from backend_api.services.auth_cache import auth_cache
+
+
+def login(client, password="admin123"):
+    return client.post("/api/v1/auth/token", data={"username": "admin", "password": password})
+
+
+def test_login_upgrades_hashes_of_another_cost(client, db_session):
+    admin = db_session.query(models.User).filter_by(username="admin").one()
+    admin.password_hash = CryptContext(schemes=["bcrypt"]).hash("admin123", rounds=4)
+    db_session.commit()
+
+    assert login(client, "wrong").status_code == 401
+    assert "$04$" in admin.password_hash  # Failed logins never rewrite the hash
+
+    assert login(client).status_code == 200
+    db_session.refresh(admin)
+    assert f"${security.settings.BCRYPT_ROUNDS:02d}$" in admin.password_hash
+    assert security.verify_password("admin123", admin.password_hash)
+
+    assert client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"}).status_code == 200
+    admin.password_hash = "legacy-plaintext"
+    db_session.commit()
+    assert login(client).status_code == 401
+
+
+def test_login_sheds_load_when_the_hash_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(security, "_pending", threading.BoundedSemaphore(1))
+    security._pending.acquire()  # One check already waiting
+    response = login(client)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    security._pending.release()
+    assert login(client).status_code == 200
+
+
+def test_validate_pin_caches_quick_switches(client, db_session, auth_headers):
+    cashier = models.User(username="caja1", password_hash="x", role=models.UserRole.CASHIER, is_active=True)
+    db_session.add(cashier)
+    db_session.commit()
+
+    def validate(pin, user_id=cashier.id):
+        return client.post("/api/v1/auth/validate-pin", json={"user_id": user_id, "pin": pin})
+
+    assert validate("1234").status_code == 400  # No PIN set
+    assert client.put(f"/api/v1/users/{cashier.id}/pin", json={"pin": "1234"}).status_code == 200
+    assert validate("1234").json()["valid"] is True
+    assert auth_cache.pin_result(cashier.id, "1234")["username"] == "caja1"
+    assert validate("9999").json()["valid"] is False
+    assert validate("1234", str(cashier.id)).json()["valid"] is True
+
+    assert client.put(f"/api/v1/users/{cashier.id}/pin", json={"pin": "5678"}).status_code == 200
+    assert auth_cache.pin_result(cashier.id, "1234") is None
+    assert validate("1234").json()["valid"] is False
+    assert validate("5678").json()["valid"] is True
+
+    assert client.delete(f"/api/v1/users/{cashier.id}", headers=auth_headers).status_code == 200
+    assert validate("5678").status_code == 403
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from backend_api.models import models
+
+
+def seed(db):
+    tools = models.Category(name="Herramientas")
+    main, branch = models.Warehouse(name="Principal", is_main=True), models.Warehouse(name="Sucursal")
+    db.add_all([tools, main, branch])
+    db.flush()
+    products = []
+    for i in range(7):
+        product = models.Product(name=f"Producto {i}", sku=f"SKU-{i}", price=10 + i, stock=i % 3,
+                                 is_active=i != 6, category_id=tools.id if i % 2 else None)
+        product.units.append(models.ProductUnit(unit_name="Caja", conversion_factor=12, price_usd=100))
+        products.append(product)
+    db.add_all(products)
+    db.flush()
+    for product in products[:4]:
+        db.add(models.ProductStock(product_id=product.id, warehouse_id=branch.id, quantity=product.id % 2))
+    db.commit()
+    return {"category": tools.id, "branch": branch.id, "products": [p.id for p in products]}
+
+
+def test_catalog_pages_with_cursor_and_sparse_fields(client, db_session):
+    ids = seed(db_session)
+
+    items, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 4, "fields": "name,sku,price,stock"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/v1/products/catalog", params=params).json()
+        items += page["items"]
+        pages += 1
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert pages == 2
+    assert [item["id"] for item in items] == ids["products"][:6]  # The inactive one is left out
+    assert items[1] == {"id": ids["products"][1], "name": "Producto 1", "sku": "SKU-1", "price": "11.00",
+                        "stock": "1.000"}
+
+    full = client.get("/api/v1/products/catalog", params={"limit": 1}).json()["items"][0]
+    assert full["units"][0]["unit_name"] == "Caja" and "stocks" in full
+
+    assert client.get("/api/v1/products/catalog", params={"fields": "name,password"}).status_code == 400
+    assert client.get("/api/v1/products/catalog", params={"cursor": "nope"}).status_code == 400
+
+
+def test_catalog_filters(client, db_session):
+    ids = seed(db_session)
+    p = ids["products"]
+
+    def catalog_ids(**params):
+        return [item["id"] for item in client.get("/api/v1/products/catalog",
+                                                  params={"fields": "id", **params}).json()["items"]]
+
+    assert catalog_ids(category_id=ids["category"]) == [p[1], p[3], p[5]]
+    assert catalog_ids(in_stock=True) == [p[1], p[2], p[4], p[5]]
+    assert catalog_ids(warehouse_id=ids["branch"]) == p[:4]
+    assert catalog_ids(warehouse_id=ids["branch"], in_stock=True) == [i for i in p[:4] if i % 2]
+    assert catalog_ids(warehouse_id=ids["branch"], in_stock=False) == [i for i in p[:4] if not i % 2]
+    assert catalog_ids(active=False) == [p[6]]
+
+    db_session.query(models.Product).filter(models.Product.id == p[2]).update({"price": 99})
+    db_session.commit()
+    since = (datetime.now() - timedelta(seconds=1)).isoformat()
+    assert p[2] in catalog_ids(updated_since=since)
+    yesterday = datetime.now() - timedelta(days=1)
+    db_session.query(models.Product).update({"updated_at": yesterday})
+    db_session.query(models.ProductUnit).update({"updated_at": yesterday})
+    db_session.commit()
+    assert catalog_ids(updated_since=since) == []
+    db_session.query(models.ProductUnit).filter(models.ProductUnit.product_id == p[3]).update({"price_usd": 90})
+    db_session.commit()
+    assert catalog_ids(updated_since=since) == [p[3]]  # Units travel with their product
+
+
+def test_catalog_etag_returns_304_until_the_page_changes(client, db_session):
+    ids = seed(db_session)
+    params = {"fields": "name,price"}
+
+    first = client.get("/api/v1/products/catalog", params=params)
+    etag = first.headers["ETag"]
+    again = client.get("/api/v1/products/catalog", params=params, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag and not again.content
+
+    db_session.query(models.Product).filter(models.Product.id == ids["products"][0]).update({"price": 50})
+    db_session.commit()
+    changed = client.get("/api/v1/products/catalog", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
@@ -0,0 +1,162 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from backend_api.database.db import Base, get_db, get_read_db
+from backend_api.main import app
+from backend_api.models import models
+from backend_api.services import product_search
+
+
+@pytest.fixture
+def search_db(db_session):
+    product_search.create_index(db_session)
+    db_session.commit()
+    yield db_session
+    db_session.rollback()
+    db_session.execute(text("DROP TABLE IF EXISTS product_search_vocab"))
+    db_session.execute(text("DROP TABLE IF EXISTS product_search"))
+    db_session.commit()
+
+
+def seed(db):
+    screws, tools = models.Category(name="Tornillería"), models.Category(name="Herramientas")
+    db.add_all([screws, tools])
+    db.flush()
+    products = {
+        "galv": models.Product(name='Tornillo Galvanizado 1/2" x 2"', sku="TOR-001-GAL", stock=10,
+                               category_id=screws.id),
+        "black": models.Product(name='Tornillo Negro 1/2" x 2"', sku="TOR-002-NEG", stock=0, category_id=screws.id),
+        "nut": models.Product(name="Tuerca Galvanizada 3/8", sku="TUE-38", stock=5, category_id=screws.id),
+        "hammer": models.Product(name="Martillo de Uña 16oz", sku="MAR-16", stock=3, category_id=tools.id,
+                                 description="Mango de fibra"),
+        "cable": models.Product(name="Cable THW 2.5mm", sku="CAB-25", stock=100),
+        "hook": models.Product(name="Gancho Galvanizado", sku="GAN-01", stock=1, category_id=tools.id),
+    }
+    products["hammer"].units.append(models.ProductUnit(unit_name="Caja", conversion_factor=6, barcode="7591234500016"))
+    db.add_all(products.values())
+    db.commit()
+    return {key: product.id for key, product in products.items()}, {"screws": screws.id, "tools": tools.id}
+
+
+def found(client, q, **params):
+    body = client.get("/api/v1/products/search", params={"q": q, **params}).json()
+    return [item["id"] for item in body["items"]], body["fuzzy"]
+
+
+def test_tokenizer_keeps_codes_and_fractions():
+    assert product_search.index_terms('Tornillo Galvanizado 1/2" x 2.5"') == [
+        "tornillo", "galvanizado", "1f2", "x", "2p5"]
+    assert product_search.index_terms("TOR-001-GAL") == ["tor001gal", "tor", "001", "gal"]
+    assert product_search.index_terms("Cable 10mm Ñandú") == ["cable", "10mm", "10", "mm", "nandu"]
+    assert product_search.query_terms("tornillo 1 / 2 galv") == ["tornillo", "1f2", "galv"]
+    assert product_search.query_terms("tor-001") == ["tor001"]
+
+
+@pytest.fixture
+def postgres_search():
+    """(client, session) on TEST_POSTGRES_URL (an empty database), search tables created"""
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        product_search.create_index(db)
+        db.commit()
+        with TestClient(app) as client:
+            yield client, db
+    finally:
+        app.dependency_overrides.clear()
+        db.close()
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS product_search"))
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def check_ranking(client, p, c, typos=True):
+    assert found(client, "tornillo 1/2 galv") == ([p["galv"]], False)
+    assert found(client, "TORNILLO 1/2")[0] == [p["galv"], p["black"]]  # In stock first
+    assert sorted(found(client, "galv")[0]) == sorted([p["galv"], p["nut"], p["hook"]])
+    assert found(client, "tor-001") == ([p["galv"]], False)
+    assert found(client, "una")[0] == [p["hammer"]]
+    assert found(client, "2.5")[0] == [p["cable"]]
+    assert found(client, "759123450")[0] == [p["hammer"]]  # Unit barcode
+    assert found(client, "fibra")[0] == [p["hammer"]]  # Description
+    assert sorted(found(client, "herramientas")[0]) == sorted([p["hammer"], p["hook"]])  # Category name
+    assert found(client, "galv", category_id=c["tools"])[0][0] == p["hook"]
+    assert found(client, "galv", category_id=c["screws"])[0][-1] == p["hook"]
+
+    if typos:
+        assert found(client, "tornilo galvanisado") == ([p["galv"]], True)
+        assert found(client, "martilo") == ([p["hammer"]], True)
+    assert found(client, "zzzz") == ([], False)
+    assert client.get("/api/v1/products/search", params={"q": ""}).status_code == 422
+
+
+def test_search_ranks_folds_and_tolerates_typos(client, search_db):
+    check_ranking(client, *seed(search_db))
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_search_on_postgres(postgres_search):
+    client, db = postgres_search
+    p, c = seed(db)
+    product_search.rebuild(db)  # Same documents the ORM hook wrote, from scratch
+    db.commit()
+    check_ranking(client, p, c, typos=product_search.has_trigrams(db))
+
+    db.get(models.Product, p["hammer"]).name = "Mazo de Goma"
+    db.commit()
+    assert found(client, "mazo")[0] == [p["hammer"]]
+    assert found(client, "martillo")[0] == []
+
+
+def test_index_follows_changes_in_the_same_transaction(client, search_db, auth_headers):
+    p, c = seed(search_db)
+    db = search_db
+
+    hammer = db.get(models.Product, p["hammer"])
+    hammer.name = "Mazo de Goma"
+    db.flush()
+    db.rollback()
+    assert found(client, "mazo")[0] == []
+
+    hammer = db.get(models.Product, p["hammer"])
+    hammer.name = "Mazo de Goma"
+    db.commit()
+    assert found(client, "mazo")[0] == [p["hammer"]]
+    assert found(client, "martillo")[0] == []
+
+    hammer.stock = 0  # Stock changes don't rewrite the document
+    db.commit()
+
+    db.get(models.Category, c["tools"]).name = "Ferretería Pesada"
+    db.commit()
+    assert sorted(found(client, "pesada")[0]) == sorted([p["hammer"], p["hook"]])
+
+    db.add(models.ProductUnit(product_id=p["cable"], unit_name="Rollo", conversion_factor=100, barcode="ROL-100"))
+    db.commit()
+    assert found(client, "rol100")[0] == [p["cable"]]
+
+    assert client.delete(f"/api/v1/products/{p['nut']}", headers=auth_headers).status_code == 200
+    assert found(client, "tuerca")[0] == []
+
+    # Core writes (catalog sync) reindex explicitly
+    db.execute(models.Product.__table__.update().where(models.Product.id == p["cable"]).values(name="Alambre"))
+    product_search.reindex(db, [p["cable"]])
+    db.commit()
+    assert found(client, "alambre")[0] == [p["cable"]]
+
+
+def test_search_without_index_falls_back_to_like(client, db_session):
+    p, _ = seed(db_session)
+    assert found(client, "negro") == ([p["black"]], False)
+
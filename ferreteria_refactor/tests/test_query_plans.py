@@ -0,0 +1,207 @@
+"""
+Query plan regression tests.
+
+Calls the sales, cash, reports and sync endpoints against a seeded
+database, records every SELECT they issue and runs EXPLAIN on it. A full
+scan of one of the transactional tables (they grow with every sale) means
+an index is missing or a query stopped using it.
+
+SQLite runs always. Postgres runs when TEST_POSTGRES_URL points to an
+empty database; there seq scans are disabled for the EXPLAIN so the plan
+shows whether an index *can* serve the query, whatever the table size.
+"""
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database.db import Base, get_db, get_read_db
+from backend_api.main import app
+from backend_api.models import models
+from backend_api.security import create_access_token, get_password_hash
+
+HOT_TABLES = {
+    "sales", "sale_payments", "sale_details", "product_stocks", "cash_movements",
+    "kardex", "returns", "return_details", "audit_logs",
+}
+
+# Queries that read a whole table on purpose: (table, regex on the statement)
+EXPECTED_SCANS = [
+    # Free-text sale search: walks ix_sales_date newest first and stops at the limit
+    ("sales", r"LIKE lower"),
+]
+SELECTS = r"^\s*(SELECT|WITH)\b"
+
+TODAY = datetime.now().replace(microsecond=0)
+PERIOD = {"start_date": str((TODAY - timedelta(days=30)).date()), "end_date": str(TODAY.date())}
+
+
+def seed(db):
+    """A few of everything, enough for every endpoint to take its usual path"""
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    customers = [models.Customer(name=f"Cliente {i}", credit_limit=1000) for i in range(3)]
+    products = [models.Product(name=f"Producto {i}", sku=f"SKU-{i}", price=10, cost_price=6, stock=100,
+                               is_active=True) for i in range(5)]
+    db.add_all([warehouse, *customers, *products])
+    db.flush()
+    for product in products:
+        db.add(models.ProductStock(product_id=product.id, warehouse_id=warehouse.id, quantity=100))
+        db.add(models.Kardex(product_id=product.id, movement_type=models.MovementType.PURCHASE, quantity=100,
+                             balance_after=100, date=TODAY - timedelta(days=40)))
+    session = models.CashSession(user_id=1, initial_cash=100, initial_cash_bs=0, status="OPEN",
+                                 start_time=TODAY - timedelta(days=20))
+    db.add(session)
+    db.flush()
+    for i in range(20):
+        credit = i % 4 == 0
+        sale = models.Sale(date=TODAY - timedelta(days=i), total_amount=20, currency="USD",
+                           customer_id=customers[i % 3].id, is_credit=credit, paid=not credit,
+                           balance_pending=20 if credit else 0, due_date=TODAY + timedelta(days=15 - i),
+                           warehouse_id=warehouse.id, unique_uuid=f"seed-{i}")
+        db.add(sale)
+        db.flush()
+        db.add(models.SaleDetail(sale_id=sale.id, product_id=products[i % 5].id, quantity=2, unit_price=10,
+                                 unit_cost=6, subtotal=20))
+        if not credit:
+            db.add(models.SalePayment(sale_id=sale.id, amount=20, currency="USD", payment_method="Efectivo"))
+    db.add(models.CashMovement(session_id=session.id, type="EXPENSE", amount=5, currency="USD",
+                               description="Café"))
+    db.add(models.AuditLog(user_id=1, action="UPDATE", table_name="products", record_id=products[0].id))
+    db.commit()
+    paid_sale = db.query(models.Sale).filter(models.Sale.paid == True).first()
+    return {"customer": customers[0].id, "product": products[0].id, "session": session.id,
+            "warehouse": warehouse.id,
+            "paid_sale": paid_sale.id, "paid_product": paid_sale.details[0].product_id,
+            "credit_sale": db.query(models.Sale.id).filter(models.Sale.is_credit == True).first()[0]}
+
+
+def exercise(client, ids):
+    """The endpoints under test; each request must succeed"""
+    sale = {"customer_id": ids["customer"], "is_credit": True, "total_amount": 10,
+            "items": [{"product_id": ids["product"], "quantity": 1, "unit_price": 10, "subtotal": 10}]}
+    calls = [
+        # Sales
+        ("post", "/api/v1/products/sales/", {"json": sale}),
+        ("get", f"/api/v1/products/sales/{ids['paid_sale']}", {}),
+        ("get", "/api/v1/products/credits/pending", {}),
+        ("post", "/api/v1/products/sales/payments", {"json": {"sale_id": ids["credit_sale"], "amount": 5}}),
+        ("get", f"/api/v1/customers/{ids['customer']}/financial-status", {}),
+        ("get", "/api/v1/returns/sales/search", {"params": {"q": "1"}}),
+        ("get", f"/api/v1/returns/sales/{ids['paid_sale']}", {}),
+        ("post", "/api/v1/returns", {"json": {"sale_id": ids["paid_sale"], "reason": "Defecto",
+                                              "items": [{"product_id": ids["paid_product"], "quantity": 1}]}}),
+        ("get", "/api/v1/inventory/kardex", {"params": {"product_id": ids["product"]}}),
+        ("get", "/api/v1/products/catalog", {"params": {"warehouse_id": ids["warehouse"], "in_stock": True}}),
+        # Cash
+        ("get", "/api/v1/cash/sessions/current", {}),
+        ("get", "/api/v1/cash/balance", {}),
+        ("post", "/api/v1/cash/movements", {"json": {"amount": 2, "type": "DEPOSIT", "description": "Cambio"}}),
+        ("get", f"/api/v1/cash/sessions/{ids['session']}/details", {}),
+        ("get", "/api/v1/cash/sessions/history", {"params": PERIOD}),
+        # Reports
+        ("get", "/api/v1/reports/dashboard/financials", {}),
+        ("get", "/api/v1/reports/sales/detailed", {"params": {**PERIOD, "customer_id": ids["customer"]}}),
+        ("get", "/api/v1/reports/sales/summary", {"params": PERIOD}),
+        ("get", "/api/v1/reports/cash-flow", {"params": PERIOD}),
+        ("get", "/api/v1/reports/top-products", {"params": PERIOD}),
+        ("get", "/api/v1/reports/customer-debts", {}),
+        ("get", f"/api/v1/reports/profit/product/{ids['product']}", {}),
+        ("get", "/api/v1/reports/sales/by-payment-method", {"params": PERIOD}),
+        ("get", "/api/v1/reports/sales/by-customer", {"params": PERIOD}),
+        ("get", "/api/v1/audit/logs", {"params": {"table_name": "products", **PERIOD}}),
+        # Sync
+        ("get", "/api/v1/sync/pull/catalog", {}),
+    ]
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'admin'})}"}
+    for method, url, kwargs in calls:
+        response = getattr(client, method)(url, headers=headers, **kwargs)
+        assert response.status_code < 300, (url, response.status_code, response.text[:300])
+
+
+def expected(table, statement):
+    return any(t == table and re.search(pattern, statement) for t, pattern in EXPECTED_SCANS)
+
+
+def sqlite_scans(conn, statement, parameters):
+    """Hot tables read in full: SCAN, or an automatic index built for the query"""
+    scans = set()
+    for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+        detail = row[-1]
+        match = re.match(r"(?:SCAN|SEARCH) (?:TABLE )?(\w+)", detail)
+        if match and match.group(1) in HOT_TABLES:
+            if detail.startswith("SCAN") or "AUTOMATIC" in detail:
+                scans.add(match.group(1))
+    return scans
+
+
+def postgres_scans(conn, statement, parameters):
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans, nodes = set(), [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in HOT_TABLES:
+            scans.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def full_scans(engine, statements, explain):
+    found = []
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            for table in sorted(explain(conn, statement, parameters)):
+                if not expected(table, statement):
+                    found.append(f"{table}: {' '.join(statement.split())}")
+    return sorted(set(found))
+
+
+def run_against(engine, explain, captured_sql):
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        ids = seed(db)
+        with TestClient(app) as client, captured_sql(engine, SELECTS, with_parameters=True) as statements:
+            exercise(client, ids)
+        assert statements
+        return full_scans(engine, statements, explain)
+    finally:
+        app.dependency_overrides.clear()
+        db.close()
+
+
+def test_hot_queries_use_indexes_on_sqlite(db_session, captured_sql):
+    assert run_against(db_session.get_bind(), sqlite_scans, captured_sql) == []
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_hot_queries_use_indexes_on_postgres(captured_sql):
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        with sessionmaker(bind=engine)() as db:
+            db.add_all([
+                models.ExchangeRate(name="BCV", currency_code="USD", currency_symbol="$", rate=1, is_default=True),
+                models.ExchangeRate(name="BCV", currency_code="VES", currency_symbol="Bs", rate=40, is_default=True),
+                models.User(username="admin", password_hash=get_password_hash("admin123"),
+                            role=models.UserRole.ADMIN, is_active=True),
+            ])
+            db.commit()
+        assert run_against(engine, postgres_scans, captured_sql) == []
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
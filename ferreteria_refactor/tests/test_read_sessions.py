@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from backend_api.database import db
+
+
+def test_sqlite_read_engine_is_read_only_and_bounded(tmp_path):
+    path = tmp_path / "pos.db"
+    writer = create_engine(f"sqlite:///{path}")
+    with writer.begin() as conn:
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+        conn.execute(text("CREATE TABLE sales (id INTEGER PRIMARY KEY, total NUMERIC)"))
+        conn.execute(text("INSERT INTO sales (total) VALUES (10), (20)"))
+
+    reader = create_engine(db._sqlite_read_only_url(f"sqlite:///{path}"))
+    db._install_sqlite_timeout(reader, 0.2)
+    with reader.connect() as conn:
+        assert conn.execute(text("SELECT SUM(total) FROM sales")).scalar() == 30
+        with pytest.raises(OperationalError, match="readonly"):
+            conn.execute(text("DELETE FROM sales"))
+        with pytest.raises(OperationalError, match="interrupted"):
+            conn.execute(text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+                              "SELECT COUNT(*) FROM c")).scalar()
+
+        # A report streaming rows does not hold up the POS writer
+        rows = conn.execute(text("SELECT id FROM sales"))
+        rows.fetchone()
+        with writer.begin() as pos:
+            pos.execute(text("INSERT INTO sales (total) VALUES (5)"))
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from backend_api.models import models
+from backend_api.services import receivables
+
+REPORT_URL = "/api/v1/reports/customer-debts"
+
+
+def credit_sale(db, customer, amount, days_past_due, balance=None, paid=False):
+    now = datetime.now()
+    db.add(models.Sale(
+        customer_id=customer.id, total_amount=amount, is_credit=True, paid=paid,
+        balance_pending=balance, date=now - timedelta(days=days_past_due + 15),
+        due_date=now - timedelta(days=days_past_due),
+    ))
+
+
+def seed(db):
+    ana = models.Customer(name="Ana")
+    beto = models.Customer(name="Beto")
+    carla = models.Customer(name="Carla")
+    db.add_all([ana, beto, carla])
+    db.flush()
+
+    credit_sale(db, ana, 100, -5)  # Not due yet
+    credit_sale(db, ana, 50, 45, balance=20)  # Abono already registered on the invoice
+    credit_sale(db, ana, 70, 120)
+    credit_sale(db, ana, 999, 200, paid=True)  # Paid: ignored
+    # Account payment in Bs: 400 / 40 = 10 USD
+    db.add(models.Payment(customer_id=ana.id, amount=400, currency="Bs", exchange_rate_used=40))
+
+    credit_sale(db, beto, 30, 75)
+    credit_sale(db, carla, 25, 10)
+    db.add(models.Payment(customer_id=carla.id, amount=25, currency="USD", exchange_rate_used=1))
+    db.commit()
+    return ana, beto, carla
+
+
+def test_aging_buckets_and_normalised_payments(db_session):
+    ana, beto, carla = seed(db_session)
+
+    report, total = receivables.aging_report(db_session)
+
+    assert total == 2  # Carla paid her invoice on account
+    first, second = report
+    assert first["customer_id"] == ana.id
+    assert first["invoiced"] == 190.0
+    assert first["unapplied_payments"] == 10.0
+    assert first["debt"] == 180.0
+    assert first["buckets"] == {"0_30": 100.0, "31_60": 20.0, "61_90": 0.0, "90_plus": 70.0}
+    assert first["overdue"] == 90.0
+    assert first["open_invoices"] == 3
+    assert first["days_overdue"] == 120
+    assert second["customer_id"] == beto.id
+    assert second["buckets"]["61_90"] == 30.0
+
+
+def test_report_is_one_query_paginated_and_sorted(client, db_session, auth_headers, captured_sql):
+    seed(db_session)
+    with captured_sql(db_session.get_bind(), "open_invoices") as statements:
+        response = client.get(REPORT_URL, params={"sort_by": "name", "order": "desc", "limit": 1},
+                              headers=auth_headers)
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert response.headers["X-Total-Count"] == "2"
+    assert [r["customer_name"] for r in response.json()] == ["Beto"]
+
+    second_page = client.get(REPORT_URL, params={"sort_by": "name", "order": "desc", "limit": 1, "skip": 1},
+                             headers=auth_headers).json()
+    assert [r["customer_name"] for r in second_page] == ["Ana"]
+    assert client.get(REPORT_URL, params={"sort_by": "phone"}, headers=auth_headers).status_code == 400
+
+
+def test_customer_debt_converts_payments_in_sql(client, db_session, auth_headers):
+    ana, _, carla = seed(db_session)
+
+    assert client.get(f"/api/v1/customers/{ana.id}/debt", headers=auth_headers).json() == {"debt": 180.0}
+    assert client.get(f"/api/v1/customers/{carla.id}/debt", headers=auth_headers).json() == {"debt": 0.0}
+    assert client.get("/api/v1/customers/99999/debt", headers=auth_headers).status_code == 404
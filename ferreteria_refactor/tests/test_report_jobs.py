@@ -0,0 +1,90 @@
+import io
+import time
+from datetime import date, datetime
+import openpyxl
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend_api.main import report_job_manager
+from backend_api.models import models
+from backend_api.services import report_jobs
+
+
+@pytest.fixture
+def job_queue(db_session, tmp_path, monkeypatch):
+    """The app's job manager on a temp store, building in threads against the test database"""
+    monkeypatch.setattr(report_job_manager, "directory", str(tmp_path))
+    monkeypatch.setattr(report_job_manager, "_store", None)
+    monkeypatch.setattr(report_job_manager, "use_processes", False)
+    monkeypatch.setattr(report_job_manager, "session_factory", sessionmaker(bind=db_session.get_bind()))
+    events = []
+    monkeypatch.setattr(report_jobs.event_bus, "publish", lambda event, data: events.append((event, data)))
+    return events
+
+
+def seed_sales(db, count):
+    for i in range(count):
+        db.add(models.Sale(total_amount=10 + i, payment_method="Efectivo", date=datetime.now()))
+    db.commit()
+
+
+def wait_for(client, auth_headers, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/v1/reports/jobs/{job_id}", headers=auth_headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_report_job_builds_artifact_and_reuses_it(client, db_session, auth_headers, job_queue):
+    seed_sales(db_session, 12)
+    spec = {"report": "general", "params": {"start_date": str(date.today().replace(day=1)),
+                                            "end_date": str(date.today())}}
+
+    submitted = client.post("/api/v1/reports/jobs", json=spec, headers=auth_headers)
+    assert submitted.status_code == 202, submitted.text
+    job = wait_for(client, auth_headers, submitted.json()["id"])
+
+    assert job["status"] == "done", job["error"]
+    download = client.get(f"/api/v1/reports/jobs/{job['id']}/download", headers=auth_headers)
+    assert download.status_code == 200
+    book = openpyxl.load_workbook(io.BytesIO(download.content))
+    assert book["Ventas Detalladas"].max_row == 13
+    assert job_queue == [("report_job:finished", {"id": job["id"], "report": "general", "status": "done",
+                                                  "user_id": 1, "filename": job["filename"], "error": None})]
+
+    # Same spec, same data: the finished file is served again
+    again = client.post("/api/v1/reports/jobs", json=spec, headers=auth_headers).json()
+    assert again["id"] == job["id"] and again["reused"] is True
+
+    # New sale, new data version: built again
+    seed_sales(db_session, 1)
+    fresh = client.post("/api/v1/reports/jobs", json=spec, headers=auth_headers).json()
+    assert fresh["id"] != job["id"] and fresh["reused"] is False
+    assert wait_for(client, auth_headers, fresh["id"])["status"] == "done"
+
+
+def test_report_job_rejects_bad_specs(client, auth_headers, job_queue):
+    assert client.post("/api/v1/reports/jobs", json={"report": "nope"}, headers=auth_headers).status_code == 400
+    assert client.post("/api/v1/reports/jobs", json={"report": "general", "format": "csv"},
+                       headers=auth_headers).status_code == 400
+    assert client.post("/api/v1/reports/jobs", json={"report": "general", "params": {"start_date": "ayer"}},
+                       headers=auth_headers).status_code == 400
+    assert client.get("/api/v1/reports/jobs/missing", headers=auth_headers).status_code == 404
+
+
+def test_store_claims_by_priority_and_requeues_orphans(tmp_path):
+    store = report_jobs.JobStore(str(tmp_path))
+    low = store.create("inventory", "csv", {}, "a", 7, 1, "a.csv")
+    high = store.create("inventory", "xlsx", {}, "b", 1, 1, "b.xlsx")
+
+    assert store.claim_next()["id"] == high["id"]
+    assert store.active_count(1) == 2
+
+    # The API process that claimed it died: the job goes back to the queue
+    with store._connect() as conn:
+        conn.execute("UPDATE report_jobs SET owner_pid = ? WHERE id = ?", (2 ** 22 + 1, high["id"]))
+    assert store.requeue_orphans() == 1
+    assert [store.claim_next()["id"], store.claim_next()["id"]] == [high["id"], low["id"]]
+    assert store.claim_next() is None
@@ -0,0 +1,117 @@
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services.auth_cache import auth_cache
+
+
+def setup_catalog(db):
+    """Main warehouse with two stocked products and a combo built from them."""
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db.add(warehouse)
+    db.flush()
+
+    cement = models.Product(name="Cemento", price=10.0, stock=20, is_active=True)
+    shovel = models.Product(name="Pala", price=15.0, stock=5, is_active=True)
+    combo = models.Product(name="Combo Emprendedor", price=30.0, stock=0, is_active=True, is_combo=True)
+    db.add_all([cement, shovel, combo])
+    db.flush()
+
+    db.add_all([
+        models.ProductStock(product_id=cement.id, warehouse_id=warehouse.id, quantity=20),
+        models.ProductStock(product_id=shovel.id, warehouse_id=warehouse.id, quantity=5),
+        models.ComboItem(parent_product_id=combo.id, child_product_id=cement.id, quantity=2),
+        models.ComboItem(parent_product_id=combo.id, child_product_id=shovel.id, quantity=1),
+    ])
+    db.commit()
+    return warehouse, cement, shovel, combo
+
+
+def line(product, quantity, price):
+    return {
+        "product_id": product.id,
+        "quantity": quantity,
+        "unit_price": price,
+        "subtotal": price * quantity,
+        "conversion_factor": 1,
+    }
+
+
+def stock_in(db, product, warehouse):
+    return db.query(models.ProductStock).filter(
+        models.ProductStock.product_id == product.id,
+        models.ProductStock.warehouse_id == warehouse.id
+    ).first().quantity
+
+
+def test_multi_line_ticket_with_combo(client, db_session, auth_headers):
+    warehouse, cement, shovel, combo = setup_catalog(db_session)
+
+    payload = {
+        "items": [line(cement, 3, 10.0), line(combo, 2, 30.0), line(cement, 1, 10.0)],
+        "total_amount": 100.0,
+        "payments": [
+            {"amount": 60.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0},
+            {"amount": 1600.0, "currency": "VES", "payment_method": "Pago Movil", "exchange_rate": 40.0},
+        ],
+    }
+    response = client.post("/api/v1/products/sales/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    sale_id = response.json()["sale_id"]
+
+    # 3 + 1 direct units plus 2 combos x 2 units each
+    assert stock_in(db_session, cement, warehouse) == Decimal("12")
+    assert stock_in(db_session, shovel, warehouse) == Decimal("3")
+
+    details = db_session.query(models.SaleDetail).filter(models.SaleDetail.sale_id == sale_id).all()
+    assert len(details) == 3
+    payments = db_session.query(models.SalePayment).filter(models.SalePayment.sale_id == sale_id).all()
+    assert len(payments) == 2
+
+    kardex = db_session.query(models.Kardex).filter(
+        models.Kardex.product_id == cement.id
+    ).order_by(models.Kardex.id).all()
+    assert [k.quantity for k in kardex] == [Decimal("-3"), Decimal("-4"), Decimal("-1")]
+    assert kardex[-1].balance_after == Decimal("12")
+
+
+def test_repeated_lines_are_validated_against_combined_quantity(client, db_session, auth_headers):
+    warehouse, cement, shovel, combo = setup_catalog(db_session)
+
+    # Each line fits on its own (4 <= 5) but together they need 8 shovels
+    payload = {
+        "items": [line(shovel, 4, 15.0), line(shovel, 4, 15.0)],
+        "total_amount": 120.0,
+    }
+    response = client.post("/api/v1/products/sales/", json=payload, headers=auth_headers)
+    assert response.status_code == 400
+    assert "Insufficient stock" in response.text
+
+    db_session.expire_all()
+    assert stock_in(db_session, shovel, warehouse) == Decimal("5")
+
+
+def test_statement_count_does_not_grow_with_ticket_size(client, db_session, auth_headers, captured_sql):
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db_session.add(warehouse)
+    db_session.flush()
+    products = [models.Product(name=f"Tornillo {i}", price=1.0, stock=100, is_active=True) for i in range(30)]
+    db_session.add_all(products)
+    db_session.flush()
+    db_session.add_all([
+        models.ProductStock(product_id=p.id, warehouse_id=warehouse.id, quantity=100) for p in products
+    ])
+    db_session.commit()
+
+    def count_statements(items):
+        auth_cache.clear()  # Both requests resolve the user the same way
+        with captured_sql(db_session.get_bind()) as statements:
+            response = client.post(
+                "/api/v1/products/sales/",
+                json={"items": items, "total_amount": float(len(items))},
+                headers=auth_headers
+            )
+        assert response.status_code == 200, response.text
+        return len([s for s in statements if not s.startswith("UPDATE")])
+
+    small = count_statements([line(p, 1, 1.0) for p in products[:3]])
+    large = count_statements([line(p, 1, 1.0) for p in products])
+    assert large == small
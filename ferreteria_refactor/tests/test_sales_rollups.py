@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import sales_rollups
+
+
+def setup_catalog(db):
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db.add(warehouse)
+    db.flush()
+    cement = models.Product(name="Cemento", price=10.0, cost_price=6.0, stock=100, is_active=True)
+    pipe = models.Product(name="Tubo", price=4.0, cost_price=1.5, stock=100, is_active=True)
+    db.add_all([cement, pipe])
+    db.flush()
+    db.add_all([
+        models.ProductStock(product_id=cement.id, warehouse_id=warehouse.id, quantity=100),
+        models.ProductStock(product_id=pipe.id, warehouse_id=warehouse.id, quantity=100),
+    ])
+    db.commit()
+    return cement, pipe
+
+
+def sell(client, auth_headers, lines, payments):
+    payload = {
+        "items": [
+            {"product_id": p.id, "quantity": qty, "unit_price": price, "subtotal": price * qty, "conversion_factor": 1}
+            for p, qty, price in lines
+        ],
+        "total_amount": sum(price * qty for _, qty, price in lines),
+        "payments": payments,
+    }
+    response = client.post("/api/v1/products/sales/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()["sale_id"]
+
+
+def seed_history(client, db, auth_headers):
+    """Three sales and a return, spread over today and two past days"""
+    cement, pipe = setup_catalog(db)
+    usd = [{"amount": 24.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0}]
+    ves = [{"amount": 400.0, "currency": "VES", "payment_method": "Pago Movil", "exchange_rate": 40.0}]
+    old = sell(client, auth_headers, [(cement, 2, 10.0), (pipe, 1, 4.0)], usd)
+    older = sell(client, auth_headers, [(cement, 1, 10.0)], ves)
+    sell(client, auth_headers, [(pipe, 3, 4.0)], usd)
+
+    session = models.CashSession(user_id=1, initial_cash=0, status="OPEN")
+    db.add(session)
+    db.commit()
+    response = client.post("/api/v1/returns", json={
+        "sale_id": old, "items": [{"product_id": cement.id, "quantity": 1}], "reason": "No lo quiso"
+    }, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    # Move history into the past, then rebuild as after a migration
+    yesterday = datetime.now() - timedelta(days=1)
+    db.query(models.Sale).filter(models.Sale.id == old).update({"date": yesterday})
+    db.query(models.Sale).filter(models.Sale.id == older).update({"date": yesterday - timedelta(days=3)})
+    db.query(models.Return).update({"date": yesterday})
+    db.query(models.CashMovement).update({"date": yesterday})
+    db.commit()
+    return cement, pipe
+
+
+def rollup_rows(db):
+    db.expire_all()
+    return sorted(
+        (r.day, r.product_id, r.warehouse_id, r.currency, r.quantity, r.revenue, r.cost, r.refund_quantity)
+        for r in db.query(models.SalesRollupDaily).all()
+    )
+
+
+def test_sales_and_returns_are_added_on_commit(client, db_session, auth_headers):
+    cement, pipe = setup_catalog(db_session)
+    usd = [{"amount": 24.0, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0}]
+    sale_id = sell(client, auth_headers, [(cement, 2, 10.0), (pipe, 1, 4.0)], usd)
+    sell(client, auth_headers, [(cement, 1, 10.0)], usd)
+    client.post("/api/v1/returns", json={
+        "sale_id": sale_id, "items": [{"product_id": cement.id, "quantity": 1}]
+    }, headers=auth_headers)
+
+    row = db_session.query(models.SalesRollupDaily).filter_by(product_id=cement.id).one()
+    assert row.day == date.today()
+    assert row.quantity == Decimal("3")
+    assert row.revenue == Decimal("30")
+    assert row.cost == Decimal("18")
+    assert row.lines == 2
+    assert row.refund_quantity == Decimal("1")
+    assert row.refund_revenue == Decimal("10")
+
+    money = db_session.query(models.CurrencyRollupDaily).filter_by(currency="USD").one()
+    assert money.sale_count == 2
+    assert money.payment_count == 2
+    assert money.collected == Decimal("48")
+
+
+def test_rebuild_is_idempotent_and_matches_live(client, db_session, auth_headers):
+    seed_history(client, db_session, auth_headers)
+    week_ago = date.today() - timedelta(days=7)
+
+    live = sales_rollups.period_totals(db_session, week_ago, date.today())
+    assert not sales_rollups.is_ready(db_session)
+
+    sales_rollups.rebuild(db_session)
+    first = rollup_rows(db_session)
+    sales_rollups.rebuild(db_session)
+    assert rollup_rows(db_session) == first
+    assert sales_rollups.is_ready(db_session)
+
+    assert sales_rollups.period_totals(db_session, week_ago, date.today()) == live
+    assert live["revenue"] == Decimal("46")
+    assert live["refund_revenue"] == Decimal("10")
+    assert live["sale_count"] == 3
+
+
+def test_abono_on_a_closed_day_reaches_the_rollups(client, db_session, auth_headers):
+    seed_history(client, db_session, auth_headers)
+    sales_rollups.rebuild(db_session)
+    oldest = db_session.query(models.Sale).order_by(models.Sale.date).first()
+    week_ago = date.today() - timedelta(days=7)
+    before = sales_rollups.period_totals(db_session, week_ago, date.today())
+
+    response = client.post("/api/v1/products/sales/payments", json={
+        "sale_id": oldest.id, "amount": 80.0, "currency": "VES", "payment_method": "Pago Movil", "exchange_rate": 40.0
+    }, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    from_rollups = sales_rollups.period_totals(db_session, week_ago, date.today())
+    assert from_rollups["currencies"]["VES"]["collected"] == before["currencies"]["VES"]["collected"] + 80
+    incremental = rollup_rows(db_session)
+    sales_rollups.rebuild(db_session)  # Straight from the base tables
+    assert rollup_rows(db_session) == incremental
+    assert sales_rollups.period_totals(db_session, week_ago, date.today()) == from_rollups
+
+
+def test_report_endpoints_answer_the_same_from_rollups(client, db_session, auth_headers):
+    seed_history(client, db_session, auth_headers)
+    params = {"start_date": str(date.today() - timedelta(days=7)), "end_date": str(date.today())}
+    urls = ["/api/v1/reports/dashboard/financials", "/api/v1/reports/profit/sales", "/api/v1/reports/profit/month"]
+
+    before = [client.get(url, params=params, headers=auth_headers).json() for url in urls]
+    rebuilt = client.post("/api/v1/reports/rollups/rebuild", headers=auth_headers)
+    assert rebuilt.status_code == 200
+    after = [client.get(url, params=params, headers=auth_headers).json() for url in urls]
+
+    assert after == before
+    financials = after[0]
+    assert {c["currency"] for c in financials["sales_by_currency"]} == {"USD", "VES"}
+    # (46 - 10) revenue - (6*3 + 1.5*4 - 6) cost
+    assert financials["profit_estimated"] == 18.0
+    assert after[1]["num_sales"] == 3
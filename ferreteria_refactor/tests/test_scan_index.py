@@ -0,0 +1,93 @@
+import importlib
+import pytest
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import scan_index as scan_module, stock_ledger
+from backend_api.services.scan_index import ScanIndex
+
+products_router = importlib.import_module("backend_api.routers.products")
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = ScanIndex()
+    monkeypatch.setattr(products_router, "scan_index", index)
+    monkeypatch.setattr(scan_module, "scan_index", index)
+    return index
+
+
+def seed(db):
+    main, branch = models.Warehouse(name="Principal", is_main=True), models.Warehouse(name="Sucursal")
+    hammer = models.Product(name="Martillo de Uña", sku="mar-16", price=12, stock=30, unit_type="Unidad",
+                            is_active=True)
+    hammer.units.append(models.ProductUnit(unit_name="Caja", conversion_factor=12, barcode="7591234567890"))
+    cement = models.Product(name="Cemento Gris", sku="CEM-42", price=9, stock=100, is_active=True)
+    cement.units.append(models.ProductUnit(unit_name="Paleta", conversion_factor=40, barcode="7590000000042",
+                                           price_usd=340))
+    db.add_all([main, branch, hammer, cement, models.Product(name="Martinete", sku="OLD-1", price=5, is_active=False)])
+    db.flush()
+    db.add_all([models.ProductStock(product_id=hammer.id, warehouse_id=main.id, quantity=20),
+                models.ProductStock(product_id=hammer.id, warehouse_id=branch.id, quantity=10)])
+    db.commit()
+    return hammer, cement, main
+
+
+def test_scan_answers_from_memory(client, db_session, index, captured_sql):
+    hammer, cement, main = seed(db_session)
+    assert client.get("/api/v1/products/scan/MAR-16").status_code == 503  # Not built yet
+    assert index.rebuild(db_session) == 2
+    hammer_id, cement_id, main_id = hammer.id, cement.id, main.id
+
+    with captured_sql(db_session.get_bind()) as statements:
+        by_sku = client.get("/api/v1/products/scan/ mar-16 ", params={"warehouse_id": main_id}).json()
+        by_barcode = client.get("/api/v1/products/scan/7590000000042").json()
+        by_name = client.get("/api/v1/products/scan/marti").json()
+        missing = client.get("/api/v1/products/scan/9999")
+    assert statements == []
+
+    assert by_sku["exact"] and by_sku["items"][0]["product_id"] == hammer_id
+    item = by_sku["items"][0]
+    assert item["unit_id"] is None and item["price"] == "12.00" and item["warehouse_stock"] == "20.000"
+    assert item["stocks"] == {str(main_id): "20.000", str(main_id + 1): "10.000"}
+
+    unit = by_barcode["items"][0]
+    assert unit["product_id"] == cement_id and unit["unit_name"] == "Paleta"
+    assert unit["conversion_factor"] == "40.0000" and unit["price"] == "340.00"
+
+    assert not by_name["exact"] and [i["name"] for i in by_name["items"]] == ["Martillo de Uña"]  # Inactive left out
+    assert client.get("/api/v1/products/scan/MARTILLO DE UNA").json()["items"][0]["product_id"] == hammer.id
+    assert missing.status_code == 404
+
+
+def test_committed_changes_refresh_the_index(db_session, index):
+    hammer, cement, main = seed(db_session)
+    index.rebuild(db_session)
+    index.refresh(db_session)  # The seed's own commit
+
+    hammer.price = Decimal("15.00")
+    hammer.units[0].barcode = "7591234567999"
+    stock_ledger.decrement(db_session, cement.id, Decimal("4"))
+    db_session.rollback()  # Nothing committed, nothing marked
+    assert index.stats()["pending"] == 0
+
+    hammer = db_session.get(models.Product, hammer.id)
+    hammer.price = Decimal("15.00")
+    hammer.units[0].barcode = "7591234567999"
+    stock_ledger.decrement(db_session, cement.id, Decimal("4"))
+    db_session.commit()
+    assert index.refresh(db_session) == 2
+
+    assert index.lookup("MAR-16")["price"] == Decimal("15.00")
+    assert index.lookup("7591234567890") is None
+    assert index.lookup("7591234567999")["unit_id"] == hammer.units[0].id
+    assert index.lookup("CEM-42")["stock"] == Decimal("96")
+
+    cement.is_active = False
+    db_session.commit()
+    index.refresh(db_session)
+    assert index.lookup("CEM-42") is None and index.lookup("7590000000042") is None
+    assert index.search_name("cem") == []
+
+    # Changes made by other workers arrive as (possibly batched) product events
+    index.on_event("product:batch_updated", {"events": [{"type": "product:stock_updated", "data": {"id": 7}}]})
+    assert index.stats()["pending"] == 1
@@ -0,0 +1,110 @@
+import asyncio
+import inspect
+import threading
+import time
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from backend_api.database import sqlite_profile
+from backend_api.database.db import get_db
+
+
+def profiled_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    lock = sqlite_profile.WriteLock(timeout=10)
+    sqlite_profile.install(engine, write_lock=lock)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER)"))
+        conn.execute(text("INSERT INTO counters VALUES (1, 0)"))
+    return engine, lock
+
+
+def test_pragmas_and_savepoints(tmp_path):
+    engine, _ = profiled_engine(tmp_path / "pos.db")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+
+    session = sessionmaker(bind=engine)()
+    session.execute(text("UPDATE counters SET value = 1"))
+    nested = session.begin_nested()
+    session.execute(text("UPDATE counters SET value = 99"))
+    nested.rollback()  # Only the savepoint goes away
+    session.commit()
+    assert session.execute(text("SELECT value FROM counters")).scalar() == 1
+    session.close()
+
+    maintenance = sqlite_profile.SqliteMaintenance(engine)
+    maintenance.run_once("TRUNCATE")
+    assert maintenance.last_checkpoint[0] == 0  # Not blocked
+
+
+def test_write_sessions_queue_instead_of_failing(tmp_path):
+    engine, lock = profiled_engine(tmp_path / "pos.db")
+    WriteSession = sessionmaker(bind=engine.execution_options(sqlite_begin="IMMEDIATE"))
+    errors = []
+
+    def cashier():
+        for _ in range(25):
+            session = WriteSession()
+            try:
+                # Read, then write: a deferred transaction here ends in "database is locked"
+                value = session.execute(text("SELECT value FROM counters")).scalar()
+                session.execute(text("UPDATE counters SET value = :v"), {"v": value + 1})
+                session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=cashier) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT value FROM counters")).scalar() == 150
+    assert lock.waits >= 150
+
+
+def test_event_loop_never_waits_for_the_write_lock():
+    lock = sqlite_profile.WriteLock(timeout=10)
+
+    async def on_loop():
+        lock.acquire()  # Free: taken without waiting
+        lock.release()
+        lock._lock.acquire()  # Held by some other writer
+        try:
+            started = time.perf_counter()
+            with pytest.raises(sqlite_profile.DatabaseBusyError):
+                lock.acquire()
+            assert time.perf_counter() - started < 1
+        finally:
+            lock.release()
+
+    asyncio.run(on_loop())
+
+
+def api_routes(routes):
+    for route in routes:
+        if isinstance(route, APIRoute):
+            yield route
+        elif hasattr(route, "original_router"):  # Routers included into the app
+            yield from api_routes(route.original_router.routes)
+
+
+def test_mutation_routes_are_not_coroutines():
+    from backend_api.main import app
+    routes = list(api_routes(app.routes))
+    assert len(routes) > 100
+    on_loop = [
+        route.path for route in routes
+        if isinstance(route, APIRoute) and route.methods & {"POST", "PUT", "PATCH", "DELETE"}
+        and inspect.iscoroutinefunction(route.endpoint)
+        and any(dep.call is get_db for dep in route.dependant.dependencies)
+    ]
+    assert on_loop == []
@@ -0,0 +1,56 @@
+import pytest
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import stock_ledger
+
+
+@pytest.fixture
+def stocked(db_session):
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db_session.add(warehouse)
+    db_session.flush()
+    p1 = models.Product(name="Clavo 2\"", price=1.0, stock=10, is_active=True)
+    p2 = models.Product(name="Martillo", price=8.0, stock=3, is_active=True)
+    db_session.add_all([p1, p2])
+    db_session.flush()
+    db_session.add_all([
+        models.ProductStock(product_id=p1.id, warehouse_id=warehouse.id, quantity=10),
+        models.ProductStock(product_id=p2.id, warehouse_id=warehouse.id, quantity=3),
+    ])
+    db_session.commit()
+    return warehouse, p1, p2
+
+
+def test_decrement_is_conditional(db_session, stocked):
+    warehouse, p1, _ = stocked
+
+    level = stock_ledger.decrement(db_session, p1.id, Decimal("4"), warehouse_id=warehouse.id)
+    assert level.warehouse_quantity == Decimal("6")
+    assert level.total_stock == Decimal("6")
+
+    assert stock_ledger.decrement(db_session, p1.id, Decimal("7"), warehouse_id=warehouse.id) is None
+    assert stock_ledger.available(db_session, p1.id, warehouse.id) == Decimal("6")
+
+
+def test_increment_creates_missing_warehouse_row(db_session, stocked):
+    _, p1, _ = stocked
+    branch = models.Warehouse(name="Sucursal", is_active=True)
+    db_session.add(branch)
+    db_session.flush()
+
+    level = stock_ledger.increment(db_session, p1.id, 5, warehouse_id=branch.id, update_total=False)
+    assert level.warehouse_quantity == Decimal("5")
+    assert level.total_stock is None
+    assert stock_ledger.available(db_session, p1.id, branch.id) == Decimal("5")
+
+
+def test_reserve_is_all_or_nothing(db_session, stocked):
+    warehouse, p1, p2 = stocked
+
+    with pytest.raises(stock_ledger.InsufficientStock) as exc:
+        stock_ledger.reserve(db_session, {p1.id: Decimal("2"), p2.id: Decimal("5")}, warehouse_id=warehouse.id)
+
+    assert exc.value.product_id == p2.id
+    assert exc.value.available == Decimal("3")
+    assert stock_ledger.available(db_session, p1.id, warehouse.id) == Decimal("10")
+    assert stock_ledger.available(db_session, p1.id) == Decimal("10")
@@ -0,0 +1,68 @@
+import csv
+import io
+from datetime import datetime
+import openpyxl
+from backend_api.models import models
+from backend_api.services.streaming_export import Cell, Sheet, stream_xlsx
+
+
+def seed(db):
+    customer = models.Customer(name="Ferretería Ana")
+    tools = models.Category(name="Herramientas")
+    db.add_all([customer, tools])
+    db.flush()
+    db.add(models.Product(name="Martillo", sku="MAR-1", price=12, cost_price=7, stock=4, is_active=True,
+                          category_id=tools.id))
+    for i in range(30):
+        db.add(models.Sale(total_amount=10 + i, payment_method="Efectivo", date=datetime.now(),
+                           customer_id=customer.id if i % 2 else None))
+    db.add(models.CashSession(user_id=1, initial_cash=10, final_cash_expected=50, final_cash_reported=45,
+                              status="CLOSED", start_time=datetime.now()))
+    db.commit()
+
+
+def test_workbook_streams_in_chunks_and_opens_in_openpyxl():
+    sheet = Sheet("Datos", ([i, f"fila <{i}> & más"] for i in range(20000)), auto_filter=True)
+    chunks = list(stream_xlsx([Sheet("Resumen", [[Cell("Total", "header"), Cell(9.5, "money")]]), sheet],
+                              chunk_bytes=4096))
+
+    assert len(chunks) > 2  # Data left before the last row was produced
+    book = openpyxl.load_workbook(io.BytesIO(b"".join(chunks)))
+    assert book.sheetnames == ["Resumen", "Datos"]
+    assert book["Resumen"]["A1"].font.b and book["Resumen"]["A1"].fill.fgColor.rgb == "FF4472C4"
+    assert book["Datos"].max_row == 20000
+    assert book["Datos"]["B20000"].value == "fila <19999> & más"
+    assert book["Datos"].auto_filter.ref == "A1:B20000"
+
+
+def test_management_report_keeps_summary_sheets(client, db_session, auth_headers):
+    seed(db_session)
+
+    response = client.get("/api/v1/reports/export/excel", headers=auth_headers)
+
+    assert response.status_code == 200
+    book = openpyxl.load_workbook(io.BytesIO(response.content))
+    assert book.sheetnames == ["Dashboard", "Ventas Detalle", "Auditoría Cajas", "Inventario"]
+    dashboard = {row[0]: row[1] for row in book["Dashboard"].iter_rows(min_row=2, max_row=8, values_only=True)}
+    assert dashboard["Número de Ventas"] == 30
+    assert dashboard["Total Ventas"] == "$735.00"
+    assert dashboard["Total Faltantes Caja"] == "$-5.00"
+    assert book["Ventas Detalle"].max_row == 31
+    assert book["Ventas Detalle"]["C2"].value == "Público General"
+    audit = book["Auditoría Cajas"]
+    assert audit["H2"].value == -5.0 and audit["H2"].fill.fgColor.rgb == "FFFFE6E6"
+
+    csv_response = client.get("/api/v1/reports/export/excel", params={"format": "csv"}, headers=auth_headers)
+    rows = list(csv.reader(io.StringIO(csv_response.content.decode("utf-8-sig"))))
+    assert rows[0][0] == "ID Venta" and len(rows) == 31
+
+
+def test_inventory_export_streams_products(client, db_session, auth_headers):
+    seed(db_session)
+
+    response = client.get("/api/v1/products/export/excel", headers=auth_headers)
+
+    assert response.status_code == 200
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content))["Inventario"]
+    assert [c.value for c in sheet[2]][:4] == [1, "Martillo", "MAR-1", "$12.00"]
+    assert sheet["J2"].value == "Herramientas"
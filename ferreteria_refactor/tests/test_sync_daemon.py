@@ -0,0 +1,125 @@
+import asyncio
+import json
+import uuid
+import httpx
+from sqlalchemy.orm import sessionmaker
+from backend_api.models import models
+from backend_api.services import sync_daemon as daemon_module
+from backend_api.services.sync_daemon import SyncDaemon, backoff_delay
+
+
+class FakeCloud:
+    """Stands in for the VPS: no streaming endpoint, records push batch sizes"""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.push_sizes = []
+
+    def __call__(self, request: httpx.Request):
+        if request.url.path.endswith("/sync/pull/catalog/stream"):
+            return httpx.Response(404)
+        if request.url.path.endswith("/sync/pull/catalog"):
+            return httpx.Response(200, json={"products": [], "deleted": {}, "cursor": "c1", "has_more": False})
+        if request.url.path.endswith("/sync/push/sales"):
+            batch = json.loads(request.content)
+            self.push_sizes.append(len(batch))
+            errors = [{"uuid": s["unique_uuid"], "error": "rejected"} for s in batch if s["unique_uuid"] in self.reject]
+            return httpx.Response(200, json={"processed": len(batch) - len(errors), "skipped": 0, "errors": errors})
+        return httpx.Response(404)
+
+
+def seed_pending_sales(db, n):
+    db.add(models.BusinessConfig(key="cloud_url", value="http://cloud.test"))
+    product = models.Product(name="Pega", price=3, stock=50, is_active=True)
+    db.add(product)
+    db.flush()
+    uuids = []
+    for _ in range(n):
+        sale = models.Sale(total_amount=3, unique_uuid=str(uuid.uuid4()), sync_status="PENDING", is_offline_sale=True)
+        db.add(sale)
+        db.flush()
+        db.add(models.SaleDetail(sale_id=sale.id, product_id=product.id, quantity=1, unit_price=3, subtotal=3))
+        uuids.append(sale.unique_uuid)
+    db.commit()
+    return uuids
+
+
+def make_daemon(db, transport, **kwargs):
+    daemon = SyncDaemon(session_factory=sessionmaker(bind=db.get_bind()), **kwargs)
+    daemon.client = httpx.AsyncClient(transport=transport)
+    return daemon
+
+
+def statuses(db):
+    db.expire_all()
+    return sorted(status for (status,) in db.query(models.Sale.sync_status).all())
+
+
+def test_pushes_pending_sales_in_bounded_batches(db_session):
+    seed_pending_sales(db_session, 5)
+    cloud = FakeCloud()
+    daemon = make_daemon(db_session, httpx.MockTransport(cloud), batch_size=2)
+
+    result = asyncio.run(daemon.run_once())
+
+    assert result["pushed"] == 5
+    assert cloud.push_sizes == [2, 2, 1]
+    assert statuses(db_session) == ["SYNCED"] * 5
+    status = daemon.get_status()
+    assert status["queue_depth"] == 0
+    assert status["pushed_total"] == 5
+    assert status["throughput_per_min"] > 0
+    assert daemon.last_pull["pages"] == 1
+
+
+def test_rejected_sales_do_not_block_the_queue(db_session):
+    uuids = seed_pending_sales(db_session, 3)
+    daemon = make_daemon(db_session, httpx.MockTransport(FakeCloud(reject=[uuids[0]])), batch_size=10)
+
+    asyncio.run(daemon.run_once())
+
+    assert statuses(db_session) == ["ERROR", "SYNCED", "SYNCED"]
+    assert daemon.rejected_total == 1
+
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    for failures in range(1, 12):
+        ceiling = min(60.0, 2.0 * 2 ** (failures - 1))
+        delay = backoff_delay(failures, base=2.0, cap=60.0)
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_unreachable_cloud_puts_worker_in_backoff(db_session, monkeypatch):
+    seed_pending_sales(db_session, 1)
+
+    def unreachable(request):
+        raise httpx.ConnectError("no route to host", request=request)
+
+    async def scenario():
+        daemon = SyncDaemon(session_factory=sessionmaker(bind=db_session.get_bind()), max_backoff=30)
+        real_client = httpx.AsyncClient
+        monkeypatch.setattr(daemon_module.httpx, "AsyncClient",
+                            lambda **kwargs: real_client(transport=httpx.MockTransport(unreachable)))
+        await daemon.start()
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if daemon.consecutive_failures:
+                break
+        status = daemon.get_status()
+        await daemon.stop()
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["state"] == "backoff"
+    assert status["consecutive_failures"] == 1
+    assert "ConnectError" in status["last_error"]
+    assert status["last_success_at"] is None
+    assert statuses(db_session) == ["PENDING"]
+
+
+def test_status_endpoint_reports_queue_depth(client, db_session):
+    seed_pending_sales(db_session, 2)
+    response = client.get("/api/v1/sync-local/status")
+    assert response.status_code == 200
+    assert response.json()["queue_depth"] == 2
+    assert response.json()["running"] is False
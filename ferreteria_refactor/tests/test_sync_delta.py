@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+from backend_api.models import models
+
+
+def seed_catalog(db, n_products=5):
+    category = models.Category(name="Herramientas")
+    spare = models.Category(name="Temporal")
+    db.add_all([category, spare])
+    db.flush()
+    products = [
+        models.Product(name=f"Llave {i}", sku=f"LL-{i}", price=2.0, stock=10, is_active=True, category_id=category.id)
+        for i in range(n_products)
+    ]
+    db.add_all(products)
+    db.commit()
+
+    # Everything "already synced" an hour ago
+    an_hour_ago = datetime.now() - timedelta(hours=1)
+    for model in (models.Category, models.Product, models.ExchangeRate, models.User):
+        db.query(model).update({model.updated_at: an_hour_ago}, synchronize_session=False)
+    db.commit()
+    return category, spare, products
+
+
+def pull_all(client, cursor=None, limit=2000):
+    """Follow has_more like sync_client does; returns merged page data and the final cursor"""
+    merged = {"products": [], "categories": [], "deleted": {}}
+    pages = 0
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/sync/pull/catalog", params=params)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        pages += 1
+        merged["products"] += data["products"]
+        merged["categories"] += data["categories"]
+        for entity, ids in data["deleted"].items():
+            merged["deleted"].setdefault(entity, []).extend(ids)
+        cursor = data["cursor"]
+        if not data["has_more"]:
+            return merged, cursor, pages
+
+
+def test_delta_returns_only_changes_and_tombstones(client, db_session):
+    category, spare, products = seed_catalog(db_session)
+
+    full, cursor, _ = pull_all(client)
+    assert len(full["products"]) == 5
+
+    products[0].price = 3.5
+    products[1].is_active = False
+    db_session.delete(spare)
+    db_session.commit()
+
+    delta, _, _ = pull_all(client, cursor)
+    assert [p["id"] for p in delta["products"]] == [products[0].id]
+    assert delta["deleted"]["products"] == [products[1].id]
+    assert delta["deleted"]["categories"] == [spare.id]
+    assert delta["categories"] == []
+
+
+def test_unit_change_resends_its_product(client, db_session):
+    _, _, products = seed_catalog(db_session)
+    _, cursor, _ = pull_all(client)
+
+    db_session.add(models.ProductUnit(product_id=products[2].id, unit_name="Caja", conversion_factor=12))
+    db_session.commit()
+
+    delta, _, _ = pull_all(client, cursor)
+    assert [p["id"] for p in delta["products"]] == [products[2].id]
+    assert [u["unit_name"] for u in delta["products"][0]["units"]] == ["Caja"]
+
+
+def test_stock_rules_and_combos_resend_their_product(client, db_session):
+    from backend_api.services import stock_ledger
+
+    _, _, products = seed_catalog(db_session)
+    warehouse = models.Warehouse(name="Depósito", is_active=True)
+    db_session.add(warehouse)
+    db_session.commit()
+    _, cursor = pull_all(client)[:2]
+
+    stock_ledger.increment(db_session, products[0].id, 5, warehouse_id=warehouse.id, update_total=False)  # Transfer leg
+    db_session.add(models.PriceRule(product_id=products[1].id, min_quantity=10, price=1.5))
+    db_session.add(models.ComboItem(parent_product_id=products[2].id, child_product_id=products[3].id, quantity=2))
+    db_session.commit()
+
+    delta, _, _ = pull_all(client, cursor)
+    by_id = {p["id"]: p for p in delta["products"]}
+    assert sorted(by_id) == sorted(p.id for p in products[:3])
+    assert [s["quantity"] for s in by_id[products[0].id]["stocks"]] == ["5.000"]
+    assert [r["min_quantity"] for r in by_id[products[1].id]["price_rules"]] == ["10.000"]
+
+
+def test_large_pull_is_paged_without_gaps(client, db_session):
+    seed_catalog(db_session, n_products=7)
+
+    full, _, pages = pull_all(client, limit=3)
+    ids = [p["id"] for p in full["products"]]
+    assert len(ids) == 7
+    assert len(set(ids)) == 7
+    assert pages > 3
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/api/v1/sync/pull/catalog", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_client_applies_page_units_and_deletions(db_session):
+    from backend_api.services import sync_client
+
+    category, _, products = seed_catalog(db_session, n_products=2)
+    old_unit = models.ProductUnit(product_id=products[0].id, unit_name="Bulto", conversion_factor=10)
+    db_session.add(old_unit)
+    db_session.commit()
+
+    page = {
+        "products": [{
+            "id": products[0].id, "name": "Llave renombrada", "price": 4, "stock": 10,
+            "category_id": category.id, "units": [{"id": 999, "unit_name": "Caja", "conversion_factor": 12}],
+        }],
+        "deleted": {"products": [products[1].id]},
+    }
+    sync_client._apply_catalog_page(db_session, page)
+    db_session.commit()
+    db_session.expire_all()
+
+    assert db_session.query(models.Product).get(products[0].id).name == "Llave renombrada"
+    assert db_session.query(models.Product).get(products[1].id).is_active is False
+    units = db_session.query(models.ProductUnit).filter(models.ProductUnit.product_id == products[0].id).all()
+    assert [u.id for u in units] == [999]
+
+
+def test_stream_matches_paged_pull_and_is_gzipped(client, db_session):
+    import json
+    seed_catalog(db_session, n_products=4)
+
+    with client.stream("GET", "/api/v1/sync/pull/catalog/stream") as response:
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        records = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert records[0]["type"] == "header"
+    assert records[-1]["type"] == "end"
+    streamed_products = [r["data"]["id"] for r in records if r.get("entity") == "products"]
+    paged, _, _ = pull_all(client)
+    assert streamed_products == [p["id"] for p in paged["products"]]
+
+    # The stream's cursor continues like a paged one: nothing changed since
+    delta, _, _ = pull_all(client, records[-1]["cursor"])
+    assert delta["products"] == []
+
+
+def test_stream_ingest_applies_in_batches(db_session):
+    from backend_api.services.sync_client import CatalogStreamIngest
+
+    category, _, products = seed_catalog(db_session, n_products=3)
+    category_id = category.id
+    rows = [(p.id, p.name) for p in products]
+
+    ingest = CatalogStreamIngest(db_session, batch_size=2)
+    ingest.feed({"type": "header"})
+    for product_id, name in rows:
+        ingest.feed({"entity": "products", "data": {"id": product_id, "name": f"{name} v2", "price": 2, "category_id": category_id}})
+    ingest.feed({"entity": "products", "deleted": rows[0][0]})
+    ingest.feed({"type": "end", "cursor": "abc"})
+    db_session.commit()
+
+    assert ingest.complete and ingest.cursor == "abc"
+    assert ingest.totals["batches"] == 2
+    names = sorted(n for (n,) in db_session.query(models.Product.name).all())
+    assert names == ["Llave 0 v2", "Llave 1 v2", "Llave 2 v2"]
+    assert db_session.query(models.Product).get(rows[0][0]).is_active is False
+
+
+def test_client_applies_unblocks_and_reactivations(db_session):
+    from backend_api.services import sync_client
+
+    customer = models.Customer(name="Constructora", is_blocked=True)
+    user = models.User(username="caja9", password_hash="x", role=models.UserRole.CASHIER, is_active=False)
+    db_session.add_all([customer, user])
+    db_session.commit()
+
+    sync_client._apply_catalog_page(db_session, {
+        "customers": [{"id": customer.id, "name": "Constructora", "is_blocked": False}],
+        "users": [{"id": user.id, "username": "caja9", "role": "ADMIN", "pin": "4321"},
+                  {"id": 9999, "username": "nuevo", "role": "CASHIER", "pin": None}],
+    })
+    db_session.commit()
+    db_session.expire_all()
+
+    assert db_session.query(models.Customer).get(customer.id).is_blocked is False
+    user = db_session.query(models.User).get(user.id)
+    assert (user.is_active, user.role, user.pin, user.password_hash) == (True, models.UserRole.ADMIN, "4321", "x")
+    assert db_session.query(models.User).get(9999) is None  # No password hash to create it with
+
+
+def test_paged_pull_commits_each_page(db_session):
+    import asyncio
+    import httpx
+    from backend_api.services import sync_client
+
+    category, _, products = seed_catalog(db_session, n_products=2)
+    pages = [
+        {"products": [{"id": products[0].id, "name": "Página 1", "category_id": category.id}],
+         "deleted": {}, "cursor": "page-2", "has_more": True},
+    ]
+    open_transactions = []
+
+    def cloud(request):
+        if request.url.path.endswith("/stream"):
+            return httpx.Response(404)
+        open_transactions.append(db_session.in_transaction())
+        if request.url.params.get("cursor") == "page-2":
+            return httpx.Response(500, text="down")
+        return httpx.Response(200, json=pages[0])
+
+    async def pull():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(cloud)) as http:
+            return await sync_client.pull_catalog_from_cloud(db_session, vps_url="http://cloud", client=http)
+
+    result = asyncio.run(pull())
+    assert result["success"] is False
+    assert open_transactions == [False, False]  # Nothing held open while waiting on the cloud
+    db_session.expire_all()
+    assert db_session.query(models.Product).get(products[0].id).name == "Página 1"
+    assert sync_client._get_sync_cursor(db_session) == "page-2"  # The next pull resumes after page 1
+
+
+def test_indexes_are_only_dropped_on_a_requested_full_resync(db_session, monkeypatch):
+    import asyncio
+    import httpx
+    import pytest
+    from backend_api.services import bulk_upsert, sync_client
+
+    dropped = []
+    monkeypatch.setattr(bulk_upsert, "drop_secondary_indexes", lambda db, tables: dropped.append(True) or [])
+    monkeypatch.setattr(bulk_upsert, "ensure_secondary_indexes", lambda db, tables: [])
+    page = {"products": [], "deleted": {}, "cursor": "next", "has_more": False}
+
+    def cloud(request):
+        return httpx.Response(404) if request.url.path.endswith("/stream") else httpx.Response(200, json=page)
+
+    async def pull(**kwargs):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(cloud)) as http:
+            return await sync_client.pull_catalog_from_cloud(db_session, vps_url="http://cloud", client=http, **kwargs)
+
+    assert sync_client._get_sync_cursor(db_session) is None
+    asyncio.run(pull())  # First pull: full pass, indexes kept
+    assert dropped == []
+    with pytest.raises(ValueError):
+        asyncio.run(pull(drop_indexes=True))
+    asyncio.run(pull(full_resync=True, drop_indexes=True))
+    assert dropped == [True]
@@ -0,0 +1,91 @@
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import sales_sync
+
+PUSH_URL = "/api/v1/sync/push/sales"
+
+
+def seed_products(db, n=3):
+    products = [models.Product(name=f"Cemento {i}", price=10, stock=100, is_active=True) for i in range(n)]
+    db.add_all(products)
+    db.commit()
+    return [p.id for p in products]
+
+
+def offline_sale(uuid, items, payments=None):
+    return {
+        "unique_uuid": uuid,
+        "total_amount": "10.00",
+        "payment_method": "Efectivo",
+        "is_offline_sale": True,
+        "items": [
+            {"product_id": pid, "quantity": str(qty), "unit_price": "10.00", "subtotal": "10.00"}
+            for pid, qty in items
+        ],
+        "payments": payments or [{"amount": "10.00", "currency": "USD", "payment_method": "Efectivo"}],
+    }
+
+
+def stock_of(db, product_id):
+    db.expire_all()
+    return db.query(models.Product).get(product_id).stock
+
+
+def test_push_is_idempotent_and_aggregates_stock(client, db_session):
+    a, b, _ = seed_products(db_session)
+    batch = [
+        offline_sale("u-1", [(a, 2), (b, 1)]),
+        offline_sale("u-2", [(a, 3)]),
+        offline_sale("u-2", [(a, 3)]),  # Retried inside the same batch
+    ]
+
+    first = client.post(PUSH_URL, json=batch).json()
+    assert first == {"processed": 2, "skipped": 1, "errors": []}
+    assert stock_of(db_session, a) == Decimal("95")
+    assert stock_of(db_session, b) == Decimal("99")
+    assert db_session.query(models.SalePayment).count() == 2
+    assert db_session.query(models.SaleDetail).count() == 3
+
+    again = client.post(PUSH_URL, json=batch).json()
+    assert again == {"processed": 0, "skipped": 3, "errors": []}
+    assert stock_of(db_session, a) == Decimal("95")
+
+
+def test_statement_count_does_not_grow_with_batch(client, db_session, captured_sql):
+    ids = seed_products(db_session)
+    batch = [offline_sale(f"bulk-{i}", [(ids[i % 3], 1)]) for i in range(200)]
+
+    with captured_sql(db_session.get_bind()) as statements:
+        result = client.post(PUSH_URL, json=batch).json()
+
+    assert result["processed"] == 200
+    assert len(statements) < 20
+    assert db_session.query(models.Sale).count() == 200
+
+
+def test_failing_sale_does_not_discard_the_batch(client, db_session, monkeypatch):
+    a, b, _ = seed_products(db_session)
+    original = sales_sync._sale_row
+
+    def broken_row(sale_data, now):
+        row = original(sale_data, now)
+        if sale_data.unique_uuid == "bad":
+            row["total_amount"] = None  # NOT NULL violation at insert time
+        return row
+
+    monkeypatch.setattr(sales_sync, "_sale_row", broken_row)
+    batch = [
+        offline_sale("ok-1", [(a, 1)]),
+        offline_sale("bad", [(a, 50)]),
+        offline_sale("unknown-product", [(999999, 1)]),
+        offline_sale("ok-2", [(b, 4)]),
+    ]
+    result = client.post(PUSH_URL, json=batch).json()
+
+    assert result["processed"] == 2
+    assert sorted(e["uuid"] for e in result["errors"]) == ["bad", "unknown-product"]
+    stored = sorted(u for (u,) in db_session.query(models.Sale.unique_uuid).all())
+    assert stored == ["ok-1", "ok-2"]
+    # Only the stored sales moved stock
+    assert stock_of(db_session, a) == Decimal("99")
+    assert stock_of(db_session, b) == Decimal("96")
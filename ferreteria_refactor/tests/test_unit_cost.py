@@ -0,0 +1,94 @@
+from datetime import datetime
+from decimal import Decimal
+from backend_api.models import models
+from backend_api.services import cost_backfill
+
+
+def setup_catalog(db):
+    warehouse = models.Warehouse(name="Principal", is_main=True, is_active=True)
+    db.add(warehouse)
+    db.flush()
+    cement = models.Product(name="Cemento", price=10.0, cost_price=6.0, stock=50, is_active=True)
+    shovel = models.Product(name="Pala", price=15.0, cost_price=9.0, stock=50, is_active=True)
+    combo = models.Product(name="Combo", price=30.0, cost_price=0, stock=0, is_active=True, is_combo=True)
+    db.add_all([cement, shovel, combo])
+    db.flush()
+    db.add_all([
+        models.ProductStock(product_id=cement.id, warehouse_id=warehouse.id, quantity=50),
+        models.ProductStock(product_id=shovel.id, warehouse_id=warehouse.id, quantity=50),
+        models.ComboItem(parent_product_id=combo.id, child_product_id=cement.id, quantity=2),
+        models.ComboItem(parent_product_id=combo.id, child_product_id=shovel.id, quantity=1),
+    ])
+    db.commit()
+    return cement, shovel, combo
+
+
+def sell(client, auth_headers, product, quantity, price):
+    payload = {
+        "items": [{"product_id": product.id, "quantity": quantity, "unit_price": price,
+                   "subtotal": price * quantity, "conversion_factor": 1}],
+        "total_amount": price * quantity,
+        "payments": [{"amount": price * quantity, "currency": "USD", "payment_method": "Efectivo", "exchange_rate": 1.0}],
+    }
+    response = client.post("/api/v1/products/sales/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()["sale_id"]
+
+
+def test_profit_uses_cost_at_time_of_sale(client, db_session, auth_headers):
+    cement, shovel, combo = setup_catalog(db_session)
+    sale_id = sell(client, auth_headers, cement, 2, 10.0)
+    sell(client, auth_headers, combo, 1, 30.0)
+
+    # A later purchase moves the average cost; history must not change
+    cement.cost_price = 8.0
+    db_session.commit()
+
+    details = {d.product_id: d.unit_cost for d in db_session.query(models.SaleDetail).all()}
+    assert details[cement.id] == Decimal("6")
+    assert details[combo.id] == Decimal("21")  # 2 x 6 + 1 x 9
+
+    profit = client.get("/api/v1/reports/profit/sales", headers=auth_headers).json()
+    assert Decimal(str(profit["total_cost"])) == Decimal("33")
+    by_product = client.get(f"/api/v1/reports/profit/product/{cement.id}", headers=auth_headers).json()
+    assert Decimal(str(by_product["total_profit"])) == Decimal("8")
+
+    client.post("/api/v1/returns", json={
+        "sale_id": sale_id, "items": [{"product_id": cement.id, "quantity": 1}]
+    }, headers=auth_headers)
+    assert db_session.query(models.ReturnDetail).one().unit_cost == Decimal("6")
+
+
+def test_backfill_estimates_old_lines_from_purchases(db_session):
+    product = models.Product(name="Tubo", price=5, cost_price=3, stock=0)
+    supplier = models.Supplier(name="Proveedor")
+    db_session.add_all([product, supplier])
+    db_session.flush()
+    for when, cost in [(datetime(2025, 1, 1), Decimal("2")), (datetime(2025, 6, 1), Decimal("4"))]:
+        order = models.PurchaseOrder(supplier_id=supplier.id, purchase_date=when, total_amount=cost)
+        db_session.add(order)
+        db_session.flush()
+        db_session.add(models.PurchaseItem(purchase_id=order.id, product_id=product.id, quantity=1, unit_cost=cost))
+
+    sales = []
+    for when in [datetime(2024, 12, 1), datetime(2025, 3, 1), datetime(2025, 7, 1), datetime(2026, 2, 1)]:
+        sale = models.Sale(total_amount=5, date=when)
+        db_session.add(sale)
+        db_session.flush()
+        db_session.add(models.SaleDetail(sale_id=sale.id, product_id=product.id, quantity=1,
+                                         unit_price=5, subtotal=5, unit_cost=3))
+        sales.append(sale)
+    ret = models.Return(sale_id=sales[1].id, total_refunded=5, date=datetime(2025, 3, 2))
+    db_session.add(ret)
+    db_session.flush()
+    db_session.add(models.ReturnDetail(return_id=ret.id, product_id=product.id, quantity=1, unit_price=5, unit_cost=3))
+    db_session.commit()
+
+    result = cost_backfill.backfill(db_session, before=datetime(2026, 1, 1), chunk_size=2)
+
+    assert result == {"sale_lines": 3, "return_lines": 1}
+    db_session.expire_all()
+    costs = [d.unit_cost for d in db_session.query(models.SaleDetail).order_by(models.SaleDetail.id)]
+    # No purchase yet -> kept; then last purchase on or before the sale; after the cutoff -> untouched
+    assert costs == [Decimal("3"), Decimal("2"), Decimal("4"), Decimal("3")]
+    assert db_session.query(models.ReturnDetail).one().unit_cost == Decimal("2")
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from backend_api.websocket.manager import ConnectionManager
+from backend_api.websocket.events import WebSocketEvents
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0, block=False):
+        self.delay = delay
+        self.block = block
+        self.received = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed = code
+
+    async def send_text(self, message):
+        if self.block:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(json.loads(message))
+
+
+def test_stalled_client_does_not_delay_others():
+    async def scenario():
+        manager = ConnectionManager(send_timeout=0.2)
+        stalled, fast = FakeSocket(block=True), FakeSocket()
+        await manager.connect(stalled)
+        await manager.connect(fast)
+
+        await manager.broadcast(WebSocketEvents.SALE_COMPLETED, {"id": 1})
+        await asyncio.sleep(0.01)
+        assert [m["data"]["id"] for m in fast.received] == [1]
+
+        await asyncio.sleep(0.3)
+        return manager, stalled
+
+    manager, stalled = asyncio.run(scenario())
+    assert manager.get_connection_count() == 1
+    assert manager.timed_out_count == 1
+    assert stalled.closed == 1013  # The frontend reconnects on close
+
+
+def test_slow_client_queue_collapses_then_closes_on_overflow():
+    async def scenario():
+        manager = ConnectionManager(max_queue=3)
+        slow = FakeSocket(delay=0.05)
+        client = await manager.connect(slow)
+
+        for stock in range(10):  # Same product: one queued message, newest payload
+            await manager.broadcast(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 7, "stock": stock})
+        assert len(client.queue) <= 1 and client.collapsed > 0
+        for sale_id in range(5):
+            await manager.broadcast(WebSocketEvents.SALE_COMPLETED, {"id": sale_id})
+
+        await asyncio.sleep(0.2)
+        return manager, slow, client
+
+    manager, slow, client = asyncio.run(scenario())
+    assert client.dropped > 0
+    assert slow.closed == 1013
+    assert manager.get_connection_count() == 0 and manager.overflow_count == 1
+
+
+def test_replies_share_the_client_queue():
+    async def scenario():
+        manager = ConnectionManager()
+        socket = FakeSocket()
+        await manager.connect(socket)
+        await manager.broadcast(WebSocketEvents.SALE_COMPLETED, {"id": 1})
+        assert manager.send_to(socket, json.dumps({"type": "subscribed", "data": {}}))
+        await asyncio.sleep(0.01)
+        return socket
+
+    socket = asyncio.run(scenario())
+    assert [m["type"] for m in socket.received] == [WebSocketEvents.SALE_COMPLETED, "subscribed"]
+
+
+def test_topic_and_warehouse_subscriptions():
+    async def scenario():
+        manager = ConnectionManager()
+        dashboard, cashier_a, cashier_b = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(dashboard, topics=[WebSocketEvents.SALE_COMPLETED])
+        await manager.connect(cashier_a, topics=["product:*"], warehouse_id=1)
+        await manager.connect(cashier_b, topics=["product:*"], warehouse_id=2)
+
+        await manager.broadcast(WebSocketEvents.PRODUCT_BATCH_UPDATED, {"events": [
+            {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 1, "stock": 5, "warehouse_id": 1}},
+            {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 2, "stock": 3, "warehouse_id": 2}},
+        ]})
+        await manager.broadcast(WebSocketEvents.SALE_COMPLETED, {"id": 10})
+        await asyncio.sleep(0.01)
+        return dashboard, cashier_a, cashier_b
+
+    dashboard, cashier_a, cashier_b = asyncio.run(scenario())
+    assert [m["type"] for m in dashboard.received] == [WebSocketEvents.SALE_COMPLETED]
+    assert [e["data"]["id"] for e in cashier_a.received[0]["data"]["events"]] == [1]
+    assert [e["data"]["id"] for e in cashier_b.received[0]["data"]["events"]] == [2]
+    assert len(cashier_a.received) == 1
+
+
+def test_batches_are_filtered_by_inner_topic():
+    async def scenario():
+        manager = ConnectionManager()
+        stock_only, everything, sales = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(stock_only, topics=[WebSocketEvents.PRODUCT_STOCK_UPDATED])
+        await manager.connect(everything)
+        await manager.connect(sales, topics=[WebSocketEvents.SALE_COMPLETED])
+
+        await manager.broadcast(WebSocketEvents.PRODUCT_BATCH_UPDATED, {"events": [
+            {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 1, "stock": 5}},
+            {"type": WebSocketEvents.PRODUCT_UPDATED, "data": {"id": 2, "price": 3}},
+        ]})
+        await asyncio.sleep(0.01)
+        return stock_only, everything, sales
+
+    stock_only, everything, sales = asyncio.run(scenario())
+    assert [e["data"]["id"] for e in stock_only.received[0]["data"]["events"]] == [1]
+    assert [e["data"]["id"] for e in everything.received[0]["data"]["events"]] == [1, 2]
+    assert sales.received == []
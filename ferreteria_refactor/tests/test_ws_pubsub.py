@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+import socket
+from backend_api.websocket.events import WebSocketEvents
+from backend_api.websocket.pubsub import DeliveryFilter, Envelope, LocalSocketBackend
+
+WORKERS = 3
+EVENTS_PER_WORKER = 5
+
+
+def test_duplicates_and_stale_entity_updates_are_dropped():
+    node_a, node_b = Envelope("a"), Envelope("b")
+    delivery = DeliveryFilter()
+
+    older = node_a.wrap(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 1, "stock": 9})
+    newer = node_b.wrap(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 1, "stock": 8})
+
+    assert delivery.accept(newer) == (WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 1, "stock": 8})
+    assert delivery.accept(newer) is None  # same envelope delivered twice
+    assert delivery.accept(older) is None  # arrived late, already superseded
+    assert delivery.duplicates == 1
+    assert delivery.stale == 1
+
+    # Events without an entity id are never considered stale
+    sale = node_a.wrap(WebSocketEvents.SALE_COMPLETED, {"total_amount": 5})
+    assert delivery.accept(sale) is not None
+
+
+def test_batch_keeps_only_current_entities():
+    node = Envelope("a")
+    delivery = DeliveryFilter()
+    delivery.accept(node.wrap(WebSocketEvents.PRODUCT_STOCK_UPDATED, {"id": 2, "stock": 1}))
+    stale_batch = {
+        **node.wrap(WebSocketEvents.PRODUCT_BATCH_UPDATED, {"events": []}),
+        "version": [0, "a", 0],
+        "data": {"events": [
+            {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 2, "stock": 5}},
+            {"type": WebSocketEvents.PRODUCT_STOCK_UPDATED, "data": {"id": 3, "stock": 5}},
+        ]},
+    }
+    event_type, data = delivery.accept(stale_batch)
+    assert [e["data"]["id"] for e in data["events"]] == [3]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(worker_id, address, barrier, results):
+    """One API worker: joins the local broker, publishes, records what it receives"""
+    async def main():
+        received = []
+        backend = LocalSocketBackend(address)
+        await backend.start(received.append)
+        await asyncio.wait_for(backend.connected.wait(), timeout=10)
+
+        await asyncio.to_thread(barrier.wait, 10)
+        envelope = Envelope(f"worker-{worker_id}")
+        for i in range(EVENTS_PER_WORKER):
+            await backend.publish(envelope.wrap(WebSocketEvents.SALE_COMPLETED, {"worker": worker_id, "n": i}))
+
+        deadline = asyncio.get_running_loop().time() + 10
+        while len(received) < WORKERS * EVENTS_PER_WORKER and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+
+        # Keep the broker alive until everybody is done
+        await asyncio.to_thread(barrier.wait, 10)
+        await backend.stop()
+        return [(e["data"]["worker"], e["data"]["n"]) for e in received]
+
+    results.put((worker_id, asyncio.run(main())))
+
+
+def test_local_broker_fans_out_across_worker_processes():
+    ctx = multiprocessing.get_context("spawn")
+    address = f"127.0.0.1:{_free_port()}"
+    barrier = ctx.Barrier(WORKERS)
+    results = ctx.Queue()
+
+    processes = [ctx.Process(target=_worker, args=(n, address, barrier, results)) for n in range(WORKERS)]
+    for p in processes:
+        p.start()
+    collected = dict(results.get(timeout=60) for _ in processes)
+    for p in processes:
+        p.join(timeout=10)
+
+    expected = {(w, n) for w in range(WORKERS) for n in range(EVENTS_PER_WORKER)}
+    for worker_id, received in collected.items():
+        assert len(received) == len(expected), worker_id
+        assert set(received) == expected
+        # Per-origin order is preserved
+        for w in range(WORKERS):
+            assert [n for origin, n in received if origin == w] == list(range(EVENTS_PER_WORKER))